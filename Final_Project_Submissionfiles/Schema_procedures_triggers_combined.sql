@@ -1,3 +1,13 @@
+-- =====================================================================
+-- COMBINED INSTALL SCRIPT (generated - do not edit by hand)
+-- sql_src/schema.sql, sql_src/migrations/*.sql and
+-- sql_src/procedures_triggers.sql, in that order. Regenerate after
+-- changing any of them (lines 1-39 are this header and the preamble):
+--   F=Final_Project_Submissionfiles/Schema_procedures_triggers_combined.sql
+--   (sed -n '1,39p' $F; cat sql_src/schema.sql; for f in sql_src/migrations/*.sql; \
+--    do echo; cat "$f"; done; echo; cat sql_src/procedures_triggers.sql; echo) > /tmp/c.sql && mv /tmp/c.sql $F
+-- =====================================================================
+
 -- =====================================================================
 -- CREATE DATABASE
 -- =====================================================================
@@ -34,22 +44,31 @@ DROP TABLE IF EXISTS Manufacturer;
 CREATE TABLE Manufacturer (
     manufacturer_id VARCHAR(20) PRIMARY KEY,
     name VARCHAR(255) NOT NULL
+    -- Other manufacturer details (address, etc.) could go here
 );
 
 CREATE TABLE Supplier (
     supplier_id VARCHAR(20) PRIMARY KEY,
     name VARCHAR(255) NOT NULL
+    -- Other supplier details
 );
 
+-- Handles the login and role for all users
 CREATE TABLE AppUser (
     user_id INT PRIMARY KEY AUTO_INCREMENT,
     username VARCHAR(100) NOT NULL UNIQUE,
     password_hash VARCHAR(255) NOT NULL,
+    -- This role determines which menu the user sees
     role ENUM('Manufacturer', 'Supplier', 'Viewer') NOT NULL,
+    
+    -- These FKs link a user login to their specific company profile
+    -- A user can only be one role, so only one of these will be non-NULL.
     manufacturer_id VARCHAR(20) NULL,
     supplier_id VARCHAR(20) NULL,
+    
     FOREIGN KEY (manufacturer_id) REFERENCES Manufacturer(manufacturer_id),
     FOREIGN KEY (supplier_id) REFERENCES Supplier(supplier_id),
+    -- A CHECK constraint to ensure a user isn't both a supplier AND a manufacturer
     CONSTRAINT chk_user_role CHECK (
         (role = 'Manufacturer' AND manufacturer_id IS NOT NULL AND supplier_id IS NULL) OR
         (role = 'Supplier' AND supplier_id IS NOT NULL AND manufacturer_id IS NULL) OR
@@ -58,7 +77,7 @@ CREATE TABLE AppUser (
 );
 
 -- =====================================================================
--- 2. PRODUCT & RECIPE DEFINITIONS
+-- 2. PRODUCT & RECIPE DEFINITIONS (The "Templates")
 -- =====================================================================
 
 CREATE TABLE Category (
@@ -69,68 +88,89 @@ CREATE TABLE Category (
 CREATE TABLE Ingredient (
     ingredient_id VARCHAR(20) PRIMARY KEY,
     name VARCHAR(255) NOT NULL UNIQUE,
+    -- This 'type' is critical for the "no grandchildren" rule
     ingredient_type ENUM('ATOMIC', 'COMPOUND') NOT NULL
 );
 
 CREATE TABLE Product (
     product_id VARCHAR(20) PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
+    
+    -- FK to link to a category (e.g., 'Dinners')
     category_id VARCHAR(20) NOT NULL,
+    -- FK to establish product "ownership" by a manufacturer
     manufacturer_id VARCHAR(20) NOT NULL,
+    
+    -- Standard batch size for production validation
     standard_batch_size INT NOT NULL CHECK (standard_batch_size > 0),
+    
     FOREIGN KEY (category_id) REFERENCES Category(category_id),
     FOREIGN KEY (manufacturer_id) REFERENCES Manufacturer(manufacturer_id)
 );
 
+-- Stores the "template" for a product (e.g., "v1 Steak Dinner")
+-- This allows a Product to have multiple recipe versions over time
 CREATE TABLE Recipe (
     recipe_id INT PRIMARY KEY AUTO_INCREMENT,
     product_id VARCHAR(20) NOT NULL,
-    name VARCHAR(100) NOT NULL,
+    name VARCHAR(100) NOT NULL, -- e.g., "v1-standard", "v2-low-sodium"
     creation_date DATE NOT NULL,
-    is_active BOOLEAN DEFAULT TRUE,
+    is_active BOOLEAN DEFAULT TRUE, -- Good for knowing which to use
+    
     FOREIGN KEY (product_id) REFERENCES Product(product_id),
-    UNIQUE KEY (product_id, name)
+    UNIQUE KEY (product_id, name) -- A product can't have two recipes named "v1"
 );
 
+-- Linking table for the manufacturer's BOM (Recipe -> Ingredients)
 CREATE TABLE RecipeIngredient (
     recipe_id INT NOT NULL,
     ingredient_id VARCHAR(20) NOT NULL,
     quantity DECIMAL(10, 2) NOT NULL,
-    unit_of_measure VARCHAR(20) NOT NULL,
+    unit_of_measure VARCHAR(20) NOT NULL, -- e.g., 'g', 'lbs', 'oz'
+    
     PRIMARY KEY (recipe_id, ingredient_id),
     FOREIGN KEY (recipe_id) REFERENCES Recipe(recipe_id),
     FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id)
 );
 
 -- =====================================================================
--- 3. SUPPLIER FORMULATIONS
+-- 3. SUPPLIER FORMULATIONS (Supplier-specific Ingredient definitions)
 -- =====================================================================
 
+-- Supplier formulation (ingredient offering)
 CREATE TABLE Formulation (
     formulation_id INT PRIMARY KEY AUTO_INCREMENT,
     supplier_id VARCHAR(20) NOT NULL,
     ingredient_id VARCHAR(20) NOT NULL,
+    
     pack_size VARCHAR(50) NOT NULL,
     unit_price DECIMAL(10, 2) NOT NULL,
+    
+    -- Used for versioning and selecting the "active" formulation
     valid_from_date DATE NOT NULL,
-    valid_to_date DATE,
+    valid_to_date DATE, -- NULL means it's currently active
+    
     FOREIGN KEY (supplier_id) REFERENCES Supplier(supplier_id),
     FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id)
 );
 
+-- Linking table for the supplier's "nested BOM"
+-- This REPLACES our initial 'CompoundIngredientMaterials' idea
 CREATE TABLE FormulationMaterials (
     formulation_id INT NOT NULL,
     material_ingredient_id VARCHAR(20) NOT NULL,
     quantity DECIMAL(10, 2) NOT NULL,
+    
     PRIMARY KEY (formulation_id, material_ingredient_id),
     FOREIGN KEY (formulation_id) REFERENCES Formulation(formulation_id),
     FOREIGN KEY (material_ingredient_id) REFERENCES Ingredient(ingredient_id)
 );
 
 -- =====================================================================
--- 4. INVENTORY & TRACEABILITY
+-- 4. INVENTORY & TRACEABILITY (The "Physical" Lots)
 -- =====================================================================
 
+-- Physical inventory of raw materials from suppliers
 CREATE TABLE IngredientBatch (
     lot_number VARCHAR(255) PRIMARY KEY,
     ingredient_id VARCHAR(20) NOT NULL,
@@ -140,11 +180,14 @@ CREATE TABLE IngredientBatch (
     per_unit_cost DECIMAL(10, 2) NOT NULL,
     expiration_date DATE NOT NULL,
     intake_date DATE NOT NULL,
+    
     FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id),
     FOREIGN KEY (supplier_id) REFERENCES Supplier(supplier_id),
-    UNIQUE KEY (ingredient_id, supplier_id, supplier_batch_id)
+    -- Ensures you can't have two 'B001' batches for the same ingredient from the same supplier
+    UNIQUE KEY (ingredient_id, supplier_id, supplier_batch_id) 
 );
 
+-- Physical inventory of finished goods made by the manufacturer
 CREATE TABLE ProductBatch (
     lot_number VARCHAR(255) PRIMARY KEY,
     product_id VARCHAR(20) NOT NULL,
@@ -155,16 +198,19 @@ CREATE TABLE ProductBatch (
     production_date DATETIME NOT NULL,
     total_batch_cost DECIMAL(10, 2),
     recipe_id_used INT NOT NULL,
+    
     FOREIGN KEY (product_id) REFERENCES Product(product_id),
     FOREIGN KEY (manufacturer_id) REFERENCES Manufacturer(manufacturer_id),
     FOREIGN KEY (recipe_id_used) REFERENCES Recipe(recipe_id),
     UNIQUE KEY (product_id, manufacturer_id, manufacturer_batch_id)
 );
 
+-- Links ingredient batches to product batches
 CREATE TABLE BatchConsumption (
     product_lot_number VARCHAR(255) NOT NULL,
     ingredient_lot_number VARCHAR(255) NOT NULL,
     quantity_consumed DECIMAL(10, 2) NOT NULL,
+    
     PRIMARY KEY (product_lot_number, ingredient_lot_number),
     FOREIGN KEY (product_lot_number) REFERENCES ProductBatch(lot_number),
     FOREIGN KEY (ingredient_lot_number) REFERENCES IngredientBatch(lot_number)
@@ -174,32 +220,258 @@ CREATE TABLE BatchConsumption (
 -- 5. GRADUATE FEATURES
 -- =====================================================================
 
+-- Stores the (ingredient_a, ingredient_b) incompatible pairs
 CREATE TABLE DoNotCombine (
     ingredient_a_id VARCHAR(20) NOT NULL,
     ingredient_b_id VARCHAR(20) NOT NULL,
+    
     PRIMARY KEY (ingredient_a_id, ingredient_b_id),
     FOREIGN KEY (ingredient_a_id) REFERENCES Ingredient(ingredient_id),
     FOREIGN KEY (ingredient_b_id) REFERENCES Ingredient(ingredient_id),
+    -- This prevents duplicate pairs (A,B) and (B,A)
     CONSTRAINT chk_ingredient_order CHECK (ingredient_a_id < ingredient_b_id)
 );
+-- =====================================================================
+-- MIGRATION 001: Covering indexes for the hot query paths
+-- Apply once on an existing database (re-running it is harmless: an index
+-- that already exists is skipped):
+--   mysql -u root -p Meal_Manufacturer < sql_src/migrations/001_hot_path_indexes.sql
+-- The same set is declared in indexes.py (HOT_PATH_INDEXES), which can also
+-- create any missing index and verify via EXPLAIN that the queries use them.
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+-- MySQL has no CREATE INDEX IF NOT EXISTS; this helper only lives for the
+-- length of the migration.
+DROP PROCEDURE IF EXISTS Create_Index_If_Missing;
+
+DELIMITER //
+CREATE PROCEDURE Create_Index_If_Missing(
+    IN p_table VARCHAR(64),
+    IN p_index VARCHAR(64),
+    IN p_columns VARCHAR(255)
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE table_schema = DATABASE()
+          AND table_name = p_table
+          AND index_name = p_index
+    ) THEN
+        SET @meal_index_ddl = CONCAT('CREATE INDEX ', p_index, ' ON ', p_table, ' (', p_columns, ')');
+        PREPARE stmt FROM @meal_index_ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END;
+//
+DELIMITER ;
+
+-- FEFO: ingredient_id = ? AND quantity_on_hand > 0 AND expiration_date > CURDATE()
+--       ORDER BY expiration_date, lot_number
+-- lot_number is listed explicitly so the ORDER BY is served by the index,
+-- and quantity_on_hand makes it covering.
+CALL Create_Index_If_Missing('IngredientBatch', 'idx_ib_fefo',
+    'ingredient_id, expiration_date, lot_number, quantity_on_hand');
+
+-- Formulation validity-range lookups (lot intake authorization,
+-- Evaluate_Health_Risk flattening, generate_ingredient_list).
+CALL Create_Index_If_Missing('Formulation', 'idx_formulation_validity',
+    'ingredient_id, supplier_id, valid_from_date, valid_to_date');
+
+-- Consumption by ingredient lot (recall tracing, supplier reports).
+CALL Create_Index_If_Missing('BatchConsumption', 'idx_bc_ingredient_lot',
+    'ingredient_lot_number, product_lot_number, quantity_consumed');
+
+-- "Latest batch of product X by manufacturer Y" (report 1).
+CALL Create_Index_If_Missing('ProductBatch', 'idx_pb_product_date',
+    'product_id, manufacturer_id, production_date');
+
+-- Active recipe lookup (create_product_batch, generate_ingredient_list).
+CALL Create_Index_If_Missing('Recipe', 'idx_recipe_active',
+    'product_id, is_active');
+
+DROP PROCEDURE Create_Index_If_Missing;
+
+-- =====================================================================
+-- MIGRATION 002: Materialized flattened recipes
+-- Cache of the fully flattened (atomic-only) BOM of a recipe as of a date.
+-- Filled on demand by Flatten_Recipe, which also drops a recipe's past
+-- days when it fills a new one, and invalidated by triggers on
+-- RecipeIngredient, Formulation and FormulationMaterials
+-- (see sql_src/procedures_triggers.sql).
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS FlattenedRecipe (
+    recipe_id INT NOT NULL,
+    -- Formulations are resolved as of this date
+    effective_date DATE NOT NULL,
+    -- Always an ATOMIC ingredient after flattening
+    ingredient_id VARCHAR(20) NOT NULL,
+    -- Quantity per produced unit (recipe quantity x material quantities)
+    quantity DECIMAL(20, 6) NOT NULL,
+
+    PRIMARY KEY (recipe_id, effective_date, ingredient_id),
+    FOREIGN KEY (recipe_id) REFERENCES Recipe(recipe_id),
+    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id)
+);
+
+-- =====================================================================
+-- MIGRATION 003: Symmetric DoNotCombine index
+-- DoNotCombine stores each pair once (a < b). IncompatiblePair stores it in
+-- both directions so "which partners does X have?" is a single primary-key
+-- probe. It is kept in sync by triggers on DoNotCombine
+-- (see sql_src/procedures_triggers.sql).
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS IncompatiblePair (
+    ingredient_id VARCHAR(20) NOT NULL,
+    partner_id VARCHAR(20) NOT NULL,
+
+    PRIMARY KEY (ingredient_id, partner_id),
+    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id),
+    FOREIGN KEY (partner_id) REFERENCES Ingredient(ingredient_id)
+);
+
+-- Backfill from the existing rules
+INSERT IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+SELECT ingredient_a_id, ingredient_b_id FROM DoNotCombine
+UNION ALL
+SELECT ingredient_b_id, ingredient_a_id FROM DoNotCombine;
+
+-- =====================================================================
+-- MIGRATION 004: Per-ingredient stock summary
+-- One row per ingredient with its total quantity on hand, the earliest
+-- expiration date among lots that still have stock, and the number of such
+-- lots. Reports 6 and 7 read it instead of aggregating every IngredientBatch
+-- row. It is maintained incrementally by the IngredientBatch triggers (every
+-- consumption / adjustment reaches them through trg_maintain_on_hand_*),
+-- see sql_src/procedures_triggers.sql.
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS IngredientStockSummary (
+    ingredient_id VARCHAR(20) PRIMARY KEY,
+    total_on_hand DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    earliest_expiry DATE NULL,      -- over lots with quantity_on_hand > 0
+    lot_count INT NOT NULL DEFAULT 0,  -- lots with quantity_on_hand > 0
+
+    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id),
+    INDEX idx_stock_summary_expiry (earliest_expiry)
+);
+
+-- Backfill from the current lots
+REPLACE INTO IngredientStockSummary (ingredient_id, total_on_hand, earliest_expiry, lot_count)
+SELECT
+    ingredient_id,
+    SUM(quantity_on_hand),
+    MIN(CASE WHEN quantity_on_hand > 0 THEN expiration_date END),
+    SUM(quantity_on_hand > 0)
+FROM IngredientBatch
+GROUP BY ingredient_id;
+
+-- =====================================================================
+-- MIGRATION 006: Hot / archive split for historical lots and batches
+-- MySQL cannot range-partition InnoDB tables that have or are referenced
+-- by foreign keys, and IngredientBatch / ProductBatch / BatchConsumption
+-- are linked by FKs. Cold rows are instead moved to *Archive tables (same
+-- columns, no FKs) by archive.py, in short chunked transactions.
+-- The All* views union hot and archived rows for queries that explicitly
+-- ask for history (genealogy traces, report 4 with include_archive).
+-- Archived lot numbers cannot be reused: the lot-number triggers in
+-- sql_src/procedures_triggers.sql reject them, so every lot_number appears
+-- once across hot and archive tables.
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS IngredientBatchArchive (
+    lot_number VARCHAR(255) PRIMARY KEY,
+    ingredient_id VARCHAR(20) NOT NULL,
+    supplier_id VARCHAR(20) NOT NULL,
+    supplier_batch_id VARCHAR(100) NOT NULL,
+    quantity_on_hand DECIMAL(10, 2) NOT NULL,
+    per_unit_cost DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    intake_date DATE NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_iba_ingredient (ingredient_id, expiration_date)
+);
+
+CREATE TABLE IF NOT EXISTS ProductBatchArchive (
+    lot_number VARCHAR(255) PRIMARY KEY,
+    product_id VARCHAR(20) NOT NULL,
+    manufacturer_id VARCHAR(20) NOT NULL,
+    manufacturer_batch_id VARCHAR(100) NOT NULL,
+    produced_quantity INT NOT NULL,
+    expiration_date DATE NOT NULL,
+    production_date DATETIME NOT NULL,
+    total_batch_cost DECIMAL(10, 2),
+    recipe_id_used INT NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_pba_product_date (product_id, manufacturer_id, production_date)
+);
+
+CREATE TABLE IF NOT EXISTS BatchConsumptionArchive (
+    product_lot_number VARCHAR(255) NOT NULL,
+    ingredient_lot_number VARCHAR(255) NOT NULL,
+    quantity_consumed DECIMAL(10, 2) NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (product_lot_number, ingredient_lot_number),
+    INDEX idx_bca_ingredient_lot (ingredient_lot_number, product_lot_number, quantity_consumed)
+);
+
+CREATE OR REPLACE VIEW AllIngredientBatch AS
+    SELECT lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand,
+           per_unit_cost, expiration_date, intake_date, 0 AS archived
+    FROM IngredientBatch
+    UNION ALL
+    SELECT lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand,
+           per_unit_cost, expiration_date, intake_date, 1 AS archived
+    FROM IngredientBatchArchive;
+
+CREATE OR REPLACE VIEW AllProductBatch AS
+    SELECT lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+           expiration_date, production_date, total_batch_cost, recipe_id_used, 0 AS archived
+    FROM ProductBatch
+    UNION ALL
+    SELECT lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+           expiration_date, production_date, total_batch_cost, recipe_id_used, 1 AS archived
+    FROM ProductBatchArchive;
+
+CREATE OR REPLACE VIEW AllBatchConsumption AS
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed, 0 AS archived
+    FROM BatchConsumption
+    UNION ALL
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed, 1 AS archived
+    FROM BatchConsumptionArchive;
 
 -- ============================================
--- DROP Triggers and Procedures if exists
+-- STORED PROCEDURES AND TRIGGERS
+-- Meal Manufacturer Database
 -- ============================================
 
-DROP TRIGGER IF EXISTS trg_compute_ingredient_lot_number;
-DROP TRIGGER IF EXISTS trg_compute_product_lot_number;
-DROP TRIGGER IF EXISTS trg_validate_consumption;
-DROP TRIGGER IF EXISTS trg_maintain_on_hand_CONSUME;
-DROP TRIGGER IF EXISTS trg_maintain_on_hand_ADJUST;
-DROP PROCEDURE IF EXISTS Evaluate_Health_Risk;
-DROP PROCEDURE IF EXISTS Record_Production_Batch;
-DROP PROCEDURE IF EXISTS Trace_Recall;
+USE Meal_Manufacturer;
+
+-- ============================================
+-- TRIGGERS
+-- ============================================
 
 -- ============================================
--- Compute Ingredient Lot Trigger
+-- LOT NUMBER TRIGGERS
 -- ============================================
 
+DROP TRIGGER IF EXISTS trg_compute_ingredient_lot_number;
+
 DELIMITER //
 CREATE TRIGGER trg_compute_ingredient_lot_number
 BEFORE INSERT ON IngredientBatch
@@ -212,12 +484,15 @@ BEGIN
     '-', 
     NEW.supplier_batch_id
   );
+  -- Archived lot numbers stay taken (migration 006, archive.py)
+  IF EXISTS (SELECT 1 FROM IngredientBatchArchive WHERE lot_number = NEW.lot_number) THEN
+    SIGNAL SQLSTATE '45000'
+      SET MESSAGE_TEXT = 'ERROR: Lot number already used by an archived lot.';
+  END IF;
 END;
 //
 
--- ============================================
--- Compute Product Lot Trigger
--- ============================================
+DROP TRIGGER IF EXISTS trg_compute_product_lot_number;
 //
 CREATE TRIGGER trg_compute_product_lot_number
 BEFORE INSERT ON ProductBatch
@@ -230,41 +505,66 @@ BEGIN
     '-', 
     NEW.manufacturer_batch_id
   );
+  -- Archived lot numbers stay taken (migration 006, archive.py)
+  IF EXISTS (SELECT 1 FROM ProductBatchArchive WHERE lot_number = NEW.lot_number) THEN
+    SIGNAL SQLSTATE '45000'
+      SET MESSAGE_TEXT = 'ERROR: Lot number already used by an archived batch.';
+  END IF;
 END;
 //
 
 -- ============================================
--- Master Consumption Validation Trigger
+-- MASTER CONSUMPTION VALIDATION TRIGGER (UPDATED)
 -- ============================================
 
+-- Drop the old trigger
+DROP TRIGGER IF EXISTS trg_prevent_expired_consumption;
+//
+-- Drop the new trigger if it exists
+DROP TRIGGER IF EXISTS trg_validate_consumption;
 //
 CREATE TRIGGER trg_validate_consumption
+-- Fire *before* a consumption record is saved
 BEFORE INSERT ON BatchConsumption
 FOR EACH ROW
 BEGIN
+    -- 1. Create variables to hold the data we need to check
     DECLARE v_expiration_date DATE;
     DECLARE v_quantity_on_hand DECIMAL(10, 2);
 
-    SELECT expiration_date, quantity_on_hand 
-    INTO v_expiration_date, v_quantity_on_hand
+    -- 2. Look up the batch data from the 'parent' table
+    SELECT expiration_date, quantity_on_hand INTO v_expiration_date, v_quantity_on_hand
     FROM IngredientBatch
     WHERE lot_number = NEW.ingredient_lot_number;
 
+    -- 3. CHECK 1: Is the lot expired?
     IF CURDATE() > v_expiration_date THEN
+        -- If it is expired, stop the INSERT and throw a custom error.
         SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'ERROR: Cannot consume an expired ingredient lot! Lot has expired.';
     END IF;
-
+    
+    -- 4. CHECK 2: Is there enough quantity?
     IF v_quantity_on_hand < NEW.quantity_consumed THEN
+        -- If not enough stock, stop the INSERT and throw a custom error.
         SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'ERROR: Not enough quantity on hand. A-vailable: v_quantity_on_hand, Tried to consume: NEW.quantity_consumed';
     END IF;
+    
+    -- If both checks pass, the trigger finishes and the INSERT proceeds.
 END;
 //
 
 -- ============================================
--- Maintain On-Hand Triggers
+-- MAINTAIN ON-HAND TRIGGERS (NEWLY ADDED)
 -- ============================================
+
+-- ---------------------------------------------------------------------
+-- Trigger 1: "Consumption"
+-- This trigger fires *after* a consumption record is inserted
+-- and SUBTRACTS the quantity from the ingredient batch.
+-- ---------------------------------------------------------------------
+DROP TRIGGER IF EXISTS trg_maintain_on_hand_CONSUME;
 //
 CREATE TRIGGER trg_maintain_on_hand_CONSUME
 AFTER INSERT ON BatchConsumption
@@ -276,91 +576,619 @@ BEGIN
 END;
 //
 
+-- ---------------------------------------------------------------------
+-- Trigger 2: "Adjustment"
+-- This trigger fires *after* a consumption record is deleted
+-- and ADDS the quantity *back* to the ingredient batch.
+-- archive.py sets @meal_archiving while it moves consumption rows to
+-- BatchConsumptionArchive; that is not a reversal, so stock is unchanged.
+-- ---------------------------------------------------------------------
+DROP TRIGGER IF EXISTS trg_maintain_on_hand_ADJUST;
 //
 CREATE TRIGGER trg_maintain_on_hand_ADJUST
 AFTER DELETE ON BatchConsumption
 FOR EACH ROW
 BEGIN
-    UPDATE IngredientBatch
-    SET quantity_on_hand = quantity_on_hand + OLD.quantity_consumed
-    WHERE lot_number = OLD.ingredient_lot_number;
+    IF @meal_archiving IS NULL THEN
+        UPDATE IngredientBatch
+        SET quantity_on_hand = quantity_on_hand + OLD.quantity_consumed
+        WHERE lot_number = OLD.ingredient_lot_number;
+    END IF;
 END;
 //
 
 -- ============================================
--- Procedures (already DROP IF EXISTS)
+-- INGREDIENT STOCK SUMMARY (migration 004)
+-- Keeps IngredientStockSummary in step with IngredientBatch. The
+-- consumption triggers above update IngredientBatch, so they reach these
+-- triggers too. A lot counts as "in stock" while quantity_on_hand > 0.
 -- ============================================
--- Evaluate_Health_Risk
 
+-- ---------------------------------------------------------------------
+-- Procedure: Apply Stock Delta
+-- Adds p_qty_delta / p_lot_delta to one ingredient's summary row.
+-- p_added_expiry: expiration date of a lot that is (now) in stock.
+-- p_removed_expiry: expiration date of a lot that left the stock; only when
+-- it was the earliest is the minimum re-read (one idx_ib_fefo range probe).
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Apply_Stock_Delta;
 //
-CREATE PROCEDURE Evaluate_Health_Risk(IN p_consumption_list JSON)
+CREATE PROCEDURE Apply_Stock_Delta(
+    IN p_ingredient_id VARCHAR(20),
+    IN p_qty_delta DECIMAL(14, 2),
+    IN p_lot_delta INT,
+    IN p_added_expiry DATE,
+    IN p_removed_expiry DATE
+)
 BEGIN
-    DECLARE v_conflict_count INT DEFAULT 0;
-    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Flattened_Atomics (ingredient_id VARCHAR(20) PRIMARY KEY);
-    TRUNCATE TABLE Temp_Flattened_Atomics;
+    INSERT INTO IngredientStockSummary (ingredient_id, total_on_hand, earliest_expiry, lot_count)
+    VALUES (p_ingredient_id, p_qty_delta, p_added_expiry, GREATEST(p_lot_delta, 0))
+    ON DUPLICATE KEY UPDATE
+        total_on_hand = total_on_hand + p_qty_delta,
+        lot_count = lot_count + p_lot_delta,
+        earliest_expiry = CASE
+            WHEN p_added_expiry IS NULL THEN earliest_expiry
+            WHEN earliest_expiry IS NULL THEN p_added_expiry
+            ELSE LEAST(earliest_expiry, p_added_expiry)
+        END;
 
-    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Affected_Lots (
-        lot_number VARCHAR(255) PRIMARY KEY
-    );
-    TRUNCATE TABLE Temp_Affected_Lots;
+    IF p_removed_expiry IS NOT NULL THEN
+        UPDATE IngredientStockSummary
+        SET earliest_expiry = (
+            SELECT MIN(expiration_date)
+            FROM IngredientBatch
+            WHERE ingredient_id = p_ingredient_id
+              AND quantity_on_hand > 0
+        )
+        WHERE ingredient_id = p_ingredient_id
+          AND earliest_expiry >= p_removed_expiry;
+    END IF;
+END;
+//
 
-    -- =================================================================
-    -- Create temporary tables to store intermediate results
-    -- =================================================================
-    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Flattened_Atomics_2 (
-        ingredient_id VARCHAR(20) PRIMARY KEY
-    );
-   TRUNCATE TABLE Temp_Flattened_Atomics_2;
-
-
-    INSERT INTO Temp_Affected_Lots (lot_number)
-    SELECT lot FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
-        lot VARCHAR(255) PATH '$.lot'
-    )) AS jt;
-
-    INSERT IGNORE INTO Temp_Flattened_Atomics (ingredient_id)
-    SELECT ib.ingredient_id
-    FROM IngredientBatch ib
-    JOIN Temp_Affected_Lots al ON ib.lot_number = al.lot_number
-    JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
-    WHERE i.ingredient_type = 'ATOMIC';
-
-    INSERT IGNORE INTO Temp_Flattened_Atomics (ingredient_id)
-    SELECT fm.material_ingredient_id
-    FROM IngredientBatch ib
-    JOIN Temp_Affected_Lots al ON ib.lot_number = al.lot_number
-    JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
-    JOIN Formulation f ON f.ingredient_id = ib.ingredient_id
-        AND f.supplier_id = ib.supplier_id
-        AND ib.intake_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
-    JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
-    WHERE i.ingredient_type = 'COMPOUND';
-
-    INSERT INTO Temp_Flattened_Atomics_2 (ingredient_id)
-    SELECT ingredient_id FROM Temp_Flattened_Atomics;
-
-    SELECT COUNT(*) INTO v_conflict_count
-    FROM Temp_Flattened_Atomics AS t1
-    JOIN DoNotCombine AS dnc ON t1.ingredient_id = dnc.ingredient_a_id
-    JOIN Temp_Flattened_Atomics_2 AS t2 ON dnc.ingredient_b_id = t2.ingredient_id;
-
-    SET v_conflict_count = v_conflict_count + (
-        SELECT COUNT(*)
-        FROM Temp_Flattened_Atomics AS t1
-        JOIN DoNotCombine AS dnc ON t1.ingredient_id = dnc.ingredient_b_id
-        JOIN Temp_Flattened_Atomics_2 AS t2 ON dnc.ingredient_a_id = t2.ingredient_id
+DROP TRIGGER IF EXISTS trg_stock_summary_insert;
+//
+CREATE TRIGGER trg_stock_summary_insert
+AFTER INSERT ON IngredientBatch
+FOR EACH ROW
+BEGIN
+    CALL Apply_Stock_Delta(NEW.ingredient_id, NEW.quantity_on_hand, NEW.quantity_on_hand > 0,
+        IF(NEW.quantity_on_hand > 0, NEW.expiration_date, NULL), NULL);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_stock_summary_update;
+//
+CREATE TRIGGER trg_stock_summary_update
+AFTER UPDATE ON IngredientBatch
+FOR EACH ROW
+BEGIN
+    IF NEW.ingredient_id = OLD.ingredient_id THEN
+        IF NEW.quantity_on_hand <> OLD.quantity_on_hand OR NEW.expiration_date <> OLD.expiration_date THEN
+            CALL Apply_Stock_Delta(NEW.ingredient_id,
+                NEW.quantity_on_hand - OLD.quantity_on_hand,
+                (NEW.quantity_on_hand > 0) - (OLD.quantity_on_hand > 0),
+                IF(NEW.quantity_on_hand > 0, NEW.expiration_date, NULL),
+                IF(OLD.quantity_on_hand > 0
+                   AND (NEW.quantity_on_hand <= 0 OR NEW.expiration_date <> OLD.expiration_date),
+                   OLD.expiration_date, NULL));
+        END IF;
+    ELSE
+        CALL Apply_Stock_Delta(OLD.ingredient_id, -OLD.quantity_on_hand, -(OLD.quantity_on_hand > 0),
+            NULL, IF(OLD.quantity_on_hand > 0, OLD.expiration_date, NULL));
+        CALL Apply_Stock_Delta(NEW.ingredient_id, NEW.quantity_on_hand, NEW.quantity_on_hand > 0,
+            IF(NEW.quantity_on_hand > 0, NEW.expiration_date, NULL), NULL);
+    END IF;
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_stock_summary_delete;
+//
+CREATE TRIGGER trg_stock_summary_delete
+AFTER DELETE ON IngredientBatch
+FOR EACH ROW
+BEGIN
+    CALL Apply_Stock_Delta(OLD.ingredient_id, -OLD.quantity_on_hand, -(OLD.quantity_on_hand > 0),
+        NULL, IF(OLD.quantity_on_hand > 0, OLD.expiration_date, NULL));
+END;
+//
+
+-- ============================================
+-- FLATTENED RECIPE CACHE (migration 002)
+-- ============================================
+
+-- ---------------------------------------------------------------------
+-- Procedure: Flatten Recipe
+-- Returns the atomic ingredients of a recipe (per produced unit) as of
+-- p_effective_date (NULL = today). Compound ingredients are expanded
+-- through their active Formulation at any nesting depth with a recursive
+-- CTE; the result is cached in FlattenedRecipe. Filling a day drops the
+-- recipe's cached days before today (other than the one requested), so
+-- the cache keeps at most one past day per recipe.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Flatten_Recipe;
+//
+CREATE PROCEDURE Flatten_Recipe(
+    IN p_recipe_id INT,
+    IN p_effective_date DATE
+)
+BEGIN
+    DECLARE v_effective_date DATE DEFAULT COALESCE(p_effective_date, CURDATE());
+
+    IF NOT EXISTS (
+        SELECT 1 FROM FlattenedRecipe
+        WHERE recipe_id = p_recipe_id AND effective_date = v_effective_date
+    ) THEN
+        DELETE FROM FlattenedRecipe
+        WHERE recipe_id = p_recipe_id
+          AND effective_date < CURDATE()
+          AND effective_date <> v_effective_date;
+
+        -- IGNORE: another session may have cached the same key concurrently
+        INSERT IGNORE INTO FlattenedRecipe (recipe_id, effective_date, ingredient_id, quantity)
+        WITH RECURSIVE bom (ingredient_id, ingredient_type, quantity, depth) AS (
+            SELECT
+                ri.ingredient_id,
+                i.ingredient_type,
+                CAST(ri.quantity AS DECIMAL(20, 6)),
+                0
+            FROM RecipeIngredient ri
+            JOIN Ingredient i ON i.ingredient_id = ri.ingredient_id
+            WHERE ri.recipe_id = p_recipe_id
+
+            UNION ALL
+
+            -- Expand every COMPOUND through the formulation active on the date
+            SELECT
+                fm.material_ingredient_id,
+                mi.ingredient_type,
+                b.quantity * fm.quantity,
+                b.depth + 1
+            FROM bom b
+            JOIN Formulation f
+              ON f.ingredient_id = b.ingredient_id
+             AND v_effective_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+            JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+            JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+            WHERE b.ingredient_type = 'COMPOUND'
+              AND b.depth < 10  -- guards against accidental cycles
+        )
+        SELECT p_recipe_id, v_effective_date, ingredient_id, SUM(quantity)
+        FROM bom
+        WHERE ingredient_type = 'ATOMIC'
+        GROUP BY ingredient_id;
+    END IF;
+
+    SELECT
+        fr.ingredient_id,
+        i.name,
+        fr.quantity
+    FROM FlattenedRecipe fr
+    JOIN Ingredient i ON i.ingredient_id = fr.ingredient_id
+    WHERE fr.recipe_id = p_recipe_id
+      AND fr.effective_date = v_effective_date
+    ORDER BY fr.quantity DESC, i.name;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Invalidate Flattened Recipes (by ingredient)
+-- Drops the cached flattening of every recipe that uses p_ingredient_id,
+-- directly or nested inside a compound at any depth.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Invalidate_Flattened_Recipes;
+//
+CREATE PROCEDURE Invalidate_Flattened_Recipes(
+    IN p_ingredient_id VARCHAR(20)
+)
+BEGIN
+    DELETE FROM FlattenedRecipe
+    WHERE recipe_id IN (
+        SELECT recipe_id FROM (
+            WITH RECURSIVE affected (ingredient_id) AS (
+                SELECT CAST(p_ingredient_id AS CHAR(20))
+                UNION
+                -- every compound whose formulation contains an affected ingredient
+                SELECT f.ingredient_id
+                FROM affected a
+                JOIN FormulationMaterials fm ON fm.material_ingredient_id = a.ingredient_id
+                JOIN Formulation f ON f.formulation_id = fm.formulation_id
+            )
+            SELECT DISTINCT ri.recipe_id
+            FROM RecipeIngredient ri
+            JOIN affected a ON a.ingredient_id = ri.ingredient_id
+        ) AS affected_recipes
     );
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_ri_insert;
+//
+CREATE TRIGGER trg_flattened_recipe_ri_insert
+AFTER INSERT ON RecipeIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id = NEW.recipe_id;
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_ri_update;
+//
+CREATE TRIGGER trg_flattened_recipe_ri_update
+AFTER UPDATE ON RecipeIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_ri_delete;
+//
+CREATE TRIGGER trg_flattened_recipe_ri_delete
+AFTER DELETE ON RecipeIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id = OLD.recipe_id;
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_formulation_insert;
+//
+CREATE TRIGGER trg_flattened_recipe_formulation_insert
+AFTER INSERT ON Formulation
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(NEW.ingredient_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_formulation_update;
+//
+CREATE TRIGGER trg_flattened_recipe_formulation_update
+AFTER UPDATE ON Formulation
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(OLD.ingredient_id);
+    CALL Invalidate_Flattened_Recipes(NEW.ingredient_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_formulation_delete;
+//
+CREATE TRIGGER trg_flattened_recipe_formulation_delete
+AFTER DELETE ON Formulation
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(OLD.ingredient_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_fm_insert;
+//
+CREATE TRIGGER trg_flattened_recipe_fm_insert
+AFTER INSERT ON FormulationMaterials
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = NEW.formulation_id));
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_fm_update;
+//
+CREATE TRIGGER trg_flattened_recipe_fm_update
+AFTER UPDATE ON FormulationMaterials
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = OLD.formulation_id));
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = NEW.formulation_id));
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_fm_delete;
+//
+CREATE TRIGGER trg_flattened_recipe_fm_delete
+AFTER DELETE ON FormulationMaterials
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = OLD.formulation_id));
+END;
+//
+
+-- ============================================
+-- INCOMPATIBLE PAIR SYNC (migration 003)
+-- Mirrors every DoNotCombine row into IncompatiblePair in both directions.
+-- ============================================
+
+DROP TRIGGER IF EXISTS trg_incompatible_pair_insert;
+//
+CREATE TRIGGER trg_incompatible_pair_insert
+AFTER INSERT ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+    VALUES (NEW.ingredient_a_id, NEW.ingredient_b_id),
+           (NEW.ingredient_b_id, NEW.ingredient_a_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_incompatible_pair_update;
+//
+CREATE TRIGGER trg_incompatible_pair_update
+AFTER UPDATE ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM IncompatiblePair
+    WHERE (ingredient_id = OLD.ingredient_a_id AND partner_id = OLD.ingredient_b_id)
+       OR (ingredient_id = OLD.ingredient_b_id AND partner_id = OLD.ingredient_a_id);
+
+    INSERT IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+    VALUES (NEW.ingredient_a_id, NEW.ingredient_b_id),
+           (NEW.ingredient_b_id, NEW.ingredient_a_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_incompatible_pair_delete;
+//
+CREATE TRIGGER trg_incompatible_pair_delete
+AFTER DELETE ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM IncompatiblePair
+    WHERE (ingredient_id = OLD.ingredient_a_id AND partner_id = OLD.ingredient_b_id)
+       OR (ingredient_id = OLD.ingredient_b_id AND partner_id = OLD.ingredient_a_id);
+END;
+//
+
+-- ============================================
+-- STAGED CONSUMPTION
+-- The consumption plan lives in ConsumptionStage, a TEMPORARY table of the
+-- session, while a batch is checked and posted. Posters never share stage
+-- rows, index ranges or locks. Open_Consumption_Stage creates the table
+-- before the posting transaction starts. CREATE TEMPORARY TABLE does not
+-- commit implicitly, and the pool's session reset drops the table again.
+-- Python stages a plan with one multi-row INSERT. The JSON procedures stage
+-- it with a single JSON_TABLE pass and then run the same staged logic.
+-- ============================================
+
+-- ---------------------------------------------------------------------
+-- Procedure: Open Consumption Stage
+-- Creates this session's stage table if it does not exist yet.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Open_Consumption_Stage;
+//
+CREATE PROCEDURE Open_Consumption_Stage()
+BEGIN
+    CREATE TEMPORARY TABLE IF NOT EXISTS ConsumptionStage (
+        lot_number VARCHAR(255) NOT NULL PRIMARY KEY,
+        qty DECIMAL(10, 2) NOT NULL
+    ) ENGINE = InnoDB;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Stage Consumption List
+-- Replaces this session's staged plan with the JSON list
+-- [{"lot": ..., "qty": ...}] (duplicate lots are summed).
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Stage_Consumption_List;
+//
+CREATE PROCEDURE Stage_Consumption_List(
+    IN p_consumption_list JSON
+)
+BEGIN
+    CALL Open_Consumption_Stage();
+    DELETE FROM ConsumptionStage;
+
+    INSERT INTO ConsumptionStage (lot_number, qty)
+    SELECT jt.lot, SUM(COALESCE(jt.qty, 0))
+    FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
+        lot VARCHAR(255) PATH '$.lot',
+        qty DECIMAL(10, 2) PATH '$.qty'
+    )) AS jt
+    GROUP BY jt.lot;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Evaluate Staged Health Risk
+-- Flattens the staged lots to their atomic ingredients and probes
+-- IncompatiblePair once per ingredient. No temporary tables, so nothing
+-- DDL-like runs inside the posting transaction.
+-- Compound lots resolve through their own supplier's formulation as of the
+-- lot's intake date; nested compounds through any formulation active then.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Evaluate_Staged_Health_Risk;
+//
+CREATE PROCEDURE Evaluate_Staged_Health_Risk()
+BEGIN
+    DECLARE v_conflict VARCHAR(64) DEFAULT NULL;
+    DECLARE v_message VARCHAR(255);
 
-    IF v_conflict_count > 0 THEN
+    WITH RECURSIVE atoms (ingredient_id, ingredient_type, supplier_id, as_of_date, depth) AS (
+        SELECT
+            ib.ingredient_id,
+            i.ingredient_type,
+            ib.supplier_id,
+            ib.intake_date,
+            0
+        FROM ConsumptionStage cs
+        JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+
+        UNION ALL
+
+        SELECT
+            fm.material_ingredient_id,
+            mi.ingredient_type,
+            NULL,
+            a.as_of_date,
+            a.depth + 1
+        FROM atoms a
+        JOIN Formulation f
+          ON f.ingredient_id = a.ingredient_id
+         AND (a.supplier_id IS NULL OR f.supplier_id = a.supplier_id)
+         AND a.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE a.ingredient_type = 'COMPOUND'
+          AND a.depth < 10
+    ),
+    batch_atoms AS (
+        SELECT DISTINCT ingredient_id FROM atoms WHERE ingredient_type = 'ATOMIC'
+    )
+    -- One primary-key probe per atom; each pair is reported once (a < b)
+    SELECT MIN(CONCAT(ip.ingredient_id, ' + ', ip.partner_id))
+    INTO v_conflict
+    FROM batch_atoms ba
+    JOIN IncompatiblePair ip ON ip.ingredient_id = ba.ingredient_id
+    WHERE ip.ingredient_id < ip.partner_id
+      AND ip.partner_id IN (SELECT ingredient_id FROM batch_atoms);
+
+    IF v_conflict IS NOT NULL THEN
+        SET v_message = LEFT(CONCAT(
+            'ERROR: Health risk detected! Incompatible ingredients found in batch: ', v_conflict), 128);
         SIGNAL SQLSTATE '45000'
-        SET MESSAGE_TEXT = 'ERROR: Health risk detected! Incompatible ingredients found in batch.';
+        SET MESSAGE_TEXT = v_message;
     END IF;
+
 END;
 //
 
--- Record_Production_Batch
+-- ---------------------------------------------------------------------
+-- Procedure: Evaluate Health Risk
+-- JSON entry point (kept for compatibility): the Evaluate_Staged_Health_Risk
+-- check over the lots of the JSON list, read with JSON_TABLE. The session's
+-- ConsumptionStage is left alone, so a plan the caller has staged survives.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Evaluate_Health_Risk;
 //
-CREATE PROCEDURE Record_Production_Batch(
+CREATE PROCEDURE Evaluate_Health_Risk(
+    IN p_consumption_list JSON
+)
+BEGIN
+    DECLARE v_conflict VARCHAR(64) DEFAULT NULL;
+    DECLARE v_message VARCHAR(255);
+
+    WITH RECURSIVE atoms (ingredient_id, ingredient_type, supplier_id, as_of_date, depth) AS (
+        SELECT
+            ib.ingredient_id,
+            i.ingredient_type,
+            ib.supplier_id,
+            ib.intake_date,
+            0
+        FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
+            lot VARCHAR(255) PATH '$.lot'
+        )) AS jt
+        JOIN IngredientBatch ib ON ib.lot_number = jt.lot
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+
+        UNION ALL
+
+        SELECT
+            fm.material_ingredient_id,
+            mi.ingredient_type,
+            NULL,
+            a.as_of_date,
+            a.depth + 1
+        FROM atoms a
+        JOIN Formulation f
+          ON f.ingredient_id = a.ingredient_id
+         AND (a.supplier_id IS NULL OR f.supplier_id = a.supplier_id)
+         AND a.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE a.ingredient_type = 'COMPOUND'
+          AND a.depth < 10
+    ),
+    batch_atoms AS (
+        SELECT DISTINCT ingredient_id FROM atoms WHERE ingredient_type = 'ATOMIC'
+    )
+    SELECT MIN(CONCAT(ip.ingredient_id, ' + ', ip.partner_id))
+    INTO v_conflict
+    FROM batch_atoms ba
+    JOIN IncompatiblePair ip ON ip.ingredient_id = ba.ingredient_id
+    WHERE ip.ingredient_id < ip.partner_id
+      AND ip.partner_id IN (SELECT ingredient_id FROM batch_atoms);
+
+    IF v_conflict IS NOT NULL THEN
+        SET v_message = LEFT(CONCAT(
+            'ERROR: Health risk detected! Incompatible ingredients found in batch: ', v_conflict), 128);
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = v_message;
+    END IF;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Post Staged Production Batch
+-- Health check, cost, ProductBatch insert and consumption insert over the
+-- staged plan, WITHOUT transaction control (callers post many batches per
+-- COMMIT, one SAVEPOINT per batch). The caller opens and fills the stage.
+-- The stage is cleared when done. On error the caller's rollback removes the
+-- staged rows with everything else, because the temporary table is InnoDB.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Post_Staged_Production_Batch;
+//
+CREATE PROCEDURE Post_Staged_Production_Batch(
+    IN p_product_id VARCHAR(20),
+    IN p_manufacturer_id VARCHAR(20),
+    IN p_manufacturer_batch_id VARCHAR(100),
+    IN p_produced_quantity INT,
+    IN p_expiration_date DATE,
+    IN p_recipe_id_used INT
+)
+BEGIN
+    DECLARE v_total_cost DECIMAL(10, 2) DEFAULT 0.00;
+    DECLARE v_new_lot_number VARCHAR(255);
+
+    CALL Evaluate_Staged_Health_Risk();
+
+    -- Calculate total cost of the staged plan
+    SELECT SUM(cs.qty * ib.per_unit_cost)
+    INTO v_total_cost
+    FROM ConsumptionStage cs
+    JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number;
+
+    -- Create product batch record
+    INSERT INTO ProductBatch
+      (product_id, manufacturer_id, manufacturer_batch_id,
+       produced_quantity, production_date, expiration_date,
+       recipe_id_used, total_batch_cost)
+    VALUES
+      (p_product_id, p_manufacturer_id, p_manufacturer_batch_id,
+       p_produced_quantity, CURDATE(), p_expiration_date,
+       p_recipe_id_used, v_total_cost);
+
+    -- Record ingredient consumption (fires the validation / on-hand triggers).
+    -- In ingredient order, so concurrent posters take the IngredientStockSummary
+    -- row locks in the same order and wait for each other instead of deadlocking.
+    SET v_new_lot_number = CONCAT(p_product_id, '-', p_manufacturer_id, '-', p_manufacturer_batch_id);
+
+    INSERT INTO BatchConsumption
+      (product_lot_number, ingredient_lot_number, quantity_consumed)
+    SELECT v_new_lot_number, cs.lot_number, cs.qty
+    FROM ConsumptionStage cs
+    JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number
+    ORDER BY ib.ingredient_id, cs.lot_number;
+
+    DELETE FROM ConsumptionStage;
+
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Post Production Batch
+-- JSON entry point (kept for compatibility): parses the list once into
+-- ConsumptionStage and posts it with Post_Staged_Production_Batch.
+-- No transaction control; errors propagate to the caller.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Post_Production_Batch;
+//
+CREATE PROCEDURE Post_Production_Batch(
     IN p_product_id VARCHAR(20),
     IN p_manufacturer_id VARCHAR(20),
     IN p_manufacturer_batch_id VARCHAR(100),
@@ -370,45 +1198,55 @@ CREATE PROCEDURE Record_Production_Batch(
     IN p_consumption_list JSON
 )
 BEGIN
-    DECLARE v_total_cost DECIMAL(10,2) DEFAULT 0.00;
-    DECLARE v_new_lot_number VARCHAR(255);
+    CALL Stage_Consumption_List(p_consumption_list);
+    CALL Post_Staged_Production_Batch(
+        p_product_id, p_manufacturer_id, p_manufacturer_batch_id,
+        p_produced_quantity, p_expiration_date, p_recipe_id_used
+    );
+END;
+//
 
+-- ---------------------------------------------------------------------
+-- Procedure: Record Production Batch
+-- Main transaction for creating a product batch and consuming ingredients
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Record_Production_Batch;
+//
+CREATE PROCEDURE Record_Production_Batch(
+    IN p_product_id VARCHAR(20),
+    IN p_manufacturer_id VARCHAR(20),
+    IN p_manufacturer_batch_id VARCHAR(100),
+    IN p_produced_quantity INT,
+    IN p_expiration_date DATE,
+    IN p_recipe_id_used INT,
+    IN p_consumption_list JSON
+)
+BEGIN
     DECLARE EXIT HANDLER FOR SQLEXCEPTION
     BEGIN
         ROLLBACK;
         RESIGNAL;
     END;
 
+    CALL Open_Consumption_Stage();  -- before the transaction, not inside it
     START TRANSACTION;
 
-    CALL Evaluate_Health_Risk(p_consumption_list);
-
-    SELECT SUM(jt.qty * ib.per_unit_cost) INTO v_total_cost
-    FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
-        lot VARCHAR(255) PATH '$.lot',
-        qty DECIMAL(10,2) PATH '$.qty'
-    )) AS jt
-    JOIN IngredientBatch ib ON ib.lot_number = jt.lot;
-
-    INSERT INTO ProductBatch
-      (product_id, manufacturer_id, manufacturer_batch_id, produced_quantity, production_date, expiration_date, recipe_id_used, total_batch_cost)
-    VALUES
-      (p_product_id, p_manufacturer_id, p_manufacturer_batch_id, p_produced_quantity, CURDATE(), p_expiration_date, p_recipe_id_used, v_total_cost);
-
-    SET v_new_lot_number = CONCAT(p_product_id,'-',p_manufacturer_id,'-',p_manufacturer_batch_id);
-
-    INSERT INTO BatchConsumption (product_lot_number, ingredient_lot_number, quantity_consumed)
-    SELECT v_new_lot_number, jt.lot, jt.qty
-    FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
-        lot VARCHAR(255) PATH '$.lot',
-        qty DECIMAL(10,2) PATH '$.qty'
-    )) AS jt;
+    CALL Post_Production_Batch(
+        p_product_id, p_manufacturer_id, p_manufacturer_batch_id,
+        p_produced_quantity, p_expiration_date, p_recipe_id_used,
+        p_consumption_list
+    );
 
     COMMIT;
+
 END;
 //
 
--- Trace_Recall
+-- ---------------------------------------------------------------------
+-- Procedure: Trace Recall
+-- Find all product batches affected by a recalled ingredient lot
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Trace_Recall;
 //
 CREATE PROCEDURE Trace_Recall(
     IN p_ingredient_lot_number VARCHAR(255),
@@ -421,12 +1259,18 @@ BEGIN
         pb.production_date,
         pb.expiration_date,
         pb.produced_quantity
-    FROM BatchConsumption bc
-    JOIN ProductBatch pb ON bc.product_lot_number = pb.lot_number
-    JOIN Product p ON pb.product_id = p.product_id
-    WHERE bc.ingredient_lot_number = p_ingredient_lot_number
-      AND DATE(pb.production_date) BETWEEN (p_recall_date - INTERVAL 20 DAY) AND p_recall_date;
+    FROM
+        BatchConsumption AS bc
+    JOIN
+        ProductBatch AS pb ON bc.product_lot_number = pb.lot_number
+    JOIN
+        Product AS p ON pb.product_id = p.product_id
+    WHERE
+        bc.ingredient_lot_number = p_ingredient_lot_number
+        AND DATE(pb.production_date) 
+            BETWEEN (p_recall_date - INTERVAL 20 DAY) AND p_recall_date;
+
 END;
 //
 
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
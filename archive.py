@@ -0,0 +1,208 @@
+"""
+Hot / archive split for historical lots and batches (migration 006).
+
+MySQL cannot range-partition IngredientBatch, ProductBatch or
+BatchConsumption: a partitioned InnoDB table can neither have foreign keys
+nor be the target of one. Cold rows are instead moved to the *Archive
+tables, so the FEFO query, reservations and reports only scan live data.
+
+    product batches:  produced and expired before the cutoff; their
+                      BatchConsumption rows move with them
+    ingredient lots:  expired before the cutoff, or empty and received
+                      before it, once no hot BatchConsumption row refers
+                      to them (their batches are moved first)
+
+Each chunk of CHUNK_SIZE rows is copied and deleted in its own short
+READ COMMITTED transaction. Candidates come from a plain (non-locking)
+keyset scan on the primary key; only those are then locked, by primary key,
+FOR UPDATE SKIP LOCKED with the cold conditions checked again. The scan
+itself locks nothing, no gap is locked, and a poster holding a lot is never
+waited on: a skipped row is picked up by a later run. The job can be
+stopped and re-run at any point.
+
+Archived lot numbers stay taken: the lot-number triggers reject a new lot
+or batch whose number is already in an *Archive table, so a lot is never
+archived twice and the All* views never show two rows for one number.
+
+Deleting BatchConsumption rows would normally put the consumed quantity
+back on the ingredient lot (trg_maintain_on_hand_ADJUST); the job sets
+@meal_archiving for its session, which the trigger checks.
+
+Archived rows stay readable: genealogy traces and report 4 accept
+include_archive=True and then read the All* views (hot UNION ALL archive).
+"""
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from instrumentation import query_name
+
+CHUNK_SIZE = 1000
+DEFAULT_RETENTION_DAYS = 365
+
+HOT_TABLES = {'consumption': 'BatchConsumption', 'product_batches': 'ProductBatch',
+              'ingredient_batches': 'IngredientBatch'}
+ALL_TABLES = {'consumption': 'AllBatchConsumption', 'product_batches': 'AllProductBatch',
+              'ingredient_batches': 'AllIngredientBatch'}
+
+PRODUCT_BATCH_COLUMNS = ('lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity, '
+                         'expiration_date, production_date, total_batch_cost, recipe_id_used')
+CONSUMPTION_COLUMNS = 'product_lot_number, ingredient_lot_number, quantity_consumed'
+INGREDIENT_BATCH_COLUMNS = ('lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand, '
+                            'per_unit_cost, expiration_date, intake_date')
+
+# Candidate scans (consistent reads, no locks). Params: (last lot_number, cutoff, cutoff, chunk size)
+COLD_PRODUCT_BATCHES_QUERY = """
+    SELECT lot_number
+    FROM ProductBatch
+    WHERE lot_number > %s
+      AND production_date < %s
+      AND expiration_date < %s
+    ORDER BY lot_number
+    LIMIT %s
+"""
+
+COLD_INGREDIENT_LOTS_QUERY = """
+    SELECT ib.lot_number
+    FROM IngredientBatch ib
+    WHERE ib.lot_number > %s
+      AND (ib.expiration_date < %s OR (ib.quantity_on_hand = 0 AND ib.intake_date < %s))
+      AND NOT EXISTS (SELECT 1 FROM BatchConsumption bc WHERE bc.ingredient_lot_number = ib.lot_number)
+    ORDER BY ib.lot_number
+    LIMIT %s
+"""
+
+# Lock the candidates by primary key, re-checking that they are still cold;
+# {keys} is the chunk's placeholder list. Params: (*keys, cutoff, cutoff)
+LOCK_PRODUCT_BATCHES_TEMPLATE = """
+    SELECT lot_number
+    FROM ProductBatch
+    WHERE lot_number IN ({keys})
+      AND production_date < %s
+      AND expiration_date < %s
+    ORDER BY lot_number
+    FOR UPDATE SKIP LOCKED
+"""
+
+LOCK_INGREDIENT_LOTS_TEMPLATE = """
+    SELECT ib.lot_number
+    FROM IngredientBatch ib
+    WHERE ib.lot_number IN ({keys})
+      AND (ib.expiration_date < %s OR (ib.quantity_on_hand = 0 AND ib.intake_date < %s))
+      AND NOT EXISTS (SELECT 1 FROM BatchConsumption bc WHERE bc.ingredient_lot_number = ib.lot_number)
+    ORDER BY ib.lot_number
+    FOR UPDATE OF ib SKIP LOCKED
+"""
+
+# (counter label or None, statement); {keys} is the chunk's placeholder list.
+PRODUCT_BATCH_STEPS = (
+    ('product_batches', f"INSERT INTO ProductBatchArchive ({PRODUCT_BATCH_COLUMNS}) "
+                        f"SELECT {PRODUCT_BATCH_COLUMNS} FROM ProductBatch WHERE lot_number IN ({{keys}})"),
+    ('consumption_rows', f"INSERT INTO BatchConsumptionArchive ({CONSUMPTION_COLUMNS}) "
+                         f"SELECT {CONSUMPTION_COLUMNS} FROM BatchConsumption WHERE product_lot_number IN ({{keys}})"),
+    (None, "DELETE FROM BatchConsumption WHERE product_lot_number IN ({keys})"),
+    (None, "DELETE FROM ProductBatch WHERE lot_number IN ({keys})"),
+)
+
+INGREDIENT_LOT_STEPS = (
+    ('ingredient_lots', f"INSERT INTO IngredientBatchArchive ({INGREDIENT_BATCH_COLUMNS}) "
+                        f"SELECT {INGREDIENT_BATCH_COLUMNS} FROM IngredientBatch WHERE lot_number IN ({{keys}})"),
+    (None, "DELETE FROM IngredientBatch WHERE lot_number IN ({keys})"),
+)
+
+# What a run would move (dry run). An ingredient lot qualifies once every
+# batch that consumed it is itself cold. Params: (cutoff, cutoff) / (cutoff x 4).
+PENDING_PRODUCT_BATCHES_QUERY = """
+    SELECT COUNT(*) AS pending
+    FROM ProductBatch
+    WHERE production_date < %s AND expiration_date < %s
+"""
+
+PENDING_INGREDIENT_LOTS_QUERY = """
+    SELECT COUNT(*) AS pending
+    FROM IngredientBatch ib
+    WHERE (ib.expiration_date < %s OR (ib.quantity_on_hand = 0 AND ib.intake_date < %s))
+      AND NOT EXISTS (
+            SELECT 1
+            FROM BatchConsumption bc
+            JOIN ProductBatch pb ON pb.lot_number = bc.product_lot_number
+            WHERE bc.ingredient_lot_number = ib.lot_number
+              AND NOT (pb.production_date < %s AND pb.expiration_date < %s)
+      )
+"""
+
+
+def table_names(include_archive=False):
+    """Table (or view) names for the lot/batch tables, keyed as in HOT_TABLES."""
+    return ALL_TABLES if include_archive else HOT_TABLES
+
+
+def default_cutoff(retention_days=DEFAULT_RETENTION_DAYS):
+    return date.today() - timedelta(days=retention_days)
+
+
+def _move_chunks(db, cursor, name, cold_query, lock_template, cutoff, steps, chunk_size, pause):
+    """Copy-and-delete the rows cold_query selects, one committed chunk at a time."""
+    moved = Counter()
+    last = ''
+    cursor.execute("SET @meal_archiving = 1")
+    try:
+        while True:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")  # next transaction only
+            with query_name(name):
+                cursor.execute(cold_query, (last, cutoff, cutoff, chunk_size))
+                candidates = [row['lot_number'] for row in cursor.fetchall()]
+            if not candidates:
+                db.rollback()
+                break
+            cursor.execute(lock_template.format(keys=', '.join(['%s'] * len(candidates))),
+                           (*candidates, cutoff, cutoff))
+            keys = [row['lot_number'] for row in cursor.fetchall()]
+            if keys:
+                placeholders = ', '.join(['%s'] * len(keys))
+                for label, statement in steps:
+                    cursor.execute(statement.format(keys=placeholders), tuple(keys))
+                    if label:
+                        moved[label] += cursor.rowcount
+            db.commit()
+            last = candidates[-1]
+            if pause:
+                time.sleep(pause)
+    finally:
+        cursor.execute("SET @meal_archiving = NULL")
+    return moved
+
+
+def archive_product_batches(db, cursor, cutoff, chunk_size=CHUNK_SIZE, pause=0):
+    """Move cold product batches and their consumption rows. Returns a Counter of moved rows."""
+    return _move_chunks(db, cursor, 'archive_product_batches', COLD_PRODUCT_BATCHES_QUERY,
+                        LOCK_PRODUCT_BATCHES_TEMPLATE, cutoff, PRODUCT_BATCH_STEPS, chunk_size, pause)
+
+
+def archive_ingredient_lots(db, cursor, cutoff, chunk_size=CHUNK_SIZE, pause=0):
+    """Move cold ingredient lots no hot batch refers to. Returns a Counter of moved rows."""
+    return _move_chunks(db, cursor, 'archive_ingredient_lots', COLD_INGREDIENT_LOTS_QUERY,
+                        LOCK_INGREDIENT_LOTS_TEMPLATE, cutoff, INGREDIENT_LOT_STEPS, chunk_size, pause)
+
+
+def run_archive(db, cursor, cutoff=None, chunk_size=CHUNK_SIZE, pause=0):
+    """
+    Archive everything cold as of cutoff (default: DEFAULT_RETENTION_DAYS
+    ago): product batches first, so their ingredient lots become movable.
+    pause (seconds) is slept between chunks to leave room for other work.
+    Returns {'product_batches': n, 'consumption_rows': n, 'ingredient_lots': n}.
+    """
+    cutoff = cutoff or default_cutoff()
+    moved = archive_product_batches(db, cursor, cutoff, chunk_size, pause)
+    moved.update(archive_ingredient_lots(db, cursor, cutoff, chunk_size, pause))
+    return {label: moved[label] for label in ('product_batches', 'consumption_rows', 'ingredient_lots')}
+
+
+def pending(cursor, cutoff=None):
+    """Rows run_archive would move: {'product_batches': n, 'ingredient_lots': n}."""
+    cutoff = cutoff or default_cutoff()
+    cursor.execute(PENDING_PRODUCT_BATCHES_QUERY, (cutoff, cutoff))
+    product_batches = cursor.fetchone()['pending']
+    cursor.execute(PENDING_INGREDIENT_LOTS_QUERY, (cutoff, cutoff, cutoff, cutoff))
+    ingredient_lots = cursor.fetchone()['pending']
+    return {'product_batches': product_batches, 'ingredient_lots': ingredient_lots}
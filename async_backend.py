@@ -0,0 +1,80 @@
+"""
+asyncio data-access backend.
+
+Exposes the application operations (operations.py) as coroutines so one
+process can serve many concurrent clients:
+
+    init_pool(DB_CONFIG, 10)
+    backend = AsyncBackend()
+    lot = await backend.create_product_batch('MFG001', '100', 100, 'B0950', '2026-03-01')
+    rows = await backend.run_report('2')
+
+mysql.connector is blocking, so every call runs on a worker thread with its
+own pooled connection. Concurrency is bounded by a semaphore sized to the
+connection pool (a call never waits inside borrow_connection), and at most
+max_pending calls may be queued behind it; beyond that the backend sheds
+load by raising BackendBusy right away instead of queueing without limit.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import operations
+from db_pool import get_pool
+
+DEFAULT_MAX_PENDING = 100
+
+
+class BackendBusy(Exception):
+    """Too many requests are already waiting; the caller should retry later."""
+
+
+class AsyncBackend:
+    """Coroutine wrappers around operations.py with bounded concurrency."""
+
+    def __init__(self, max_concurrency=None, max_pending=DEFAULT_MAX_PENDING):
+        self.max_concurrency = max_concurrency or get_pool().pool_size
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix='meal-db')
+        self._in_flight = 0   # running + waiting calls
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    async def _run(self, fn, *args, **kwargs):
+        if self._in_flight >= self.max_concurrency + self.max_pending:
+            raise BackendBusy(f"{self._in_flight} requests in flight; try again later.")
+        self._in_flight += 1
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+
+    # --- Operations ---
+
+    async def plan_product_batch(self, manufacturer_id, product_id, produced_quantity):
+        return await self._run(operations.plan_product_batch, manufacturer_id, product_id, produced_quantity)
+
+    async def create_product_batch(self, manufacturer_id, product_id, produced_quantity,
+                                   manufacturer_batch_id, expiration_date, reserve=True):
+        return await self._run(operations.create_product_batch, manufacturer_id, product_id,
+                               produced_quantity, manufacturer_batch_id, expiration_date, reserve=reserve)
+
+    async def run_report(self, report_id, manufacturer_id=None, product_lots=None, max_rows=None, **options):
+        return await self._run(operations.run_report, report_id, manufacturer_id=manufacturer_id,
+                               product_lots=product_lots, max_rows=max_rows, **options)
+
+    async def ingredient_list(self, product_id):
+        return await self._run(operations.ingredient_list, product_id)
+
+    async def intake_lot(self, supplier_id, lot):
+        return await self._run(operations.intake_lot, supplier_id, lot)
+
+    def close(self):
+        """Wait for running calls and stop the worker threads."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,85 @@
+"""
+Benchmark: a burst of concurrent requests through async_backend.AsyncBackend.
+
+Usage (from the project root):
+    python -m benchmarks.bench_async --clients 200 --pool 8 --max-pending 50
+
+--clients coroutines each send one read-only request at the same moment
+(round robin: a FEFO plan for the demo product, report 2, the flattened
+ingredient list). The backend runs at most --pool of them at a time and
+lets --max-pending more wait; the rest are shed with BackendBusy. The script
+prints served and shed counts, the peak number of calls in flight, the
+throughput and the p50/p99 latency of the served calls. Nothing is written.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from async_backend import AsyncBackend, BackendBusy
+from benchmarks.common import timing_stats
+from db_pool import close_pool, init_pool
+from main import DB_CONFIG
+
+MANUFACTURER_ID = 'MFG001'
+PRODUCT_ID = '100'
+
+
+def requests(backend):
+    """The request mix, as coroutine factories."""
+    return [
+        lambda: backend.plan_product_batch(MANUFACTURER_ID, PRODUCT_ID, 100),
+        lambda: backend.run_report('2', manufacturer_id=MANUFACTURER_ID),
+        lambda: backend.ingredient_list(PRODUCT_ID),
+    ]
+
+
+async def burst(backend, clients):
+    """Send `clients` requests at once; returns (latencies of served calls, shed count, peak in flight, seconds)."""
+    mix = requests(backend)
+    latencies, shed, peak = [], 0, 0
+
+    async def client(n):
+        nonlocal shed
+        start = time.perf_counter()
+        try:
+            await mix[n % len(mix)]()
+        except BackendBusy:
+            shed += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(client(n)) for n in range(clients)]
+    while not all(task.done() for task in tasks):
+        peak = max(peak, backend.in_flight)
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*tasks)
+    return latencies, shed, peak, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200, help='concurrent requests (default 200)')
+    parser.add_argument('--pool', type=int, default=8, help='connection pool size = max concurrency (default 8)')
+    parser.add_argument('--max-pending', type=int, default=50, help='calls allowed to wait (default 50)')
+    args = parser.parse_args()
+
+    init_pool(dict(DB_CONFIG, password=os.environ.get('MEAL_DB_PASSWORD', '')), args.pool)
+    backend = AsyncBackend(max_pending=args.max_pending)
+    try:
+        latencies, shed, peak, elapsed = asyncio.run(burst(backend, args.clients))
+    finally:
+        backend.close()
+        close_pool()
+
+    print(f"{args.clients} requests: {len(latencies)} served, {shed} shed (BackendBusy); "
+          f"peak in flight {peak} (limit {backend.max_concurrency} running + {args.max_pending} waiting)")
+    if latencies:
+        stats = timing_stats(latencies)
+        print(f"{len(latencies) / elapsed:8.1f} requests/sec   p50 {stats['p50_ms']:9.3f} ms"
+              f"   p99 {stats['p99_ms']:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: the hot paths on MySQL vs. the embedded SQLite backend.
+
+Usage (from the project root):
+    python -m benchmarks.bench_backends --scale 10000 --repeat 20
+
+Generates the same 'GEN-' data set (benchmarks.suite.scale_config) in each
+backend, times benchmarks.suite.run_paths there and prints the p50 of every
+path side by side. MySQL uses main.DB_CONFIG plus MEAL_DB_PASSWORD, SQLite
+the file in MEAL_SQLITE_PATH (created on first use). A backend that cannot
+be reached is reported and left out of the comparison.
+"""
+import argparse
+import random
+
+import mysql.connector
+
+from benchmarks import datagen
+from benchmarks.common import connect
+from benchmarks.suite import run_paths, scale_config
+from db_pool import BACKENDS
+
+
+def time_backend(backend_name, config, repeat, seed):
+    """Generate the data set in one backend and return run_paths' {path: stats}."""
+    db = connect(backend_name)
+    cursor = db.cursor(dictionary=True)
+    try:
+        datagen.clean(cursor, db)
+        datagen.generate(cursor, db, **config)
+        return run_paths(cursor, db, repeat, random.Random(seed))
+    finally:
+        datagen.clean(cursor, db)
+        cursor.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10000, help='lot count to benchmark (default 10000)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    config = scale_config(args.scale, args.seed)
+    results = {}
+    for backend_name in BACKENDS:
+        print(f"\n=== {backend_name} ===")
+        try:
+            results[backend_name] = time_backend(backend_name, config, args.repeat, args.seed)
+        except mysql.connector.Error as err:
+            print(f"Skipping {backend_name}: {err}")
+    if not results:
+        return
+
+    names = list(results)
+    print(f"\np50 in ms at {args.scale} lots")
+    print(f"{'path':<24}" + ''.join(f"{name:>12}" for name in names) + ('       ratio' if len(names) == 2 else ''))
+    for path in next(iter(results.values())):
+        p50s = [results[name][path]['p50_ms'] for name in names]
+        line = f"{path:<24}" + ''.join(f"{p50:12.3f}" for p50 in p50s)
+        if len(p50s) == 2 and p50s[1]:
+            line += f"{p50s[0] / p50s[1]:11.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: vectorised costing (costing.py) vs. per-row SQL.
+
+Usage (from the project root):
+    python -m benchmarks.bench_costing --batches 5000 --recipes 500
+
+Runs against the batches and recipes already in the database; load a
+larger data set first with `python -m benchmarks.datagen --lots 100000`.
+
+    batch costs:   one SUM(quantity_consumed * per_unit_cost) query per batch
+                   (as Post_Production_Batch does) vs. costing.batch_costs
+    recipe costs:  allocate_fefo + one lot-price query per recipe
+                   vs. costing.recipe_costs
+"""
+import argparse
+
+from benchmarks.common import connect, summarize, time_calls
+from costing import batch_costs, recipe_costs
+from fefo import allocate_fefo
+
+
+def per_row_batch_costs(cursor, product_lots):
+    """One cost query per batch."""
+    costs = {}
+    for lot in product_lots:
+        cursor.execute("""
+            SELECT COALESCE(SUM(bc.quantity_consumed * ib.per_unit_cost), 0) AS material_cost
+            FROM BatchConsumption bc
+            JOIN IngredientBatch ib ON ib.lot_number = bc.ingredient_lot_number
+            WHERE bc.product_lot_number = %s
+        """, (lot,))
+        costs[lot] = cursor.fetchone()['material_cost']
+    return costs
+
+
+def per_row_recipe_costs(cursor, recipes):
+    """FEFO plan per recipe, then the prices of the planned lots."""
+    costs = {}
+    for recipe in recipes:
+        plan, _ = allocate_fefo(cursor, recipe['recipe_id'], recipe['standard_batch_size'])
+        total = 0
+        for item in plan:
+            cursor.execute("SELECT per_unit_cost FROM IngredientBatch WHERE lot_number = %s", (item['lot'],))
+            total += float(cursor.fetchone()['per_unit_cost']) * item['qty']
+        costs[recipe['recipe_id']] = total
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', type=int, default=5000, help='product batches to cost (default 5000)')
+    parser.add_argument('--recipes', type=int, default=500, help='recipes to cost (default 500)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT lot_number FROM ProductBatch ORDER BY lot_number LIMIT %s", (args.batches,))
+        product_lots = [row['lot_number'] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT r.recipe_id, p.standard_batch_size
+            FROM Recipe r JOIN Product p ON p.product_id = r.product_id
+            ORDER BY r.recipe_id
+            LIMIT %s
+        """, (args.recipes,))
+        recipes = cursor.fetchall()
+        print(f"Costing {len(product_lots)} batches and {len(recipes)} recipes.")
+
+        expected = per_row_batch_costs(cursor, product_lots)
+        mismatches = [row['product_lot'] for row in batch_costs(cursor, product_lots)
+                      if abs(float(expected[row['product_lot']]) - row['material_cost']) > 0.01]
+        print(f"Batch costs {'match' if not mismatches else f'DIFFER for {len(mismatches)} batch(es)'}.")
+
+        expected = per_row_recipe_costs(cursor, recipes)
+        mismatches = [row['recipe_id'] for row in recipe_costs(cursor, [recipe['recipe_id'] for recipe in recipes])
+                      if abs(float(expected[row['recipe_id']]) - row['fefo_cost']) > 0.01]
+        print(f"Recipe FEFO costs {'match' if not mismatches else f'DIFFER for {len(mismatches)} recipe(s)'}.")
+
+        summarize("per-batch SQL SUM", time_calls(lambda: per_row_batch_costs(cursor, product_lots), args.repeat))
+        summarize("costing.batch_costs", time_calls(lambda: batch_costs(cursor, product_lots), args.repeat))
+        summarize("per-recipe FEFO + prices", time_calls(lambda: per_row_recipe_costs(cursor, recipes), args.repeat))
+        summarize("costing.recipe_costs", time_calls(
+            lambda: recipe_costs(cursor, [recipe['recipe_id'] for recipe in recipes]), args.repeat))
+    finally:
+        db.rollback()
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: set-based FEFO allocation vs. the original per-ingredient loop.
+
+Usage (from the project root):
+    python -m benchmarks.bench_fefo --recipe-id 1 --quantity 100
+    python -m benchmarks.bench_fefo --synthetic 200 --lots 20000
+
+With --synthetic, a throw-away recipe with N ingredients and L lots per
+ingredient is created inside a transaction and rolled back at the end, so
+the database is left untouched.
+"""
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.common import connect, summarize, time_calls
+from fefo import allocate_fefo
+
+
+def legacy_fefo_loop(cursor, recipe_id, produced_quantity):
+    """
+    The original create_product_batch allocation: one query per ingredient.
+    (lot_number is added as a tie-breaker so both plans are comparable.)
+    """
+    cursor.execute("SELECT ingredient_id, quantity FROM RecipeIngredient WHERE recipe_id = %s", (recipe_id,))
+    recipe_ingredients = cursor.fetchall()
+
+    consumption_plan = []
+    for ingredient in recipe_ingredients:
+        total_needed = ingredient['quantity'] * produced_quantity
+        cursor.execute("""
+            SELECT lot_number, quantity_on_hand
+            FROM IngredientBatch
+            WHERE ingredient_id = %s
+              AND quantity_on_hand > 0
+              AND expiration_date > CURDATE()
+            ORDER BY expiration_date ASC, lot_number ASC
+        """, (ingredient['ingredient_id'],))
+        for lot in cursor.fetchall():
+            if total_needed <= 0:
+                break
+            consume_qty = min(lot['quantity_on_hand'], total_needed)
+            consumption_plan.append({"lot": lot['lot_number'], "qty": float(consume_qty)})
+            total_needed -= consume_qty
+    return consumption_plan
+
+
+def seed_synthetic_recipe(cursor, n_ingredients, lots_per_ingredient):
+    """Create a recipe for product 100 with synthetic ingredients and stock (uncommitted)."""
+    ingredient_ids = [f"BF-{i:05d}" for i in range(n_ingredients)]
+    cursor.executemany(
+        "INSERT INTO Ingredient (ingredient_id, name, ingredient_type) VALUES (%s, %s, 'ATOMIC')",
+        [(ing_id, f"Bench FEFO {ing_id}") for ing_id in ingredient_ids])
+
+    cursor.execute("INSERT INTO Recipe (product_id, name, creation_date, is_active) VALUES ('100', 'bench-fefo', CURDATE(), 0)")
+    recipe_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO RecipeIngredient (recipe_id, ingredient_id, quantity, unit_of_measure) VALUES (%s, %s, 1.0, 'oz')",
+        [(recipe_id, ing_id) for ing_id in ingredient_ids])
+
+    first_expiry = date.today() + timedelta(days=1)
+    for ing_id in ingredient_ids:
+        cursor.executemany("""
+            INSERT INTO IngredientBatch
+              (ingredient_id, supplier_id, supplier_batch_id,
+               quantity_on_hand, per_unit_cost, expiration_date, intake_date)
+            VALUES (%s, '20', %s, 10, 0.10, %s, CURDATE())
+        """, [(ing_id, f"B{j:07d}", first_expiry + timedelta(days=j % 3650))
+              for j in range(lots_per_ingredient)])
+    return recipe_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipe-id', type=int, default=1)
+    parser.add_argument('--quantity', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='benchmark a rolled-back synthetic recipe with N ingredients')
+    parser.add_argument('--lots', type=int, default=1000,
+                        help='lots per synthetic ingredient (default 1000)')
+    args = parser.parse_args()
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    try:
+        recipe_id = args.recipe_id
+        if args.synthetic:
+            print(f"Seeding {args.synthetic} ingredients x {args.lots} lots (rolled back afterwards)...")
+            recipe_id = seed_synthetic_recipe(cursor, args.synthetic, args.lots)
+
+        legacy_plan = legacy_fefo_loop(cursor, recipe_id, args.quantity)
+        set_plan, _ = allocate_fefo(cursor, recipe_id, args.quantity)
+        key = lambda item: item['lot']
+        if sorted(legacy_plan, key=key) != sorted(set_plan, key=key):
+            print("WARNING: plans differ between legacy loop and set-based allocation!")
+        else:
+            print(f"Plans match ({len(set_plan)} lots).")
+
+        summarize("legacy per-ingredient loop", time_calls(
+            lambda: legacy_fefo_loop(cursor, recipe_id, args.quantity), args.repeat))
+        summarize("set-based allocate_fefo", time_calls(
+            lambda: allocate_fefo(cursor, recipe_id, args.quantity), args.repeat))
+    finally:
+        db.rollback()
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark: Evaluate_Health_Risk (IncompatiblePair probe) vs. the original
+temp-table version, at 10k DoNotCombine pairs and a 500-lot consumption list.
+
+Usage (from the project root):
+    python -m benchmarks.bench_health_risk --pairs 10000 --lots 500
+
+Synthetic ingredients are created with the 'HR-' prefix and removed again
+at the end; the legacy procedure is installed under a benchmark-only name
+and dropped afterwards. MySQL only: the legacy side is a stored procedure.
+"""
+import argparse
+import json
+import random
+
+import mysql.connector
+
+from benchmarks.common import connect, summarize, time_calls
+from db_pool import backend
+
+PREFIX = 'HR-'
+
+# The original procedure body, kept here only for comparison.
+LEGACY_PROCEDURE = """
+CREATE PROCEDURE Bench_Evaluate_Health_Risk_Legacy(IN p_consumption_list JSON)
+BEGIN
+    DECLARE v_conflict_count INT DEFAULT 0;
+
+    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Flattened_Atomics (ingredient_id VARCHAR(20) PRIMARY KEY);
+    TRUNCATE TABLE Temp_Flattened_Atomics;
+    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Affected_Lots (lot_number VARCHAR(255) PRIMARY KEY);
+    TRUNCATE TABLE Temp_Affected_Lots;
+    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Flattened_Atomics_2 (ingredient_id VARCHAR(20) PRIMARY KEY);
+    TRUNCATE TABLE Temp_Flattened_Atomics_2;
+
+    INSERT INTO Temp_Affected_Lots (lot_number)
+    SELECT lot FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (lot VARCHAR(255) PATH '$.lot')) AS jt;
+
+    INSERT IGNORE INTO Temp_Flattened_Atomics (ingredient_id)
+    SELECT ib.ingredient_id
+    FROM IngredientBatch ib
+    JOIN Temp_Affected_Lots al ON ib.lot_number = al.lot_number
+    JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
+    WHERE i.ingredient_type = 'ATOMIC';
+
+    INSERT IGNORE INTO Temp_Flattened_Atomics (ingredient_id)
+    SELECT fm.material_ingredient_id
+    FROM IngredientBatch ib
+    JOIN Temp_Affected_Lots al ON ib.lot_number = al.lot_number
+    JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
+    JOIN Formulation f ON f.ingredient_id = ib.ingredient_id
+        AND f.supplier_id = ib.supplier_id
+        AND ib.intake_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+    JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+    WHERE i.ingredient_type = 'COMPOUND';
+
+    INSERT INTO Temp_Flattened_Atomics_2 (ingredient_id)
+    SELECT ingredient_id FROM Temp_Flattened_Atomics;
+
+    SELECT COUNT(*) INTO v_conflict_count
+    FROM Temp_Flattened_Atomics AS t1
+    JOIN DoNotCombine AS dnc ON t1.ingredient_id = dnc.ingredient_a_id
+    JOIN Temp_Flattened_Atomics_2 AS t2 ON dnc.ingredient_b_id = t2.ingredient_id;
+
+    SET v_conflict_count = v_conflict_count + (
+        SELECT COUNT(*)
+        FROM Temp_Flattened_Atomics AS t1
+        JOIN DoNotCombine AS dnc ON t1.ingredient_id = dnc.ingredient_b_id
+        JOIN Temp_Flattened_Atomics_2 AS t2 ON dnc.ingredient_a_id = t2.ingredient_id
+    );
+
+    IF v_conflict_count > 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'ERROR: Health risk detected! Incompatible ingredients found in batch.';
+    END IF;
+END
+"""
+
+
+def seed(cursor, db, n_pairs, n_lots):
+    """
+    Create 2 x n_lots atomic ingredients, one lot for each of the first n_lots,
+    and n_pairs DoNotCombine rules that never pair two consumed ingredients
+    (so both procedures take the full, conflict-free path).
+    """
+    rng = random.Random(7)
+    n_ingredients = 2 * n_lots
+    ids = [f"{PREFIX}{i:05d}" for i in range(n_ingredients)]
+    cursor.executemany("INSERT INTO Ingredient (ingredient_id, name, ingredient_type) VALUES (%s, %s, 'ATOMIC')",
+                       [(ing_id, f"Bench HR {ing_id}") for ing_id in ids])
+    cursor.executemany("""
+        INSERT INTO IngredientBatch
+          (ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand, per_unit_cost, expiration_date, intake_date)
+        VALUES (%s, '20', 'BENCH', 100, 0.10, CURDATE() + INTERVAL 1 YEAR, CURDATE())
+    """, [(ing_id,) for ing_id in ids[:n_lots]])
+
+    pairs = set()
+    while len(pairs) < n_pairs:
+        a = rng.randrange(n_ingredients)
+        b = rng.randrange(n_lots, n_ingredients)  # at least one side is never consumed
+        if a != b:
+            pairs.add((ids[min(a, b)], ids[max(a, b)]))
+    cursor.executemany("INSERT INTO DoNotCombine (ingredient_a_id, ingredient_b_id) VALUES (%s, %s)", sorted(pairs))
+    db.commit()
+
+    return json.dumps([{"lot": f"{ing_id}-20-BENCH", "qty": 1} for ing_id in ids[:n_lots]])
+
+
+def cleanup(cursor, db):
+    like = PREFIX + '%'
+    cursor.execute("DELETE FROM DoNotCombine WHERE ingredient_a_id LIKE %s OR ingredient_b_id LIKE %s", (like, like))
+    cursor.execute("DELETE FROM IngredientBatch WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM IngredientStockSummary WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Ingredient WHERE ingredient_id LIKE %s", (like,))
+    db.commit()
+    cursor.execute("DROP PROCEDURE IF EXISTS Bench_Evaluate_Health_Risk_Legacy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=10000)
+    parser.add_argument('--lots', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    if backend() == 'sqlite':
+        parser.error("the legacy comparison is a MySQL stored procedure; unset MEAL_DB_BACKEND=sqlite")
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("DROP PROCEDURE IF EXISTS Bench_Evaluate_Health_Risk_Legacy")
+        cursor.execute(LEGACY_PROCEDURE)
+        print(f"Seeding {args.pairs} DoNotCombine pairs and {args.lots} lots...")
+        consumption_list = seed(cursor, db, args.pairs, args.lots)
+
+        summarize("legacy temp-table procedure", time_calls(
+            lambda: cursor.callproc('Bench_Evaluate_Health_Risk_Legacy', (consumption_list,)), args.repeat))
+        summarize("IncompatiblePair probe", time_calls(
+            lambda: cursor.callproc('Evaluate_Health_Risk', (consumption_list,)), args.repeat))
+
+        # Sanity check: a conflicting pair is reported by name
+        cursor.execute("INSERT INTO DoNotCombine (ingredient_a_id, ingredient_b_id) VALUES (%s, %s)",
+                       (f"{PREFIX}00000", f"{PREFIX}00001"))
+        try:
+            cursor.callproc('Evaluate_Health_Risk', (consumption_list,))
+            print("WARNING: expected a health-risk error for the injected pair")
+        except mysql.connector.Error as err:
+            print(f"Injected conflict reported as: {err.msg}")
+        db.rollback()
+    finally:
+        cleanup(cursor, db)
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: vectorised shortage planning (planning.py) vs. a day-by-day loop.
+
+Usage (from the project root):
+    python -m benchmarks.bench_planning --days 180 --runs 20
+
+Builds a random schedule over the products already in the database: --runs
+production runs per product with an active recipe, spread over --days days
+from today. Load a larger catalogue first, e.g.
+`python -m benchmarks.datagen --products 5000 --ingredients 2000 --lots 200000`.
+
+    day loop        walks every ingredient's lots in FEFO order, one day at a time
+    plan_schedule   planning.plan_schedule (loading included)
+
+Both must agree on shortage, waste and closing stock before anything is timed.
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.common import connect, summarize, time_calls
+from planning import plan_schedule
+
+
+def make_schedule(cursor, days, runs, seed):
+    cursor.execute("SELECT DISTINCT product_id FROM Recipe WHERE is_active = 1 ORDER BY product_id")
+    products = [row['product_id'] for row in cursor.fetchall()]
+    rng = random.Random(seed)
+    start = date.today()
+    return [{'product_id': product_id, 'quantity': rng.randint(1, 200),
+             'date': start + timedelta(days=rng.randrange(days))}
+            for product_id in products for _ in range(runs)]
+
+
+def day_loop(cursor, plan):
+    """Reference FEFO simulation over plan['demand']; returns (shortage, waste, on_hand) arrays."""
+    start, ingredient_ids = plan['start'], plan['ingredient_ids']
+    demand = plan['demand']
+    n_days, n_ingredients = demand.shape
+    shortage, waste, on_hand = np.zeros_like(demand), np.zeros_like(demand), np.zeros_like(demand)
+    lots = {ingredient_id: [] for ingredient_id in ingredient_ids}
+    cursor.execute("""
+        SELECT ingredient_id, quantity_on_hand, expiration_date
+        FROM IngredientBatch
+        WHERE quantity_on_hand > 0 AND expiration_date > %s
+        ORDER BY ingredient_id, expiration_date, lot_number
+    """, (start,))
+    for row in cursor.fetchall():
+        if row['ingredient_id'] in lots:
+            expiry = date.fromisoformat(str(row['expiration_date'])[:10])
+            lots[row['ingredient_id']].append([(expiry - start).days, float(row['quantity_on_hand'])])
+
+    for n, ingredient_id in enumerate(ingredient_ids):
+        queue, head = lots[ingredient_id], 0
+        remaining = sum(quantity for _, quantity in queue)
+        for day in range(n_days):
+            while head < len(queue) and queue[head][0] <= day:
+                waste[day, n] += queue[head][1]
+                remaining -= queue[head][1]
+                head += 1
+            need = demand[day, n]
+            while need > 0 and head < len(queue):
+                take = min(need, queue[head][1])
+                queue[head][1] -= take
+                remaining -= take
+                need -= take
+                if queue[head][1] <= 0:
+                    head += 1
+            shortage[day, n] = need
+            on_hand[day, n] = remaining
+    return shortage, waste, on_hand
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=180, help='planning horizon in days (default 180)')
+    parser.add_argument('--runs', type=int, default=20, help='production runs per product (default 20)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    try:
+        schedule = make_schedule(cursor, args.days, args.runs, args.seed)
+        plan = plan_schedule(cursor, schedule)
+        print(f"Planning {len(schedule)} runs: {plan['demand'].shape[0]} days x "
+              f"{plan['demand'].shape[1]} ingredients.")
+
+        expected = day_loop(cursor, plan)
+        matches = all(np.allclose(expected[k], plan[key], atol=1e-6)
+                      for k, key in enumerate(('shortage', 'waste', 'on_hand')))
+        print(f"Shortage / waste / stock {'match' if matches else 'DIFFER'}.")
+
+        summarize("day loop", time_calls(lambda: day_loop(cursor, plan), args.repeat))
+        summarize("planning.plan_schedule", time_calls(lambda: plan_schedule(cursor, schedule), args.repeat))
+    finally:
+        db.rollback()
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: registered hot queries as prepared statements vs. plain text.
+
+Usage (from the project root):
+    python -m benchmarks.bench_prepared --batches 500 --lots 2000
+
+Each workload runs twice on one borrowed connection, first with
+queries.configure(enabled=False) (the server parses every statement) and
+then with prepared statements (parsed once per checkout):
+
+    fefo_query      the FEFO allocation query, --repeat times
+    posting         --batches single-unit batches through post_production_batches
+                    (reserve=True: product context, reservation queries, staging)
+    lot intake      --lots lots, one authorization check + INSERT + commit each,
+                    as the interactive intake does
+
+The throw-away product and ingredients of bench_reservation ('RS-' prefix),
+plus a formulation that lets supplier 20 deliver one of them, are created
+for the run and deleted at the end. The SQLite backend has no
+server-side parsing to save, so both columns should match there.
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+import queries
+from benchmarks.bench_reservation import MANUFACTURER_ID, PREFIX, PRODUCT_ID, cleanup, reset_stock, seed
+from benchmarks.common import connect, summarize, time_calls
+from db_pool import borrow_connection, close_pool, init_pool
+from fefo import allocate_fefo
+from intake import AUTHORIZATION_QUERY, INSERT_LOT_QUERY, INTAKE_DATE
+from main import DB_CONFIG
+from production import post_production_batches
+
+SUPPLIER_ID = '20'
+INTAKE_INGREDIENT_ID = f'{PREFIX}0000'     # first ingredient created by bench_reservation.seed
+
+
+def bench_fefo(recipe_id, repeat):
+    with borrow_connection() as (db, cursor):
+        return time_calls(lambda: allocate_fefo(cursor, recipe_id, 1), repeat)
+
+
+def bench_posting(n_batches, label):
+    requests = [{'product_id': PRODUCT_ID, 'produced_quantity': 1,
+                 'manufacturer_batch_id': f"PS-{label}-{n:05d}",
+                 'expiration_date': (date.today() + timedelta(days=365)).isoformat()}
+                for n in range(n_batches)]
+    results, summary = post_production_batches(requests, MANUFACTURER_ID, reserve=True)
+    failed = [result['error'] for result in results if not result['ok']]
+    if failed:
+        print(f"  {len(failed)} batch(es) failed, e.g. {failed[0]}")
+    return summary['elapsed']
+
+
+def bench_intake(n_lots, label):
+    """Per-lot intake; returns the per-lot timings. The lots are removed again."""
+    expiry = INTAKE_DATE + timedelta(days=365)
+    batch_ids = iter(range(n_lots))
+    with borrow_connection() as (db, cursor):
+        def intake_one():
+            cursor.execute(AUTHORIZATION_QUERY, (SUPPLIER_ID, INTAKE_INGREDIENT_ID))
+            if not cursor.fetchone():
+                raise RuntimeError(f"Supplier {SUPPLIER_ID} may not supply {INTAKE_INGREDIENT_ID}")
+            supplier_batch_id = f"{PREFIX}{label}-{next(batch_ids):06d}"
+            cursor.execute(INSERT_LOT_QUERY, (INTAKE_INGREDIENT_ID, SUPPLIER_ID, supplier_batch_id,
+                                              10, 0.10, expiry, INTAKE_DATE))
+            db.commit()
+        timings = time_calls(intake_one, n_lots)
+        cursor.execute("DELETE FROM IngredientBatch WHERE ingredient_id = %s AND supplier_batch_id LIKE %s",
+                       (INTAKE_INGREDIENT_ID, f"{PREFIX}{label}-%"))
+        db.commit()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', type=int, default=500, help='batches posted per mode')
+    parser.add_argument('--lots', type=int, default=2000, help='lots received per mode')
+    parser.add_argument('--repeat', type=int, default=1000, help='FEFO queries per mode')
+    parser.add_argument('--ingredients', type=int, default=8, help='recipe size of the throw-away product')
+    args = parser.parse_args()
+
+    was_enabled = queries.enabled()
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    init_pool(dict(DB_CONFIG, password=os.environ.get('MEAL_DB_PASSWORD', '')), 1)
+    try:
+        print(f"Seeding {args.ingredients} ingredients x {args.batches} lots...")
+        seed(cursor, db, args.ingredients, args.batches)
+        cursor.execute("""
+            INSERT INTO Formulation (ingredient_id, supplier_id, pack_size, unit_price, valid_from_date)
+            VALUES (%s, %s, 'bench', 1.00, CURDATE())
+        """, (INTAKE_INGREDIENT_ID, SUPPLIER_ID))
+        db.commit()
+        cursor.execute("SELECT recipe_id FROM Recipe WHERE product_id = %s", (PRODUCT_ID,))
+        recipe_id = cursor.fetchone()['recipe_id']
+
+        posting = {}
+        for label, prepared in (('text', False), ('prepared', True)):
+            queries.configure(enabled=prepared)
+            print(f"\n--- {label} ---")
+            summarize(f"fefo_query ({label})", bench_fefo(recipe_id, args.repeat))
+            reset_stock(cursor, db)
+            posting[label] = bench_posting(args.batches, label[:4].upper())
+            print(f"{'posting (' + label + ')':<32} {args.batches / posting[label]:9.1f} batches/sec")
+            summarize(f"lot intake ({label})", bench_intake(args.lots, label[:4].upper()))
+
+        saved = 1 - posting['prepared'] / posting['text']
+        print(f"\nPosting time saved by prepared statements: {saved:.1%}")
+    finally:
+        queries.configure(enabled=was_enabled)
+        close_pool()
+        cursor.execute("DELETE FROM Formulation WHERE ingredient_id = %s", (INTAKE_INGREDIENT_ID,))
+        cleanup(cursor, db)
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
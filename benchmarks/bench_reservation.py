@@ -0,0 +1,145 @@
+"""
+Stress test: parallel batch posting with and without lot reservation.
+
+Usage (from the project root):
+    python -m benchmarks.bench_reservation --threads 8 --batches 25 --lots 400
+
+A throw-away product ('RS-PRODUCT', owned by MFG001) is created with a
+recipe of --ingredients synthetic ingredients, each stocked with --lots small
+lots. Every thread then posts --batches batches through
+post_production_batches (one batch per commit), first in the plain
+(optimistic) mode and then with reserve=True. For each mode the script
+reports batches/sec and the abort rate (failed / attempted). The stock is
+sized so that every batch can be served; failures are lost races.
+
+Everything created here uses the 'RS-' prefix and is deleted at the end.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import connect
+from db_pool import close_pool, init_pool
+from main import DB_CONFIG
+from production import post_production_batches
+
+PREFIX = 'RS-'
+PRODUCT_ID = f'{PREFIX}PRODUCT'
+MANUFACTURER_ID = 'MFG001'
+LOT_QUANTITY = 10
+
+
+def seed(cursor, db, n_ingredients, lots_per_ingredient):
+    """Create the product, its active recipe (1 oz of each ingredient per unit) and stock."""
+    ingredient_ids = [f"{PREFIX}{i:04d}" for i in range(n_ingredients)]
+    cursor.executemany("INSERT INTO Ingredient (ingredient_id, name, ingredient_type) VALUES (%s, %s, 'ATOMIC')",
+                       [(ing_id, f"Bench reservation {ing_id}") for ing_id in ingredient_ids])
+    cursor.execute("""
+        INSERT INTO Product (product_id, name, category_id, manufacturer_id, standard_batch_size)
+        VALUES (%s, 'Bench reservation product', '2', %s, 1)
+    """, (PRODUCT_ID, MANUFACTURER_ID))
+    cursor.execute("INSERT INTO Recipe (product_id, name, creation_date, is_active) VALUES (%s, 'bench', CURDATE(), 1)",
+                   (PRODUCT_ID,))
+    recipe_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO RecipeIngredient (recipe_id, ingredient_id, quantity, unit_of_measure) VALUES (%s, %s, 1.0, 'oz')",
+        [(recipe_id, ing_id) for ing_id in ingredient_ids])
+
+    first_expiry = date.today() + timedelta(days=30)
+    for ing_id in ingredient_ids:
+        cursor.executemany("""
+            INSERT INTO IngredientBatch
+              (ingredient_id, supplier_id, supplier_batch_id,
+               quantity_on_hand, per_unit_cost, expiration_date, intake_date)
+            VALUES (%s, '20', %s, %s, 0.10, %s, CURDATE())
+        """, [(ing_id, f"B{j:06d}", LOT_QUANTITY, first_expiry + timedelta(days=j // 10))
+              for j in range(lots_per_ingredient)])
+    db.commit()
+
+
+def reset_stock(cursor, db):
+    """Undo the previous round's postings so both modes start from the same stock."""
+    like = PREFIX + '%'
+    # Deleting BatchConsumption puts the stock back (trg_maintain_on_hand_ADJUST)
+    cursor.execute("DELETE FROM BatchConsumption WHERE product_lot_number LIKE %s", (like,))
+    cursor.execute("DELETE FROM ProductBatch WHERE product_id = %s", (PRODUCT_ID,))
+    db.commit()
+
+
+def cleanup(cursor, db):
+    like = PREFIX + '%'
+    reset_stock(cursor, db)
+    cursor.execute("DELETE FROM FlattenedRecipe WHERE recipe_id IN (SELECT recipe_id FROM Recipe WHERE product_id = %s)",
+                   (PRODUCT_ID,))
+    cursor.execute("DELETE FROM RecipeIngredient WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Recipe WHERE product_id = %s", (PRODUCT_ID,))
+    cursor.execute("DELETE FROM Product WHERE product_id = %s", (PRODUCT_ID,))
+    cursor.execute("DELETE FROM IngredientBatch WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM IngredientStockSummary WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Ingredient WHERE ingredient_id LIKE %s", (like,))
+    db.commit()
+
+
+def run_round(label, n_threads, n_batches, quantity, reserve):
+    """Post n_threads x n_batches batches in parallel; print throughput and abort rate."""
+    outcomes = []
+    lock = threading.Lock()
+
+    def poster(thread_no):
+        requests = [{'product_id': PRODUCT_ID, 'produced_quantity': quantity,
+                     'manufacturer_batch_id': f"{label[:3].upper()}-T{thread_no:02d}-{n:04d}",
+                     'expiration_date': (date.today() + timedelta(days=365)).isoformat()}
+                    for n in range(n_batches)]
+        results, _ = post_production_batches(requests, MANUFACTURER_ID, commit_group_size=1, reserve=reserve)
+        with lock:
+            outcomes.extend(results)
+
+    threads = [threading.Thread(target=poster, args=(n,)) for n in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    posted = sum(1 for result in outcomes if result['ok'])
+    attempted = len(outcomes)
+    print(f"{label:<12} posted {posted:5d}/{attempted:<5d}  "
+          f"{posted / elapsed:8.1f} batches/sec   abort rate {100.0 * (attempted - posted) / attempted:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--batches', type=int, default=25, help='batches per thread')
+    parser.add_argument('--quantity', type=int, default=15, help='units per batch (oz of each ingredient)')
+    parser.add_argument('--ingredients', type=int, default=4)
+    parser.add_argument('--lots', type=int, default=0,
+                        help='lots per ingredient (default: just enough for every batch, plus 10%%)')
+    args = parser.parse_args()
+
+    total_needed = args.threads * args.batches * args.quantity
+    lots = args.lots or int(total_needed * 1.1 / LOT_QUANTITY) + 1
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    config = dict(DB_CONFIG, password=os.environ.get('MEAL_DB_PASSWORD', ''))
+    init_pool(config, args.threads)
+    try:
+        print(f"Seeding {args.ingredients} ingredients x {lots} lots of {LOT_QUANTITY} oz...")
+        seed(cursor, db, args.ingredients, lots)
+
+        run_round("optimistic", args.threads, args.batches, args.quantity, reserve=False)
+        reset_stock(cursor, db)
+        run_round("reserve", args.threads, args.batches, args.quantity, reserve=True)
+    finally:
+        close_pool()
+        cleanup(cursor, db)
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks talk to the same Meal_Manufacturer database as main.py. The
+password is read from MEAL_DB_PASSWORD so runs can be scripted. With
+MEAL_DB_BACKEND=sqlite (or connect('sqlite')) they run against the embedded
+database in MEAL_SQLITE_PATH instead.
+"""
+import os
+import statistics
+import time
+
+import mysql.connector
+
+import sqlite_backend
+from db_pool import backend
+from main import DB_CONFIG
+
+
+def connect(backend_name=None):
+    """Open a connection using main.DB_CONFIG plus MEAL_DB_PASSWORD (or the SQLite file)."""
+    if (backend_name or backend()) == 'sqlite':
+        return sqlite_backend.connect(os.environ.get('MEAL_SQLITE_PATH', sqlite_backend.DEFAULT_PATH))
+    config = dict(DB_CONFIG)
+    config['password'] = os.environ.get('MEAL_DB_PASSWORD', '')
+    return mysql.connector.connect(**config)
+
+
+def time_calls(fn, repeat):
+    """Call fn() `repeat` times and return the per-call timings in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def timing_stats(timings):
+    """mean / p50 / p99 (milliseconds) and call count for a list of timings (seconds)."""
+    ordered = sorted(timings)
+    return {
+        'calls': len(ordered),
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'p50_ms': statistics.median(ordered) * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    }
+
+
+def summarize(label, timings):
+    """Print mean / p50 / p99 for a list of timings (seconds)."""
+    stats = timing_stats(timings)
+    print(f"{label:<32} mean {stats['mean_ms']:9.3f} ms"
+          f"   p50 {stats['p50_ms']:9.3f} ms"
+          f"   p99 {stats['p99_ms']:9.3f} ms")
+    return stats
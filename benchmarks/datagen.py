@@ -0,0 +1,291 @@
+"""
+Deterministic synthetic data generator for the Meal_Manufacturer schema.
+
+Usage (from the project root):
+    python -m benchmarks.datagen --lots 100000 --batches 10000
+    python -m benchmarks.datagen --clean
+
+The same --seed and counts always produce the same rows. All generated keys
+start with 'GEN-', so the data can live next to the sample data and be
+removed again with --clean. Rows are bulk-loaded with multi-row executemany
+in chunks (one COMMIT per chunk, foreign-key/unique checks off for the load);
+the schema's triggers still run, so lot numbers, stock and the FlattenedRecipe /
+IncompatiblePair tables stay consistent.
+
+Shape of the data:
+  * --compound-ratio of the ingredients are COMPOUND; each has a formulation with
+    2-4 materials, and --nesting-ratio of those materials are themselves compound
+    (always of a lower index, so there are no cycles);
+  * every ingredient has a formulation from one or two suppliers;
+  * every product has one active recipe with 3-8 ingredients;
+  * lots are spread evenly over the ingredients and expire 120-850 days out;
+  * every product batch consumes one lot of each ingredient of its recipe.
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import connect
+
+PREFIX = 'GEN-'
+CHUNK_SIZE = 5000
+LOT_QUANTITY = 1000
+TODAY = date.today()
+
+DEFAULTS = {
+    'manufacturers': 10,
+    'suppliers': 20,
+    'ingredients': 1000,
+    'products': 200,
+    'lots': 10000,
+    'batches': 1000,
+    'pairs': 500,
+    'compound_ratio': 0.2,
+    'nesting_ratio': 0.1,
+    'seed': 42,
+}
+
+
+def manufacturer_id(n):
+    return f"{PREFIX}M-{n:04d}"
+
+
+def supplier_id(n):
+    return f"{PREFIX}S-{n:04d}"
+
+
+def ingredient_id(n):
+    return f"{PREFIX}I-{n:07d}"
+
+
+def product_id(n):
+    return f"{PREFIX}P-{n:06d}"
+
+
+def lot_ingredient(lot_index, n_ingredients):
+    """Lots are assigned round-robin, so lot j belongs to ingredient j % n_ingredients."""
+    return lot_index % n_ingredients
+
+
+def lot_number(lot_index, n_ingredients, n_suppliers):
+    """Lot number as trg_compute_ingredient_lot_number builds it: ingredient-supplier-batch."""
+    ing = lot_ingredient(lot_index, n_ingredients)
+    return f"{ingredient_id(ing)}-{supplier_id(ing % n_suppliers)}-L{lot_index:08d}"
+
+
+def _insert_chunks(cursor, db, sql, rows, chunk_size=CHUNK_SIZE):
+    """executemany() a (possibly lazy) row iterable in chunks, committing each chunk."""
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            cursor.executemany(sql, chunk)
+            db.commit()
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        cursor.executemany(sql, chunk)
+        db.commit()
+        count += len(chunk)
+    return count
+
+
+def generate(cursor, db, manufacturers, suppliers, ingredients, products, lots, batches, pairs,
+             compound_ratio, nesting_ratio, seed, log=print):
+    """Load one data set. Returns {table: rows inserted}."""
+    rng = random.Random(seed)
+    counts = {}
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    cursor.execute("SET SESSION unique_checks = 0")
+    try:
+        counts['Manufacturer'] = _insert_chunks(
+            cursor, db, "INSERT INTO Manufacturer (manufacturer_id, name) VALUES (%s, %s)",
+            ((manufacturer_id(m), f"Generated Manufacturer {m}") for m in range(manufacturers)))
+        counts['Supplier'] = _insert_chunks(
+            cursor, db, "INSERT INTO Supplier (supplier_id, name) VALUES (%s, %s)",
+            ((supplier_id(s), f"Generated Supplier {s}") for s in range(suppliers)))
+
+        # --- Ingredients: the last compound_ratio share is COMPOUND ---
+        first_compound = ingredients - int(ingredients * compound_ratio)
+        counts['Ingredient'] = _insert_chunks(
+            cursor, db, "INSERT INTO Ingredient (ingredient_id, name, ingredient_type) VALUES (%s, %s, %s)",
+            ((ingredient_id(i), f"Generated Ingredient {i}", 'COMPOUND' if i >= first_compound else 'ATOMIC')
+             for i in range(ingredients)))
+        log(f"  {ingredients} ingredients ({ingredients - first_compound} compound)")
+
+        # --- Formulations: primary supplier i % S, plus a second supplier for every third ingredient ---
+        offers = [(i, i % suppliers) for i in range(ingredients)]
+        offers += [(i, (i + 1) % suppliers) for i in range(0, ingredients, 3) if suppliers > 1]
+        cursor.execute("SELECT COALESCE(MAX(formulation_id), 0) AS last_id FROM Formulation")
+        first_formulation_id = cursor.fetchone()['last_id'] + 1
+        counts['Formulation'] = _insert_chunks(cursor, db, """
+            INSERT INTO Formulation
+              (formulation_id, ingredient_id, supplier_id, pack_size, unit_price, valid_from_date, valid_to_date)
+            VALUES (%s, %s, %s, '10-kg pack', %s, '2020-01-01', NULL)
+        """, ((first_formulation_id + n, ingredient_id(i), supplier_id(s), round(rng.uniform(5, 50), 2))
+              for n, (i, s) in enumerate(offers)))
+
+        atomic = range(first_compound)
+
+        def materials(i):
+            chosen = set()
+            for _ in range(rng.randint(2, 4)):
+                if i > first_compound and rng.random() < nesting_ratio:
+                    chosen.add(rng.randrange(first_compound, i))   # nested compound, lower index
+                else:
+                    chosen.add(rng.choice(atomic))
+            return chosen
+
+        counts['FormulationMaterials'] = _insert_chunks(cursor, db, """
+            INSERT INTO FormulationMaterials (formulation_id, material_ingredient_id, quantity)
+            VALUES (%s, %s, %s)
+        """, ((first_formulation_id + n, ingredient_id(m), round(rng.uniform(0.1, 2.0), 2))
+              for n, (i, s) in enumerate(offers) if i >= first_compound for m in sorted(materials(i))))
+
+        # --- DoNotCombine pairs between atomic ingredients ---
+        pair_set = set()
+        while len(pair_set) < min(pairs, first_compound * (first_compound - 1) // 2):
+            a, b = rng.sample(atomic, 2)
+            pair_set.add((min(a, b), max(a, b)))
+        counts['DoNotCombine'] = _insert_chunks(
+            cursor, db, "INSERT INTO DoNotCombine (ingredient_a_id, ingredient_b_id) VALUES (%s, %s)",
+            ((ingredient_id(a), ingredient_id(b)) for a, b in sorted(pair_set)))
+
+        # --- Products with one active recipe each ---
+        product_owner = [p % manufacturers for p in range(products)]
+        product_sbs = [rng.choice((10, 20, 50, 100)) for _ in range(products)]
+        counts['Product'] = _insert_chunks(cursor, db, """
+            INSERT INTO Product (product_id, name, category_id, manufacturer_id, standard_batch_size)
+            VALUES (%s, %s, '2', %s, %s)
+        """, ((product_id(p), f"Generated Product {p}", manufacturer_id(product_owner[p]), product_sbs[p])
+              for p in range(products)))
+        counts['Recipe'] = _insert_chunks(
+            cursor, db, "INSERT INTO Recipe (product_id, name, creation_date, is_active) VALUES (%s, 'gen-v1', %s, 1)",
+            ((product_id(p), TODAY) for p in range(products)))
+        cursor.execute("SELECT product_id, recipe_id FROM Recipe WHERE product_id LIKE %s", (PREFIX + '%',))
+        recipe_of = {row['product_id']: row['recipe_id'] for row in cursor.fetchall()}
+
+        recipe_ingredients = [rng.sample(range(ingredients), min(ingredients, rng.randint(3, 8)))
+                              for _ in range(products)]
+        counts['RecipeIngredient'] = _insert_chunks(cursor, db, """
+            INSERT INTO RecipeIngredient (recipe_id, ingredient_id, quantity, unit_of_measure)
+            VALUES (%s, %s, %s, 'oz')
+        """, ((recipe_of[product_id(p)], ingredient_id(i), round(rng.uniform(0.1, 1.0), 2))
+              for p in range(products) for i in recipe_ingredients[p]))
+        log(f"  {products} products / recipes")
+
+        # --- Lots (round-robin over ingredients, primary supplier) ---
+        counts['IngredientBatch'] = _insert_chunks(cursor, db, """
+            INSERT INTO IngredientBatch
+              (ingredient_id, supplier_id, supplier_batch_id,
+               quantity_on_hand, per_unit_cost, expiration_date, intake_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, ((ingredient_id(lot_ingredient(j, ingredients)), supplier_id(lot_ingredient(j, ingredients) % suppliers),
+               f"L{j:08d}", LOT_QUANTITY, round(rng.uniform(0.05, 2.0), 2),
+               TODAY + timedelta(days=120 + j % 730), TODAY - timedelta(days=j % 30))
+              for j in range(lots)))
+        log(f"  {lots} lots")
+
+        # --- Product batches, each consuming one lot per recipe ingredient ---
+        batch_products = [rng.randrange(products) for _ in range(batches)]
+        start_time = datetime.combine(TODAY, datetime.min.time()) - timedelta(days=365)
+
+        def product_lot(b):
+            p = batch_products[b]
+            return f"{product_id(p)}-{manufacturer_id(product_owner[p])}-B{b:08d}"
+
+        counts['ProductBatch'] = _insert_chunks(cursor, db, """
+            INSERT INTO ProductBatch
+              (product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+               production_date, expiration_date, recipe_id_used, total_batch_cost)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, ((product_id(p), manufacturer_id(product_owner[p]), f"B{b:08d}", product_sbs[p],
+               start_time + timedelta(minutes=b * 525600 // max(1, batches)),
+               TODAY + timedelta(days=180), recipe_of[product_id(p)], round(rng.uniform(10, 500), 2))
+              for b, p in enumerate(batch_products)))
+
+        def consumption(b):
+            for i in recipe_ingredients[batch_products[b]]:
+                if i >= lots:
+                    continue  # fewer lots than ingredients: this one has no stock
+                ingredient_lots = (lots - 1 - i) // ingredients + 1
+                j = i + ingredients * rng.randrange(ingredient_lots)
+                yield (product_lot(b), lot_number(j, ingredients, suppliers), 1)
+
+        counts['BatchConsumption'] = _insert_chunks(cursor, db, """
+            INSERT INTO BatchConsumption (product_lot_number, ingredient_lot_number, quantity_consumed)
+            VALUES (%s, %s, %s)
+        """, (row for b in range(batches) for row in consumption(b)))
+        log(f"  {batches} product batches")
+    finally:
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+        cursor.execute("SET SESSION unique_checks = 1")
+    return counts
+
+
+def _delete_in_chunks(cursor, db, sql, params=(), chunk_size=50000):
+    while True:
+        cursor.execute(f"{sql} LIMIT {chunk_size}", params)
+        deleted = cursor.rowcount
+        db.commit()
+        if deleted < chunk_size:
+            break
+
+
+def clean(cursor, db):
+    """Remove every generated ('GEN-') row, children first."""
+    like = PREFIX + '%'
+    _delete_in_chunks(cursor, db, "DELETE FROM BatchConsumption WHERE product_lot_number LIKE %s", (like,))
+    _delete_in_chunks(cursor, db, "DELETE FROM ProductBatch WHERE product_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM FlattenedRecipe WHERE recipe_id IN "
+                   "(SELECT recipe_id FROM Recipe WHERE product_id LIKE %s)", (like,))
+    cursor.execute("DELETE FROM RecipeIngredient WHERE recipe_id IN "
+                   "(SELECT recipe_id FROM Recipe WHERE product_id LIKE %s)", (like,))
+    cursor.execute("DELETE FROM Recipe WHERE product_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Product WHERE product_id LIKE %s", (like,))
+    db.commit()
+    _delete_in_chunks(cursor, db, "DELETE FROM IngredientBatch WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM FormulationMaterials WHERE formulation_id IN "
+                   "(SELECT formulation_id FROM Formulation WHERE supplier_id LIKE %s)", (like,))
+    cursor.execute("DELETE FROM Formulation WHERE supplier_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM DoNotCombine WHERE ingredient_a_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM IngredientStockSummary WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Ingredient WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Supplier WHERE supplier_id LIKE %s", (like,))
+    _delete_in_chunks(cursor, db, "DELETE FROM BatchConsumptionArchive WHERE product_lot_number LIKE %s", (like,))
+    _delete_in_chunks(cursor, db, "DELETE FROM ProductBatchArchive WHERE product_id LIKE %s", (like,))
+    _delete_in_chunks(cursor, db, "DELETE FROM IngredientBatchArchive WHERE ingredient_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM Manufacturer WHERE manufacturer_id LIKE %s", (like,))
+    db.commit()
+
+
+def add_arguments(parser):
+    """Generator options, shared with the benchmark harness."""
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument('--clean', action='store_true', help='only remove previously generated data')
+    args = parser.parse_args()
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    try:
+        print("Removing previously generated data...")
+        clean(cursor, db)
+        if not args.clean:
+            print("Generating...")
+            counts = generate(cursor, db, **{name: getattr(args, name) for name in DEFAULTS})
+            for table, count in counts.items():
+                print(f"  {table:<22} {count:>10}")
+    finally:
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Scale benchmark suite: times every hot path on generated data sets.
+
+Usage (from the project root):
+    python -m benchmarks.suite --scales 1000 10000 100000 --output results.json
+    python -m benchmarks.suite --scales 1000 10000 --compare baseline.json --tolerance 0.25
+
+For each scale N (number of IngredientBatch lots; 10^3 .. 10^7) the suite
+regenerates the 'GEN-' data set with benchmarks.datagen (N lots, N/10 product
+batches, N/100 ingredients, N/1000 products) and times:
+
+    fefo_query              fefo.allocate_fefo for a generated recipe
+    evaluate_health_risk    Evaluate_Health_Risk on that FEFO plan
+    report_1 .. report_7    reports.execute_report + fetchall
+    ingredient_list_cold    Flatten_Recipe with an empty FlattenedRecipe entry
+    ingredient_list_warm    Flatten_Recipe served from FlattenedRecipe
+
+Results are written as JSON (one entry per scale and path with calls, mean,
+p50 and p99 in ms). With --compare, any path whose p50 grew by more than
+--tolerance against the baseline file is listed and the exit status is 1.
+The generated data is removed at the end unless --keep is given.
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from benchmarks import datagen
+from benchmarks.common import connect, time_calls, timing_stats
+from bom import flatten_recipe
+from fefo import allocate_fefo
+from reports import REPORTS, execute_report
+
+
+def scale_config(scale, seed):
+    """Generator counts for one scale (scale = number of lots)."""
+    ingredients = max(100, scale // 100)
+    return {
+        'manufacturers': 10,
+        'suppliers': 20,
+        'ingredients': ingredients,
+        'products': max(20, scale // 1000),
+        'lots': scale,
+        'batches': max(10, scale // 10),
+        'pairs': ingredients // 2,
+        'compound_ratio': 0.2,
+        'nesting_ratio': 0.1,
+        'seed': seed,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pick_targets(cursor, rng):
+    """A generated recipe (with its product SBS), manufacturer and product lot to run the paths against."""
+    cursor.execute("""
+        SELECT r.recipe_id, p.product_id, p.standard_batch_size, p.manufacturer_id
+        FROM Recipe r JOIN Product p ON p.product_id = r.product_id
+        WHERE p.product_id LIKE %s
+        ORDER BY r.recipe_id
+    """, (datagen.PREFIX + '%',))
+    recipe = rng.choice(cursor.fetchall())
+    cursor.execute("SELECT lot_number FROM ProductBatch WHERE product_id LIKE %s ORDER BY lot_number LIMIT 100",
+                   (datagen.PREFIX + '%',))
+    product_lots = [row['lot_number'] for row in cursor.fetchall()]
+    return recipe, rng.choice(product_lots) if product_lots else None
+
+
+def run_paths(cursor, db, repeat, rng):
+    """Time every hot path once per repeat. Returns {path: stats}."""
+    recipe, product_lot = pick_targets(cursor, rng)
+    recipe_id, quantity = recipe['recipe_id'], recipe['standard_batch_size']
+    results = {}
+
+    results['fefo_query'] = timing_stats(time_calls(
+        lambda: allocate_fefo(cursor, recipe_id, quantity), repeat))
+
+    plan, _ = allocate_fefo(cursor, recipe_id, quantity)
+    plan_json = json.dumps(plan)
+
+    def health_check():
+        try:
+            cursor.callproc('Evaluate_Health_Risk', (plan_json,))
+        except mysql.connector.Error:
+            pass  # a generated conflict still does the full flattening work
+    results['evaluate_health_risk'] = timing_stats(time_calls(health_check, repeat))
+
+    for report_id in REPORTS:
+        def report():
+            execute_report(cursor, report_id, manufacturer_id=recipe['manufacturer_id'],
+                           product_lots=[product_lot] if product_lot else None,
+                           product_id=recipe['product_id']).fetchall()
+        results[f"report_{report_id}"] = timing_stats(time_calls(report, repeat))
+
+    def cold_flatten():
+        flatten_recipe(cursor, recipe_id)
+        db.rollback()  # discard the FlattenedRecipe entry so the next call is cold too
+    cursor.execute("DELETE FROM FlattenedRecipe WHERE recipe_id = %s", (recipe_id,))
+    db.commit()
+    results['ingredient_list_cold'] = timing_stats(time_calls(cold_flatten, repeat))
+
+    flatten_recipe(cursor, recipe_id)
+    db.commit()
+    results['ingredient_list_warm'] = timing_stats(time_calls(lambda: flatten_recipe(cursor, recipe_id), repeat))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of p50 beyond tolerance (0.25 = +25%)."""
+    previous = {(entry['scale'], path): stats['p50_ms']
+                for entry in baseline['results'] for path, stats in entry['paths'].items()}
+    regressions = []
+    for entry in results:
+        for path, stats in entry['paths'].items():
+            before = previous.get((entry['scale'], path))
+            if before and stats['p50_ms'] > before * (1 + tolerance):
+                regressions.append(f"{path} @ {entry['scale']}: p50 {before:.3f} ms -> {stats['p50_ms']:.3f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='lot counts to benchmark (default 1000 10000 100000)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='previous results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 growth (default 0.25 = 25%%)')
+    parser.add_argument('--keep', action='store_true', help='leave the last generated data set in place')
+    args = parser.parse_args()
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    results = []
+    try:
+        for scale in args.scales:
+            config = scale_config(scale, args.seed)
+            print(f"\n=== scale {scale} lots ===")
+            datagen.clean(cursor, db)
+            load_start = time.perf_counter()
+            counts = datagen.generate(cursor, db, **config)
+            load_sec = time.perf_counter() - load_start
+            rows = sum(counts.values())
+            print(f"Loaded {rows} rows in {load_sec:.1f}s ({rows / load_sec:.0f} rows/sec)")
+
+            paths = run_paths(cursor, db, args.repeat, random.Random(args.seed))
+            for path, stats in paths.items():
+                print(f"{path:<24} mean {stats['mean_ms']:9.3f} ms   p50 {stats['p50_ms']:9.3f} ms"
+                      f"   p99 {stats['p99_ms']:9.3f} ms")
+            results.append({'scale': scale, 'rows': rows, 'load_sec': load_sec, 'config': config, 'paths': paths})
+    finally:
+        if not args.keep:
+            datagen.clean(cursor, db)
+        cursor.close()
+        db.close()
+
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump({'generated_at': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                   'repeat': args.repeat, 'results': results}, handle, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
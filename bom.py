@@ -0,0 +1,25 @@
+"""
+Recipe flattening (bill of materials) backed by the FlattenedRecipe cache.
+
+Flatten_Recipe expands compound ingredients through their active
+Formulation at any nesting depth (recursive CTE) and materializes the
+result per (recipe_id, effective_date). Triggers on RecipeIngredient,
+Formulation and FormulationMaterials invalidate stale entries, so repeat
+calls are a primary-key lookup.
+"""
+
+
+def flatten_recipe(cursor, recipe_id, effective_date=None):
+    """
+    Return the atomic ingredients of a recipe as
+    [{'ingredient_id', 'name', 'quantity'}] (quantity per produced unit),
+    largest quantity first. effective_date=None means today.
+
+    The first call for a key fills the cache; the caller should commit.
+    """
+    cursor.callproc('Flatten_Recipe', (recipe_id, effective_date))
+    rows = []
+    for result in cursor.stored_results():
+        columns = result.column_names
+        rows.extend(dict(zip(columns, values)) for values in result.fetchall())
+    return rows
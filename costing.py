@@ -0,0 +1,305 @@
+"""
+Bulk cost analytics for product batches and what-if recipe costing.
+
+    batch_costs(cursor, ...)     material cost and unit cost of many posted batches
+    cost_by_product(costs)       per-product unit-cost statistics over those batches
+    recipe_costs(cursor, ids)    what each recipe would cost today:
+                                   fefo_cost  - consuming current lots in FEFO order
+                                   list_cost  - at the cheapest active Formulation price
+                                                per unit (unit_price is per pack, so it
+                                                is divided by the pack size)
+
+Consumption, lot and price rows are pulled with a few chunked set-based
+queries and the arithmetic runs as NumPy array operations (bincount for the
+per-batch sums, cumulative sums + searchsorted for FEFO), so thousands of
+batches or recipes cost one round trip per chunk instead of one per row.
+Amounts are float64; results are rounded to cents.
+"""
+import re
+from datetime import date
+
+import numpy as np
+
+from instrumentation import query_name
+from streaming import DEFAULT_FETCH_SIZE
+
+KEY_CHUNK_SIZE = 1000
+
+BATCHES_TEMPLATE = """
+    SELECT lot_number, product_id, manufacturer_id, produced_quantity, production_date, total_batch_cost
+    FROM ProductBatch pb
+    WHERE {filter}
+"""
+
+CONSUMPTION_TEMPLATE = """
+    SELECT bc.product_lot_number, bc.quantity_consumed, ib.per_unit_cost
+    FROM ProductBatch pb
+    JOIN BatchConsumption bc ON bc.product_lot_number = pb.lot_number
+    JOIN IngredientBatch ib ON ib.lot_number = bc.ingredient_lot_number
+    WHERE {filter}
+"""
+
+REQUIREMENTS_TEMPLATE = """
+    SELECT ri.recipe_id, ri.ingredient_id, ri.quantity, p.standard_batch_size
+    FROM RecipeIngredient ri
+    JOIN Recipe r ON r.recipe_id = ri.recipe_id
+    JOIN Product p ON p.product_id = r.product_id
+    WHERE ri.recipe_id IN ({keys})
+"""
+
+# Usable lots in FEFO order (the same order as fefo.FEFO_ALLOCATION_QUERY).
+LOTS_TEMPLATE = """
+    SELECT ingredient_id, quantity_on_hand, per_unit_cost
+    FROM IngredientBatch
+    WHERE ingredient_id IN ({keys})
+      AND quantity_on_hand > 0
+      AND expiration_date > %s
+    ORDER BY ingredient_id, expiration_date, lot_number
+"""
+
+LIST_PRICES_TEMPLATE = """
+    SELECT ingredient_id, unit_price, pack_size
+    FROM Formulation
+    WHERE ingredient_id IN ({keys})
+      AND %s BETWEEN valid_from_date AND COALESCE(valid_to_date, '9999-12-31')
+"""
+
+# Leading number of a pack size such as '8.0 oz' or '10-kg pack'
+_PACK_QUANTITY = re.compile(r'\s*(\d+(?:\.\d*)?|\.\d+)')
+
+
+def _fetch_all(cursor, fetch_size):
+    rows = []
+    while True:
+        chunk = cursor.fetchmany(fetch_size)
+        if not chunk:
+            return rows
+        rows.extend(chunk)
+
+
+def keyed_rows(cursor, name, template, keys, params=(), fetch_size=DEFAULT_FETCH_SIZE):
+    """Run template once per chunk of keys ({keys} placeholder first, then params)."""
+    keys = list(dict.fromkeys(keys))
+    rows = []
+    with query_name(name):
+        for start in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_CHUNK_SIZE]
+            cursor.execute(template.format(keys=', '.join(['%s'] * len(chunk))), (*chunk, *params))
+            rows.extend(_fetch_all(cursor, fetch_size))
+    return rows
+
+
+def pack_quantity(pack_size):
+    """
+    Units in one pack: the leading number of pack_size, taken to be in the
+    ingredient's unit of measure. None when there is no positive number.
+    """
+    match = _PACK_QUANTITY.match(pack_size or '')
+    quantity = float(match.group(1)) if match else 0.0
+    return quantity if quantity > 0 else None
+
+
+def _unit_prices(rows):
+    """Cheapest price per unit (unit_price / pack quantity) per ingredient; unreadable packs are skipped."""
+    prices = {}
+    for row in rows:
+        quantity = pack_quantity(row['pack_size'])
+        if quantity is not None:
+            price = float(row['unit_price']) / quantity
+            prices[row['ingredient_id']] = min(price, prices.get(row['ingredient_id'], price))
+    return prices
+
+
+def _batch_filter(product_lots, manufacturer_id, produced_from, produced_to):
+    """WHERE clause + params for the batch selection (product_lots are handled by chunking)."""
+    clauses, params = [], []
+    if manufacturer_id is not None:
+        clauses.append("pb.manufacturer_id = %s")
+        params.append(manufacturer_id)
+    if produced_from is not None:
+        clauses.append("DATE(pb.production_date) >= %s")
+        params.append(produced_from)
+    if produced_to is not None:
+        clauses.append("DATE(pb.production_date) <= %s")
+        params.append(produced_to)
+    return ' AND '.join(clauses) or 'TRUE', params
+
+
+def _select_batches(cursor, name, template, product_lots, where, params, fetch_size):
+    if product_lots is None:
+        with query_name(name):
+            cursor.execute(template.format(filter=where), tuple(params))
+            return _fetch_all(cursor, fetch_size)
+    keyed = template.format(filter=f"pb.lot_number IN ({{keys}}) AND {where}")
+    return keyed_rows(cursor, name, keyed, product_lots, params, fetch_size)
+
+
+# --- Posted batches ---
+
+def batch_costs(cursor, product_lots=None, manufacturer_id=None, produced_from=None, produced_to=None,
+                fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    Recompute the material cost of posted batches from BatchConsumption.
+    Select batches by product_lots and/or manufacturer / production date
+    range (nothing = every batch). Returns one dict per batch:
+    product_lot, product_id, manufacturer_id, produced_quantity,
+    material_cost, unit_cost, recorded_cost (ProductBatch.total_batch_cost).
+    """
+    where, params = _batch_filter(product_lots, manufacturer_id, produced_from, produced_to)
+    batches = _select_batches(cursor, 'costing_batches', BATCHES_TEMPLATE, product_lots, where, params, fetch_size)
+    if not batches:
+        return []
+    consumption = _select_batches(cursor, 'costing_consumption', CONSUMPTION_TEMPLATE, product_lots, where,
+                                  params, fetch_size)
+
+    position = {row['lot_number']: index for index, row in enumerate(batches)}
+    batch_index = np.fromiter((position[row['product_lot_number']] for row in consumption), dtype=np.int64,
+                              count=len(consumption))
+    quantity = np.fromiter((row['quantity_consumed'] for row in consumption), dtype=np.float64,
+                           count=len(consumption))
+    price = np.fromiter((row['per_unit_cost'] for row in consumption), dtype=np.float64, count=len(consumption))
+
+    material = np.bincount(batch_index, weights=quantity * price, minlength=len(batches))
+    produced = np.fromiter((row['produced_quantity'] for row in batches), dtype=np.float64, count=len(batches))
+    unit = np.divide(material, produced, out=np.full_like(material, np.nan), where=produced > 0)
+
+    return [{
+        'product_lot': row['lot_number'],
+        'product_id': row['product_id'],
+        'manufacturer_id': row['manufacturer_id'],
+        'production_date': row['production_date'],
+        'produced_quantity': row['produced_quantity'],
+        'material_cost': round(float(material[index]), 2),
+        'unit_cost': None if np.isnan(unit[index]) else round(float(unit[index]), 4),
+        'recorded_cost': row['total_batch_cost'],
+    } for index, row in enumerate(batches)]
+
+
+def cost_by_product(costs):
+    """Per product: batches, units produced, weighted / min / max unit cost (from batch_costs rows)."""
+    if not costs:
+        return []
+    product_ids, product_index = np.unique([row['product_id'] for row in costs], return_inverse=True)
+    material = np.array([row['material_cost'] for row in costs], dtype=np.float64)
+    produced = np.array([row['produced_quantity'] for row in costs], dtype=np.float64)
+    unit = np.array([np.nan if row['unit_cost'] is None else row['unit_cost'] for row in costs], dtype=np.float64)
+
+    batches = np.bincount(product_index, minlength=len(product_ids))
+    total_material = np.bincount(product_index, weights=material, minlength=len(product_ids))
+    total_produced = np.bincount(product_index, weights=produced, minlength=len(product_ids))
+    low = np.full(len(product_ids), np.inf)
+    high = np.full(len(product_ids), -np.inf)
+    valid = ~np.isnan(unit)
+    np.minimum.at(low, product_index[valid], unit[valid])
+    np.maximum.at(high, product_index[valid], unit[valid])
+
+    summary = []
+    for index, product_id in enumerate(product_ids):
+        has_units = np.isfinite(low[index])
+        summary.append({
+            'product_id': str(product_id),
+            'batches': int(batches[index]),
+            'units_produced': int(total_produced[index]),
+            'material_cost': round(float(total_material[index]), 2),
+            'avg_unit_cost': round(float(total_material[index] / total_produced[index]), 4)
+            if total_produced[index] else None,
+            'min_unit_cost': round(float(low[index]), 4) if has_units else None,
+            'max_unit_cost': round(float(high[index]), 4) if has_units else None,
+        })
+    return summary
+
+
+# --- What-if recipe costing ---
+
+def _fefo_cost(need, segment_start, segment_end, lot_quantity, lot_price):
+    """
+    Cost of taking `need` units of each requirement from its ingredient's
+    lots (rows segment_start..segment_end-1, FEFO order). Returns
+    (cost, covered) arrays; covered < need means a shortage.
+    """
+    cum_quantity = np.concatenate(([0.0], np.cumsum(lot_quantity)))
+    cum_cost = np.concatenate(([0.0], np.cumsum(lot_quantity * lot_price)))
+    base_quantity = cum_quantity[segment_start]
+    available = cum_quantity[segment_end] - base_quantity
+    covered = np.minimum(need, available)
+
+    # Lot in which the running total reaches base + covered (clipped into the segment).
+    has_lots = segment_end > segment_start
+    target = base_quantity + covered
+    lot = np.searchsorted(cum_quantity, target, side='left') - 1
+    lot = np.clip(lot, segment_start, np.maximum(segment_end - 1, segment_start))
+    lot = np.minimum(lot, len(lot_quantity) - 1) if len(lot_quantity) else lot
+    partial_price = lot_price[lot] if len(lot_price) else np.zeros_like(need)
+    cost = cum_cost[lot] - cum_cost[segment_start] + (target - cum_quantity[lot]) * partial_price
+    return np.where(has_lots, cost, 0.0), covered
+
+
+def recipe_costs(cursor, recipe_ids, quantities=None, as_of=None, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    What-if cost of producing each recipe today. quantities maps recipe_id
+    -> units (default: the product's standard batch size). Returns one dict
+    per recipe: recipe_id, quantity, fefo_cost / fefo_unit_cost (current
+    lots, FEFO order), list_cost / list_unit_cost (cheapest active
+    Formulation price per unit, see pack_quantity), short_ingredients (FEFO
+    cannot cover) and unpriced_ingredients (no active formulation with a
+    readable pack size). list_cost / list_unit_cost are None when any
+    ingredient is unpriced. Every recipe is costed against the full current
+    stock, independently of the others.
+    """
+    as_of = as_of or date.today()
+    quantities = quantities or {}
+    requirements = keyed_rows(cursor, 'costing_requirements', REQUIREMENTS_TEMPLATE, recipe_ids,
+                              fetch_size=fetch_size)
+    recipes = list(dict.fromkeys(row['recipe_id'] for row in requirements))
+    if not recipes:
+        return []
+    ingredients = list(dict.fromkeys(row['ingredient_id'] for row in requirements))
+    lots = keyed_rows(cursor, 'costing_fefo_lots', LOTS_TEMPLATE, ingredients, (as_of,), fetch_size)
+    prices = _unit_prices(keyed_rows(cursor, 'costing_list_prices', LIST_PRICES_TEMPLATE, ingredients, (as_of,),
+                                     fetch_size))
+
+    ingredient_code = {ingredient_id: code for code, ingredient_id in enumerate(ingredients)}
+    recipe_code = {recipe_id: code for code, recipe_id in enumerate(recipes)}
+
+    # Lots grouped by ingredient code; a stable sort keeps FEFO order inside each group.
+    lot_code = np.fromiter((ingredient_code[row['ingredient_id']] for row in lots), dtype=np.int64, count=len(lots))
+    order = np.argsort(lot_code, kind='stable')
+    lot_code = lot_code[order]
+    lot_quantity = np.fromiter((row['quantity_on_hand'] for row in lots), dtype=np.float64, count=len(lots))[order]
+    lot_price = np.fromiter((row['per_unit_cost'] for row in lots), dtype=np.float64, count=len(lots))[order]
+    codes = np.arange(len(ingredients))
+    segment_start = np.searchsorted(lot_code, codes, side='left')
+    segment_end = np.searchsorted(lot_code, codes, side='right')
+
+    produce = np.array([float(quantities.get(recipe_id) or 0) for recipe_id in recipes])
+    standard = {row['recipe_id']: row['standard_batch_size'] for row in requirements}
+    produce = np.where(produce > 0, produce, [float(standard[recipe_id]) for recipe_id in recipes])
+
+    req_recipe = np.fromiter((recipe_code[row['recipe_id']] for row in requirements), dtype=np.int64,
+                             count=len(requirements))
+    req_ingredient = np.fromiter((ingredient_code[row['ingredient_id']] for row in requirements), dtype=np.int64,
+                                 count=len(requirements))
+    per_unit = np.fromiter((row['quantity'] for row in requirements), dtype=np.float64, count=len(requirements))
+    need = per_unit * produce[req_recipe]
+
+    fefo, covered = _fefo_cost(need, segment_start[req_ingredient], segment_end[req_ingredient],
+                               lot_quantity, lot_price)
+    list_price = np.array([prices.get(ingredient_id, np.nan) for ingredient_id in ingredients])[req_ingredient]
+    priced = ~np.isnan(list_price)
+
+    count = len(recipes)
+    fefo_total = np.bincount(req_recipe, weights=fefo, minlength=count)
+    list_total = np.bincount(req_recipe[priced], weights=(need * list_price)[priced], minlength=count)
+    short = np.bincount(req_recipe, weights=(covered < need - 1e-9), minlength=count)
+    unpriced = np.bincount(req_recipe, weights=~priced, minlength=count)
+
+    return [{
+        'recipe_id': recipe_id,
+        'quantity': int(produce[index]),
+        'fefo_cost': round(float(fefo_total[index]), 2),
+        'fefo_unit_cost': round(float(fefo_total[index] / produce[index]), 4),
+        'list_cost': None if unpriced[index] else round(float(list_total[index]), 2),
+        'list_unit_cost': None if unpriced[index] else round(float(list_total[index] / produce[index]), 4),
+        'short_ingredients': int(short[index]),
+        'unpriced_ingredients': int(unpriced[index]),
+    } for index, recipe_id in enumerate(recipes)]
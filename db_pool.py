@@ -0,0 +1,120 @@
+"""
+Pooled data-access layer built on mysql.connector.pooling.
+
+Every operation borrows a connection for the duration of one request:
+
+    with borrow_connection() as (db, cursor):
+        cursor.execute(...)
+        db.commit()
+
+Connections are health-checked (ping + reconnect) on checkout, rolled back
+if the block raises, and always handed back to the pool afterwards. The
+cursor runs registered hot queries as prepared statements (queries.py).
+
+MEAL_DB_BACKEND=sqlite swaps in the embedded backend (sqlite_backend.py,
+database file MEAL_SQLITE_PATH); db_config is then ignored.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import pooling
+
+from instrumentation import instrument
+from queries import preparing
+
+POOL_NAME = 'meal_manufacturer'
+DEFAULT_POOL_SIZE = 5
+CHECKOUT_TIMEOUT = 10       # seconds to wait for a free connection
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 1         # seconds between reconnect attempts
+
+BACKENDS = ('mysql', 'sqlite')
+
+_pool = None
+
+
+def backend():
+    """The configured storage backend: 'mysql' (default) or 'sqlite'."""
+    name = os.environ.get('MEAL_DB_BACKEND', 'mysql').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"MEAL_DB_BACKEND must be one of {', '.join(BACKENDS)}, not {name!r}.")
+    return name
+
+
+def init_pool(db_config, pool_size=DEFAULT_POOL_SIZE):
+    """Create the process-wide connection pool."""
+    global _pool
+    if backend() == 'sqlite':
+        import sqlite_backend
+        _pool = sqlite_backend.SQLitePool(os.environ.get('MEAL_SQLITE_PATH', sqlite_backend.DEFAULT_PATH), pool_size)
+        return _pool
+    _pool = pooling.MySQLConnectionPool(
+        pool_name=POOL_NAME,
+        pool_size=pool_size,
+        pool_reset_session=True,
+        **db_config
+    )
+    return _pool
+
+
+def get_pool():
+    """Return the pool, failing loudly if init_pool() was never called."""
+    if _pool is None:
+        raise RuntimeError("Connection pool is not initialised; call init_pool() first.")
+    return _pool
+
+
+def close_pool():
+    """Close all idle pooled connections (connections still borrowed close on return)."""
+    global _pool
+    if _pool is not None:
+        _pool._remove_connections()
+        _pool = None
+
+
+def _checkout(timeout):
+    """Get a connection, waiting up to `timeout` seconds when the pool is exhausted."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return get_pool().get_connection()
+        except pooling.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _health_check(db):
+    """Ping the server, transparently reconnecting if the connection dropped."""
+    db.ping(reconnect=True, attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY)
+
+
+@contextmanager
+def borrow_connection(dictionary=True, timeout=CHECKOUT_TIMEOUT):
+    """Borrow a healthy (db, cursor) pair from the pool for one request."""
+    db = _checkout(timeout)
+    cursor = None
+    try:
+        _health_check(db)
+        cursor = instrument(preparing(db, db.cursor(dictionary=dictionary), dictionary))
+        yield db, cursor
+    except BaseException:
+        try:
+            db.rollback()
+        except mysql.connector.Error:
+            pass  # connection is already gone; the pool reconnects it on next checkout
+        raise
+    finally:
+        try:
+            if db.unread_result:
+                db.consume_results()  # e.g. a streamed (unbuffered) result that was abandoned
+            if cursor is not None:
+                cursor.close()
+        except mysql.connector.Error:
+            pass
+        try:
+            db.close()  # resets the session and returns the connection to the pool
+        except mysql.connector.Error:
+            pass
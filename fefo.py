@@ -0,0 +1,87 @@
+"""
+Set-based FEFO (First-Expired, First-Out) allocation.
+
+Plans every ingredient of a recipe in a single round trip. A running SUM
+over expiration_date (per ingredient) lets the server return only the lots
+that are actually needed instead of every non-expired lot.
+"""
+from queries import register
+
+# One row per lot that takes part in the plan, plus one NULL-lot row for any
+# ingredient that has no usable stock at all (so shortages are still visible).
+FEFO_ALLOCATION_QUERY = """
+    WITH need AS (
+        SELECT ingredient_id, quantity * %s AS total_needed
+        FROM RecipeIngredient
+        WHERE recipe_id = %s
+    ),
+    candidate AS (
+        SELECT
+            n.ingredient_id,
+            n.total_needed,
+            ib.lot_number,
+            ib.quantity_on_hand,
+            ib.expiration_date,
+            SUM(ib.quantity_on_hand) OVER (
+                PARTITION BY n.ingredient_id
+                ORDER BY ib.expiration_date, ib.lot_number
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ) AS running_total
+        FROM need n
+        LEFT JOIN IngredientBatch ib
+          ON ib.ingredient_id = n.ingredient_id
+         AND ib.quantity_on_hand > 0
+         AND ib.expiration_date > CURDATE()
+    )
+    SELECT
+        ingredient_id,
+        total_needed,
+        lot_number,
+        LEAST(quantity_on_hand, total_needed - (running_total - quantity_on_hand)) AS consume_qty
+    FROM candidate
+    WHERE lot_number IS NULL
+       OR running_total - quantity_on_hand < total_needed
+    ORDER BY ingredient_id, expiration_date, lot_number
+"""
+register('fefo_query', FEFO_ALLOCATION_QUERY)
+
+
+def build_fefo_plan(rows):
+    """
+    Fold the rows of FEFO_ALLOCATION_QUERY into a consumption plan.
+
+    Returns (consumption_plan, requirements):
+      consumption_plan -> [{"lot": ..., "qty": ...}] ready for Record_Production_Batch
+      requirements     -> one dict per ingredient with 'ingredient_id',
+                          'total_needed' and 'found' (found < total_needed = shortage)
+    """
+    consumption_plan = []
+    requirements = []
+    by_ingredient = {}
+
+    for row in rows:
+        ing_id = row['ingredient_id']
+        req = by_ingredient.get(ing_id)
+        if req is None:
+            req = {'ingredient_id': ing_id, 'total_needed': row['total_needed'], 'found': 0}
+            by_ingredient[ing_id] = req
+            requirements.append(req)
+
+        if row['lot_number'] is None:
+            continue
+
+        consumption_plan.append({"lot": row['lot_number'], "qty": float(row['consume_qty'])})
+        req['found'] += row['consume_qty']
+
+    return consumption_plan, requirements
+
+
+def allocate_fefo(cursor, recipe_id, produced_quantity):
+    """Plan FEFO consumption for all ingredients of a recipe in one query."""
+    cursor.execute(FEFO_ALLOCATION_QUERY, (produced_quantity, recipe_id))
+    return build_fefo_plan(cursor.fetchall())
+
+
+def shortages(requirements):
+    """Return the requirements that could not be fully covered by stock."""
+    return [req for req in requirements if req['found'] < req['total_needed']]
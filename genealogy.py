@@ -0,0 +1,323 @@
+"""
+Lot genealogy (recall tracing).
+
+    forward:   ingredient lot(s)  -> product lots that consumed them
+    backward:  product lot(s)     -> ingredient lots they consumed
+               (+ the atomic materials inside compound lots)
+    recall:    ingredient id(s)   -> every lot containing them, directly or
+               inside a compound, -> every product lot that consumed those
+
+Each step is one indexed query per chunk of LOT_CHUNK_SIZE keys
+(BatchConsumption primary key / idx_bc_ingredient_lot, idx_ib_fefo), and
+rows are fetched with fetchmany, so a trace over millions of consumption
+rows never materialises more than one chunk at a time. The iter_* functions
+yield lists of row dicts; trace_* collect them, and export_trace() streams
+them to a streaming.py sink (CSV, JSONL, columnar, screen).
+
+For repeated traces (a recall investigation), ConsumptionGraph loads the
+BatchConsumption adjacency into memory once and answers the lot-to-lot
+steps without round trips: either the whole table, or only the edges of
+the lots being traced (one indexed query per chunk of lots).
+
+Compound lots resolve through their own supplier's formulation as of the
+lot's intake date, as in Evaluate_Health_Risk and report 4.
+
+Traces read the hot tables by default. With include_archive=True they read
+the All* views (migration 006), which add the rows archive.py has moved out.
+"""
+import sys
+from collections import defaultdict
+from itertools import chain
+
+from archive import table_names
+from instrumentation import query_name
+from streaming import DEFAULT_FETCH_SIZE, as_tuples
+
+LOT_CHUNK_SIZE = 1000
+MAX_DEPTH = 10
+
+FORWARD_COLUMNS = ['ingredient_lot', 'product_lot', 'quantity_consumed', 'product_id', 'manufacturer_id',
+                   'production_date', 'expiration_date']
+BACKWARD_COLUMNS = ['product_lot', 'ingredient_lot', 'quantity_consumed', 'ingredient_id', 'ingredient_name',
+                    'supplier_id', 'intake_date', 'expiration_date']
+MATERIAL_COLUMNS = ['ingredient_lot', 'material_id', 'part_of', 'depth']
+RECALL_COLUMNS = ['traced_ingredient_id', 'depth'] + FORWARD_COLUMNS
+
+FORWARD_TEMPLATE = """
+    SELECT
+        bc.ingredient_lot_number AS ingredient_lot,
+        bc.product_lot_number AS product_lot,
+        bc.quantity_consumed,
+        pb.product_id,
+        pb.manufacturer_id,
+        pb.production_date,
+        pb.expiration_date
+    FROM {consumption} bc
+    JOIN {product_batches} pb ON pb.lot_number = bc.product_lot_number
+    WHERE bc.ingredient_lot_number IN ({keys})
+"""
+
+BACKWARD_TEMPLATE = """
+    SELECT
+        bc.product_lot_number AS product_lot,
+        bc.ingredient_lot_number AS ingredient_lot,
+        bc.quantity_consumed,
+        ib.ingredient_id,
+        i.name AS ingredient_name,
+        ib.supplier_id,
+        ib.intake_date,
+        ib.expiration_date
+    FROM {consumption} bc
+    JOIN {ingredient_batches} ib ON ib.lot_number = bc.ingredient_lot_number
+    JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+    WHERE bc.product_lot_number IN ({keys})
+"""
+
+GRAPH_EDGES_TEMPLATE = """
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed
+    FROM {consumption}
+    WHERE ingredient_lot_number IN ({keys})
+"""
+
+PRODUCT_LOTS_TEMPLATE = """
+    SELECT lot_number AS product_lot, product_id, manufacturer_id, production_date, expiration_date
+    FROM {product_batches}
+    WHERE lot_number IN ({keys})
+"""
+
+# Atomic materials inside the given (compound) ingredient lots, any depth;
+# intermediate compounds are walked through, not returned. UNION (not UNION
+# ALL) keeps one row per material and parent when formulations share a
+# sub-compound, instead of one per path.
+MATERIALS_TEMPLATE = f"""
+    WITH RECURSIVE parts (ingredient_lot, ingredient_id, ingredient_type, supplier_id, as_of_date, part_of, depth) AS (
+        SELECT ib.lot_number, ib.ingredient_id, i.ingredient_type, ib.supplier_id, ib.intake_date,
+               CAST(NULL AS CHAR(20)), 0
+        FROM {{ingredient_batches}} ib
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+        WHERE ib.lot_number IN ({{keys}})
+
+        UNION
+
+        SELECT p.ingredient_lot, fm.material_ingredient_id, mi.ingredient_type, NULL, p.as_of_date,
+               p.ingredient_id, p.depth + 1
+        FROM parts p
+        JOIN Formulation f
+          ON f.ingredient_id = p.ingredient_id
+         AND (p.supplier_id IS NULL OR f.supplier_id = p.supplier_id)
+         AND p.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE p.ingredient_type = 'COMPOUND'
+          AND p.depth < {MAX_DEPTH}
+    )
+    SELECT DISTINCT ingredient_lot, ingredient_id AS material_id, part_of, depth
+    FROM parts
+    WHERE depth > 0
+      AND ingredient_type = 'ATOMIC'
+"""
+
+# Every lot of the given ingredients, plus every compound lot whose
+# formulation (at intake) contains one of them at any depth. UNION keeps the
+# recursion to one row per (container, child, traced id, depth): with UNION
+# ALL a shared sub-compound was expanded once per path above it.
+CONTAINING_LOTS_TEMPLATE = f"""
+    WITH RECURSIVE containers (ingredient_id, child_id, traced_id, depth) AS (
+        SELECT i.ingredient_id, CAST(NULL AS CHAR(20)), i.ingredient_id, 0
+        FROM Ingredient i
+        WHERE i.ingredient_id IN ({{keys}})
+
+        UNION
+
+        SELECT f.ingredient_id, c.ingredient_id, c.traced_id, c.depth + 1
+        FROM containers c
+        JOIN FormulationMaterials fm ON fm.material_ingredient_id = c.ingredient_id
+        JOIN Formulation f ON f.formulation_id = fm.formulation_id
+        WHERE c.depth < {MAX_DEPTH}
+    )
+    SELECT ib.lot_number AS ingredient_lot, c.traced_id AS traced_ingredient_id, MIN(c.depth) AS depth
+    FROM containers c
+    JOIN {{ingredient_batches}} ib ON ib.ingredient_id = c.ingredient_id
+    WHERE c.depth = 0
+       OR EXISTS (
+            SELECT 1
+            FROM Formulation f
+            JOIN FormulationMaterials fm
+              ON fm.formulation_id = f.formulation_id
+             AND fm.material_ingredient_id = c.child_id
+            WHERE f.ingredient_id = ib.ingredient_id
+              AND f.supplier_id = ib.supplier_id
+              AND ib.intake_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+       )
+    GROUP BY ib.lot_number, c.traced_id
+"""
+
+
+def _chunks(keys, size):
+    keys = list(dict.fromkeys(keys))  # de-duplicate, keep order
+    for start in range(0, len(keys), size):
+        yield keys[start:start + size]
+
+
+def _iter_query(cursor, name, template, keys, chunk_size, fetch_size, include_archive=False):
+    """Run template once per chunk of keys; yield the rows fetch_size at a time."""
+    tables = table_names(include_archive)
+    with query_name(name):
+        for chunk in _chunks(keys, chunk_size):
+            cursor.execute(template.format(keys=', '.join(['%s'] * len(chunk)), **tables), tuple(chunk))
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+
+
+# --- In-memory adjacency ---
+
+class ConsumptionGraph:
+    """BatchConsumption as two adjacency maps (ingredient lot <-> product lot)."""
+
+    def __init__(self):
+        self.consumers = defaultdict(list)   # ingredient lot -> [(product lot, qty)]
+        self.inputs = defaultdict(list)      # product lot -> [(ingredient lot, qty)]
+        self.edges = 0
+
+    @classmethod
+    def load(cls, cursor, ingredient_lots=None, chunk_size=LOT_CHUNK_SIZE, fetch_size=DEFAULT_FETCH_SIZE,
+             include_archive=False):
+        """
+        Stream BatchConsumption rows (and archived ones, if asked) into a new
+        graph: every row, or only those consuming ingredient_lots. Product
+        lots are never consumed themselves, so the edges of ingredient_lots
+        are the whole forward closure of those lots.
+        """
+        graph = cls()
+        if ingredient_lots is None:
+            with query_name('trace_graph_load'):
+                cursor.execute("SELECT product_lot_number, ingredient_lot_number, quantity_consumed FROM {}".format(
+                    table_names(include_archive)['consumption']))
+                batches = iter(lambda: cursor.fetchmany(fetch_size), [])
+                graph.add_rows(chain.from_iterable(batches))
+        else:
+            graph.add_rows(chain.from_iterable(_iter_query(cursor, 'trace_graph_load', GRAPH_EDGES_TEMPLATE,
+                                                           ingredient_lots, chunk_size, fetch_size,
+                                                           include_archive)))
+        return graph
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add(row['product_lot_number'], row['ingredient_lot_number'], row['quantity_consumed'])
+
+    def add(self, product_lot, ingredient_lot, quantity):
+        product_lot, ingredient_lot = sys.intern(product_lot), sys.intern(ingredient_lot)
+        self.consumers[ingredient_lot].append((product_lot, quantity))
+        self.inputs[product_lot].append((ingredient_lot, quantity))
+        self.edges += 1
+
+    def forward_edges(self, ingredient_lots):
+        return [(lot, product_lot, qty) for lot in dict.fromkeys(ingredient_lots)
+                for product_lot, qty in self.consumers.get(lot, ())]
+
+    def backward_edges(self, product_lots):
+        return [(product_lot, lot, qty) for product_lot in dict.fromkeys(product_lots)
+                for lot, qty in self.inputs.get(product_lot, ())]
+
+
+def _iter_forward_from_graph(cursor, graph, ingredient_lots, chunk_size, fetch_size, include_archive):
+    """Graph edges, decorated with ProductBatch details (one query per chunk of product lots)."""
+    edges = graph.forward_edges(ingredient_lots)
+    by_product = defaultdict(list)
+    for ingredient_lot, product_lot, qty in edges:
+        by_product[product_lot].append((ingredient_lot, qty))
+    for rows in _iter_query(cursor, 'trace_product_lots', PRODUCT_LOTS_TEMPLATE, by_product, chunk_size,
+                            fetch_size, include_archive):
+        yield [{'ingredient_lot': ingredient_lot, 'quantity_consumed': qty, **product}
+               for product in rows for ingredient_lot, qty in by_product[product['product_lot']]]
+
+
+# --- Traversals ---
+
+def iter_forward(cursor, ingredient_lots, graph=None, chunk_size=LOT_CHUNK_SIZE, fetch_size=DEFAULT_FETCH_SIZE,
+                 include_archive=False):
+    """Yield batches of FORWARD_COLUMNS rows: the product lots that consumed ingredient_lots."""
+    if graph is not None:
+        return _iter_forward_from_graph(cursor, graph, ingredient_lots, chunk_size, fetch_size, include_archive)
+    return _iter_query(cursor, 'trace_forward', FORWARD_TEMPLATE, ingredient_lots, chunk_size, fetch_size,
+                       include_archive)
+
+
+def iter_backward(cursor, product_lots, chunk_size=LOT_CHUNK_SIZE, fetch_size=DEFAULT_FETCH_SIZE,
+                  include_archive=False):
+    """Yield batches of BACKWARD_COLUMNS rows: the ingredient lots product_lots consumed."""
+    return _iter_query(cursor, 'trace_backward', BACKWARD_TEMPLATE, product_lots, chunk_size, fetch_size,
+                       include_archive)
+
+
+def iter_materials(cursor, ingredient_lots, chunk_size=LOT_CHUNK_SIZE, fetch_size=DEFAULT_FETCH_SIZE,
+                   include_archive=False):
+    """Yield batches of MATERIAL_COLUMNS rows: the materials inside compound ingredient_lots."""
+    return _iter_query(cursor, 'trace_materials', MATERIALS_TEMPLATE, ingredient_lots, chunk_size, fetch_size,
+                       include_archive)
+
+
+def containing_lots(cursor, ingredient_ids, chunk_size=LOT_CHUNK_SIZE, fetch_size=DEFAULT_FETCH_SIZE,
+                    include_archive=False):
+    """{ingredient lot: (traced ingredient id, depth)} for every lot that contains ingredient_ids."""
+    lots = {}
+    for rows in _iter_query(cursor, 'trace_containing_lots', CONTAINING_LOTS_TEMPLATE, ingredient_ids,
+                            chunk_size, fetch_size, include_archive):
+        for row in rows:
+            known = lots.get(row['ingredient_lot'])
+            if known is None or row['depth'] < known[1]:
+                lots[row['ingredient_lot']] = (row['traced_ingredient_id'], row['depth'])
+    return lots
+
+
+def iter_recall(cursor, ingredient_ids, graph=None, chunk_size=LOT_CHUNK_SIZE, fetch_size=DEFAULT_FETCH_SIZE,
+                include_archive=False, lots=None):
+    """
+    Yield batches of RECALL_COLUMNS rows: every product lot exposed to
+    ingredient_ids. lots is their containing_lots() when the caller already
+    has it (e.g. to load a graph of just those lots).
+    """
+    if lots is None:
+        lots = containing_lots(cursor, ingredient_ids, chunk_size, fetch_size, include_archive)
+    for rows in iter_forward(cursor, lots, graph, chunk_size, fetch_size, include_archive):
+        for row in rows:
+            row['traced_ingredient_id'], row['depth'] = lots[row['ingredient_lot']]
+        yield rows
+
+
+def trace_forward(cursor, ingredient_lots, graph=None, include_archive=False):
+    return list(chain.from_iterable(iter_forward(cursor, ingredient_lots, graph, include_archive=include_archive)))
+
+
+def trace_backward(cursor, product_lots, include_materials=False, include_archive=False):
+    """
+    Ingredient lots consumed by product_lots. With include_materials, also
+    returns the atomic materials of the compound lots: (lots, materials).
+    """
+    lots = list(chain.from_iterable(iter_backward(cursor, product_lots, include_archive=include_archive)))
+    if not include_materials:
+        return lots
+    materials = list(chain.from_iterable(iter_materials(cursor, [row['ingredient_lot'] for row in lots],
+                                                        include_archive=include_archive)))
+    return lots, materials
+
+
+def recall(cursor, ingredient_ids, graph=None, include_archive=False):
+    return list(chain.from_iterable(iter_recall(cursor, ingredient_ids, graph, include_archive=include_archive)))
+
+
+# --- Export ---
+
+def export_trace(batches, sink, columns):
+    """Stream row batches (from an iter_* function) through a sink. Returns the row count."""
+    sink.open(columns)
+    try:
+        for rows in batches:
+            if sink.write(as_tuples(rows, columns)) is False:
+                break
+    finally:
+        count = sink.close()
+    return count
@@ -0,0 +1,129 @@
+"""
+Managed index set for the hot query paths, plus an EXPLAIN-based check.
+
+    python indexes.py apply   # create any missing index from HOT_PATH_INDEXES
+    python indexes.py check   # EXPLAIN every hot query; exit 1 if one stops using its index
+
+The same indexes ship as sql_src/migrations/001_hot_path_indexes.sql. The
+check is meant to be run against a database with representative volumes;
+on a near-empty table the optimizer is free to prefer a full scan.
+HOT_QUERIES uses the query constants the application itself executes, and
+tests/test_indexes.py runs the same check against the local MySQL server.
+"""
+import sys
+
+import costing
+import fefo
+import genealogy
+import intake
+import refcache
+import reports
+import reservation
+from archive import table_names
+from db_pool import backend, borrow_connection, close_pool, init_pool
+
+# index name -> (table, columns)
+HOT_PATH_INDEXES = {
+    'idx_ib_fefo': ('IngredientBatch', ('ingredient_id', 'expiration_date', 'lot_number', 'quantity_on_hand')),
+    'idx_formulation_validity': ('Formulation', ('ingredient_id', 'supplier_id', 'valid_from_date', 'valid_to_date')),
+    'idx_bc_ingredient_lot': ('BatchConsumption', ('ingredient_lot_number', 'product_lot_number', 'quantity_consumed')),
+    'idx_pb_product_date': ('ProductBatch', ('product_id', 'manufacturer_id', 'production_date')),
+    'idx_recipe_active': ('Recipe', ('product_id', 'is_active')),
+}
+
+# Each hot query: (label, sql, params, table alias in EXPLAIN, expected index, filesort allowed).
+# The SQL is the constant the application runs, so a plan regression in the
+# real query fails the check; sample parameters match the demo data.
+HOT_QUERIES = [
+    ('fefo_query', fefo.FEFO_ALLOCATION_QUERY, (1, 1), 'ib', 'idx_ib_fefo', True),
+    ('reservation_lock_lots', reservation.LOCK_LOTS_QUERY, ('106', '1000-01-01', '1000-01-01', '', 4),
+     'IngredientBatch', 'idx_ib_fefo', False),
+    ('costing_fefo_lots', costing.LOTS_TEMPLATE.format(keys='%s'), ('106', '2025-11-15'),
+     'IngredientBatch', 'idx_ib_fefo', False),
+    ('formulation_authorization', intake.AUTHORIZATION_QUERY, ('20', '201'),
+     'Formulation', 'idx_formulation_validity', True),
+    ('trace_forward', genealogy.FORWARD_TEMPLATE.format(keys='%s', **table_names()), ('106-20-B0006',),
+     'bc', 'idx_bc_ingredient_lot', True),
+    ('report_1_latest_batch', reports.REPORT_1_QUERY, ('100', 'MFG001', '100', 'MFG001'),
+     'pb2', 'idx_pb_product_date', True),
+    ('active_recipe', refcache.ACTIVE_RECIPE_QUERY, ('100',), 'cr', 'idx_recipe_active', True),
+    ('product_context', refcache.PRODUCT_CONTEXT_QUERY, ('100',), 'cr', 'idx_recipe_active', True),
+]
+
+
+def existing_indexes(cursor):
+    """Return the set of index names present in the current schema."""
+    cursor.execute("""
+        SELECT DISTINCT index_name AS index_name
+        FROM information_schema.STATISTICS
+        WHERE table_schema = DATABASE()
+    """)
+    return {row['index_name'] for row in cursor.fetchall()}
+
+
+def apply_indexes(cursor, db):
+    """Create every index from HOT_PATH_INDEXES that does not exist yet."""
+    present = existing_indexes(cursor)
+    created = []
+    for name, (table, columns) in HOT_PATH_INDEXES.items():
+        if name in present:
+            continue
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+        created.append(name)
+    db.commit()
+    return created
+
+
+def check_index_usage(cursor):
+    """
+    EXPLAIN every hot query and return a list of human-readable failures.
+    An empty list means every query uses its expected index.
+    """
+    failures = []
+    for label, sql, params, table, expected, filesort_ok in HOT_QUERIES:
+        cursor.execute("EXPLAIN " + sql, params)
+        plan = cursor.fetchall()
+        rows = [row for row in plan if row.get('table') == table]
+        if not rows:
+            failures.append(f"{label}: table '{table}' not found in EXPLAIN output")
+            continue
+
+        row = rows[0]
+        if row.get('key') != expected:
+            failures.append(f"{label}: expected index {expected} on {table}, got {row.get('key')} "
+                            f"(access type {row.get('type')})")
+        if not filesort_ok and 'filesort' in str(row.get('Extra') or ''):
+            failures.append(f"{label}: ORDER BY is no longer served by {expected} (Using filesort)")
+    return failures
+
+
+def main():
+    if len(sys.argv) != 2 or sys.argv[1] not in ('apply', 'check'):
+        print("Usage: python indexes.py apply|check")
+        return 2
+    if backend() != 'mysql':
+        print("indexes.py works on the MySQL backend only (the SQLite schema creates these indexes itself).")
+        return 2
+
+    from main import DB_CONFIG, get_db_password
+    DB_CONFIG['password'] = get_db_password()
+    init_pool(DB_CONFIG, 1)
+    try:
+        with borrow_connection() as (db, cursor):
+            if sys.argv[1] == 'apply':
+                created = apply_indexes(cursor, db)
+                print(f"Created: {', '.join(created)}" if created else "All hot-path indexes already exist.")
+                return 0
+            failures = check_index_usage(cursor)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        if failures:
+            return 1
+        print(f"OK: all {len(HOT_QUERIES)} hot queries use their indexes.")
+        return 0
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
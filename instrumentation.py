@@ -0,0 +1,299 @@
+"""
+Query-level instrumentation for cursor.execute / executemany / callproc.
+
+Disabled by default. When MEAL_QUERY_STATS=1 (or configure(enabled=True)),
+borrow_connection() hands out an InstrumentedCursor that records, per
+named query: calls, total / mean / p50 / p99 / max latency, rows returned
+and slow calls, and optionally the EXPLAIN plan of each SELECT.
+
+Queries are named by, in order:
+    query_name('report_4')      an explicit block around the call
+    register_query(name, sql)   a module-level SQL constant (fefo_query, ...)
+    callproc                    the procedure name (Record_Production_Batch, ...)
+    otherwise                   the first words of the SQL text
+
+    MEAL_QUERY_STATS=1            turn instrumentation on
+    MEAL_SLOW_QUERY_MS=200        calls at or above this are written to the slow log
+    MEAL_SLOW_QUERY_LOG=path      JSONL slow log (default: stderr)
+    MEAL_SLOW_QUERY_PARAMS=1      log bound values too (default: only their count,
+                                  so password hashes and the like stay out of the log)
+    MEAL_QUERY_EXPLAIN=1          capture EXPLAIN once per named SELECT
+    MEAL_QUERY_STATS_FILE=path    where main.py dumps the stats at exit
+
+When disabled, instrument() returns the cursor itself and query_name() a
+shared no-op context, so the cost is one flag check per borrowed cursor.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_STATS_FILE = 'query_stats.json'
+SAMPLE_SIZE = 2048          # latency samples kept per query
+FINGERPRINT_LENGTH = 60
+_EXPLAINABLE = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+_enabled = os.environ.get('MEAL_QUERY_STATS', '').lower() in ('1', 'true', 'yes', 'on')
+_slow_ms = float(os.environ.get('MEAL_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS))
+_slow_log = os.environ.get('MEAL_SLOW_QUERY_LOG') or None
+_log_params = os.environ.get('MEAL_SLOW_QUERY_PARAMS', '').lower() in ('1', 'true', 'yes', 'on')
+_explain = os.environ.get('MEAL_QUERY_EXPLAIN', '').lower() in ('1', 'true', 'yes', 'on')
+
+_registered = {}            # sql text -> name
+_local = threading.local()  # .name set by query_name()
+_NO_OP = nullcontext()
+
+
+def configure(enabled=None, slow_ms=None, slow_log=None, explain=None, log_params=None):
+    """Override the environment settings (None leaves a setting unchanged)."""
+    global _enabled, _slow_ms, _slow_log, _explain, _log_params
+    if enabled is not None:
+        _enabled = enabled
+    if slow_ms is not None:
+        _slow_ms = float(slow_ms)
+    if slow_log is not None:
+        _slow_log = slow_log or None
+    if explain is not None:
+        _explain = explain
+    if log_params is not None:
+        _log_params = log_params
+
+
+def enabled():
+    return _enabled
+
+
+def register_query(name, sql):
+    """Name a SQL constant so every execution of it is recorded under `name`."""
+    _registered[sql] = name
+    return sql
+
+
+def query_name(name):
+    """Record the statements run inside this block under `name`."""
+    return _named(name) if _enabled else _NO_OP
+
+
+@contextmanager
+def _named(name):
+    previous = getattr(_local, 'name', None)
+    _local.name = name
+    try:
+        yield
+    finally:
+        _local.name = previous
+
+
+def _name_for(sql):
+    name = getattr(_local, 'name', None) or _registered.get(sql)
+    if name:
+        return name
+    return ' '.join(str(sql).split())[:FINGERPRINT_LENGTH]
+
+
+# --- Statistics ---
+
+class QueryStats:
+    """Thread-safe per-query counters and latency samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}      # name -> counters
+
+    def _entry(self, name):
+        entry = self._queries.get(name)
+        if entry is None:
+            entry = self._queries[name] = {'calls': 0, 'total': 0.0, 'max': 0.0, 'rows': 0, 'slow': 0,
+                                           'samples': deque(maxlen=SAMPLE_SIZE), 'explain': None}
+        return entry
+
+    def record(self, name, seconds, slow):
+        with self._lock:
+            entry = self._entry(name)
+            entry['calls'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['slow'] += 1 if slow else 0
+            entry['samples'].append(seconds)
+
+    def add_rows(self, name, count):
+        with self._lock:
+            self._entry(name)['rows'] += count
+
+    def needs_explain(self, name):
+        with self._lock:
+            entry = self._queries.get(name)
+            return entry is None or entry['explain'] is None
+
+    def set_explain(self, name, plan):
+        with self._lock:
+            self._entry(name)['explain'] = plan
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+
+    def snapshot(self):
+        """[{name, calls, total_ms, mean_ms, p50_ms, p99_ms, max_ms, rows, slow, explain}], slowest total first."""
+        with self._lock:
+            report = []
+            for name, entry in self._queries.items():
+                ordered = sorted(entry['samples'])
+                report.append({
+                    'name': name,
+                    'calls': entry['calls'],
+                    'total_ms': entry['total'] * 1000,
+                    'mean_ms': entry['total'] * 1000 / entry['calls'] if entry['calls'] else None,
+                    'p50_ms': ordered[len(ordered) // 2] * 1000 if ordered else None,
+                    'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000 if ordered else None,
+                    'max_ms': entry['max'] * 1000,
+                    'rows': entry['rows'],
+                    'slow': entry['slow'],
+                    'explain': entry['explain'],
+                })
+        return sorted(report, key=lambda row: row['total_ms'], reverse=True)
+
+
+STATS = QueryStats()
+_log_lock = threading.Lock()
+
+
+def _redact(params):
+    """'<n params>' instead of the bound values (executemany's '<n rows>' is kept as is)."""
+    return params if isinstance(params, str) else f"<{len(params or ())} params>"
+
+
+def _log_slow(name, sql, params, seconds):
+    line = json.dumps({'at': datetime.now().isoformat(timespec='milliseconds'), 'name': name,
+                       'ms': round(seconds * 1000, 3), 'sql': ' '.join(str(sql).split()),
+                       'params': params if _log_params else _redact(params)}, default=str)
+    with _log_lock:
+        if _slow_log:
+            with open(_slow_log, 'a', encoding='utf-8') as handle:
+                handle.write(line + '\n')
+        else:
+            print(f"SLOW QUERY {line}", file=sys.stderr)
+
+
+# --- Cursor wrapper ---
+
+class InstrumentedCursor:
+    """Times statements and counts fetched rows; everything else goes to the wrapped cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._current = None    # name that fetched rows are attributed to
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count(1)
+            yield row
+
+    def _timed(self, name, sql, params, run):
+        self._current = name
+        start = time.perf_counter()
+        try:
+            return run()
+        finally:
+            seconds = time.perf_counter() - start
+            slow = seconds * 1000 >= _slow_ms
+            STATS.record(name, seconds, slow)
+            if slow:
+                _log_slow(name, sql, params, seconds)
+
+    def _capture_explain(self, name, sql, params):
+        if not _EXPLAINABLE.match(sql) or not STATS.needs_explain(name):
+            return
+        try:
+            self._cursor.execute("EXPLAIN " + sql, params)
+            STATS.set_explain(name, self._cursor.fetchall())
+        except Exception as err:  # a plan we cannot get must never break the real query
+            STATS.set_explain(name, [{'error': str(err)}])
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        name = _name_for(operation)
+        if _explain:
+            self._capture_explain(name, operation, params)
+        result = self._timed(name, operation, params,
+                             lambda: self._cursor.execute(operation, params, *args, **kwargs))
+        if not getattr(self._cursor, 'with_rows', False) and self._cursor.rowcount > 0:
+            self._count(self._cursor.rowcount)  # DML: rows affected
+        return result
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        name = _name_for(operation)
+        result = self._timed(name, operation, f"<{len(seq_params)} rows>",
+                             lambda: self._cursor.executemany(operation, seq_params, *args, **kwargs))
+        if self._cursor.rowcount > 0:
+            self._count(self._cursor.rowcount)
+        return result
+
+    def callproc(self, procname, args=()):
+        name = getattr(_local, 'name', None) or procname
+        return self._timed(name, f"CALL {procname}", args, lambda: self._cursor.callproc(procname, args))
+
+    def _count(self, count):
+        if self._current and count:
+            STATS.add_rows(self._current, count)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count(len(rows))
+        return rows
+
+
+def instrument(cursor):
+    """Wrap cursor when instrumentation is on; otherwise return it unchanged."""
+    return InstrumentedCursor(cursor) if _enabled else cursor
+
+
+# --- Reporting ---
+
+def snapshot():
+    return STATS.snapshot()
+
+
+def reset():
+    STATS.reset()
+
+
+def dump(path=None):
+    """Write the current statistics as JSON to path (default MEAL_QUERY_STATS_FILE). Returns the path."""
+    path = path or os.environ.get('MEAL_QUERY_STATS_FILE') or DEFAULT_STATS_FILE
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump({'generated_at': datetime.now().isoformat(timespec='seconds'), 'slow_query_ms': _slow_ms,
+                   'queries': STATS.snapshot()}, handle, indent=2, default=str)
+    return path
+
+
+def format_report(queries, limit=None):
+    """Plain-text table of a snapshot (or the 'queries' list of a dump file)."""
+    header = f"{'query':<{FINGERPRINT_LENGTH}} {'calls':>7} {'total ms':>11} {'mean ms':>9} " \
+             f"{'p50 ms':>9} {'p99 ms':>9} {'rows':>9} {'slow':>5}"
+    lines = [header, '-' * len(header)]
+    for row in queries[:limit]:
+        lines.append(f"{row['name'][:FINGERPRINT_LENGTH]:<{FINGERPRINT_LENGTH}} {row['calls']:>7} "
+                     f"{row['total_ms']:>11.1f} {row['mean_ms'] or 0:>9.3f} {row['p50_ms'] or 0:>9.3f} "
+                     f"{row['p99_ms'] or 0:>9.3f} {row['rows']:>9} {row['slow']:>5}")
+    return '\n'.join(lines)
@@ -0,0 +1,190 @@
+"""
+Bulk lot intake for IngredientBatch (supplier delivery manifests).
+
+bulk_intake_lots() validates a whole manifest up front and then loads the
+accepted rows in chunks:
+  * formulation authorization is checked with one set-based query per
+    chunk of distinct ingredients, not one query per lot;
+  * the 90-day shelf-life rule and duplicate checks run in a single pass;
+  * rows are inserted with multi-row executemany() and committed per chunk.
+
+A manifest row is a dict with:
+    ingredient_id, supplier_batch_id, quantity, per_unit_cost, expiration_date (YYYY-MM-DD)
+"""
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+
+from db_pool import borrow_connection
+from queries import register
+
+# The demo data set treats 2025-11-15 as "today" for intake.
+INTAKE_DATE = date(2025, 11, 15)
+MIN_SHELF_LIFE_DAYS = 90
+DEFAULT_CHUNK_SIZE = 1000
+
+REQUIRED_FIELDS = ('ingredient_id', 'supplier_batch_id', 'quantity', 'per_unit_cost', 'expiration_date')
+
+INSERT_LOT_QUERY = """
+    INSERT INTO IngredientBatch
+      (ingredient_id, supplier_id, supplier_batch_id,
+       quantity_on_hand, per_unit_cost, expiration_date, intake_date)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+register('intake_insert_lot', INSERT_LOT_QUERY)
+
+# Single-ingredient check (interactive intake); bulk intake uses authorized_ingredients()
+AUTHORIZATION_QUERY = """
+    SELECT 1 FROM Formulation
+    WHERE supplier_id = %s
+      AND ingredient_id = %s
+      AND CURDATE() BETWEEN valid_from_date AND COALESCE(valid_to_date, '9999-12-31')
+"""
+register('formulation_authorization', AUTHORIZATION_QUERY)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+def authorized_ingredients(cursor, supplier_id, ingredient_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return the subset of ingredient_ids this supplier has an active formulation for."""
+    authorized = set()
+    ingredient_ids = sorted(set(ingredient_ids))
+    for chunk in _chunks(ingredient_ids, chunk_size):
+        cursor.execute(f"""
+            SELECT DISTINCT ingredient_id
+            FROM Formulation
+            WHERE supplier_id = %s
+              AND ingredient_id IN ({_placeholders(len(chunk))})
+              AND CURDATE() BETWEEN valid_from_date AND COALESCE(valid_to_date, '9999-12-31')
+        """, (supplier_id, *chunk))
+        authorized.update(row['ingredient_id'] for row in cursor.fetchall())
+    return authorized
+
+
+def existing_lot_numbers(cursor, lot_numbers, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return the subset of lot_numbers already present in IngredientBatch."""
+    existing = set()
+    for chunk in _chunks(list(lot_numbers), chunk_size):
+        cursor.execute(f"SELECT lot_number FROM IngredientBatch WHERE lot_number IN ({_placeholders(len(chunk))})",
+                       tuple(chunk))
+        existing.update(row['lot_number'] for row in cursor.fetchall())
+    return existing
+
+
+def _parse_row(row_number, row):
+    """Turn one manifest row into typed values, or raise ValueError with the reason."""
+    missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"Missing field(s): {', '.join(missing)}")
+    try:
+        quantity = Decimal(str(row['quantity']))
+        cost = Decimal(str(row['per_unit_cost']))
+    except InvalidOperation:
+        raise ValueError("Quantity/Cost must be numbers.")
+    if quantity <= 0 or cost < 0:
+        raise ValueError("Quantity must be positive and cost must not be negative.")
+    try:
+        expiration_date = date.fromisoformat(str(row['expiration_date']).strip())
+    except ValueError:
+        raise ValueError(f"Expiration date {row['expiration_date']!r} must be YYYY-MM-DD.")
+
+    return {
+        'row': row_number,
+        'ingredient_id': str(row['ingredient_id']).strip(),
+        'supplier_batch_id': str(row['supplier_batch_id']).strip(),
+        'quantity': quantity,
+        'per_unit_cost': cost,
+        'expiration_date': expiration_date,
+    }
+
+
+def bulk_intake_lots(supplier_id, rows, intake_date=INTAKE_DATE, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Validate and load a delivery manifest for one supplier.
+
+    Returns (rejections, summary):
+      rejections -> one dict per rejected row: row, ingredient_id, supplier_batch_id, reason
+      summary    -> accepted, rejected, elapsed (s), lots_per_sec
+    """
+    start = time.perf_counter()
+    rejections = []
+
+    def reject(lot, reason):
+        rejections.append({'row': lot['row'], 'ingredient_id': lot.get('ingredient_id'),
+                           'supplier_batch_id': lot.get('supplier_batch_id'), 'reason': reason})
+
+    # --- 1. Parse + shelf-life rule, in one pass over the manifest ---
+    candidates = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            lot = _parse_row(row_number, row)
+        except ValueError as err:
+            reject({'row': row_number, 'ingredient_id': row.get('ingredient_id'),
+                    'supplier_batch_id': row.get('supplier_batch_id')}, str(err))
+            continue
+        if (lot['expiration_date'] - intake_date).days < MIN_SHELF_LIFE_DAYS:
+            reject(lot, f"Expiration date {lot['expiration_date']} is less than "
+                        f"{MIN_SHELF_LIFE_DAYS} days after intake ({intake_date}).")
+            continue
+        lot['lot_number'] = f"{lot['ingredient_id']}-{supplier_id}-{lot['supplier_batch_id']}"
+        candidates.append(lot)
+
+    accepted = 0
+    with borrow_connection() as (db, cursor):
+        # --- 2. Set-based authorization and duplicate checks ---
+        authorized = authorized_ingredients(cursor, supplier_id, [lot['ingredient_id'] for lot in candidates],
+                                            chunk_size)
+        existing = existing_lot_numbers(cursor, {lot['lot_number'] for lot in candidates}, chunk_size)
+
+        to_insert = []
+        seen = set()
+        for lot in candidates:
+            if lot['ingredient_id'] not in authorized:
+                reject(lot, f"Not authorized to supply ingredient {lot['ingredient_id']} "
+                            f"(or no active formulation exists).")
+            elif lot['lot_number'] in existing:
+                reject(lot, f"Lot {lot['lot_number']} already exists.")
+            elif lot['lot_number'] in seen:
+                reject(lot, f"Lot {lot['lot_number']} appears more than once in the manifest.")
+            else:
+                seen.add(lot['lot_number'])
+                to_insert.append(lot)
+
+        # --- 3. Chunked multi-row inserts, one commit per chunk ---
+        for chunk in _chunks(to_insert, chunk_size):
+            params = [(lot['ingredient_id'], supplier_id, lot['supplier_batch_id'], lot['quantity'],
+                       lot['per_unit_cost'], lot['expiration_date'], intake_date) for lot in chunk]
+            try:
+                cursor.executemany(INSERT_LOT_QUERY, params)
+                db.commit()
+                accepted += len(chunk)
+            except mysql.connector.Error:
+                # Something changed since validation (e.g. a concurrent intake);
+                # retry the chunk row by row so only the offending lots are rejected.
+                db.rollback()
+                for lot, lot_params in zip(chunk, params):
+                    try:
+                        cursor.execute(INSERT_LOT_QUERY, lot_params)
+                        accepted += 1
+                    except mysql.connector.Error as err:
+                        reject(lot, err.msg)
+                db.commit()
+
+    rejections.sort(key=lambda rejection: rejection['row'])
+    elapsed = time.perf_counter() - start
+    summary = {
+        'accepted': accepted,
+        'rejected': len(rejections),
+        'elapsed': elapsed,
+        'lots_per_sec': accepted / elapsed if elapsed > 0 else 0.0,
+    }
+    return rejections, summary
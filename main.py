@@ -1,30 +1,53 @@
 import mysql.connector
+import argparse
 import getpass
 import json
+import os
 import sys
 from datetime import date, timedelta
 from tabulate import tabulate
 
+import archive
+import costing
+import genealogy
+import instrumentation
+import operations
+import planning
+import refcache
+import report_runner
+from db_pool import backend, borrow_connection, close_pool, init_pool
+from fefo import allocate_fefo, shortages
+from intake import (AUTHORIZATION_QUERY, DEFAULT_CHUNK_SIZE, INSERT_LOT_QUERY, INTAKE_DATE, MIN_SHELF_LIFE_DAYS,
+                    bulk_intake_lots)
+from operations import FORMULATION_OWNER_QUERY, OperationError, authenticate
+from production import DEFAULT_COMMIT_GROUP_SIZE, post_production_batches
+from records import RecordError, read_records
+from reports import (DEFAULT_AS_OF, DEFAULT_PRODUCT_ID, DEFAULT_PRODUCT_LOT, DEFAULT_SUPPLIER_ID, NEAR_EXPIRY_DAYS,
+                     REPORTS, execute_report)
+from service import DEFAULT_HOST, DEFAULT_MAX_PENDING, DEFAULT_PORT, serve
+from streaming import OutputPathError, TableSink, sink_for_path, stream_cursor, write_rows
+
 # --- Database Configuration ---
 DB_CONFIG = {
     'user': 'root',
     'host': '127.0.0.1',
     'database': 'Meal_Manufacturer'
 }
+DB_POOL_SIZE = int(os.environ.get('MEAL_DB_POOL_SIZE', 5))
 
 # --- Helper Functions ---
-def pretty_print_results(cursor):
-    """Print query results in a formatted table."""
-    results = cursor.fetchall()
-    if not results:
-        print("No results found.")
-        return
-    
-    print(tabulate(results, headers="keys", tablefmt="grid"))
+def pretty_print_results(cursor, sink=None):
+    """Stream query results (fetchmany) to a paged table, or to the given sink."""
+    report_export(stream_cursor(cursor, sink or TableSink()), sink)
+
+def report_export(count, sink):
+    """Confirm file exports (screen output speaks for itself)."""
+    if sink is not None and not isinstance(sink, TableSink):
+        print(f"Exported {count} row(s).")
 
 # --- Main Application ---
 
-def login(cursor):
+def login():
     """
     Handles user login, authenticates against the AppUser table,
     and returns the user's session info.
@@ -33,27 +56,12 @@ def login(cursor):
     username = input("Username: ")
     password = getpass.getpass("Password: ") 
 
-    query = """
-        SELECT role, manufacturer_id, supplier_id 
-        FROM AppUser 
-        WHERE username = %s AND password_hash = %s
-    """
     try:
-        cursor.execute(query, (username, password))
-        result = cursor.fetchone()
+        result = authenticate(username, password)
 
         if result:
-            role = result.get('role')
-            man_id = result.get('manufacturer_id')
-            sup_id = result.get('supplier_id')
-            user_id = man_id if role == 'Manufacturer' else sup_id
-            
-            print(f"\nLogin successful. Welcome, {username} (Role: {role})")
-            return {
-                "username": username,
-                "role": role,
-                "id": user_id
-            }
+            print(f"\nLogin successful. Welcome, {username} (Role: {result['role']})")
+            return result
         else:
             print("Login failed. Invalid username or password.")
             return None
@@ -65,7 +73,7 @@ def login(cursor):
 # --- MANUFACTURER MENU ---
 # =====================================================================
 
-def create_product_type(cursor, db, user_session):
+def create_product_type(user_session):
     """Create a new product type."""
     print("\n--- (1) Create & Manage Product Types ---")
     try:
@@ -80,141 +88,95 @@ def create_product_type(cursor, db, user_session):
               (product_id, name, category_id, manufacturer_id, standard_batch_size)
             VALUES (%s, %s, %s, %s, %s)
         """
-        cursor.execute(query, (product_id, name, category_id, manufacturer_id, sbs))
-        db.commit()
+        with borrow_connection() as (db, cursor):
+            cursor.execute(query, (product_id, name, category_id, manufacturer_id, sbs))
+            db.commit()
+        refcache.invalidate_product(product_id)
         print(f"Success! Product '{name}' created.")
 
     except mysql.connector.Error as err:
-        db.rollback()
         print(f"Error: {err.msg}")
     except ValueError:
         print("Error: Standard batch size must be an integer.")
 
-def create_recipe_plan(cursor, db, user_session):
+def create_recipe_plan(user_session):
     """Create a new versioned recipe."""
     print("\n--- (2) Create & Update Recipe Plans (Versioned) ---")
     try:
         product_id = input("Enter Product ID to create a recipe for (e.g., 100): ")
         recipe_name = input("Enter new Recipe Name (e.g., 'v2-low-sodium'): ")
-        
-        # 1. Create the 'parent' Recipe row
-        query_recipe = """
-            INSERT INTO Recipe (product_id, name, creation_date, is_active)
-            VALUES (%s, %s, %s, %s)
-        """
-        # (We could also have logic to set other recipes for this product to is_active=0)
-        cursor.execute(query_recipe, (product_id, recipe_name, date.today(), 1))
-        recipe_id = cursor.lastrowid # Get the new PK we just created
-        print(f"Created new recipe with ID: {recipe_id}")
 
-        # 2. Loop and add ingredients
+        # 1. Collect the ingredients first; nothing is sent (or locked) while typing
+        ingredients = []
         while True:
             print("\nAdd an ingredient to the recipe (or type 'done' to finish):")
             ing_id = input("  Ingredient ID (e.g., 101): ")
             if ing_id.lower() == 'done':
                 break
-            
+
             qty = float(input("  Quantity (oz) (e.g., 0.5): "))
             unit = input("  Unit (e.g., 'oz'): ")
-
-            query_ing = """
-                INSERT INTO RecipeIngredient (recipe_id, ingredient_id, quantity, unit_of_measure)
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(query_ing, (recipe_id, ing_id, qty, unit))
+            ingredients.append({'ingredient_id': ing_id, 'quantity': qty, 'unit_of_measure': unit})
             print(f"Added ingredient {ing_id}.")
-        
-        db.commit()
-        print(f"\nSuccess! Recipe '{recipe_name}' (ID: {recipe_id}) created.")
-        
+
+        # 2. Recipe row + one multi-row INSERT for all ingredients, in one transaction
+        recipe_id = operations.create_recipe(user_session['id'], product_id, recipe_name, ingredients)
+        print(f"\nSuccess! Recipe '{recipe_name}' (ID: {recipe_id}) created with {len(ingredients)} ingredient(s).")
+
+    except OperationError as err:
+        print(f"Error: {err}")
     except mysql.connector.Error as err:
-        db.rollback()
         print(f"Error: {err.msg}")
     except ValueError:
-        db.rollback()
         print("Error: Quantity must be a number.")
 
-def create_product_batch(cursor, db, user_session):
+def create_product_batch(user_session):
     """Create a new product batch with FEFO ingredient allocation."""
     print("\n--- (3) Create Product Batch (Production Posting) ---")
-    
+
     try:
         # --- Step 1: Get Input ---
         product_id = input("Enter Product ID to manufacture (e.g., 100): ")
         produced_quantity = int(input("Enter Production Quantity (e.g., 100): "))
         manufacturer_batch_id = input("Enter new Manufacturer Batch ID (e.g., B0902): ")
         exp_date_str = input("Enter Expiration Date (YYYY-MM-DD): ")
-        
-        # --- Step 2: Validate Quantity (Python Check) ---
-        cursor.execute("SELECT standard_batch_size FROM Product WHERE product_id = %s AND manufacturer_id = %s", 
-                       (product_id, user_session['id']))
-        sbs_result = cursor.fetchone()
-        if not sbs_result:
-            print(f"Error: You do not own Product ID {product_id}.")
-            return
-            
-        sbs = sbs_result['standard_batch_size']
-        if produced_quantity % sbs != 0:
-            print(f"Error: Quantity ({produced_quantity}) must be a multiple of the standard batch size ({sbs}).")
-            return
 
-        # --- Step 3: Get Active Recipe ---
-        cursor.execute("SELECT recipe_id FROM Recipe WHERE product_id = %s AND is_active = 1 LIMIT 1", (product_id,))
-        recipe_result = cursor.fetchone()
-        if not recipe_result:
-            print(f"Error: No active recipe found for Product ID {product_id}.")
-            return
-        
-        recipe_id_used = recipe_result['recipe_id']
-        
-        cursor.execute("SELECT ingredient_id, quantity FROM RecipeIngredient WHERE recipe_id = %s", (recipe_id_used,))
-        recipe_ingredients = cursor.fetchall()
+        # The connection is only held while planning and while posting,
+        # not while the operator is looking at the confirmation prompt.
+        with borrow_connection() as (db, cursor):
+            # --- Step 2 & 3: Product + Active Recipe (one query, then the reference-data cache) ---
+            product = refcache.product_context(cursor, product_id)
+            if not product or product['manufacturer_id'] != user_session['id']:
+                print(f"Error: You do not own Product ID {product_id}.")
+                return
 
-        # --- Step 4 & 5: Calculate Totals & Run FEFO Logic ---
-        print("Calculating inventory requirements...")
-        consumption_plan = []
-        
-        for ingredient in recipe_ingredients:
-            ing_id = ingredient['ingredient_id']
-            qty_per_unit = ingredient['quantity']
-            
-            total_needed = qty_per_unit * produced_quantity
-            print(f"Need {total_needed} oz of ingredient {ing_id}...")
-            
-            fefo_query = """
-                SELECT lot_number, quantity_on_hand 
-                FROM IngredientBatch 
-                WHERE ingredient_id = %s 
-                  AND quantity_on_hand > 0 
-                  AND expiration_date > CURDATE()
-                ORDER BY expiration_date ASC
-            """
-            cursor.execute(fefo_query, (ing_id,))
-            available_lots = cursor.fetchall()
-            
-            if not available_lots:
-                print(f"*** CRITICAL ERROR: No available stock for ingredient {ing_id}! ***")
-                print("Batch creation cancelled.")
+            sbs = product['standard_batch_size']
+            if produced_quantity % sbs != 0:
+                print(f"Error: Quantity ({produced_quantity}) must be a multiple of the standard batch size ({sbs}).")
                 return
 
-            # FEFO allocation loop
-            for lot in available_lots:
-                lot_number = lot['lot_number']
-                lot_qty = lot['quantity_on_hand']
-
-                if total_needed <= 0:
-                    break
-                
-                consume_qty = min(lot_qty, total_needed)
-                consumption_plan.append({"lot": lot_number, "qty": float(consume_qty)})
-                total_needed -= consume_qty
-            
-            if total_needed > 0:
-                print(f"*** CRITICAL ERROR: Not enough stock for ingredient {ing_id}! ***")
-                print(f"Only found {qty_per_unit * produced_quantity - total_needed} oz, but still need {total_needed} oz.")
-                print("Batch creation cancelled.")
+            recipe_id_used = product['recipe_id']
+            if recipe_id_used is None:
+                print(f"Error: No active recipe found for Product ID {product_id}.")
                 return
 
+            # --- Step 4 & 5: Calculate Totals & Run FEFO Logic (one query for all ingredients) ---
+            print("Calculating inventory requirements...")
+            consumption_plan, requirements = allocate_fefo(cursor, recipe_id_used, produced_quantity)
+
+        for req in requirements:
+            print(f"Need {req['total_needed']} oz of ingredient {req['ingredient_id']}...")
+
+        for req in shortages(requirements):
+            ing_id = req['ingredient_id']
+            if req['found'] == 0:
+                print(f"*** CRITICAL ERROR: No available stock for ingredient {ing_id}! ***")
+            else:
+                print(f"*** CRITICAL ERROR: Not enough stock for ingredient {ing_id}! ***")
+                print(f"Only found {req['found']} oz, but still need {req['total_needed'] - req['found']} oz.")
+            print("Batch creation cancelled.")
+            return
+
         # --- Step 6: Build the JSON ---
         json_string = json.dumps(consumption_plan)
         print("\nConsumption Plan (JSON):")
@@ -236,295 +198,67 @@ def create_product_batch(cursor, db, user_session):
             json_string
         )
         
-        # Call the production batch procedure
-        cursor.callproc('Record_Production_Batch', args)
-        db.commit()
+        # Call the production batch procedure (rolled back by borrow_connection on error)
+        with borrow_connection() as (db, cursor):
+            cursor.callproc('Record_Production_Batch', args)
+            db.commit()
         print("\n*** SUCCESS: Product batch created! ***")
 
     except mysql.connector.Error as err:
-        db.rollback() # Rollback any changes
         print("\n*** ERROR: Batch creation failed! ***")
         print(f"Database error: {err.msg}")
     except Exception as e:
-        db.rollback()
         print(f"An unexpected error occurred: {e}")
 
-def run_manufacturer_reports(cursor, db, user_session):
-    """(REPORTING FUNCTION) - Runs the 5 required queries."""
+def run_manufacturer_reports(user_session):
+    """(REPORTING FUNCTION) - Runs the required queries (see reports.REPORTS)."""
     print("\n--- (5) Run Reports ---")
     
     print("\n--- Required Queries ---")
-    print("1. Ingredients of last 'Steak Dinner' batch (MFG001)")
-    print("2. Suppliers and spending (MFG002)")
-    print("3. Unit cost for lot '100-MFG001-B0901'")
-    print("4. Conflicting ingredients for lot '100-MFG001-B0901'")
-    print("5. Manufacturers not supplied by 'James Miller' (21)")
-    print("\n--- Other Health Reports (NEWLY ADDED) ---")
-    print("6. Nearly-Out-of-Stock Items (by Product)")
-    print("7. Almost-Expired Ingredient Lots (Next 10 Days)")
+    for report_id, title in REPORTS.items():
+        if report_id == '6':
+            print("\n--- Other Health Reports (NEWLY ADDED) ---")
+        print(f"{report_id}. {title}")
     
     choice = input("Select a report (1-7): ")
-    
-    try:
-        if choice == '1':
-            print("Report 1: Last batch of Steak Dinner (100) by MFG001")
-            query1 = """
-                SELECT
-                    bc.ingredient_lot_number AS 'Ingredient Lot',
-                    i.name AS 'Ingredient Name',
-                    pb.production_date AS 'Produced On'
-                FROM BatchConsumption bc
-                JOIN ProductBatch pb ON bc.product_lot_number = pb.lot_number
-                JOIN IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
-                JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
-                WHERE
-                    pb.production_date = (
-                        SELECT MAX(pb2.production_date)
-                        FROM ProductBatch pb2
-                        WHERE pb2.product_id = '100'
-                        AND pb2.manufacturer_id = 'MFG001'
-                    )
-                AND pb.product_id = '100'
-                AND pb.manufacturer_id = 'MFG001';
-            """
-            cursor.execute(query1)
-            pretty_print_results(cursor)
-
-        elif choice == '2':
-            print("Report 2: Total spending by MFG002, by supplier")
-            query2 = """
-                SELECT
-                    s.name AS 'Supplier Name',
-                    SUM(bc.quantity_consumed * ib.per_unit_cost) AS 'Total Spent ($)'
-                FROM
-                    BatchConsumption bc
-                JOIN
-                    ProductBatch pb ON bc.product_lot_number = pb.lot_number
-                JOIN
-                    IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
-                JOIN
-                    Supplier s ON ib.supplier_id = s.supplier_id
-                WHERE
-                    pb.manufacturer_id = 'MFG002'
-                GROUP BY
-                    s.supplier_id, s.name;
-            """
-            cursor.execute(query2)
-            pretty_print_results(cursor)
-
-        elif choice == '3':
-            print("Report 3: Unit cost for lot '100-MFG001-B0901'")
-            query3 = """
-                SELECT
-                    (total_batch_cost / produced_quantity) AS 'Unit Cost ($)'
-                FROM
-                    ProductBatch
-                WHERE
-                    lot_number = '100-MFG001-B0901';
-            """
-            cursor.execute(query3)
-            pretty_print_results(cursor)
-
-        elif choice == '4':
-            print("Report 4: Conflicting ingredients for lot '100-MFG001-B0901'")
-            
-            cursor.execute("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Atoms_In_Batch (
-                    ingredient_id VARCHAR(20) PRIMARY KEY
-                );
-            """)
-            cursor.execute("TRUNCATE TABLE Temp_Atoms_In_Batch;")
-            
-            cursor.execute("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Atoms_In_Batch_2 (
-                    ingredient_id VARCHAR(20) PRIMARY KEY
-                );
-            """)
-            cursor.execute("TRUNCATE TABLE Temp_Atoms_In_Batch_2;")
-            
-            cursor.execute("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Atoms_In_Batch_3 (
-                    ingredient_id VARCHAR(20) PRIMARY KEY
-                );
-            """)
-            cursor.execute("TRUNCATE TABLE Temp_Atoms_In_Batch_3;")
-            
-            cursor.execute("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Atoms_In_Batch_4 (
-                    ingredient_id VARCHAR(20) PRIMARY KEY
-                );
-            """)
-            cursor.execute("TRUNCATE TABLE Temp_Atoms_In_Batch_4;")
-            
-            cursor.execute("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Atoms_In_Batch_5 (
-                    ingredient_id VARCHAR(20) PRIMARY KEY
-                );
-            """)
-            cursor.execute("TRUNCATE TABLE Temp_Atoms_In_Batch_5;")
-            
-            cursor.execute("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Conflict_List (
-                    ingredient_id VARCHAR(20) PRIMARY KEY,
-                    name VARCHAR(255)
-                );
-            """)
-            cursor.execute("TRUNCATE TABLE Temp_Conflict_List;")
-
-            # Get all ATOMIC ingredients from the lot
-            cursor.execute("""
-                INSERT IGNORE INTO Temp_Atoms_In_Batch (ingredient_id)
-                SELECT ib.ingredient_id
-                FROM BatchConsumption bc
-                JOIN IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
-                JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
-                WHERE bc.product_lot_number = '100-MFG001-B0901'
-                  AND i.ingredient_type = 'ATOMIC';
-            """)
-            
-            # Get all FLATTENED atomic ingredients from COMPOUND lots
-            cursor.execute("""
-                INSERT IGNORE INTO Temp_Atoms_In_Batch (ingredient_id)
-                SELECT fm.material_ingredient_id
-                FROM BatchConsumption bc
-                JOIN IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
-                JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
-                JOIN Formulation f ON f.ingredient_id = ib.ingredient_id 
-                                   AND f.supplier_id = ib.supplier_id
-                                   AND ib.intake_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
-                JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
-                WHERE bc.product_lot_number = '100-MFG001-B0901'
-                  AND i.ingredient_type = 'COMPOUND';
-            """)
-            
-            # Replicate data across temporary tables
-            cursor.execute("INSERT INTO Temp_Atoms_In_Batch_2 (ingredient_id) SELECT ingredient_id FROM Temp_Atoms_In_Batch;")
-            cursor.execute("INSERT INTO Temp_Atoms_In_Batch_3 (ingredient_id) SELECT ingredient_id FROM Temp_Atoms_In_Batch;")
-            cursor.execute("INSERT INTO Temp_Atoms_In_Batch_4 (ingredient_id) SELECT ingredient_id FROM Temp_Atoms_In_Batch;")
-            cursor.execute("INSERT INTO Temp_Atoms_In_Batch_5 (ingredient_id) SELECT ingredient_id FROM Temp_Atoms_In_Batch;")
-            db.commit()
-
-            # Find conflicting ingredients using DoNotCombine rules
-            query4_part1 = """
-                INSERT IGNORE INTO Temp_Conflict_List (ingredient_id, name)
-                SELECT
-                    i.ingredient_id,
-                    i.name
-                FROM
-                    Ingredient i
-                JOIN
-                    DoNotCombine dnc ON i.ingredient_id = dnc.ingredient_a_id
-                JOIN
-                    Temp_Atoms_In_Batch_2 AS t1 ON dnc.ingredient_b_id = t1.ingredient_id
-                WHERE
-                    i.ingredient_id NOT IN (SELECT ingredient_id FROM Temp_Atoms_In_Batch_3);
-            """
-            cursor.execute(query4_part1)
-            
-            # Second part: Find conflicts where ingredient is dnc.ingredient_b_id
-            query4_part2 = """
-                INSERT IGNORE INTO Temp_Conflict_List (ingredient_id, name)
-                SELECT
-                    i.ingredient_id,
-                    i.name
-                FROM
-                    Ingredient i
-                JOIN
-                    DoNotCombine dnc ON i.ingredient_id = dnc.ingredient_b_id
-                JOIN
-                    Temp_Atoms_In_Batch_4 AS t_other ON dnc.ingredient_a_id = t_other.ingredient_id
-                WHERE
-                    i.ingredient_id NOT IN (SELECT ingredient_id FROM Temp_Atoms_In_Batch_5);
-            """
-            cursor.execute(query4_part2)
-            db.commit()
+    if choice not in REPORTS:
+        print("Invalid choice.")
+        return
 
-            cursor.execute("SELECT ingredient_id AS 'Conflicting ID', name AS 'Conflicting Ingredient Name' FROM Temp_Conflict_List;")
-            pretty_print_results(cursor)
+    product_lots = product_id = supplier_id = None
+    as_of, horizon_days = None, NEAR_EXPIRY_DAYS
+    include_archive = False
+    if choice == '1':
+        product_id = input(f"Product ID [{DEFAULT_PRODUCT_ID}]: ").strip() or None
+    elif choice in ('3', '4'):
+        lots = input(f"Product lot(s), comma-separated [{DEFAULT_PRODUCT_LOT}]: ")
+        product_lots = [lot.strip() for lot in lots.split(',') if lot.strip()] or [DEFAULT_PRODUCT_LOT]
+        if choice == '4':
+            include_archive = input("Include archived batches? (y/N): ").strip().lower() == 'y'
+    elif choice == '5':
+        supplier_id = input(f"Supplier ID [{DEFAULT_SUPPLIER_ID}]: ").strip() or None
+    elif choice == '7':
+        as_of = input(f"As of date (YYYY-MM-DD) [{DEFAULT_AS_OF}]: ").strip() or None
+        horizon_days = input(f"Days ahead [{NEAR_EXPIRY_DAYS}]: ").strip() or NEAR_EXPIRY_DAYS
+    output = input("Output file (.csv, .jsonl, or a directory/ for columnar CSV; blank = screen): ")
 
-        elif choice == '5':
-            print("Report 5: Manufacturers not supplied by 'James Miller' (21)")
-            query5 = """
-                SELECT 
-                    m.manufacturer_id AS 'Manufacturer ID', 
-                    m.name AS 'Manufacturer Name'
-                FROM Manufacturer m
-                WHERE m.manufacturer_id NOT IN (
-                    SELECT DISTINCT
-                        pb.manufacturer_id
-                    FROM
-                        BatchConsumption bc
-                    JOIN
-                        IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
-                    JOIN
-                        ProductBatch pb ON bc.product_lot_number = pb.lot_number
-                    WHERE
-                        ib.supplier_id = '21'
-                );
-            """
-            cursor.execute(query5)
-            pretty_print_results(cursor)
-        
-        # =================================================================
-        # NEWLY ADDED REPORTS
-        # =================================================================
-        elif choice == '6':
-            print("Report 6: Nearly-Out-of-Stock Items (by Product)")
-            # Find ingredients with stock below standard batch size
-            query6 = """
-                SELECT 
-                    i.name AS 'Ingredient Name',
-                    p.name AS 'Product Name',
-                    p.standard_batch_size AS 'Product SBS',
-                    COALESCE(SUM(ib.quantity_on_hand), 0) AS 'Total Stock On-Hand'
-                FROM 
-                    Ingredient i
-                JOIN 
-                    RecipeIngredient ri ON i.ingredient_id = ri.ingredient_id
-                JOIN 
-                    Recipe r ON ri.recipe_id = r.recipe_id
-                JOIN 
-                    Product p ON r.product_id = p.product_id
-                LEFT JOIN 
-                    IngredientBatch ib ON i.ingredient_id = ib.ingredient_id
-                WHERE 
-                    p.manufacturer_id = %s -- Only show for products *this* mfg owns
-                GROUP BY 
-                    i.ingredient_id, i.name, p.product_id, p.name, p.standard_batch_size
-                HAVING 
-                    `Total Stock On-Hand` < p.standard_batch_size;
-            """
-            cursor.execute(query6, (user_session['id'],))
-            pretty_print_results(cursor)
-
-        elif choice == '7':
-            print("Report 7: Almost-Expired Ingredient Lots (Next 10 Days)")
-            # Assumes today is 2025-11-15
-            query7 = """
-                SELECT 
-                    lot_number AS 'Lot Number', 
-                    ingredient_id AS 'Ingredient ID',
-                    quantity_on_hand AS 'Qty',
-                    expiration_date AS 'Expires On'
-                FROM 
-                    IngredientBatch
-                WHERE 
-                    expiration_date BETWEEN '2025-11-15' AND ('2025-11-15' + INTERVAL 10 DAY);
-            """
-            cursor.execute(query7)
-            pretty_print_results(cursor)
-            
-        else:
-            print("Invalid choice.")
+    try:
+        sink = sink_for_path(output)
+        print(f"Report {choice}: {REPORTS[choice]}")
+        with borrow_connection() as (db, cursor):
+            result = execute_report(cursor, choice, manufacturer_id=user_session['id'], product_lots=product_lots,
+                                    as_of=as_of, horizon_days=horizon_days, include_archive=include_archive,
+                                    product_id=product_id, supplier_id=supplier_id)
+            pretty_print_results(result, sink)
     
+    except OutputPathError as err:
+        print(f"Error: {err}")
     except mysql.connector.Error as err:
-        db.rollback() # Rollback in case of error
         print(f"Report Error: {err.msg}")
     except Exception as e:
-        db.rollback() # Rollback in case of error
         print(f"An unexpected error occurred: {e}")
 
-def manufacturer_menu(cursor, db, user_session):
+def manufacturer_menu(user_session):
     """Main menu loop for the Manufacturer role."""
     while True:
         print("\n--- Manufacturer Menu ---")
@@ -536,13 +270,13 @@ def manufacturer_menu(cursor, db, user_session):
         choice = input("Enter choice: ")
 
         if choice == '1':
-            create_product_type(cursor, db, user_session)
+            create_product_type(user_session)
         elif choice == '2':
-            create_recipe_plan(cursor, db, user_session)
+            create_recipe_plan(user_session)
         elif choice == '3':
-            create_product_batch(cursor, db, user_session)
+            create_product_batch(user_session)
         elif choice == '4':
-            run_manufacturer_reports(cursor, db, user_session)
+            run_manufacturer_reports(user_session)
         elif choice == '5':
             break
         else:
@@ -552,7 +286,7 @@ def manufacturer_menu(cursor, db, user_session):
 # --- SUPPLIER MENU ---
 # =====================================================================
 
-def manage_formulations(cursor, db, user_session):
+def manage_formulations(user_session):
     """(SIMPLE FUNCTION) - Creates a new formulation (supplier 'offer')."""
     print("\n--- (1) Manage Ingredients Supplied (Formulations) ---")
     try:
@@ -570,76 +304,68 @@ def manage_formulations(cursor, db, user_session):
               (ingredient_id, supplier_id, pack_size, unit_price, valid_from_date, valid_to_date)
             VALUES (%s, %s, %s, %s, %s, %s)
         """
-        cursor.execute(query, (ingredient_id, user_session['id'], pack_size, 
-                               unit_price, valid_from_date, valid_to_date))
-        
-        db.commit()
+        with borrow_connection() as (db, cursor):
+            cursor.execute(query, (ingredient_id, user_session['id'], pack_size,
+                                   unit_price, valid_from_date, valid_to_date))
+            db.commit()
+        refcache.invalidate_formulations()
         print("\n*** SUCCESS: New formulation created! ***")
         print("If this is a compound ingredient, you may define its materials next.")
 
     except mysql.connector.Error as err:
-        db.rollback()
         print(f"Error: {err.msg}")
     except ValueError:
-        db.rollback()
         print("Error: Invalid input. Price must be a number.")
 
-def define_formulation_materials(cursor, db, user_session):
+def define_formulation_materials(user_session):
     """(SIMPLE FUNCTION) - Defines the 'nested BOM' for a compound formulation."""
     print("\n--- (2) Define Ingredient Materials (For Compound) ---")
     try:
         formulation_id = int(input("Enter Formulation ID to define materials for: "))
-        
-        # Security check: Does this supplier *own* this formulation?
-        cursor.execute("SELECT 1 FROM Formulation WHERE formulation_id = %s AND supplier_id = %s",
-                       (formulation_id, user_session['id']))
-        if not cursor.fetchone():
-            print(f"Error: You do not own Formulation ID {formulation_id}.")
-            return
-            
+
+        # Security check: Does this supplier *own* this formulation? (repeated when saving)
+        with borrow_connection() as (db, cursor):
+            cursor.execute(FORMULATION_OWNER_QUERY, (formulation_id, user_session['id']))
+            if not cursor.fetchone():
+                print(f"Error: You do not own Formulation ID {formulation_id}.")
+                return
+
         print(f"Defining materials for Formulation ID {formulation_id}...")
-        
-        # Loop and add materials
+
+        # Collect the materials, then save them with one multi-row INSERT
+        materials = []
         while True:
             print("\nAdd a material to the formulation (or type 'done' to finish):")
             ing_id = input("  Material Ingredient ID (must be ATOMIC, e.g., 101): ")
             if ing_id.lower() == 'done':
                 break
-            
-            qty = float(input("  Quantity (oz) (e.g., 0.5): "))
 
-            query_ing = """
-                INSERT INTO FormulationMaterials (formulation_id, material_ingredient_id, quantity)
-                VALUES (%s, %s, %s)
-            """
-            cursor.execute(query_ing, (formulation_id, ing_id, qty))
+            qty = float(input("  Quantity (oz) (e.g., 0.5): "))
+            materials.append({'ingredient_id': ing_id, 'quantity': qty})
             print(f"Added material {ing_id}.")
-        
-        db.commit()
+
+        operations.define_formulation_materials(user_session['id'], formulation_id, materials)
         print(f"\nSuccess! Materials for Formulation ID {formulation_id} saved.")
-        
+
+    except OperationError as err:
+        print(f"Error: {err}")
     except mysql.connector.Error as err:
-        db.rollback()
         print(f"Error: {err.msg}")
     except ValueError:
-        db.rollback()
         print("Error: Quantity must be a number.")
 
-def create_supplier_batch(cursor, db, user_session):
+def create_supplier_batch(user_session):
     """(SIMPLE FUNCTION) - Creates a new ingredient batch."""
     print("\n--- (3) Create Ingredient Batch (Lot Intake) ---")
     try:
         ingredient_id = input("Enter Ingredient ID: ")
         
         # Check if supplier has an active formulation for this ingredient
-        cursor.execute("""
-            SELECT 1 FROM Formulation 
-            WHERE supplier_id = %s 
-              AND ingredient_id = %s
-              AND CURDATE() BETWEEN valid_from_date AND COALESCE(valid_to_date, '9999-12-31')
-        """, (user_session['id'], ingredient_id))
-        
-        if not cursor.fetchone():
+        with borrow_connection() as (db, cursor):
+            cursor.execute(AUTHORIZATION_QUERY, (user_session['id'], ingredient_id))
+            authorized = cursor.fetchone()
+
+        if not authorized:
             print(f"Error: You are not authorized to supply ingredient {ingredient_id} (or no active formulation exists).")
             return
             
@@ -649,48 +375,65 @@ def create_supplier_batch(cursor, db, user_session):
         exp_date_str = input("Enter Expiration Date (YYYY-MM-DD): ")
         
         # Enforce 90-day minimum shelf life
-        intake_date = date(2025, 11, 15)
+        intake_date = INTAKE_DATE
         expiration_date = date.fromisoformat(exp_date_str)
-        if (expiration_date - intake_date).days < 90:
-            print(f"Error: Expiration date ({exp_date_str}) must be at least 90 days from today ({intake_date}).")
+        if (expiration_date - intake_date).days < MIN_SHELF_LIFE_DAYS:
+            print(f"Error: Expiration date ({exp_date_str}) must be at least {MIN_SHELF_LIFE_DAYS} days from today ({intake_date}).")
             return
            
-        query = """
-            INSERT INTO IngredientBatch 
-              (ingredient_id, supplier_id, supplier_batch_id, 
-               quantity_on_hand, per_unit_cost, expiration_date, intake_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        cursor.execute(query, (ingredient_id, user_session['id'], supplier_batch_id, 
-                               quantity, cost, exp_date_str, intake_date))
-        
-        db.commit()
+        with borrow_connection() as (db, cursor):
+            cursor.execute(INSERT_LOT_QUERY, (ingredient_id, user_session['id'], supplier_batch_id,
+                                              quantity, cost, exp_date_str, intake_date))
+            db.commit()
         print("\n*** SUCCESS: Ingredient batch created! ***")
 
     except mysql.connector.Error as err:
-        db.rollback()
         print(f"Error: {err.msg}")
     except ValueError:
-        db.rollback()
         print("Error: Invalid input. Quantity/Cost must be numbers. Date must be YYYY-MM-DD.")
 
-def supplier_menu(cursor, db, user_session):
+def print_intake_report(rejections, summary):
+    """Print the per-row rejection report and throughput of a bulk intake."""
+    for rejection in rejections:
+        print(f"  row {rejection['row']}: REJECTED {rejection['ingredient_id']}/"
+              f"{rejection['supplier_batch_id']} - {rejection['reason']}")
+    print(f"\nAccepted {summary['accepted']}, rejected {summary['rejected']} "
+          f"in {summary['elapsed']:.2f}s ({summary['lots_per_sec']:.0f} lots/sec)")
+
+def bulk_intake_manifest(user_session):
+    """Load a whole delivery manifest (CSV/JSONL) of ingredient lots."""
+    print("\n--- (4) Bulk Lot Intake (Delivery Manifest) ---")
+    try:
+        path = input("Manifest file (.csv with header, or .jsonl): ")
+        rows = read_records(path)
+        print(f"Loading {len(rows)} lot(s)...")
+        rejections, summary = bulk_intake_lots(user_session['id'], rows)
+        print_intake_report(rejections, summary)
+    except (OSError, RecordError) as err:
+        print(f"Error: {err}")
+    except mysql.connector.Error as err:
+        print(f"Error: {err.msg}")
+
+def supplier_menu(user_session):
     """(SIMPLE FUNCTIONS) - Menu for Supplier role."""
     while True:
         print("\n--- Supplier Menu ---")
         print("1. Manage Ingredients Supplied (Formulations)")
         print("2. Define Ingredient Materials (For Compound)")
         print("3. Create Ingredient Batch (Lot Intake)")
-        print("4. Exit")
+        print("4. Bulk Lot Intake (Delivery Manifest)")
+        print("5. Exit")
         choice = input("Enter choice: ")
 
         if choice == '1':
-            manage_formulations(cursor, db, user_session)
+            manage_formulations(user_session)
         elif choice == '2':
-            define_formulation_materials(cursor, db, user_session)
+            define_formulation_materials(user_session)
         elif choice == '3':
-            create_supplier_batch(cursor, db, user_session)
+            create_supplier_batch(user_session)
         elif choice == '4':
+            bulk_intake_manifest(user_session)
+        elif choice == '5':
             break
         else:
             print("Invalid choice.")
@@ -699,87 +442,35 @@ def supplier_menu(cursor, db, user_session):
 # --- VIEWER MENU ---
 # =====================================================================
 
-def generate_ingredient_list(cursor, db, user_session):
+def generate_ingredient_list(user_session):
     """(SIMPLE FUNCTION) - Complex SELECT query."""
     print("\n--- (2) Generate Ingredient List (Flattened) ---")
     
     try:
         product_id = input("Enter Product ID (e.g., 100): ")
         
-        # Query the active recipe and flatten ingredients
-        
-        # Get active recipe
-        cursor.execute("SELECT recipe_id FROM Recipe WHERE product_id = %s AND is_active = 1 LIMIT 1", (product_id,))
-        recipe_result = cursor.fetchone()
-        if not recipe_result:
-            print(f"Error: No active recipe found for Product ID {product_id}.")
-            return
-        
-        recipe_id = recipe_result['recipe_id']
-
-        # Get all ATOMIC ingredients from the recipe
-        query_atomic = """
-            SELECT i.name AS name, ri.quantity AS quantity
-            FROM RecipeIngredient ri
-            JOIN Ingredient i ON ri.ingredient_id = i.ingredient_id
-            WHERE ri.recipe_id = %s AND i.ingredient_type = 'ATOMIC'
-        """
-        
-        # Get all FLATTENED materials from COMPOUND ingredients
-        query_compound = """
-            SELECT 
-                i_mat.name AS name, 
-                (ri.quantity * fm.quantity) AS total_quantity
-            FROM 
-                RecipeIngredient ri
-            JOIN 
-                Ingredient i_comp ON ri.ingredient_id = i_comp.ingredient_id
-            JOIN 
-                Formulation f ON f.ingredient_id = i_comp.ingredient_id
-            JOIN 
-                FormulationMaterials fm ON fm.formulation_id = f.formulation_id
-            JOIN 
-                Ingredient i_mat ON fm.material_ingredient_id = i_mat.ingredient_id
-            WHERE 
-                ri.recipe_id = %s 
-                AND i_comp.ingredient_type = 'COMPOUND'
-                AND f.valid_from_date <= CURDATE() 
-                AND COALESCE(f.valid_to_date, '9999-12-31') >= CURDATE()
-        """
-        
-        cursor.execute(query_atomic, (recipe_id,))
-        ingredients = cursor.fetchall()
-        
-        cursor.execute(query_compound, (recipe_id,))
-        ingredients_compound = cursor.fetchall()
-        
-        # Manually create a new list of dicts to extend
-        for item in ingredients_compound:
-            ingredients.append({'name': item['name'], 'quantity': item['total_quantity']})
+        with borrow_connection() as (db, cursor):
+            # Get active recipe (reference-data cache)
+            recipe_id = refcache.active_recipe_id(cursor, product_id)
+            if recipe_id is None:
+                print(f"Error: No active recipe found for Product ID {product_id}.")
+                return
+
+            # Flattened (atomic) ingredients, at any nesting depth, from the FlattenedRecipe cache
+            flattened = refcache.flattened_recipe(cursor, recipe_id)
+            db.commit()  # keep the cache entry if this call just computed it
+
+        rows = [(item['name'], item['quantity']) for item in flattened]
 
-        
-        # Sum duplicate ingredients
-        final_list = {}
-        for item in ingredients:
-            name = item['name']
-            qty = item.get('quantity') or item.get('total_quantity', 0)
-            if name in final_list:
-                final_list[name] += qty
-            else:
-                final_list[name] = qty
-        
-        # Sort by quantity descending
-        sorted_list = sorted(final_list.items(), key=lambda x: x[1], reverse=True)
-        
         print(f"\n--- Flattened Ingredient List for Product {product_id} ---")
-        print(tabulate(sorted_list, headers=["Ingredient", "Quantity (oz)"], tablefmt="grid"))
+        print(tabulate(rows, headers=["Ingredient", "Quantity (oz)"], tablefmt="grid"))
 
     except mysql.connector.Error as err:
         print(f"Error: {err.msg}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
-def viewer_menu(cursor, db, user_session):
+def viewer_menu(user_session):
     """(SIMPLE FUNCTIONS) - Menu for Viewer role."""
     while True:
         print("\n--- Viewer Menu ---")
@@ -802,54 +493,361 @@ def viewer_menu(cursor, db, user_session):
                     JOIN Manufacturer m ON p.manufacturer_id = m.manufacturer_id
                     ORDER BY m.name, c.name, p.name
                 """
-                cursor.execute(query)
-                pretty_print_results(cursor)
+                with borrow_connection() as (db, cursor):
+                    cursor.execute(query)
+                    pretty_print_results(cursor)
             except mysql.connector.Error as err:
                 print(f"Error: {err.msg}")
         elif choice == '2':
-            generate_ingredient_list(cursor, db, user_session)
+            generate_ingredient_list(user_session)
         elif choice == '3':
             break
         else:
             print("Invalid choice.")
 
+# =====================================================================
+# --- NON-INTERACTIVE COMMANDS ---
+# =====================================================================
+
+def post_batches_command(args):
+    """CLI: post every batch request in a CSV/JSONL file without prompts."""
+    requests = read_records(args.file)
+    print(f"Posting {len(requests)} batch request(s) for {args.manufacturer} "
+          f"(commit group size {args.group_size}{', reserving lots' if args.reserve else ''})...")
+
+    results, summary = post_production_batches(requests, args.manufacturer, args.group_size,
+                                               reserve=args.reserve, staged=not args.json_plan)
+
+    for result in results:
+        if result['ok']:
+            print(f"  row {result['row']}: OK     {result['lot_number']}")
+        else:
+            print(f"  row {result['row']}: FAILED {result['manufacturer_batch_id']} - {result['error']}")
+
+    print(f"\nPosted {summary['posted']}, failed {summary['failed']} "
+          f"in {summary['elapsed']:.2f}s ({summary['batches_per_sec']:.1f} batches/sec)")
+    cache = refcache.stats()
+    print(f"Reference-data cache: {cache['hits']} hits, {cache['misses']} misses")
+    return 1 if summary['failed'] else 0
+
+def intake_lots_command(args):
+    """CLI: load a supplier delivery manifest (CSV/JSONL) in bulk."""
+    rows = read_records(args.file)
+    print(f"Loading {len(rows)} lot(s) for supplier {args.supplier} (chunk size {args.chunk_size})...")
+    rejections, summary = bulk_intake_lots(args.supplier, rows, chunk_size=args.chunk_size)
+    print_intake_report(rejections, summary)
+    return 1 if rejections else 0
+
+def serve_command(args):
+    """CLI: run the HTTP/JSON service (see service.py)."""
+    serve(args.host, args.port, args.max_pending)
+    return 0
+
+def trace_command(args):
+    """CLI: forward / backward / recall trace, to the screen or an export file."""
+    keys = list(args.keys)
+    if args.from_file:
+        with open(args.from_file, encoding='utf-8') as handle:
+            keys.extend(line.strip() for line in handle if line.strip())
+    if not keys:
+        print("Error: give at least one lot / ingredient ID (or --from-file).")
+        return 1
+
+    sink = sink_for_path(args.output)
+    with borrow_connection() as (db, cursor):
+        archived = args.include_archive
+        graph = None
+        if args.direction == 'forward' and args.graph:
+            graph = genealogy.ConsumptionGraph.load(cursor, keys, include_archive=archived)
+        if args.direction == 'forward':
+            batches = genealogy.iter_forward(cursor, keys, graph, include_archive=archived)
+            columns = genealogy.FORWARD_COLUMNS
+        elif args.direction == 'backward' and args.materials:
+            consumed = [row['ingredient_lot'] for row in genealogy.trace_backward(cursor, keys,
+                                                                                 include_archive=archived)]
+            batches = genealogy.iter_materials(cursor, consumed, include_archive=archived)
+            columns = genealogy.MATERIAL_COLUMNS
+        elif args.direction == 'backward':
+            batches = genealogy.iter_backward(cursor, keys, include_archive=archived)
+            columns = genealogy.BACKWARD_COLUMNS
+        else:
+            lots = genealogy.containing_lots(cursor, keys, include_archive=archived)
+            if args.graph:
+                graph = genealogy.ConsumptionGraph.load(cursor, lots, include_archive=archived)
+            batches = genealogy.iter_recall(cursor, keys, graph, include_archive=archived, lots=lots)
+            columns = genealogy.RECALL_COLUMNS
+        report_export(genealogy.export_trace(batches, sink, columns), sink)
+    return 0
+
+def costing_command(args):
+    """CLI: unit costs of posted batches, or what-if costs of recipes (see costing.py)."""
+    sink = sink_for_path(args.output)
+    with borrow_connection() as (db, cursor):
+        if args.target == 'batches':
+            rows = costing.batch_costs(cursor, args.keys or None, args.manufacturer, args.produced_from,
+                                       args.produced_to)
+            if args.by_product:
+                rows = costing.cost_by_product(rows)
+        else:
+            if not args.keys:
+                print("Error: give at least one recipe ID.")
+                return 1
+            bad = [key for key in args.keys if not key.isdigit()]
+            if bad:
+                print(f"Error: recipe IDs must be whole numbers, not {', '.join(bad)}.")
+                return 1
+            recipe_ids = [int(key) for key in args.keys]
+            quantities = {recipe_id: args.quantity for recipe_id in recipe_ids} if args.quantity else None
+            rows = costing.recipe_costs(cursor, recipe_ids, quantities)
+    report_export(write_rows(rows, sink), sink)
+    unpriced = [str(row['recipe_id']) for row in rows if row.get('unpriced_ingredients')]
+    if unpriced:
+        print(f"Note: recipe(s) {', '.join(unpriced)} use ingredients with no active list price; "
+              f"their list cost is left blank.")
+    return 0
+
+def archive_command(args):
+    """CLI: move cold lots and batches to the archive tables (see archive.py)."""
+    cutoff = date.fromisoformat(args.before) if args.before else archive.default_cutoff(args.retention_days)
+    with borrow_connection() as (db, cursor):
+        if args.dry_run:
+            counts = archive.pending(cursor, cutoff)
+            print(f"Cold as of {cutoff}: {counts['product_batches']} product batch(es), "
+                  f"{counts['ingredient_lots']} ingredient lot(s).")
+            return 0
+        moved = archive.run_archive(db, cursor, cutoff, args.chunk_size, args.pause)
+    print(f"Archived as of {cutoff}: {moved['product_batches']} product batch(es), "
+          f"{moved['consumption_rows']} consumption row(s), {moved['ingredient_lots']} ingredient lot(s).")
+    return 0
+
+def plan_command(args):
+    """CLI: project shortages and waste for a production schedule (see planning.py)."""
+    schedule = read_records(args.file)
+    sink = sink_for_path(args.output)
+    try:
+        with borrow_connection() as (db, cursor):
+            plan = planning.plan_schedule(cursor, schedule, args.start)
+    except (KeyError, ValueError) as err:
+        print(f"Error: bad schedule: {err}")
+        return 1
+    for row in plan['unplanned']:
+        print(f"  skipped: product {row['product_id']} has no active recipe")
+    if args.view == 'daily':
+        rows = planning.daily_rows(plan)
+    elif args.view == 'materials':
+        rows = planning.material_rows(plan)
+    else:
+        rows = planning.ingredient_summary(plan)
+    report_export(write_rows(rows, sink), sink)
+    return 0
+
+def reports_command(args):
+    """CLI: run reports for every manufacturer / supplier in parallel (see report_runner.py)."""
+    with borrow_connection() as (db, cursor):
+        jobs = report_runner.plan_jobs(cursor, args.reports, args.since, args.as_of, args.days, args.include_archive)
+    print(f"Running {len(jobs)} report job(s) with {args.workers} {args.mode} worker(s)...")
+    results, elapsed = report_runner.run_jobs(jobs, DB_CONFIG, args.workers, args.mode)
+    counts = report_runner.write_outputs(results, args.output_dir)
+    print(f"Wrote {sum(counts.values())} row(s) for {len(counts)} tenant(s) to {args.output_dir} "
+          f"in {elapsed:.2f}s")
+    if args.compare_sequential:
+        baseline, sequential = report_runner.run_jobs(jobs, DB_CONFIG, mode='sequential')
+        if sum(len(result['rows']) for result in baseline) != sum(counts.values()):
+            print("Warning: the sequential run returned a different number of rows.")
+        print(f"Sequential baseline: {sequential:.2f}s ({sequential / elapsed:.1f}x speedup)")
+    return 0
+
+def query_stats_command(args):
+    """CLI: print a query-statistics dump (written at exit when MEAL_QUERY_STATS=1)."""
+    try:
+        with open(args.file, encoding='utf-8') as handle:
+            dump = json.load(handle)
+    except (OSError, ValueError) as err:
+        print(f"Error: cannot read {args.file}: {err}")
+        return 1
+    queries = sorted(dump['queries'], key=lambda row: row[args.sort] or 0, reverse=True)
+    print(f"Query statistics from {args.file} ({dump['generated_at']}, slow >= {dump['slow_query_ms']} ms)")
+    print(instrumentation.format_report(queries, args.limit))
+    if args.explain:
+        for row in queries[:args.limit]:
+            if row['explain']:
+                print(f"\nEXPLAIN {row['name']}")
+                print(tabulate(row['explain'], headers="keys", tablefmt="grid"))
+    return 0
+
+def dump_query_stats():
+    """Write the query statistics of this run when instrumentation is on."""
+    if instrumentation.enabled():
+        print(f"Query statistics written to {instrumentation.dump()}")
+
+COMMANDS = {
+    'post-batches': post_batches_command,
+    'intake-lots': intake_lots_command,
+    'serve': serve_command,
+    'trace': trace_command,
+    'costing': costing_command,
+    'archive': archive_command,
+    'reports': reports_command,
+    'plan': plan_command,
+}
+
+def parse_args(argv=None):
+    """Parse the optional non-interactive subcommand (no subcommand = interactive menus)."""
+    parser = argparse.ArgumentParser(description="Meal Manufacturer Inventory System")
+    subparsers = parser.add_subparsers(dest='command')
+
+    post = subparsers.add_parser('post-batches', help="Post production batches from a CSV or JSONL file")
+    post.add_argument('file', help="CSV (with header) or .jsonl file of batch requests")
+    post.add_argument('--manufacturer', required=True, help="Manufacturer ID posting the batches (e.g., MFG001)")
+    post.add_argument('--group-size', type=int, default=DEFAULT_COMMIT_GROUP_SIZE,
+                      help=f"Batches per COMMIT (default {DEFAULT_COMMIT_GROUP_SIZE})")
+    post.add_argument('--reserve', action='store_true',
+                      help="Lock lots while planning (FOR UPDATE SKIP LOCKED) for parallel posters")
+    post.add_argument('--json-plan', action='store_true',
+                      help="Pass each plan as JSON (Post_Production_Batch) instead of staging it")
+
+    intake = subparsers.add_parser('intake-lots', help="Bulk-load ingredient lots from a CSV or JSONL manifest")
+    intake.add_argument('file', help="CSV (with header) or .jsonl manifest of lots")
+    intake.add_argument('--supplier', required=True, help="Supplier ID delivering the lots (e.g., 20)")
+    intake.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per multi-row INSERT/COMMIT (default {DEFAULT_CHUNK_SIZE})")
+
+    server = subparsers.add_parser('serve', help="Run the HTTP/JSON service")
+    server.add_argument('--host', default=DEFAULT_HOST, help=f"Address to bind (default {DEFAULT_HOST})")
+    server.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port (default {DEFAULT_PORT})")
+    server.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help=f"Requests allowed to wait for a connection before 503 (default {DEFAULT_MAX_PENDING})")
+
+    trace = subparsers.add_parser('trace', help="Trace lot genealogy for a recall (see genealogy.py)")
+    trace.add_argument('direction', choices=('forward', 'backward', 'recall'),
+                       help="forward: ingredient lots -> product lots; backward: product lots -> ingredient "
+                            "lots; recall: ingredient IDs -> every exposed product lot")
+    trace.add_argument('keys', nargs='*', help="Lot numbers (forward/backward) or ingredient IDs (recall)")
+    trace.add_argument('--from-file', help="Read more keys from a file, one per line")
+    trace.add_argument('--output', default='', help="Export to .csv / .jsonl / a directory/ (default: screen)")
+    trace.add_argument('--materials', action='store_true',
+                       help="backward: list the atomic materials inside the compound lots consumed instead")
+    trace.add_argument('--graph', action='store_true',
+                       help="forward/recall: load the traced lots' BatchConsumption rows into memory first")
+    trace.add_argument('--include-archive', action='store_true',
+                       help="Also search lots and batches moved to the archive tables (see archive.py)")
+
+    cost = subparsers.add_parser('costing', help="Batch unit costs or what-if recipe costs (see costing.py)")
+    cost.add_argument('target', choices=('batches', 'recipes'))
+    cost.add_argument('keys', nargs='*', help="Product lots (batches; default all) or recipe IDs (recipes)")
+    cost.add_argument('--manufacturer', help="batches: only this manufacturer's batches")
+    cost.add_argument('--from', dest='produced_from', help="batches: produced on/after YYYY-MM-DD")
+    cost.add_argument('--to', dest='produced_to', help="batches: produced on/before YYYY-MM-DD")
+    cost.add_argument('--by-product', action='store_true', help="batches: summarise unit cost per product")
+    cost.add_argument('--quantity', type=int, help="recipes: units to cost (default: standard batch size)")
+    cost.add_argument('--output', default='', help="Export to .csv / .jsonl / a directory/ (default: screen)")
+
+    arch = subparsers.add_parser('archive', help="Move cold lots and batches to the archive tables (see archive.py)")
+    arch.add_argument('--before', help="Cutoff date YYYY-MM-DD (default: --retention-days ago)")
+    arch.add_argument('--retention-days', type=int, default=archive.DEFAULT_RETENTION_DAYS,
+                      help=f"Keep this many days of history hot (default {archive.DEFAULT_RETENTION_DAYS})")
+    arch.add_argument('--chunk-size', type=int, default=archive.CHUNK_SIZE,
+                      help=f"Rows moved per transaction (default {archive.CHUNK_SIZE})")
+    arch.add_argument('--pause', type=float, default=0, help="Seconds to sleep between chunks (default 0)")
+    arch.add_argument('--dry-run', action='store_true', help="Only count the rows that would move")
+
+    rep = subparsers.add_parser('reports', help="Run reports for every tenant in parallel (see report_runner.py)")
+    rep.add_argument('--reports', nargs='*', choices=list(REPORTS), help="Reports to run (default all)")
+    rep.add_argument('--output-dir', default='report_output', help="One JSONL file per tenant (default report_output)")
+    rep.add_argument('--workers', type=int, default=report_runner.DEFAULT_WORKERS,
+                     help=f"Parallel workers, each with its own connection (default {report_runner.DEFAULT_WORKERS})")
+    rep.add_argument('--mode', choices=('thread', 'process'), default='thread', help="Worker pool (default thread)")
+    rep.add_argument('--since', help="Reports 3/4: only lots produced on/after YYYY-MM-DD")
+    rep.add_argument('--include-archive', action='store_true', help="Report 4: also search archived batches")
+    rep.add_argument('--as-of', help=f"Report 7: reference date YYYY-MM-DD (default {DEFAULT_AS_OF})")
+    rep.add_argument('--days', type=int, help=f"Report 7: horizon in days (default {NEAR_EXPIRY_DAYS})")
+    rep.add_argument('--compare-sequential', action='store_true',
+                     help="Afterwards run the same jobs one by one on a single connection and print the speedup")
+
+    plan = subparsers.add_parser('plan', help="Project shortages for a production schedule (see planning.py)")
+    plan.add_argument('file', help="CSV (with header) or .jsonl schedule: product_id, quantity, date")
+    plan.add_argument('--start', help="First planning day YYYY-MM-DD (default today)")
+    plan.add_argument('--view', choices=('summary', 'daily', 'materials'), default='summary',
+                      help="summary: per ingredient; daily: per ingredient and day; materials: atomic "
+                           "materials for compound shortfalls (default summary)")
+    plan.add_argument('--output', default='', help="Export to .csv / .jsonl / a directory/ (default: screen)")
+
+    stats = subparsers.add_parser('query-stats', help="Show a query-statistics dump (see instrumentation.py)")
+    stats.add_argument('file', nargs='?', default=instrumentation.DEFAULT_STATS_FILE,
+                       help=f"Dump written with MEAL_QUERY_STATS=1 (default {instrumentation.DEFAULT_STATS_FILE})")
+    stats.add_argument('--sort', default='total_ms', choices=('total_ms', 'p99_ms', 'mean_ms', 'calls', 'rows'),
+                       help="Column to sort by (default total_ms)")
+    stats.add_argument('--limit', type=int, default=20, help="Queries to show (default 20)")
+    stats.add_argument('--explain', action='store_true', help="Also print the captured EXPLAIN plans")
+
+    return parser.parse_args(argv)
+
+def get_db_password():
+    """Use MEAL_DB_PASSWORD when set (scripts), otherwise prompt (not needed for SQLite)."""
+    if 'MEAL_DB_PASSWORD' in os.environ or backend() == 'sqlite':
+        return os.environ.get('MEAL_DB_PASSWORD', '')
+    return getpass.getpass("Enter database password (leave blank for no password): ")
+
+def run_command(args):
+    """Run a non-interactive subcommand with its own connection pool."""
+    try:
+        DB_CONFIG['password'] = get_db_password()
+        init_pool(DB_CONFIG, DB_POOL_SIZE)
+        return COMMANDS[args.command](args)
+    except mysql.connector.Error as err:
+        print(f"Database Error: {err}")
+        return 1
+    except (RecordError, OutputPathError) as err:
+        print(f"Error: {err}")
+        return 2  # a usage error, as argparse reports them
+    except OSError as err:
+        print(f"Error: {err}")
+        return 1
+    finally:
+        close_pool()
+        dump_query_stats()
+
 # =====================================================================
 # --- MAIN EXECUTION ---
 # =====================================================================
 
-def main():
+def main(argv=None):
     """
     Main function to run the application.
     """
+    args = parse_args(argv)
+    if args.command == 'query-stats':
+        return query_stats_command(args)
+    if args.command:
+        return run_command(args)
+
     print("Welcome to the Meal Manufacturer Inventory System")
-    db = None
+    pool = None
     try:
-        # Prompt for password
-        db_pass = getpass.getpass("Enter database password (leave blank for no password): ")
-        DB_CONFIG['password'] = db_pass
-        
-        db = mysql.connector.connect(**DB_CONFIG)
-        cursor = db.cursor(dictionary=True)
-        print("Database connection successful.")
+        # Prompt for password (or MEAL_DB_PASSWORD)
+        DB_CONFIG['password'] = get_db_password()
+
+        pool = init_pool(DB_CONFIG, DB_POOL_SIZE)
+        print(f"Database connection pool ready ({DB_POOL_SIZE} connections).")
 
-        user_session = login(cursor)
+        user_session = login()
 
         if user_session:
             if user_session['role'] == 'Manufacturer':
-                manufacturer_menu(cursor, db, user_session)
+                manufacturer_menu(user_session)
             elif user_session['role'] == 'Supplier':
-                supplier_menu(cursor, db, user_session)
+                supplier_menu(user_session)
             elif user_session['role'] == 'Viewer':
-                viewer_menu(cursor, db, user_session)
+                viewer_menu(user_session)
 
     except mysql.connector.Error as err:
         print(f"\nDatabase Connection Error: {err}")
         print("Please check your MySQL server is running and config is correct.")
     finally:
-        if db and db.is_connected():
-            cursor.close()
-            db.close()
-            print("\nDatabase connection closed. Goodbye.")
+        if pool:
+            close_pool()
+            dump_query_stats()
+            print("\nDatabase connections closed. Goodbye.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+Non-interactive application operations.
+
+The menu functions in main.py mix input()/print() with database work; the
+functions here do the same work from plain arguments and return plain data
+(lists/dicts), so they can be driven by the async backend and the HTTP
+service. Each call borrows its own pooled connection.
+"""
+from datetime import date
+
+import refcache
+from db_pool import borrow_connection
+from fefo import allocate_fefo, shortages
+from intake import bulk_intake_lots
+from production import PostingError, load_product_context, post_production_batches
+from queries import register
+from reports import NEAR_EXPIRY_DAYS, execute_report
+
+FORMULATION_OWNER_QUERY = "SELECT 1 FROM Formulation WHERE formulation_id = %s AND supplier_id = %s"
+register('formulation_owner', FORMULATION_OWNER_QUERY)
+
+
+class OperationError(Exception):
+    """A request that was rejected (validation, ownership, missing data)."""
+
+
+def authenticate(username, password):
+    """Check AppUser credentials. Returns {'username', 'role', 'id'} or None."""
+    with borrow_connection() as (db, cursor):
+        cursor.execute("""
+            SELECT role, manufacturer_id, supplier_id
+            FROM AppUser
+            WHERE username = %s AND password_hash = %s
+        """, (username, password))
+        result = cursor.fetchone()
+    if not result:
+        return None
+    role = result['role']
+    return {
+        "username": username,
+        "role": role,
+        "id": result['manufacturer_id'] if role == 'Manufacturer' else result['supplier_id'],
+    }
+
+
+# --- Manufacturer ---
+
+def create_product_type(manufacturer_id, product_id, name, category_id, standard_batch_size):
+    """Create a product owned by this manufacturer."""
+    with borrow_connection() as (db, cursor):
+        cursor.execute("""
+            INSERT INTO Product
+              (product_id, name, category_id, manufacturer_id, standard_batch_size)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (product_id, name, category_id, manufacturer_id, int(standard_batch_size)))
+        db.commit()
+    refcache.invalidate_product(product_id)
+
+
+def create_recipe(manufacturer_id, product_id, name, ingredients):
+    """
+    Create an active recipe for a product this manufacturer owns.
+    ingredients: [{'ingredient_id', 'quantity', 'unit_of_measure'}]. Returns the recipe_id.
+    """
+    with borrow_connection() as (db, cursor):
+        product = refcache.product(cursor, product_id)
+        if not product or product['manufacturer_id'] != manufacturer_id:
+            raise OperationError(f"You do not own Product ID {product_id}.")
+        cursor.execute("INSERT INTO Recipe (product_id, name, creation_date, is_active) VALUES (%s, %s, %s, 1)",
+                       (product_id, name, date.today()))
+        recipe_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO RecipeIngredient (recipe_id, ingredient_id, quantity, unit_of_measure)
+            VALUES (%s, %s, %s, %s)
+        """, [(recipe_id, item['ingredient_id'], item['quantity'], item.get('unit_of_measure', 'oz'))
+              for item in ingredients])
+        db.commit()
+    refcache.invalidate_recipes(product_id)
+    return recipe_id
+
+
+def plan_product_batch(manufacturer_id, product_id, produced_quantity):
+    """
+    FEFO plan for a batch without posting it (two queries: product + active
+    recipe, then every ingredient's lots). Returns {'recipe_id',
+    'consumption_plan', 'requirements', 'shortages'}; nothing is reserved.
+    """
+    with borrow_connection() as (db, cursor):
+        try:
+            sbs, recipe_id = load_product_context(cursor, manufacturer_id, product_id)
+        except PostingError as err:
+            raise OperationError(str(err)) from err
+        if produced_quantity <= 0 or produced_quantity % sbs != 0:
+            raise OperationError(f"Quantity ({produced_quantity}) must be a positive multiple "
+                                 f"of the standard batch size ({sbs}).")
+        consumption_plan, requirements = allocate_fefo(cursor, recipe_id, produced_quantity)
+    return {'recipe_id': recipe_id, 'consumption_plan': consumption_plan, 'requirements': requirements,
+            'shortages': shortages(requirements)}
+
+
+def create_product_batch(manufacturer_id, product_id, produced_quantity, manufacturer_batch_id,
+                         expiration_date, reserve=True):
+    """
+    Plan (FEFO) and post one production batch. Returns the new product lot
+    number; raises OperationError when the batch is rejected.
+    """
+    request = {'product_id': product_id, 'produced_quantity': produced_quantity,
+               'manufacturer_batch_id': manufacturer_batch_id, 'expiration_date': expiration_date}
+    results, _ = post_production_batches([request], manufacturer_id, commit_group_size=1, reserve=reserve)
+    if not results[0]['ok']:
+        raise OperationError(results[0]['error'])
+    return results[0]['lot_number']
+
+
+def run_report(report_id, manufacturer_id=None, product_lots=None, max_rows=None, as_of=None,
+               horizon_days=NEAR_EXPIRY_DAYS, include_archive=False, product_id=None, supplier_id=None):
+    """Run report 1-7 and return its rows (at most max_rows when given)."""
+    with borrow_connection() as (db, cursor):
+        result = execute_report(cursor, report_id, manufacturer_id=manufacturer_id, product_lots=product_lots,
+                                as_of=as_of, horizon_days=horizon_days, include_archive=include_archive,
+                                product_id=product_id, supplier_id=supplier_id)
+        return result.fetchall() if max_rows is None else result.fetchmany(max_rows)
+
+
+# --- Supplier ---
+
+def create_formulation(supplier_id, ingredient_id, pack_size, unit_price, valid_from_date, valid_to_date=None):
+    """Create a supplier formulation ('offer'). Returns the formulation_id."""
+    with borrow_connection() as (db, cursor):
+        cursor.execute("""
+            INSERT INTO Formulation
+              (ingredient_id, supplier_id, pack_size, unit_price, valid_from_date, valid_to_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (ingredient_id, supplier_id, pack_size, unit_price, valid_from_date, valid_to_date or None))
+        formulation_id = cursor.lastrowid
+        db.commit()
+    refcache.invalidate_formulations()
+    return formulation_id
+
+
+def define_formulation_materials(supplier_id, formulation_id, materials):
+    """Add materials [{'ingredient_id', 'quantity'}] to a compound formulation the supplier owns."""
+    with borrow_connection() as (db, cursor):
+        cursor.execute(FORMULATION_OWNER_QUERY, (formulation_id, supplier_id))
+        if not cursor.fetchone():
+            raise OperationError(f"You do not own Formulation ID {formulation_id}.")
+        cursor.executemany("""
+            INSERT INTO FormulationMaterials (formulation_id, material_ingredient_id, quantity)
+            VALUES (%s, %s, %s)
+        """, [(formulation_id, item['ingredient_id'], item['quantity']) for item in materials])
+        db.commit()
+    refcache.invalidate_formulations()
+
+
+def intake_lots(supplier_id, lots):
+    """Bulk intake (see intake.bulk_intake_lots). Returns (rejections, summary)."""
+    return bulk_intake_lots(supplier_id, lots)
+
+
+def intake_lot(supplier_id, lot):
+    """
+    Receive one ingredient lot (same fields as a bulk-intake manifest row).
+    Returns the new lot number.
+    """
+    rejections, _ = bulk_intake_lots(supplier_id, [lot])
+    if rejections:
+        raise OperationError(rejections[0]['reason'])
+    return f"{str(lot['ingredient_id']).strip()}-{supplier_id}-{str(lot['supplier_batch_id']).strip()}"
+
+
+# --- Viewer ---
+
+def browse_products():
+    """All product types with their category and manufacturer."""
+    with borrow_connection() as (db, cursor):
+        cursor.execute("""
+            SELECT
+                p.product_id AS 'ID',
+                p.name AS 'Product Name',
+                c.name AS 'Category',
+                m.name AS 'Manufacturer'
+            FROM Product p
+            JOIN Category c ON p.category_id = c.category_id
+            JOIN Manufacturer m ON p.manufacturer_id = m.manufacturer_id
+            ORDER BY m.name, c.name, p.name
+        """)
+        return cursor.fetchall()
+
+
+def ingredient_list(product_id):
+    """Flattened (atomic) ingredient list of a product's active recipe."""
+    with borrow_connection() as (db, cursor):
+        recipe_id = refcache.active_recipe_id(cursor, product_id)
+        if recipe_id is None:
+            raise OperationError(f"No active recipe found for Product ID {product_id}.")
+        flattened = refcache.flattened_recipe(cursor, recipe_id)
+        db.commit()  # keep the FlattenedRecipe entry if this call just computed it
+    return flattened
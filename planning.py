@@ -0,0 +1,250 @@
+"""
+Shortage planning for a multi-week production schedule.
+
+    plan = plan_schedule(cursor, schedule)      schedule: [{'product_id', 'quantity', 'date'}]
+    ingredient_summary(plan)                    one row per ingredient (totals, first shortage)
+    daily_rows(plan)                            one row per ingredient and day with activity
+
+Report 6 compares stock with one standard batch; this projects the whole
+schedule instead. The active recipes (RecipeIngredient), the usable lots
+(quantity and expiry) and the Formulation materials of compound ingredients
+are loaded with a few chunked queries. Everything else is array arithmetic
+on a days x ingredients grid:
+
+    demand      scheduled quantity (bincount over day, product) spread over
+                the current recipe rows of each product
+    FEFO        lots are used in expiry order and a lot is unusable from its
+                expiration_date on (as fefo.FEFO_ALLOCATION_QUERY), so the
+                stock thrown away by day d is
+                    W(d) = max_{j<=d}(E(j) - S(j-1))
+                with S the cumulative demand and E the stock of lots expired
+                by day d - a cumsum plus a running maximum
+                (np.maximum.accumulate) per ingredient, no per-day loop
+    consumed    cumulative C(d) = min(S(d), total stock - W(d)): demand is met
+                only from stock that is still there. Once C falls short of
+                S, no stock is left and W stops growing, so the unmet demand
+                in S never hides later waste.
+    shortage    cumulative S - C
+    waste       cumulative W (lots that expire unused)
+    materials   compound shortages expanded through their active formulations
+                (the expansion Flatten_Recipe uses) into atomic material needs
+
+Quantities are float64. Dates before `start` are rejected; days run from
+`start` (default today) to the last scheduled date.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from costing import keyed_rows
+from refcache import CURRENT_RECIPE_TEMPLATE
+from streaming import DEFAULT_FETCH_SIZE
+
+MAX_NESTING = 10            # as Flatten_Recipe
+
+# The recipe production would use (refcache.CURRENT_RECIPE_TEMPLATE) for each product
+ACTIVE_RECIPES_TEMPLATE = f"""
+    SELECT r.product_id, ri.ingredient_id, ri.quantity, i.ingredient_type
+    FROM Recipe r
+    JOIN RecipeIngredient ri ON ri.recipe_id = r.recipe_id
+    JOIN Ingredient i ON i.ingredient_id = ri.ingredient_id
+    WHERE r.product_id IN ({{keys}})
+      AND r.recipe_id = ({CURRENT_RECIPE_TEMPLATE.format(product_id='r.product_id')})
+"""
+
+# Lots still usable on the first planning day
+PLAN_LOTS_TEMPLATE = """
+    SELECT ingredient_id, quantity_on_hand, expiration_date
+    FROM IngredientBatch
+    WHERE ingredient_id IN ({keys})
+      AND quantity_on_hand > 0
+      AND expiration_date > %s
+"""
+
+FORMULATION_MATERIALS_TEMPLATE = """
+    SELECT f.ingredient_id, fm.material_ingredient_id, fm.quantity, mi.ingredient_type
+    FROM Formulation f
+    JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+    JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+    WHERE f.ingredient_id IN ({keys})
+      AND %s BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+"""
+
+
+def _as_date(value):
+    return date.fromisoformat(str(value)[:10]) if not isinstance(value, date) else value
+
+
+def _load_materials(cursor, compounds, start, fetch_size):
+    """
+    Expansion of compound ingredients into materials at any depth. Returns
+    (material_ids, matrix): matrix[c, m] = units of atomic material m in one
+    unit of compounds[c].
+    """
+    index = {ingredient_id: n for n, ingredient_id in enumerate(compounds)}
+    edges, atomic, pending = [], {}, list(compounds)
+    for _ in range(MAX_NESTING):
+        if not pending:
+            break
+        rows = keyed_rows(cursor, 'plan_formulation_materials', FORMULATION_MATERIALS_TEMPLATE, pending, (start,),
+                          fetch_size)
+        pending = []
+        for row in rows:
+            material = row['material_ingredient_id']
+            if row['ingredient_type'] == 'COMPOUND':
+                if material not in index:
+                    index[material] = len(index)
+                    pending.append(material)
+            else:
+                atomic.setdefault(material, len(atomic))
+            edges.append((row['ingredient_id'], material, row['ingredient_type'], float(row['quantity'])))
+
+    # step[c, k] / direct[c, m]: one expansion level into compounds / atomic materials
+    step = np.zeros((len(index), len(index)))
+    direct = np.zeros((len(index), len(atomic)))
+    for compound, material, kind, quantity in edges:
+        if kind == 'COMPOUND':
+            step[index[compound], index[material]] += quantity
+        else:
+            direct[index[compound], atomic[material]] += quantity
+
+    matrix = direct.copy()
+    reach = np.eye(len(index))
+    for _ in range(MAX_NESTING):
+        reach = reach @ step
+        if not reach.any():
+            break
+        matrix += reach @ direct
+    return list(atomic), matrix[:len(compounds)]
+
+
+def plan_schedule(cursor, schedule, start=None, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    Project FEFO draw-down for a production schedule (dicts with product_id,
+    quantity and date). Returns a dict:
+
+      start, dates                      first day and the datetime64 day axis
+      ingredient_ids, compound          column order; mask of compound ingredients
+      demand, consumed, shortage, waste per day x ingredient (float64 arrays)
+      on_hand                           usable stock left at the end of each day
+      material_ids, material_needs      atomic materials needed per day to make
+                                        the compound shortfall
+      unplanned                         schedule rows whose product has no active recipe
+
+    Raises ValueError for a row dated before start or with a negative quantity.
+    """
+    start = _as_date(start) if start else date.today()
+    products = [str(row['product_id']) for row in schedule]
+    quantities = np.array([float(row['quantity']) for row in schedule], dtype=np.float64)
+    days = np.array([(_as_date(row['date']) - start).days for row in schedule], dtype=np.int64)
+    if len(schedule) and (days.min() < 0 or quantities.min() < 0):
+        bad = int(np.flatnonzero((days < 0) | (quantities < 0))[0])
+        raise ValueError(f"Schedule row {bad + 1}: date before {start} or negative quantity.")
+    n_days = int(days.max()) + 1 if len(schedule) else 0
+
+    recipe_rows = keyed_rows(cursor, 'plan_recipes', ACTIVE_RECIPES_TEMPLATE, products, (), fetch_size)
+    product_ids = list(dict.fromkeys(row['product_id'] for row in recipe_rows))
+    ingredient_ids = list(dict.fromkeys(row['ingredient_id'] for row in recipe_rows))
+    product_index = {product_id: n for n, product_id in enumerate(product_ids)}
+    ingredient_index = {ingredient_id: n for n, ingredient_id in enumerate(ingredient_ids)}
+    compound = np.zeros(len(ingredient_ids), dtype=bool)
+    for row in recipe_rows:
+        compound[ingredient_index[row['ingredient_id']]] = row['ingredient_type'] == 'COMPOUND'
+    n_products, n_ingredients = len(product_ids), len(ingredient_ids)
+
+    # Production per day x product, then demand = production @ recipe matrix
+    planned = np.array([product in product_index for product in products], dtype=bool)
+    unplanned = [row for row, ok in zip(schedule, planned) if not ok]
+    column = np.fromiter((product_index.get(product, 0) for product in products), dtype=np.int64,
+                         count=len(products))
+    production = np.bincount(days[planned] * n_products + column[planned], weights=quantities[planned],
+                             minlength=n_days * n_products).reshape(n_days, n_products)
+    recipe = np.zeros((n_products, n_ingredients))
+    for row in recipe_rows:
+        recipe[product_index[row['product_id']], ingredient_index[row['ingredient_id']]] += float(row['quantity'])
+    demand = production @ recipe
+
+    # Stock of each ingredient, and the part of it expired by each day
+    lots = keyed_rows(cursor, 'plan_lots', PLAN_LOTS_TEMPLATE, ingredient_ids, (start,), fetch_size)
+    lot_ingredient = np.fromiter((ingredient_index[row['ingredient_id']] for row in lots), dtype=np.int64,
+                                 count=len(lots))
+    lot_quantity = np.fromiter((row['quantity_on_hand'] for row in lots), dtype=np.float64, count=len(lots))
+    lot_expiry = np.fromiter(((_as_date(row['expiration_date']) - start).days for row in lots), dtype=np.int64,
+                             count=len(lots))
+    total = np.bincount(lot_ingredient, weights=lot_quantity, minlength=n_ingredients)
+    in_window = lot_expiry < n_days
+    expired = np.bincount(lot_expiry[in_window] * n_ingredients + lot_ingredient[in_window],
+                          weights=lot_quantity[in_window], minlength=n_days * n_ingredients)
+    expired = expired.reshape(n_days, n_ingredients).cumsum(axis=0)
+
+    # FEFO draw-down (see the module docstring)
+    demanded = demand.cumsum(axis=0)
+    wasted = np.maximum.accumulate(expired - (demanded - demand), axis=0) if n_days else expired
+    consumed = np.minimum(demanded, total - wasted)
+
+    shortage = np.diff(demanded - consumed, axis=0, prepend=0)
+    waste = np.diff(wasted, axis=0, prepend=0)
+    material_ids, expansion = _load_materials(cursor, [ingredient_ids[n] for n in np.flatnonzero(compound)],
+                                              start, fetch_size)
+    return {
+        'start': start,
+        'dates': np.datetime64(start, 'D') + np.arange(n_days),
+        'ingredient_ids': ingredient_ids,
+        'compound': compound,
+        'demand': demand,
+        'consumed': np.diff(consumed, axis=0, prepend=0),
+        'shortage': shortage,
+        'waste': waste,
+        'on_hand': total - wasted - consumed,
+        'material_ids': material_ids,
+        'material_needs': shortage[:, compound] @ expansion,
+        'unplanned': unplanned,
+    }
+
+
+def ingredient_summary(plan):
+    """Per ingredient: demand, shortage, first shortage date, waste and closing stock, shortages first."""
+    shortage = plan['shortage']
+    short_days = shortage > 0
+    first = np.where(short_days.any(axis=0), short_days.argmax(axis=0), -1)
+    closing = plan['on_hand'][-1] if len(plan['on_hand']) else np.zeros(len(plan['ingredient_ids']))
+    rows = [{
+        'ingredient_id': ingredient_id,
+        'compound': bool(plan['compound'][n]),
+        'demand': round(float(plan['demand'][:, n].sum()), 2),
+        'shortage': round(float(shortage[:, n].sum()), 2),
+        'first_shortage': plan['start'] + timedelta(days=int(first[n])) if first[n] >= 0 else None,
+        'waste': round(float(plan['waste'][:, n].sum()), 2),
+        'closing_stock': round(float(closing[n]), 2),
+    } for n, ingredient_id in enumerate(plan['ingredient_ids'])]
+    rows.sort(key=lambda row: (row['first_shortage'] is None, row['first_shortage'] or date.max,
+                               -row['shortage'], row['ingredient_id']))
+    return rows
+
+
+def daily_rows(plan):
+    """One row per (day, ingredient) with demand, shortage or waste."""
+    active = (plan['demand'] > 0) | (plan['shortage'] > 0) | (plan['waste'] > 0)
+    return [{
+        'date': plan['start'] + timedelta(days=int(day)),
+        'ingredient_id': plan['ingredient_ids'][n],
+        'demand': round(float(plan['demand'][day, n]), 2),
+        'consumed': round(float(plan['consumed'][day, n]), 2),
+        'shortage': round(float(plan['shortage'][day, n]), 2),
+        'waste': round(float(plan['waste'][day, n]), 2),
+        'on_hand': round(float(plan['on_hand'][day, n]), 2),
+    } for day, n in zip(*np.nonzero(active))]
+
+
+def material_rows(plan):
+    """Per atomic material: units needed to make the compound shortfall, by first day needed."""
+    needs = plan['material_needs']
+    rows = []
+    for m, material_id in enumerate(plan['material_ids']):
+        days = np.flatnonzero(needs[:, m] > 0)
+        if len(days):
+            rows.append({'material_id': material_id,
+                         'first_needed': plan['start'] + timedelta(days=int(days[0])),
+                         'quantity': round(float(needs[:, m].sum()), 2)})
+    rows.sort(key=lambda row: (row['first_needed'], row['material_id']))
+    return rows
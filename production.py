@@ -0,0 +1,176 @@
+"""
+Non-interactive production posting.
+
+post_production_batches() takes a list of batch requests, plans FEFO for
+each one and posts it through the Post_Production_Batch procedure. Batches
+are committed in groups; every batch gets its own SAVEPOINT so one failed
+row does not undo the rest of its group.
+
+With reserve=True the plan is built by reservation.reserve_fefo, which locks
+the chosen lots (FOR UPDATE SKIP LOCKED) in the posting transaction, so
+parallel posters consume disjoint lots instead of failing on each other.
+
+The plan is staged into ConsumptionStage, a per-session TEMPORARY table, with
+one multi-row INSERT and posted by Post_Staged_Production_Batch (no JSON
+serialisation or JSON_TABLE parsing). The stage is created before the first
+posting transaction, so parallel posters share no stage rows or locks.
+staged=False uses the JSON procedure Post_Production_Batch instead.
+
+A batch request is a dict with:
+    product_id, produced_quantity, manufacturer_batch_id, expiration_date (YYYY-MM-DD)
+"""
+import json
+import time
+
+import mysql.connector
+
+import refcache
+from db_pool import borrow_connection
+from fefo import allocate_fefo, shortages
+from queries import register
+from reservation import reserve_fefo
+
+DEFAULT_COMMIT_GROUP_SIZE = 50
+
+REQUIRED_FIELDS = ('product_id', 'produced_quantity', 'manufacturer_batch_id', 'expiration_date')
+
+# Plain %s placeholders so executemany() sends one multi-row INSERT.
+STAGE_LOT_QUERY = "INSERT INTO ConsumptionStage (lot_number, qty) VALUES (%s, %s)"
+register('stage_consumption', STAGE_LOT_QUERY)
+
+
+class PostingError(Exception):
+    """A batch request that cannot be posted (validation or stock problem)."""
+
+
+def load_product_context(cursor, manufacturer_id, product_id):
+    """
+    Return (standard_batch_size, active recipe_id) for a product this manufacturer owns.
+    One joined query, served from the reference-data cache after the first lookup.
+    """
+    context = refcache.product_context(cursor, product_id)
+    if not context or context['manufacturer_id'] != manufacturer_id:
+        raise PostingError(f"Manufacturer {manufacturer_id} does not own Product ID {product_id}.")
+
+    if context['recipe_id'] is None:
+        raise PostingError(f"No active recipe found for Product ID {product_id}.")
+
+    return context['standard_batch_size'], context['recipe_id']
+
+
+def plan_production_batch(cursor, sbs, recipe_id, produced_quantity, reserve=False):
+    """
+    Validate the quantity and build the FEFO consumption plan for one batch.
+    reserve=True locks the planned lots until the transaction ends.
+    """
+    if produced_quantity <= 0 or produced_quantity % sbs != 0:
+        raise PostingError(f"Quantity ({produced_quantity}) must be a positive multiple "
+                           f"of the standard batch size ({sbs}).")
+
+    allocate = reserve_fefo if reserve else allocate_fefo
+    consumption_plan, requirements = allocate(cursor, recipe_id, produced_quantity)
+    missing = shortages(requirements)
+    if missing:
+        details = ", ".join(f"{req['ingredient_id']} (need {req['total_needed']}, found {req['found']})"
+                            for req in missing)
+        raise PostingError(f"Not enough stock for: {details}")
+    return consumption_plan
+
+
+def open_stage(cursor):
+    """Create this session's stage table; call it outside a transaction, then commit."""
+    cursor.callproc('Open_Consumption_Stage')
+
+
+def stage_consumption_plan(cursor, consumption_plan):
+    """Stage a plan [{'lot', 'qty'}] for this session (the stage must be open and empty)."""
+    cursor.executemany(STAGE_LOT_QUERY, [(item['lot'], item['qty']) for item in consumption_plan])
+
+
+def _post_one(cursor, manufacturer_id, request, reserve, staged=True):
+    """Plan and post one batch request inside the caller's transaction."""
+    missing_fields = [field for field in REQUIRED_FIELDS if not request.get(field)]
+    if missing_fields:
+        raise PostingError(f"Missing field(s): {', '.join(missing_fields)}")
+
+    product_id = str(request['product_id'])
+    try:
+        produced_quantity = int(request['produced_quantity'])
+    except (TypeError, ValueError):
+        raise PostingError(f"produced_quantity must be an integer, got {request['produced_quantity']!r}")
+
+    sbs, recipe_id = load_product_context(cursor, manufacturer_id, product_id)
+
+    consumption_plan = plan_production_batch(cursor, sbs, recipe_id, produced_quantity, reserve)
+
+    batch = (product_id, manufacturer_id, request['manufacturer_batch_id'], produced_quantity,
+             request['expiration_date'], recipe_id)
+    if staged:
+        stage_consumption_plan(cursor, consumption_plan)
+        cursor.callproc('Post_Staged_Production_Batch', batch)
+    else:
+        cursor.callproc('Post_Production_Batch', batch + (json.dumps(consumption_plan),))
+    return f"{product_id}-{manufacturer_id}-{request['manufacturer_batch_id']}"
+
+
+def post_production_batches(requests, manufacturer_id, commit_group_size=DEFAULT_COMMIT_GROUP_SIZE,
+                            reserve=False, staged=True):
+    """
+    Post many production batches without any prompts.
+    reserve=True locks lots while planning (safe to run several posters in parallel).
+    staged=False passes each plan as JSON (Post_Production_Batch) instead.
+
+    Returns (results, summary):
+      results -> one dict per request: row, manufacturer_batch_id, ok, lot_number, error
+      summary -> posted, failed, elapsed (s), batches_per_sec
+    """
+    results = []
+    start = time.perf_counter()
+
+    with borrow_connection() as (db, cursor):
+        if reserve:
+            # Locking reads see the latest committed stock; READ COMMITTED also
+            # avoids gap locks on idx_ib_fefo that would block lot intake.
+            cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        open_stage(cursor)  # the JSON procedures stage through it too
+        db.commit()
+        group = []           # results committed together with the current group
+
+        for row_number, request in enumerate(requests, start=1):
+            result = {'row': row_number, 'manufacturer_batch_id': request.get('manufacturer_batch_id'),
+                      'ok': False, 'lot_number': None, 'error': None}
+            results.append(result)
+
+            cursor.execute("SAVEPOINT batch_row")
+            try:
+                result['lot_number'] = _post_one(cursor, manufacturer_id, request, reserve, staged)
+                result['ok'] = True
+                group.append(result)
+            except (PostingError, mysql.connector.Error) as err:
+                result['error'] = getattr(err, 'msg', None) or str(err)
+                try:
+                    cursor.execute("ROLLBACK TO SAVEPOINT batch_row")
+                except mysql.connector.Error:
+                    # The server already rolled back the whole transaction
+                    # (e.g. deadlock), so the rest of this group is lost too.
+                    db.rollback()
+                    for lost in group:
+                        lost['ok'] = False
+                        lost['error'] = f"Rolled back with its commit group: {result['error']}"
+                    group = []
+
+            if len(group) >= commit_group_size:
+                db.commit()
+                group = []
+
+        db.commit()
+
+    elapsed = time.perf_counter() - start
+    posted = sum(1 for result in results if result['ok'])
+    summary = {
+        'posted': posted,
+        'failed': len(results) - posted,
+        'elapsed': elapsed,
+        'batches_per_sec': posted / elapsed if elapsed > 0 else 0.0,
+    }
+    return results, summary
@@ -0,0 +1,113 @@
+"""
+Registry of the named hot-path queries, run as server-side prepared statements.
+
+Every hot query is declared once, next to the code that uses it:
+
+    FEFO_ALLOCATION_QUERY = "WITH need AS (...) SELECT ..."
+    register('fefo_query', FEFO_ALLOCATION_QUERY)
+
+and callers keep using cursor.execute(FEFO_ALLOCATION_QUERY, params). The
+cursor borrow_connection() hands out is a PreparingCursor: a registered
+statement runs on a prepared cursor (cursor(prepared=True)) kept per query
+name for the connection, so the server parses it once per checkout and
+later calls only send the parameters. Everything else runs on the plain
+cursor as before. That covers ad-hoc SQL, dynamic IN lists, callproc and
+executemany, whose multi-row INSERT rewrite needs the text protocol.
+
+The statement cache lives as long as the checkout. Returning a connection
+resets its session (pool_reset_session), which deallocates its prepared
+statements on the server, so the cursor closes them first.
+
+    MEAL_PREPARED_STATEMENTS=0   run registered queries as plain text again
+
+The same names label the statistics of instrumentation.py.
+"""
+import os
+
+from instrumentation import register_query
+
+QUERIES = {}                # name -> sql
+_names = {}                 # sql text -> name
+
+_enabled = os.environ.get('MEAL_PREPARED_STATEMENTS', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+def configure(enabled=None):
+    """Override MEAL_PREPARED_STATEMENTS (None leaves it unchanged)."""
+    global _enabled
+    if enabled is not None:
+        _enabled = enabled
+
+
+def enabled():
+    return _enabled
+
+
+def register(name, sql):
+    """Register sql under name and return it unchanged. A name holds exactly one statement."""
+    if QUERIES.get(name, sql) != sql:
+        raise ValueError(f"Query {name!r} is already registered with different SQL.")
+    QUERIES[name] = sql
+    _names[sql] = name
+    return register_query(name, sql)
+
+
+def get(name):
+    return QUERIES[name]
+
+
+class PreparingCursor:
+    """Runs registered statements on cached prepared cursors; everything else on the plain cursor."""
+
+    def __init__(self, db, cursor, dictionary=True):
+        self._db = db
+        self._plain = cursor
+        self._dictionary = dictionary
+        self._statements = {}   # name -> prepared cursor
+        self._active = cursor   # cursor that ran the last statement (fetch*, rowcount, ...)
+
+    def __getattr__(self, attr):
+        return getattr(self._active, attr)
+
+    def __iter__(self):
+        return iter(self._active)
+
+    def _statement(self, name):
+        cursor = self._statements.get(name)
+        if cursor is None:
+            cursor = self._statements[name] = self._db.cursor(prepared=True, dictionary=self._dictionary)
+        return cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        name = _names.get(operation)
+        if name is None:
+            self._active = self._plain
+            return self._plain.execute(operation, params, *args, **kwargs)
+        # Always pass the registered string object: the prepared cursor
+        # re-prepares whenever it sees a different one.
+        self._active = self._statement(name)
+        return self._active.execute(QUERIES[name], params)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._active = self._plain
+        return self._plain.executemany(operation, seq_params, *args, **kwargs)
+
+    def callproc(self, procname, args=()):
+        self._active = self._plain
+        return self._plain.callproc(procname, args)
+
+    def prepared(self):
+        """Names of the statements prepared on this connection so far."""
+        return sorted(self._statements)
+
+    def close(self):
+        for cursor in self._statements.values():
+            cursor.close()
+        self._statements.clear()
+        self._active = self._plain
+        return self._plain.close()
+
+
+def preparing(db, cursor, dictionary=True):
+    """Wrap a fresh cursor of db when prepared statements are on; otherwise return it unchanged."""
+    return PreparingCursor(db, cursor, dictionary) if _enabled else cursor
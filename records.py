@@ -0,0 +1,30 @@
+"""
+Reading request files for the non-interactive commands.
+
+Both CSV (with a header row) and JSON Lines are accepted; every record
+comes back as a plain dict.
+"""
+import csv
+import json
+
+
+class RecordError(ValueError):
+    """A request file that cannot be parsed (the message names the line)."""
+
+
+def _json_record(path, number, line):
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as err:
+        raise RecordError(f"{path} line {number}: invalid JSON ({err.msg}).") from err
+    if not isinstance(record, dict):
+        raise RecordError(f"{path} line {number}: expected a JSON object.")
+    return record
+
+
+def read_records(path):
+    """Read a .csv (with header row) or .jsonl file into a list of dicts. Raises RecordError for bad JSON."""
+    with open(path, newline='') as f:
+        if path.lower().endswith('.jsonl'):
+            return [_json_record(path, number, line) for number, line in enumerate(f, 1) if line.strip()]
+        return list(csv.DictReader(f))
@@ -0,0 +1,214 @@
+"""
+In-process read-through cache for slow-changing reference data.
+
+Product, active Recipe and flattened recipe (RecipeIngredient + Formulation)
+lookups are served from memory after the first round trip:
+
+    sbs = refcache.product(cursor, product_id)['standard_batch_size']
+
+product_context() loads the product and its active recipe with one joined
+query, for callers (batch planning) that need both.
+
+A product may have several active recipes (create_recipe adds a version
+without retiring the old one); the current one is always the newest, as
+CURRENT_RECIPE_TEMPLATE selects. Planning and costing use the same template.
+
+Entries expire after a TTL and the least recently used entry is evicted
+once the cache is full. Every invalidation bumps a generation counter (per
+key, per namespace, or for the whole cache); a value loaded across an
+invalidation is returned to its caller but not stored, so a stale read can
+never overwrite the invalidation. The write paths in main.py (create_product_type,
+create_recipe_plan, manage_formulations, define_formulation_materials)
+invalidate the affected entries explicitly; the TTL bounds staleness for
+writes made by other processes.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from bom import flatten_recipe
+from queries import register
+
+DEFAULT_TTL = float(os.environ.get('MEAL_REFCACHE_TTL', 300))           # seconds
+DEFAULT_MAX_ENTRIES = int(os.environ.get('MEAL_REFCACHE_MAX_ENTRIES', 1024))
+
+# Namespaces (first element of every cache key)
+PRODUCT = 'product'
+ACTIVE_RECIPE = 'active_recipe'
+PRODUCT_CONTEXT = 'product_context'
+FLATTENED_RECIPE = 'flattened_recipe'
+
+PRODUCT_QUERY = """
+    SELECT manufacturer_id, standard_batch_size FROM Product WHERE product_id = %s
+"""
+
+# The current recipe of {product_id}: its newest active one (idx_recipe_active, read backwards)
+CURRENT_RECIPE_TEMPLATE = """
+    SELECT cr.recipe_id FROM Recipe cr
+    WHERE cr.product_id = {product_id} AND cr.is_active = 1
+    ORDER BY cr.recipe_id DESC LIMIT 1
+"""
+
+ACTIVE_RECIPE_QUERY = CURRENT_RECIPE_TEMPLATE.format(product_id='%s')
+
+PRODUCT_CONTEXT_QUERY = f"""
+    SELECT p.manufacturer_id, p.standard_batch_size,
+           ({CURRENT_RECIPE_TEMPLATE.format(product_id='p.product_id')}) AS recipe_id
+    FROM Product p
+    WHERE p.product_id = %s
+"""
+register('product', PRODUCT_QUERY)
+register('active_recipe', ACTIVE_RECIPE_QUERY)
+register('product_context', PRODUCT_CONTEXT_QUERY)
+
+
+class RefCache:
+    """Thread-safe TTL + LRU cache keyed by (namespace, key) tuples."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (namespace, key) -> (expires_at, value)
+        self._key_generations = {}      # (namespace, key) -> invalidations of that key
+        self._namespace_generations = {}  # namespace -> invalidations of the whole namespace
+        self._generation = 0            # clear() calls
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, namespace, key, loader):
+        """
+        Return the cached value, or call loader() and cache its result.
+        A None result (row not found) is returned but not cached, and so is a
+        result loaded while the entry was invalidated.
+        """
+        cache_key = (namespace, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation_of(cache_key)
+
+        # Load outside the lock so one slow query does not block other lookups
+        value = loader()
+        if value is None:
+            return None
+
+        with self._lock:
+            if self._generation_of(cache_key) != generation:
+                return value
+            self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _generation_of(self, cache_key):
+        # caller holds the lock
+        return (self._generation, self._namespace_generations.get(cache_key[0], 0),
+                self._key_generations.get(cache_key, 0))
+
+    def invalidate(self, namespace, key=None):
+        """Drop one entry, or the whole namespace when key is None."""
+        with self._lock:
+            if key is not None:
+                cache_key = (namespace, key)
+                self._key_generations[cache_key] = self._key_generations.get(cache_key, 0) + 1
+                self._entries.pop(cache_key, None)
+                return
+            self._namespace_generations[namespace] = self._namespace_generations.get(namespace, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = RefCache()
+
+
+def get_cache():
+    return _cache
+
+
+# --- Read-through lookups ---
+
+def product(cursor, product_id):
+    """{'manufacturer_id', 'standard_batch_size'} for a product, or None."""
+    def load():
+        cursor.execute(PRODUCT_QUERY, (product_id,))
+        return cursor.fetchone()
+    return _cache.get_or_load(PRODUCT, str(product_id), load)
+
+
+def active_recipe_id(cursor, product_id):
+    """recipe_id of the product's current (newest active) recipe, or None."""
+    def load():
+        cursor.execute(ACTIVE_RECIPE_QUERY, (product_id,))
+        row = cursor.fetchone()
+        return row['recipe_id'] if row else None
+    return _cache.get_or_load(ACTIVE_RECIPE, str(product_id), load)
+
+
+def product_context(cursor, product_id):
+    """
+    {'manufacturer_id', 'standard_batch_size', 'recipe_id'} for a product in one
+    round trip (recipe_id is None without an active recipe), or None.
+    """
+    def load():
+        cursor.execute(PRODUCT_CONTEXT_QUERY, (product_id,))
+        return cursor.fetchone()
+    return _cache.get_or_load(PRODUCT_CONTEXT, str(product_id), load)
+
+
+def flattened_recipe(cursor, recipe_id):
+    """
+    Today's flattened ingredient list for a recipe (see bom.flatten_recipe).
+    On a miss Flatten_Recipe may fill FlattenedRecipe; the caller should commit.
+    """
+    return _cache.get_or_load(FLATTENED_RECIPE, (recipe_id, date.today()),
+                              lambda: flatten_recipe(cursor, recipe_id))
+
+
+# --- Invalidation (called by the write paths) ---
+
+def invalidate_product(product_id):
+    _cache.invalidate(PRODUCT, str(product_id))
+    _cache.invalidate(PRODUCT_CONTEXT, str(product_id))
+
+
+def invalidate_recipes(product_id):
+    """A new recipe changes which recipe is active and what it flattens to."""
+    _cache.invalidate(ACTIVE_RECIPE, str(product_id))
+    _cache.invalidate(PRODUCT_CONTEXT, str(product_id))
+    _cache.invalidate(FLATTENED_RECIPE)
+
+
+def invalidate_formulations():
+    """Formulation changes can alter the flattened form of any recipe."""
+    _cache.invalidate(FLATTENED_RECIPE)
+
+
+def stats():
+    return _cache.stats()
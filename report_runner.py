@@ -0,0 +1,175 @@
+"""
+Parallel report runner: reports 1-7 for every tenant in one go.
+
+    python main.py reports --output-dir report_output --workers 8 --mode process
+
+plan_jobs() expands the parameterised reports (reports.REPORT_PARAMETERS)
+into one job per tenant and argument set:
+
+    manufacturers   1 (one job per product they make), 2, 3 and 4 (their
+                    product lots, LOT_CHUNK_SIZE per job), 6
+    suppliers       5
+    all             7 (not tenant-scoped)
+
+run_jobs() fans the jobs out over a thread pool (one pooled connection per
+thread) or a process pool (each worker process opens its own one-connection
+pool; spawned, so no connection is shared with the parent) and write_outputs()
+merges the rows into one JSONL file per tenant:
+
+    <output_dir>/manufacturer-MFG001.jsonl
+    <output_dir>/supplier-21.jsonl
+    <output_dir>/all.jsonl
+
+Each line is one row plus "report" and "title". With mode='sequential' the
+same jobs run one after another on a single connection, the baseline the
+parallel wall-clock time is compared against.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from db_pool import borrow_connection, close_pool, init_pool
+from reports import LOT_CHUNK_SIZE, REPORT_PARAMETERS, REPORTS, execute_report
+from streaming import json_default
+
+MODES = ('thread', 'process', 'sequential')
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+MANUFACTURERS_QUERY = "SELECT manufacturer_id FROM Manufacturer ORDER BY manufacturer_id"
+SUPPLIERS_QUERY = "SELECT supplier_id FROM Supplier ORDER BY supplier_id"
+PRODUCTS_QUERY = "SELECT manufacturer_id, product_id FROM Product ORDER BY manufacturer_id, product_id"
+
+# {since} is '' or an extra production_date condition
+PRODUCT_LOTS_TEMPLATE = """
+    SELECT manufacturer_id, lot_number
+    FROM ProductBatch
+    WHERE 1 = 1 {since}
+    ORDER BY manufacturer_id, lot_number
+"""
+
+
+def _job(kind, tenant_id, report_id, **args):
+    return {'tenant': f"{kind}-{tenant_id}" if tenant_id else kind, 'report_id': report_id, 'args': args}
+
+
+def plan_jobs(cursor, report_ids=None, since=None, as_of=None, horizon_days=None, include_archive=False):
+    """
+    List the jobs for report_ids (default: all), grouped by tenant. since
+    (YYYY-MM-DD) limits reports 3 and 4 to lots produced on or after it;
+    as_of / horizon_days are passed to report 7.
+    """
+    report_ids = [str(report_id) for report_id in (report_ids or REPORTS)]
+    unknown = [report_id for report_id in report_ids if report_id not in REPORTS]
+    if unknown:
+        raise KeyError(f"Unknown report(s) {', '.join(unknown)}; choose from {', '.join(REPORTS)}.")
+
+    cursor.execute(MANUFACTURERS_QUERY)
+    manufacturers = [row['manufacturer_id'] for row in cursor.fetchall()]
+    products, lots = {}, {}
+    if '1' in report_ids:
+        cursor.execute(PRODUCTS_QUERY)
+        for row in cursor.fetchall():
+            products.setdefault(row['manufacturer_id'], []).append(row['product_id'])
+    if '3' in report_ids or '4' in report_ids:
+        cursor.execute(PRODUCT_LOTS_TEMPLATE.format(since="AND production_date >= %s" if since else ''),
+                       (since,) if since else ())
+        for row in cursor.fetchall():
+            lots.setdefault(row['manufacturer_id'], []).append(row['lot_number'])
+
+    jobs = []
+    for manufacturer_id in manufacturers:
+        for report_id in report_ids:
+            if report_id == '1':
+                jobs.extend(_job('manufacturer', manufacturer_id, '1', manufacturer_id=manufacturer_id,
+                                 product_id=product_id)
+                            for product_id in products.get(manufacturer_id, []))
+            elif report_id in ('3', '4'):
+                own_lots = lots.get(manufacturer_id, [])
+                for start in range(0, len(own_lots), LOT_CHUNK_SIZE):
+                    args = {'product_lots': own_lots[start:start + LOT_CHUNK_SIZE]}
+                    if report_id == '4':
+                        args['include_archive'] = include_archive
+                    jobs.append(_job('manufacturer', manufacturer_id, report_id, **args))
+            elif 'manufacturer_id' in REPORT_PARAMETERS[report_id]:
+                jobs.append(_job('manufacturer', manufacturer_id, report_id, manufacturer_id=manufacturer_id))
+
+    if '5' in report_ids:
+        cursor.execute(SUPPLIERS_QUERY)
+        jobs.extend(_job('supplier', row['supplier_id'], '5', supplier_id=row['supplier_id'])
+                    for row in cursor.fetchall())
+    if '7' in report_ids:
+        options = {'as_of': as_of} if as_of else {}
+        if horizon_days is not None:
+            options['horizon_days'] = horizon_days
+        jobs.append(_job('all', None, '7', **options))
+    return jobs
+
+
+def run_job(job):
+    """Run one job on a borrowed connection; returns the job with its columns and rows (picklable)."""
+    with borrow_connection(dictionary=False) as (db, cursor):
+        result = execute_report(cursor, job['report_id'], **job['args'])
+        rows = result.fetchall()
+        columns = list(result.column_names)
+    return dict(job, columns=columns, rows=[tuple(row) for row in rows])
+
+
+def _init_worker(db_config):
+    """Process-pool initializer: a one-connection pool of the worker's own."""
+    init_pool(db_config, 1)
+
+
+def run_jobs(jobs, db_config, workers=DEFAULT_WORKERS, mode='thread'):
+    """
+    Run jobs in mode ('thread', 'process' or 'sequential'). Returns
+    (results in job order, elapsed seconds). Thread and sequential modes
+    replace the process-wide pool with one of `workers` (1) connections.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}, not {mode!r}.")
+    started = time.perf_counter()
+    if mode == 'process':
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(workers, multiprocessing.get_context('spawn'), _init_worker,
+                                 (db_config,)) as executor:
+            results = list(executor.map(run_job, jobs, chunksize=chunksize))
+    else:
+        workers = 1 if mode == 'sequential' else workers
+        close_pool()
+        init_pool(db_config, workers)
+        if mode == 'sequential':
+            results = [run_job(job) for job in jobs]
+        else:
+            with ThreadPoolExecutor(workers) as executor:
+                results = list(executor.map(run_job, jobs))
+    return results, time.perf_counter() - started
+
+
+def write_outputs(results, output_dir):
+    """
+    Merge results (grouped by tenant, as plan_jobs() orders them) into one
+    JSONL file per tenant; returns {tenant: rows written}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {}
+    handle = None
+    try:
+        for result in results:
+            tenant = result['tenant']
+            if tenant not in counts:
+                if handle is not None:
+                    handle.close()
+                handle = open(os.path.join(output_dir, f"{tenant}.jsonl"), 'w', encoding='utf-8')
+                counts[tenant] = 0
+            report_id = result['report_id']
+            for row in result['rows']:
+                record = {'report': report_id, 'title': REPORTS[report_id]}
+                record.update(zip(result['columns'], row))
+                handle.write(json.dumps(record, default=json_default) + '\n')
+            counts[tenant] += len(result['rows'])
+    finally:
+        if handle is not None:
+            handle.close()
+    return counts
@@ -0,0 +1,354 @@
+"""
+Manufacturer reports 1-7.
+
+REPORTS maps each report number to its title and REPORT_PARAMETERS to the
+arguments it takes (REPORT_DEFAULTS holds the demo values used when one is
+not given); execute_report() runs one report on a cursor and returns the
+executed cursor (or, for report 4, a cursor-like ChunkedResult) with the
+rows unread, so callers can stream them (main.py) or fetch them (the async
+backend / HTTP service). report_runner.py runs them for every tenant.
+
+Report 4 (conflicting ingredients) is a single read-only CTE query: no
+temporary tables and no commits. It accepts any number of product lots,
+or every lot a manufacturer produced in a date range.
+
+Reports 6 and 7 read per-ingredient totals from IngredientStockSummary
+(migration 004), so they scale with the number of ingredients, not lots.
+
+Report 4 can also analyse archived batches (include_archive=True; see
+archive.py).
+"""
+from datetime import date, timedelta
+
+from archive import table_names
+from instrumentation import query_name
+
+# Lots per query; longer lists are split into several round trips.
+LOT_CHUNK_SIZE = 1000
+
+# {anchor_filter} selects the BatchConsumption rows to analyse (alias bc / pb);
+# the table placeholders come from archive.table_names().
+CONFLICTING_INGREDIENTS_TEMPLATE = """
+    WITH RECURSIVE atoms (product_lot_number, ingredient_id, ingredient_type, supplier_id, as_of_date, depth) AS (
+        SELECT
+            bc.product_lot_number,
+            ib.ingredient_id,
+            i.ingredient_type,
+            ib.supplier_id,
+            ib.intake_date,
+            0
+        FROM {consumption} bc
+        JOIN {product_batches} pb ON pb.lot_number = bc.product_lot_number
+        JOIN {ingredient_batches} ib ON ib.lot_number = bc.ingredient_lot_number
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+        WHERE {anchor_filter}
+
+        UNION ALL
+
+        -- Compound lots: materials of the supplier's formulation at intake
+        SELECT
+            a.product_lot_number,
+            fm.material_ingredient_id,
+            mi.ingredient_type,
+            NULL,
+            a.as_of_date,
+            a.depth + 1
+        FROM atoms a
+        JOIN Formulation f
+          ON f.ingredient_id = a.ingredient_id
+         AND (a.supplier_id IS NULL OR f.supplier_id = a.supplier_id)
+         AND a.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE a.ingredient_type = 'COMPOUND'
+          AND a.depth < 10
+    ),
+    batch_atoms AS (
+        SELECT DISTINCT product_lot_number, ingredient_id
+        FROM atoms
+        WHERE ingredient_type = 'ATOMIC'
+    )
+    -- Ingredients that must NOT be added to each lot (partner of something already in it)
+    SELECT DISTINCT
+        ba.product_lot_number AS 'Product Lot',
+        ip.partner_id AS 'Conflicting ID',
+        i.name AS 'Conflicting Ingredient Name'
+    FROM batch_atoms ba
+    JOIN IncompatiblePair ip ON ip.ingredient_id = ba.ingredient_id
+    JOIN Ingredient i ON i.ingredient_id = ip.partner_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM batch_atoms present
+        WHERE present.product_lot_number = ba.product_lot_number
+          AND present.ingredient_id = ip.partner_id
+    )
+    ORDER BY 1, 2
+"""
+
+
+def _lots_filter(lot_count):
+    return f"bc.product_lot_number IN ({', '.join(['%s'] * lot_count)})"
+
+
+def _conflicting_query(anchor_filter, include_archive):
+    return CONFLICTING_INGREDIENTS_TEMPLATE.format(anchor_filter=anchor_filter, **table_names(include_archive))
+
+
+def conflicting_ingredients(cursor, product_lots, include_archive=False):
+    """Report 4 for one or more product lots. Returns a list of row dicts."""
+    product_lots = list(dict.fromkeys(product_lots))  # de-duplicate, keep order
+    rows = []
+    with query_name('report_4'):
+        for start in range(0, len(product_lots), LOT_CHUNK_SIZE):
+            chunk = product_lots[start:start + LOT_CHUNK_SIZE]
+            cursor.execute(_conflicting_query(_lots_filter(len(chunk)), include_archive), tuple(chunk))
+            rows.extend(cursor.fetchall())
+    return rows
+
+
+def conflicting_ingredients_for_period(cursor, manufacturer_id, produced_from, produced_to,
+                                       include_archive=False):
+    """Report 4 for every lot a manufacturer produced between two dates (inclusive)."""
+    with query_name('report_4_period'):
+        cursor.execute(_conflicting_query(
+            "pb.manufacturer_id = %s AND DATE(pb.production_date) BETWEEN %s AND %s", include_archive),
+            (manufacturer_id, produced_from, produced_to))
+        return cursor.fetchall()
+
+
+# --- Report registry ---
+
+DEFAULT_PRODUCT_LOT = '100-MFG001-B0901'
+DEFAULT_PRODUCT_ID = '100'             # 'Steak Dinner'
+DEFAULT_SUPPLIER_ID = '21'             # 'James Miller'
+DEFAULT_AS_OF = date(2025, 11, 15)     # "today" in the demo data set
+NEAR_EXPIRY_DAYS = 10
+
+REPORTS = {
+    '1': "Ingredients of the last batch of a product (default 'Steak Dinner')",
+    '2': "Suppliers and spending",
+    '3': "Unit cost for product lot(s)",
+    '4': "Conflicting ingredients for product lot(s)",
+    '5': "Manufacturers not supplied by a supplier (default 'James Miller')",
+    '6': "Nearly-Out-of-Stock Items (by Product)",
+    '7': f"Almost-Expired Ingredient Lots (within a horizon, default {NEAR_EXPIRY_DAYS} days)",
+}
+
+# execute_report() keyword arguments each report uses
+REPORT_PARAMETERS = {
+    '1': ('manufacturer_id', 'product_id'),
+    '2': ('manufacturer_id',),
+    '3': ('product_lots',),
+    '4': ('product_lots', 'include_archive'),
+    '5': ('supplier_id',),
+    '6': ('manufacturer_id',),
+    '7': ('as_of', 'horizon_days'),
+}
+
+# Demo values for arguments that are not given
+REPORT_DEFAULTS = {
+    '1': {'manufacturer_id': 'MFG001', 'product_id': DEFAULT_PRODUCT_ID},
+    '2': {'manufacturer_id': 'MFG002'},
+    '3': {'product_lots': [DEFAULT_PRODUCT_LOT]},
+    '4': {'product_lots': [DEFAULT_PRODUCT_LOT]},
+    '5': {'supplier_id': DEFAULT_SUPPLIER_ID},
+    '7': {'as_of': DEFAULT_AS_OF, 'horizon_days': NEAR_EXPIRY_DAYS},
+}
+
+REPORT_1_QUERY = """
+    SELECT
+        bc.ingredient_lot_number AS 'Ingredient Lot',
+        i.name AS 'Ingredient Name',
+        pb.production_date AS 'Produced On'
+    FROM BatchConsumption bc
+    JOIN ProductBatch pb ON bc.product_lot_number = pb.lot_number
+    JOIN IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
+    JOIN Ingredient i ON ib.ingredient_id = i.ingredient_id
+    WHERE
+        pb.production_date = (
+            SELECT MAX(pb2.production_date)
+            FROM ProductBatch pb2
+            WHERE pb2.product_id = %s
+            AND pb2.manufacturer_id = %s
+        )
+    AND pb.product_id = %s
+    AND pb.manufacturer_id = %s;
+"""
+
+REPORT_2_QUERY = """
+    SELECT
+        s.name AS 'Supplier Name',
+        SUM(bc.quantity_consumed * ib.per_unit_cost) AS 'Total Spent ($)'
+    FROM
+        BatchConsumption bc
+    JOIN
+        ProductBatch pb ON bc.product_lot_number = pb.lot_number
+    JOIN
+        IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
+    JOIN
+        Supplier s ON ib.supplier_id = s.supplier_id
+    WHERE
+        pb.manufacturer_id = %s
+    GROUP BY
+        s.supplier_id, s.name;
+"""
+
+# {lots} is the placeholder list for the product lots
+REPORT_3_TEMPLATE = """
+    SELECT
+        lot_number AS 'Product Lot',
+        (total_batch_cost / produced_quantity) AS 'Unit Cost ($)'
+    FROM
+        ProductBatch
+    WHERE
+        lot_number IN ({lots})
+    ORDER BY lot_number;
+"""
+
+REPORT_5_QUERY = """
+    SELECT
+        m.manufacturer_id AS 'Manufacturer ID',
+        m.name AS 'Manufacturer Name'
+    FROM Manufacturer m
+    WHERE m.manufacturer_id NOT IN (
+        SELECT DISTINCT
+            pb.manufacturer_id
+        FROM
+            BatchConsumption bc
+        JOIN
+            IngredientBatch ib ON bc.ingredient_lot_number = ib.lot_number
+        JOIN
+            ProductBatch pb ON bc.product_lot_number = pb.lot_number
+        WHERE
+            ib.supplier_id = %s
+    );
+"""
+
+# Ingredients with stock below the standard batch size of a product that uses them
+# Ingredients read their stock from IngredientStockSummary (one row per
+# ingredient), and each (product, ingredient) pair is counted once even when
+# the product has several recipes.
+REPORT_6_QUERY = """
+    SELECT
+        i.name AS 'Ingredient Name',
+        p.name AS 'Product Name',
+        p.standard_batch_size AS 'Product SBS',
+        COALESCE(s.total_on_hand, 0) AS 'Total Stock On-Hand'
+    FROM (
+        SELECT DISTINCT r.product_id, ri.ingredient_id
+        FROM Product p
+        JOIN Recipe r ON r.product_id = p.product_id
+        JOIN RecipeIngredient ri ON ri.recipe_id = r.recipe_id
+        WHERE p.manufacturer_id = %s -- Only show for products *this* mfg owns
+    ) uses
+    JOIN Product p ON p.product_id = uses.product_id
+    JOIN Ingredient i ON i.ingredient_id = uses.ingredient_id
+    LEFT JOIN IngredientStockSummary s ON s.ingredient_id = uses.ingredient_id
+    WHERE COALESCE(s.total_on_hand, 0) < p.standard_batch_size
+    ORDER BY i.name, p.name
+"""
+
+# In-stock lots expiring between %s (as of) and %s (horizon). The summary
+# rows with earliest_expiry <= horizon (idx_stock_summary_expiry) pick the
+# ingredients; only their lots are probed (idx_ib_fefo), so an ingredient
+# whose first in-stock lot expires after the horizon costs nothing.
+REPORT_7_QUERY = """
+    SELECT
+        ib.lot_number AS 'Lot Number',
+        ib.ingredient_id AS 'Ingredient ID',
+        ib.quantity_on_hand AS 'Qty',
+        ib.expiration_date AS 'Expires On'
+    FROM IngredientStockSummary s
+    JOIN IngredientBatch ib
+      ON ib.ingredient_id = s.ingredient_id
+     AND ib.expiration_date BETWEEN %s AND %s
+     AND ib.quantity_on_hand > 0
+    WHERE s.earliest_expiry <= %s
+    ORDER BY ib.expiration_date, ib.lot_number
+"""
+
+
+class ChunkedResult:
+    """
+    Cursor-like view of one query run per chunk of keys: column_names,
+    fetchmany() and fetchall() move on to the next chunk's statement once
+    the current one is read. statements yields (sql, params).
+    """
+
+    def __init__(self, cursor, name, statements):
+        self._cursor = cursor
+        self._name = name
+        self._statements = iter(statements)
+        self._advance()
+
+    def _advance(self):
+        statement = next(self._statements, None)
+        if statement is None:
+            return False
+        with query_name(self._name):
+            self._cursor.execute(*statement)
+        return True
+
+    @property
+    def column_names(self):
+        return self._cursor.column_names
+
+    def fetchmany(self, size=1):
+        rows = []
+        while len(rows) < size:
+            more = self._cursor.fetchmany(size - len(rows))
+            if more:
+                rows.extend(more)
+            elif not self._advance():
+                break
+        return rows
+
+    def fetchall(self):
+        rows = list(self._cursor.fetchall())
+        while self._advance():
+            rows.extend(self._cursor.fetchall())
+        return rows
+
+
+def execute_report(cursor, report_id, manufacturer_id=None, product_lots=None, as_of=None,
+                   horizon_days=NEAR_EXPIRY_DAYS, include_archive=False, product_id=None, supplier_id=None):
+    """
+    Run report `report_id` ('1'-'7') on cursor without fetching the rows;
+    fetch them from the returned object (cursor itself, except for report
+    4, which runs once per LOT_CHUNK_SIZE lots). Reports 1, 2 and 6 are scoped to manufacturer_id (report 1 to the last
+    batch of product_id); reports 3 and 4 take product_lots (4:
+    include_archive also searches archived batches); report 5 takes
+    supplier_id; report 7 lists lots expiring within horizon_days of as_of.
+    Missing arguments fall back to REPORT_DEFAULTS. Raises KeyError for an
+    unknown report.
+    """
+    report_id = str(report_id)
+    if report_id not in REPORTS:
+        raise KeyError(f"Unknown report {report_id!r}; choose one of {', '.join(REPORTS)}.")
+    defaults = REPORT_DEFAULTS.get(report_id, {})
+    manufacturer_id = manufacturer_id or defaults.get('manufacturer_id')
+    product_lots = list(dict.fromkeys(product_lots or defaults.get('product_lots', [])))
+
+    with query_name(f"report_{report_id}"):
+        if report_id == '1':
+            product_id = product_id or defaults['product_id']
+            cursor.execute(REPORT_1_QUERY, (product_id, manufacturer_id, product_id, manufacturer_id))
+        elif report_id == '2':
+            cursor.execute(REPORT_2_QUERY, (manufacturer_id,))
+        elif report_id == '3':
+            cursor.execute(REPORT_3_TEMPLATE.format(lots=', '.join(['%s'] * len(product_lots))),
+                           tuple(product_lots))
+        elif report_id == '4':
+            chunks = (product_lots[start:start + LOT_CHUNK_SIZE]
+                      for start in range(0, len(product_lots), LOT_CHUNK_SIZE))
+            statements = ((_conflicting_query(_lots_filter(len(chunk)), include_archive), tuple(chunk))
+                          for chunk in chunks)
+            return ChunkedResult(cursor, 'report_4', statements)
+        elif report_id == '5':
+            cursor.execute(REPORT_5_QUERY, (supplier_id or defaults['supplier_id'],))
+        elif report_id == '6':
+            cursor.execute(REPORT_6_QUERY, (manufacturer_id,))
+        else:
+            as_of = date.fromisoformat(as_of) if isinstance(as_of, str) else as_of or DEFAULT_AS_OF
+            horizon = as_of + timedelta(days=int(horizon_days))
+            cursor.execute(REPORT_7_QUERY, (as_of, horizon, horizon))
+    return cursor
@@ -0,0 +1,96 @@
+"""
+Concurrency-safe FEFO reservation with row locks.
+
+allocate_fefo() plans from a plain (non-locking) read, so two postings for
+the same ingredient can pick the same lots and one of them only fails in
+trg_validate_consumption after all the work is done. reserve_fefo() instead
+locks the lots it is going to consume inside the caller's transaction:
+
+    SELECT ... FROM IngredientBatch WHERE ingredient_id = %s AND ...
+    ORDER BY expiration_date, lot_number LIMIT n FOR UPDATE SKIP LOCKED
+
+Lots that another poster already holds are skipped, so concurrent posters
+take disjoint lots in FEFO order instead of aborting. Each round fetches a
+small window of lots per ingredient (keyset-paged on idx_ib_fefo, so only the
+returned rows are locked); the window doubles until the need is covered or
+the ingredient runs out of unlocked stock.
+
+The locks are held until the caller commits or rolls back, so the plan must
+be posted in the same transaction (see production.post_production_batches).
+"""
+from decimal import Decimal
+
+from queries import register
+
+INITIAL_WINDOW = 4      # lots locked per ingredient in the first round
+MAX_WINDOW = 256
+
+NEED_QUERY = """
+    SELECT ingredient_id, quantity * %s AS total_needed
+    FROM RecipeIngredient
+    WHERE recipe_id = %s
+    ORDER BY ingredient_id
+"""
+
+# Keyset page in FEFO order; (expiration_date, lot_number) continues after
+# the last lot of the previous round, which this transaction already holds.
+LOCK_LOTS_QUERY = """
+    SELECT lot_number, quantity_on_hand, expiration_date
+    FROM IngredientBatch
+    WHERE ingredient_id = %s
+      AND quantity_on_hand > 0
+      AND expiration_date > CURDATE()
+      AND (expiration_date > %s OR (expiration_date = %s AND lot_number > %s))
+    ORDER BY expiration_date, lot_number
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+register('reservation_need', NEED_QUERY)
+register('reservation_lock_lots', LOCK_LOTS_QUERY)
+
+
+def _lock_ingredient_lots(cursor, ingredient_id, total_needed):
+    """Lock lots of one ingredient until total_needed is covered. Returns (plan, found)."""
+    plan = []
+    found = Decimal(0)
+    last_key = ('0001-01-01', '')
+    window = INITIAL_WINDOW
+
+    while found < total_needed:
+        last_expiry, last_lot = last_key
+        cursor.execute(LOCK_LOTS_QUERY, (ingredient_id, last_expiry, last_expiry, last_lot, window))
+        lots = cursor.fetchall()
+        for lot in lots:
+            if found >= total_needed:
+                break  # locked but not needed; released at commit
+            consume_qty = min(lot['quantity_on_hand'], total_needed - found)
+            plan.append({"lot": lot['lot_number'], "qty": float(consume_qty)})
+            found += consume_qty
+        if len(lots) < window:
+            break  # no more unlocked stock for this ingredient
+        last_key = (lots[-1]['expiration_date'], lots[-1]['lot_number'])
+        window = min(window * 2, MAX_WINDOW)
+
+    return plan, found
+
+
+def reserve_fefo(cursor, recipe_id, produced_quantity):
+    """
+    Lock and plan FEFO consumption for all ingredients of a recipe.
+
+    Must run inside a transaction. Returns (consumption_plan, requirements)
+    in the same shape as fefo.allocate_fefo, so fefo.shortages() applies.
+    Ingredients are locked in ingredient_id order to keep lock order stable
+    between concurrent posters.
+    """
+    cursor.execute(NEED_QUERY, (produced_quantity, recipe_id))
+    needs = cursor.fetchall()
+
+    consumption_plan = []
+    requirements = []
+    for need in needs:
+        plan, found = _lock_ingredient_lots(cursor, need['ingredient_id'], need['total_needed'])
+        consumption_plan.extend(plan)
+        requirements.append({'ingredient_id': need['ingredient_id'],
+                             'total_needed': need['total_needed'], 'found': found})
+    return consumption_plan, requirements
@@ -0,0 +1,390 @@
+"""
+Local HTTP/JSON service for the manufacturer, supplier and viewer actions.
+
+    MEAL_DB_PASSWORD=... python main.py serve --port 8080
+
+Every endpoint except /metrics uses HTTP Basic auth against AppUser (the
+same credentials and roles as the interactive login). Database access goes
+through the connection pool (operations.py); at most pool size + max_pending
+requests are handled at once and the rest get 503. A known path called
+with another method gets 405 and an Allow header; unknown paths get 404.
+Each handler validates its request fields before touching the database: a
+malformed request gets 400, as does one the operation rejects (OperationError, or a trigger /
+constraint error from the database). Any other exception is a server bug:
+it is logged and answered with 500.
+
+    Method  Path                                         Role
+    POST    /manufacturer/products                       Manufacturer
+    POST    /manufacturer/recipes                        Manufacturer
+    POST    /manufacturer/batches                        Manufacturer
+    POST    /manufacturer/batches/plan   (FEFO plan only)  Manufacturer
+    GET     /manufacturer/reports/<1-7>                  Manufacturer
+                           [?product=id]               (report 1)
+                           [?lots=a,b]                 (reports 3, 4)
+                           [&archive=1]                (report 4)
+                           [?supplier=id]              (report 5)
+                           [?as_of=YYYY-MM-DD&days=N]  (report 7)
+    POST    /supplier/formulations                       Supplier
+    POST    /supplier/formulations/<id>/materials        Supplier
+    POST    /supplier/lots            (one lot, or {"lots": [...]})  Supplier
+    GET     /products                                    any
+    GET     /products/<product_id>/ingredients           any
+    GET     /metrics                                     (no auth)
+    GET     /metrics/queries                             (no auth)
+
+/metrics reports, per endpoint: requests, errors, p50/p99 latency (ms, over
+the last SAMPLE_SIZE requests) and throughput since start-up.
+/metrics/queries returns the per-query statistics of instrumentation.py
+(empty unless MEAL_QUERY_STATS=1).
+"""
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import mysql.connector
+
+import instrumentation
+import operations
+from db_pool import get_pool
+from operations import OperationError
+from refcache import RefCache
+from streaming import json_default
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_MAX_PENDING = 50
+SAMPLE_SIZE = 2048          # latency samples kept per endpoint
+AUTH_CACHE_TTL = 60         # seconds a successful login is remembered
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """Maps to an HTTP error response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Metrics ---
+
+class EndpointMetrics:
+    """Thread-safe per-endpoint request counters and latency samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._endpoints = {}    # name -> {'requests', 'errors', 'samples'}
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            stats = self._endpoints.setdefault(name, {'requests': 0, 'errors': 0,
+                                                      'samples': deque(maxlen=SAMPLE_SIZE)})
+            stats['requests'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['samples'].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            endpoints = {}
+            for name, stats in sorted(self._endpoints.items()):
+                ordered = sorted(stats['samples'])
+                endpoints[name] = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'p50_ms': ordered[len(ordered) // 2] * 1000 if ordered else None,
+                    'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000 if ordered else None,
+                    'requests_per_sec': stats['requests'] / uptime if uptime > 0 else 0.0,
+                }
+            return {'uptime_sec': uptime, 'endpoints': endpoints}
+
+
+# --- Endpoint handlers: (session, params, query, body) -> (status, payload) ---
+
+def _require(body, *fields):
+    missing = [field for field in fields if body.get(field) in (None, '')]
+    if missing:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Missing field(s): {', '.join(missing)}")
+    return [body[field] for field in fields]
+
+
+def _integer(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{field} must be an integer.") from None
+
+
+def _date(value, field):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{field} must be a YYYY-MM-DD date.") from None
+
+
+def _objects(value, field, *item_fields):
+    """A non-empty JSON list of objects that each carry item_fields."""
+    if not isinstance(value, list) or not value or not all(isinstance(item, dict) for item in value):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{field} must be a non-empty list of objects.")
+    for index, item in enumerate(value):
+        missing = [name for name in item_fields if item.get(name) in (None, '')]
+        if missing:
+            raise RequestError(HTTPStatus.BAD_REQUEST,
+                               f"{field}[{index}] is missing field(s): {', '.join(missing)}")
+    return value
+
+
+def create_product(session, params, query, body):
+    product_id, name, category_id, sbs = _require(body, 'product_id', 'name', 'category_id', 'standard_batch_size')
+    operations.create_product_type(session['id'], product_id, name, category_id,
+                                   _integer(sbs, 'standard_batch_size'))
+    return HTTPStatus.CREATED, {'product_id': product_id}
+
+
+def create_recipe(session, params, query, body):
+    product_id, name, ingredients = _require(body, 'product_id', 'name', 'ingredients')
+    _objects(ingredients, 'ingredients', 'ingredient_id', 'quantity')
+    recipe_id = operations.create_recipe(session['id'], product_id, name, ingredients)
+    return HTTPStatus.CREATED, {'recipe_id': recipe_id}
+
+
+def create_batch(session, params, query, body):
+    product_id, quantity, batch_id, expiration_date = _require(
+        body, 'product_id', 'produced_quantity', 'manufacturer_batch_id', 'expiration_date')
+    lot_number = operations.create_product_batch(session['id'], product_id, _integer(quantity, 'produced_quantity'),
+                                                 batch_id, expiration_date, reserve=bool(body.get('reserve', True)))
+    return HTTPStatus.CREATED, {'lot_number': lot_number}
+
+
+def plan_batch(session, params, query, body):
+    product_id, produced_quantity = _require(body, 'product_id', 'produced_quantity')
+    plan = operations.plan_product_batch(session['id'], product_id, _integer(produced_quantity, 'produced_quantity'))
+    return HTTPStatus.OK, plan
+
+
+def run_report(session, params, query, body):
+    lots = [lot.strip() for value in query.get('lots', []) for lot in value.split(',') if lot.strip()]
+    options = {}
+    if query.get('as_of'):
+        options['as_of'] = _date(query['as_of'][0], 'as_of')
+    if query.get('days'):
+        options['horizon_days'] = _integer(query['days'][0], 'days')
+    if query.get('archive', [''])[0] in ('1', 'true'):
+        options['include_archive'] = True
+    if query.get('product'):
+        options['product_id'] = query['product'][0]
+    if query.get('supplier'):
+        options['supplier_id'] = query['supplier'][0]
+    rows = operations.run_report(params['report_id'], manufacturer_id=session['id'], product_lots=lots or None,
+                                 **options)
+    return HTTPStatus.OK, {'report': params['report_id'], 'rows': rows}
+
+
+def create_formulation(session, params, query, body):
+    ingredient_id, pack_size, unit_price, valid_from = _require(
+        body, 'ingredient_id', 'pack_size', 'unit_price', 'valid_from_date')
+    formulation_id = operations.create_formulation(session['id'], ingredient_id, pack_size, unit_price,
+                                                   valid_from, body.get('valid_to_date'))
+    return HTTPStatus.CREATED, {'formulation_id': formulation_id}
+
+
+def define_materials(session, params, query, body):
+    materials, = _require(body, 'materials')
+    _objects(materials, 'materials', 'ingredient_id', 'quantity')
+    operations.define_formulation_materials(session['id'], int(params['formulation_id']), materials)
+    return HTTPStatus.CREATED, {'formulation_id': int(params['formulation_id']), 'materials': len(materials)}
+
+
+def intake_lots(session, params, query, body):
+    if 'lots' in body:
+        rejections, summary = operations.intake_lots(session['id'], _objects(body['lots'], 'lots'))
+        return HTTPStatus.OK, {'summary': summary, 'rejections': rejections}
+    return HTTPStatus.CREATED, {'lot_number': operations.intake_lot(session['id'], body)}
+
+
+def browse_products(session, params, query, body):
+    return HTTPStatus.OK, {'products': operations.browse_products()}
+
+
+def ingredient_list(session, params, query, body):
+    return HTTPStatus.OK, {'product_id': params['product_id'],
+                           'ingredients': operations.ingredient_list(params['product_id'])}
+
+
+# (method, path pattern, required role or None for any logged-in user, handler)
+ROUTES = [
+    ('POST', r'/manufacturer/products', 'Manufacturer', create_product),
+    ('POST', r'/manufacturer/recipes', 'Manufacturer', create_recipe),
+    ('POST', r'/manufacturer/batches', 'Manufacturer', create_batch),
+    ('POST', r'/manufacturer/batches/plan', 'Manufacturer', plan_batch),
+    ('GET', r'/manufacturer/reports/(?P<report_id>[1-7])', 'Manufacturer', run_report),
+    ('POST', r'/supplier/formulations', 'Supplier', create_formulation),
+    ('POST', r'/supplier/formulations/(?P<formulation_id>\d+)/materials', 'Supplier', define_materials),
+    ('POST', r'/supplier/lots', 'Supplier', intake_lots),
+    ('GET', r'/products', None, browse_products),
+    ('GET', r'/products/(?P<product_id>[^/]+)/ingredients', None, ingredient_list),
+]
+# Metrics are keyed by "METHOD /path/<param>"
+_COMPILED_ROUTES = [(method, re.compile(pattern + '$'), re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', pattern),
+                     role, handler)
+                    for method, pattern, role, handler in ROUTES]
+
+
+# --- HTTP plumbing ---
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = 'MealManufacturer/1.0'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        pass  # per-request logging is replaced by /metrics
+
+    def _send(self, status, payload, headers=()):
+        body = json.dumps(payload, default=json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authenticate(self):
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Basic '):
+            return None
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode('utf-8').partition(':')
+        except (ValueError, UnicodeDecodeError):
+            return None
+        key = hashlib.sha256(f"{username}\0{password}".encode('utf-8')).hexdigest()
+        return self.server.auth_cache.get_or_load('login', key,
+                                                  lambda: operations.authenticate(username, password))
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Request body must be JSON.")
+        if not isinstance(body, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+        return body
+
+    def _dispatch(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path in ('/metrics', '/metrics/queries') and method != 'GET':
+            self._send(HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} not allowed on {url.path}"},
+                       [('Allow', 'GET')])
+            return
+        if url.path == '/metrics':
+            self._send(HTTPStatus.OK, self.server.metrics.snapshot())
+            return
+        if url.path == '/metrics/queries':
+            self._send(HTTPStatus.OK, {'enabled': instrumentation.enabled(),
+                                       'queries': instrumentation.snapshot()})
+            return
+
+        allowed = []
+        for route_method, regex, name, role, handler in _COMPILED_ROUTES:
+            match = regex.match(url.path)
+            if match and route_method == method:
+                break
+            if match:
+                allowed.append(route_method)
+        else:
+            if allowed:
+                self._send(HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} not allowed on {url.path}"},
+                           [('Allow', ', '.join(allowed))])
+            else:
+                self._send(HTTPStatus.NOT_FOUND, {'error': f"No endpoint {method} {url.path}"})
+            return
+
+        endpoint = f"{method} {name}"
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+        if not self.server.slots.acquire(blocking=False):
+            status = HTTPStatus.SERVICE_UNAVAILABLE
+            self._send(status, {'error': "Server busy; try again later."}, [('Retry-After', '1')])
+            self.server.metrics.record(endpoint, time.perf_counter() - start, ok=False)
+            return
+        try:
+            session = self._authenticate()
+            if session is None:
+                raise RequestError(HTTPStatus.UNAUTHORIZED, "Valid AppUser credentials required.")
+            if role is not None and session['role'] != role:
+                raise RequestError(HTTPStatus.FORBIDDEN, f"This endpoint requires the {role} role.")
+            status, payload = handler(session, match.groupdict(), parse_qs(url.query), self._read_body())
+            self._send(status, payload)
+        except RequestError as err:
+            status = err.status
+            headers = [('WWW-Authenticate', 'Basic realm="Meal Manufacturer"')] \
+                if status == HTTPStatus.UNAUTHORIZED else ()
+            self._send(status, {'error': str(err)}, headers)
+        except OperationError as err:
+            status = HTTPStatus.BAD_REQUEST
+            self._send(status, {'error': str(err)})
+        except mysql.connector.Error as err:
+            # Trigger/procedure SIGNALs and constraint violations are the caller's fault
+            client_error = err.sqlstate == '45000' or isinstance(err, (mysql.connector.IntegrityError,
+                                                                        mysql.connector.DataError))
+            status = HTTPStatus.BAD_REQUEST if client_error else HTTPStatus.INTERNAL_SERVER_ERROR
+            if not client_error:
+                logger.exception("%s failed", endpoint)
+            self._send(status, {'error': err.msg})
+        except Exception:
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            logger.exception("%s failed", endpoint)
+            self._send(status, {'error': "Internal server error."})
+        finally:
+            self.server.slots.release()
+            self.server.metrics.record(endpoint, time.perf_counter() - start, ok=status < 400)
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, max_pending=DEFAULT_MAX_PENDING):
+        super().__init__(address, ServiceHandler)
+        self.metrics = EndpointMetrics()
+        self.auth_cache = RefCache(ttl=AUTH_CACHE_TTL)
+        self.slots = threading.BoundedSemaphore(get_pool().pool_size + max_pending)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, max_pending=DEFAULT_MAX_PENDING):
+    """Run the service until interrupted (the connection pool must be initialised)."""
+    server = ServiceServer((host, port), max_pending)
+    print(f"Serving on http://{host}:{port} (GET /metrics for latency counters; Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
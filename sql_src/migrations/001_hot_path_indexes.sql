@@ -0,0 +1,62 @@
+-- =====================================================================
+-- MIGRATION 001: Covering indexes for the hot query paths
+-- Apply once on an existing database (re-running it is harmless: an index
+-- that already exists is skipped):
+--   mysql -u root -p Meal_Manufacturer < sql_src/migrations/001_hot_path_indexes.sql
+-- The same set is declared in indexes.py (HOT_PATH_INDEXES), which can also
+-- create any missing index and verify via EXPLAIN that the queries use them.
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+-- MySQL has no CREATE INDEX IF NOT EXISTS; this helper only lives for the
+-- length of the migration.
+DROP PROCEDURE IF EXISTS Create_Index_If_Missing;
+
+DELIMITER //
+CREATE PROCEDURE Create_Index_If_Missing(
+    IN p_table VARCHAR(64),
+    IN p_index VARCHAR(64),
+    IN p_columns VARCHAR(255)
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE table_schema = DATABASE()
+          AND table_name = p_table
+          AND index_name = p_index
+    ) THEN
+        SET @meal_index_ddl = CONCAT('CREATE INDEX ', p_index, ' ON ', p_table, ' (', p_columns, ')');
+        PREPARE stmt FROM @meal_index_ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END;
+//
+DELIMITER ;
+
+-- FEFO: ingredient_id = ? AND quantity_on_hand > 0 AND expiration_date > CURDATE()
+--       ORDER BY expiration_date, lot_number
+-- lot_number is listed explicitly so the ORDER BY is served by the index,
+-- and quantity_on_hand makes it covering.
+CALL Create_Index_If_Missing('IngredientBatch', 'idx_ib_fefo',
+    'ingredient_id, expiration_date, lot_number, quantity_on_hand');
+
+-- Formulation validity-range lookups (lot intake authorization,
+-- Evaluate_Health_Risk flattening, generate_ingredient_list).
+CALL Create_Index_If_Missing('Formulation', 'idx_formulation_validity',
+    'ingredient_id, supplier_id, valid_from_date, valid_to_date');
+
+-- Consumption by ingredient lot (recall tracing, supplier reports).
+CALL Create_Index_If_Missing('BatchConsumption', 'idx_bc_ingredient_lot',
+    'ingredient_lot_number, product_lot_number, quantity_consumed');
+
+-- "Latest batch of product X by manufacturer Y" (report 1).
+CALL Create_Index_If_Missing('ProductBatch', 'idx_pb_product_date',
+    'product_id, manufacturer_id, production_date');
+
+-- Active recipe lookup (create_product_batch, generate_ingredient_list).
+CALL Create_Index_If_Missing('Recipe', 'idx_recipe_active',
+    'product_id, is_active');
+
+DROP PROCEDURE Create_Index_If_Missing;
@@ -0,0 +1,24 @@
+-- =====================================================================
+-- MIGRATION 002: Materialized flattened recipes
+-- Cache of the fully flattened (atomic-only) BOM of a recipe as of a date.
+-- Filled on demand by Flatten_Recipe, which also drops a recipe's past
+-- days when it fills a new one, and invalidated by triggers on
+-- RecipeIngredient, Formulation and FormulationMaterials
+-- (see sql_src/procedures_triggers.sql).
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS FlattenedRecipe (
+    recipe_id INT NOT NULL,
+    -- Formulations are resolved as of this date
+    effective_date DATE NOT NULL,
+    -- Always an ATOMIC ingredient after flattening
+    ingredient_id VARCHAR(20) NOT NULL,
+    -- Quantity per produced unit (recipe quantity x material quantities)
+    quantity DECIMAL(20, 6) NOT NULL,
+
+    PRIMARY KEY (recipe_id, effective_date, ingredient_id),
+    FOREIGN KEY (recipe_id) REFERENCES Recipe(recipe_id),
+    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id)
+);
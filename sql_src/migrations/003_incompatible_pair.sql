@@ -0,0 +1,24 @@
+-- =====================================================================
+-- MIGRATION 003: Symmetric DoNotCombine index
+-- DoNotCombine stores each pair once (a < b). IncompatiblePair stores it in
+-- both directions so "which partners does X have?" is a single primary-key
+-- probe. It is kept in sync by triggers on DoNotCombine
+-- (see sql_src/procedures_triggers.sql).
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS IncompatiblePair (
+    ingredient_id VARCHAR(20) NOT NULL,
+    partner_id VARCHAR(20) NOT NULL,
+
+    PRIMARY KEY (ingredient_id, partner_id),
+    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id),
+    FOREIGN KEY (partner_id) REFERENCES Ingredient(ingredient_id)
+);
+
+-- Backfill from the existing rules
+INSERT IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+SELECT ingredient_a_id, ingredient_b_id FROM DoNotCombine
+UNION ALL
+SELECT ingredient_b_id, ingredient_a_id FROM DoNotCombine;
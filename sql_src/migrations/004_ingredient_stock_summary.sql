@@ -0,0 +1,31 @@
+-- =====================================================================
+-- MIGRATION 004: Per-ingredient stock summary
+-- One row per ingredient with its total quantity on hand, the earliest
+-- expiration date among lots that still have stock, and the number of such
+-- lots. Reports 6 and 7 read it instead of aggregating every IngredientBatch
+-- row. It is maintained incrementally by the IngredientBatch triggers (every
+-- consumption / adjustment reaches them through trg_maintain_on_hand_*),
+-- see sql_src/procedures_triggers.sql.
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS IngredientStockSummary (
+    ingredient_id VARCHAR(20) PRIMARY KEY,
+    total_on_hand DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    earliest_expiry DATE NULL,      -- over lots with quantity_on_hand > 0
+    lot_count INT NOT NULL DEFAULT 0,  -- lots with quantity_on_hand > 0
+
+    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id),
+    INDEX idx_stock_summary_expiry (earliest_expiry)
+);
+
+-- Backfill from the current lots
+REPLACE INTO IngredientStockSummary (ingredient_id, total_on_hand, earliest_expiry, lot_count)
+SELECT
+    ingredient_id,
+    SUM(quantity_on_hand),
+    MIN(CASE WHEN quantity_on_hand > 0 THEN expiration_date END),
+    SUM(quantity_on_hand > 0)
+FROM IngredientBatch
+GROUP BY ingredient_id;
@@ -0,0 +1,78 @@
+-- =====================================================================
+-- MIGRATION 006: Hot / archive split for historical lots and batches
+-- MySQL cannot range-partition InnoDB tables that have or are referenced
+-- by foreign keys, and IngredientBatch / ProductBatch / BatchConsumption
+-- are linked by FKs. Cold rows are instead moved to *Archive tables (same
+-- columns, no FKs) by archive.py, in short chunked transactions.
+-- The All* views union hot and archived rows for queries that explicitly
+-- ask for history (genealogy traces, report 4 with include_archive).
+-- Archived lot numbers cannot be reused: the lot-number triggers in
+-- sql_src/procedures_triggers.sql reject them, so every lot_number appears
+-- once across hot and archive tables.
+-- =====================================================================
+
+USE Meal_Manufacturer;
+
+CREATE TABLE IF NOT EXISTS IngredientBatchArchive (
+    lot_number VARCHAR(255) PRIMARY KEY,
+    ingredient_id VARCHAR(20) NOT NULL,
+    supplier_id VARCHAR(20) NOT NULL,
+    supplier_batch_id VARCHAR(100) NOT NULL,
+    quantity_on_hand DECIMAL(10, 2) NOT NULL,
+    per_unit_cost DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    intake_date DATE NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_iba_ingredient (ingredient_id, expiration_date)
+);
+
+CREATE TABLE IF NOT EXISTS ProductBatchArchive (
+    lot_number VARCHAR(255) PRIMARY KEY,
+    product_id VARCHAR(20) NOT NULL,
+    manufacturer_id VARCHAR(20) NOT NULL,
+    manufacturer_batch_id VARCHAR(100) NOT NULL,
+    produced_quantity INT NOT NULL,
+    expiration_date DATE NOT NULL,
+    production_date DATETIME NOT NULL,
+    total_batch_cost DECIMAL(10, 2),
+    recipe_id_used INT NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_pba_product_date (product_id, manufacturer_id, production_date)
+);
+
+CREATE TABLE IF NOT EXISTS BatchConsumptionArchive (
+    product_lot_number VARCHAR(255) NOT NULL,
+    ingredient_lot_number VARCHAR(255) NOT NULL,
+    quantity_consumed DECIMAL(10, 2) NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (product_lot_number, ingredient_lot_number),
+    INDEX idx_bca_ingredient_lot (ingredient_lot_number, product_lot_number, quantity_consumed)
+);
+
+CREATE OR REPLACE VIEW AllIngredientBatch AS
+    SELECT lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand,
+           per_unit_cost, expiration_date, intake_date, 0 AS archived
+    FROM IngredientBatch
+    UNION ALL
+    SELECT lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand,
+           per_unit_cost, expiration_date, intake_date, 1 AS archived
+    FROM IngredientBatchArchive;
+
+CREATE OR REPLACE VIEW AllProductBatch AS
+    SELECT lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+           expiration_date, production_date, total_batch_cost, recipe_id_used, 0 AS archived
+    FROM ProductBatch
+    UNION ALL
+    SELECT lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+           expiration_date, production_date, total_batch_cost, recipe_id_used, 1 AS archived
+    FROM ProductBatchArchive;
+
+CREATE OR REPLACE VIEW AllBatchConsumption AS
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed, 0 AS archived
+    FROM BatchConsumption
+    UNION ALL
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed, 1 AS archived
+    FROM BatchConsumptionArchive;
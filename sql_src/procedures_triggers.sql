@@ -27,11 +27,16 @@ BEGIN
     '-', 
     NEW.supplier_batch_id
   );
+  -- Archived lot numbers stay taken (migration 006, archive.py)
+  IF EXISTS (SELECT 1 FROM IngredientBatchArchive WHERE lot_number = NEW.lot_number) THEN
+    SIGNAL SQLSTATE '45000'
+      SET MESSAGE_TEXT = 'ERROR: Lot number already used by an archived lot.';
+  END IF;
 END;
 //
 
 DROP TRIGGER IF EXISTS trg_compute_product_lot_number;
-
+//
 CREATE TRIGGER trg_compute_product_lot_number
 BEFORE INSERT ON ProductBatch
 FOR EACH ROW
@@ -43,7 +48,13 @@ BEGIN
     '-', 
     NEW.manufacturer_batch_id
   );
+  -- Archived lot numbers stay taken (migration 006, archive.py)
+  IF EXISTS (SELECT 1 FROM ProductBatchArchive WHERE lot_number = NEW.lot_number) THEN
+    SIGNAL SQLSTATE '45000'
+      SET MESSAGE_TEXT = 'ERROR: Lot number already used by an archived batch.';
+  END IF;
 END;
+//
 
 -- ============================================
 -- MASTER CONSUMPTION VALIDATION TRIGGER (UPDATED)
@@ -51,6 +62,7 @@ END;
 
 -- Drop the old trigger
 DROP TRIGGER IF EXISTS trg_prevent_expired_consumption;
+//
 -- Drop the new trigger if it exists
 DROP TRIGGER IF EXISTS trg_validate_consumption;
 //
@@ -111,6 +123,8 @@ END;
 -- Trigger 2: "Adjustment"
 -- This trigger fires *after* a consumption record is deleted
 -- and ADDS the quantity *back* to the ingredient batch.
+-- archive.py sets @meal_archiving while it moves consumption rows to
+-- BatchConsumptionArchive; that is not a reversal, so stock is unchanged.
 -- ---------------------------------------------------------------------
 DROP TRIGGER IF EXISTS trg_maintain_on_hand_ADJUST;
 //
@@ -118,183 +132,653 @@ CREATE TRIGGER trg_maintain_on_hand_ADJUST
 AFTER DELETE ON BatchConsumption
 FOR EACH ROW
 BEGIN
-    UPDATE IngredientBatch
-    SET quantity_on_hand = quantity_on_hand + OLD.quantity_consumed
-    WHERE lot_number = OLD.ingredient_lot_number;
+    IF @meal_archiving IS NULL THEN
+        UPDATE IngredientBatch
+        SET quantity_on_hand = quantity_on_hand + OLD.quantity_consumed
+        WHERE lot_number = OLD.ingredient_lot_number;
+    END IF;
 END;
 //
 
+-- ============================================
+-- INGREDIENT STOCK SUMMARY (migration 004)
+-- Keeps IngredientStockSummary in step with IngredientBatch. The
+-- consumption triggers above update IngredientBatch, so they reach these
+-- triggers too. A lot counts as "in stock" while quantity_on_hand > 0.
+-- ============================================
+
 -- ---------------------------------------------------------------------
--- Procedure: Evaluate Health Risk
--- Flattens consumption list and validates against DoNotCombine table
+-- Procedure: Apply Stock Delta
+-- Adds p_qty_delta / p_lot_delta to one ingredient's summary row.
+-- p_added_expiry: expiration date of a lot that is (now) in stock.
+-- p_removed_expiry: expiration date of a lot that left the stock; only when
+-- it was the earliest is the minimum re-read (one idx_ib_fefo range probe).
 -- ---------------------------------------------------------------------
-DROP PROCEDURE IF EXISTS Evaluate_Health_Risk;
+DROP PROCEDURE IF EXISTS Apply_Stock_Delta;
 //
-CREATE PROCEDURE Evaluate_Health_Risk(
-    IN p_consumption_list JSON
+CREATE PROCEDURE Apply_Stock_Delta(
+    IN p_ingredient_id VARCHAR(20),
+    IN p_qty_delta DECIMAL(14, 2),
+    IN p_lot_delta INT,
+    IN p_added_expiry DATE,
+    IN p_removed_expiry DATE
 )
 BEGIN
-    DECLARE v_conflict_count INT DEFAULT 0;
+    INSERT INTO IngredientStockSummary (ingredient_id, total_on_hand, earliest_expiry, lot_count)
+    VALUES (p_ingredient_id, p_qty_delta, p_added_expiry, GREATEST(p_lot_delta, 0))
+    ON DUPLICATE KEY UPDATE
+        total_on_hand = total_on_hand + p_qty_delta,
+        lot_count = lot_count + p_lot_delta,
+        earliest_expiry = CASE
+            WHEN p_added_expiry IS NULL THEN earliest_expiry
+            WHEN earliest_expiry IS NULL THEN p_added_expiry
+            ELSE LEAST(earliest_expiry, p_added_expiry)
+        END;
+
+    IF p_removed_expiry IS NOT NULL THEN
+        UPDATE IngredientStockSummary
+        SET earliest_expiry = (
+            SELECT MIN(expiration_date)
+            FROM IngredientBatch
+            WHERE ingredient_id = p_ingredient_id
+              AND quantity_on_hand > 0
+        )
+        WHERE ingredient_id = p_ingredient_id
+          AND earliest_expiry >= p_removed_expiry;
+    END IF;
+END;
+//
 
-    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Flattened_Atomics (
-        ingredient_id VARCHAR(20) PRIMARY KEY
-    );
-    TRUNCATE TABLE Temp_Flattened_Atomics;
+DROP TRIGGER IF EXISTS trg_stock_summary_insert;
+//
+CREATE TRIGGER trg_stock_summary_insert
+AFTER INSERT ON IngredientBatch
+FOR EACH ROW
+BEGIN
+    CALL Apply_Stock_Delta(NEW.ingredient_id, NEW.quantity_on_hand, NEW.quantity_on_hand > 0,
+        IF(NEW.quantity_on_hand > 0, NEW.expiration_date, NULL), NULL);
+END;
+//
 
-    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Affected_Lots (
-        lot_number VARCHAR(255) PRIMARY KEY
-    );
-    TRUNCATE TABLE Temp_Affected_Lots;
+DROP TRIGGER IF EXISTS trg_stock_summary_update;
+//
+CREATE TRIGGER trg_stock_summary_update
+AFTER UPDATE ON IngredientBatch
+FOR EACH ROW
+BEGIN
+    IF NEW.ingredient_id = OLD.ingredient_id THEN
+        IF NEW.quantity_on_hand <> OLD.quantity_on_hand OR NEW.expiration_date <> OLD.expiration_date THEN
+            CALL Apply_Stock_Delta(NEW.ingredient_id,
+                NEW.quantity_on_hand - OLD.quantity_on_hand,
+                (NEW.quantity_on_hand > 0) - (OLD.quantity_on_hand > 0),
+                IF(NEW.quantity_on_hand > 0, NEW.expiration_date, NULL),
+                IF(OLD.quantity_on_hand > 0
+                   AND (NEW.quantity_on_hand <= 0 OR NEW.expiration_date <> OLD.expiration_date),
+                   OLD.expiration_date, NULL));
+        END IF;
+    ELSE
+        CALL Apply_Stock_Delta(OLD.ingredient_id, -OLD.quantity_on_hand, -(OLD.quantity_on_hand > 0),
+            NULL, IF(OLD.quantity_on_hand > 0, OLD.expiration_date, NULL));
+        CALL Apply_Stock_Delta(NEW.ingredient_id, NEW.quantity_on_hand, NEW.quantity_on_hand > 0,
+            IF(NEW.quantity_on_hand > 0, NEW.expiration_date, NULL), NULL);
+    END IF;
+END;
+//
 
-    CREATE TEMPORARY TABLE IF NOT EXISTS Temp_Flattened_Atomics_2 (
-        ingredient_id VARCHAR(20) PRIMARY KEY
-    );
-    TRUNCATE TABLE Temp_Flattened_Atomics_2;
+DROP TRIGGER IF EXISTS trg_stock_summary_delete;
+//
+CREATE TRIGGER trg_stock_summary_delete
+AFTER DELETE ON IngredientBatch
+FOR EACH ROW
+BEGIN
+    CALL Apply_Stock_Delta(OLD.ingredient_id, -OLD.quantity_on_hand, -(OLD.quantity_on_hand > 0),
+        NULL, IF(OLD.quantity_on_hand > 0, OLD.expiration_date, NULL));
+END;
+//
 
-    -- Get all lots from the JSON
-    INSERT INTO Temp_Affected_Lots (lot_number)
-    SELECT lot FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
-        lot VARCHAR(255) PATH '$.lot'
-    )) AS jt;
+-- ============================================
+-- FLATTENED RECIPE CACHE (migration 002)
+-- ============================================
 
-    -- 3. Get all ATOMIC ingredients from those lots and add them to our list
-    INSERT IGNORE INTO Temp_Flattened_Atomics (ingredient_id)
-    SELECT
-        ib.ingredient_id
-    FROM
-        IngredientBatch ib
-    JOIN
-        Temp_Affected_Lots al ON ib.lot_number = al.lot_number
-    JOIN
-        Ingredient i ON ib.ingredient_id = i.ingredient_id
-    WHERE
-        i.ingredient_type = 'ATOMIC';
+-- ---------------------------------------------------------------------
+-- Procedure: Flatten Recipe
+-- Returns the atomic ingredients of a recipe (per produced unit) as of
+-- p_effective_date (NULL = today). Compound ingredients are expanded
+-- through their active Formulation at any nesting depth with a recursive
+-- CTE; the result is cached in FlattenedRecipe. Filling a day drops the
+-- recipe's cached days before today (other than the one requested), so
+-- the cache keeps at most one past day per recipe.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Flatten_Recipe;
+//
+CREATE PROCEDURE Flatten_Recipe(
+    IN p_recipe_id INT,
+    IN p_effective_date DATE
+)
+BEGIN
+    DECLARE v_effective_date DATE DEFAULT COALESCE(p_effective_date, CURDATE());
+
+    IF NOT EXISTS (
+        SELECT 1 FROM FlattenedRecipe
+        WHERE recipe_id = p_recipe_id AND effective_date = v_effective_date
+    ) THEN
+        DELETE FROM FlattenedRecipe
+        WHERE recipe_id = p_recipe_id
+          AND effective_date < CURDATE()
+          AND effective_date <> v_effective_date;
+
+        -- IGNORE: another session may have cached the same key concurrently
+        INSERT IGNORE INTO FlattenedRecipe (recipe_id, effective_date, ingredient_id, quantity)
+        WITH RECURSIVE bom (ingredient_id, ingredient_type, quantity, depth) AS (
+            SELECT
+                ri.ingredient_id,
+                i.ingredient_type,
+                CAST(ri.quantity AS DECIMAL(20, 6)),
+                0
+            FROM RecipeIngredient ri
+            JOIN Ingredient i ON i.ingredient_id = ri.ingredient_id
+            WHERE ri.recipe_id = p_recipe_id
+
+            UNION ALL
+
+            -- Expand every COMPOUND through the formulation active on the date
+            SELECT
+                fm.material_ingredient_id,
+                mi.ingredient_type,
+                b.quantity * fm.quantity,
+                b.depth + 1
+            FROM bom b
+            JOIN Formulation f
+              ON f.ingredient_id = b.ingredient_id
+             AND v_effective_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+            JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+            JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+            WHERE b.ingredient_type = 'COMPOUND'
+              AND b.depth < 10  -- guards against accidental cycles
+        )
+        SELECT p_recipe_id, v_effective_date, ingredient_id, SUM(quantity)
+        FROM bom
+        WHERE ingredient_type = 'ATOMIC'
+        GROUP BY ingredient_id;
+    END IF;
 
-    -- 4. Get all materials from all COMPOUND ingredients and add them (the "flattening")
-    INSERT IGNORE INTO Temp_Flattened_Atomics (ingredient_id)
     SELECT
-        fm.material_ingredient_id
-    FROM
-        IngredientBatch ib
-    JOIN
-        Temp_Affected_Lots al ON ib.lot_number = al.lot_number
-    JOIN
-        Ingredient i ON ib.ingredient_id = i.ingredient_id
-    -- Find the *active* formulation for this batch (based on intake date)
-    JOIN
-        Formulation f ON f.ingredient_id = ib.ingredient_id
-        AND f.supplier_id = ib.supplier_id
-        AND ib.intake_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
-    -- Find the materials for that formulation
-    JOIN
-        FormulationMaterials fm ON fm.formulation_id = f.formulation_id
-    WHERE
-        i.ingredient_type = 'COMPOUND';
+        fr.ingredient_id,
+        i.name,
+        fr.quantity
+    FROM FlattenedRecipe fr
+    JOIN Ingredient i ON i.ingredient_id = fr.ingredient_id
+    WHERE fr.recipe_id = p_recipe_id
+      AND fr.effective_date = v_effective_date
+    ORDER BY fr.quantity DESC, i.name;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Invalidate Flattened Recipes (by ingredient)
+-- Drops the cached flattening of every recipe that uses p_ingredient_id,
+-- directly or nested inside a compound at any depth.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Invalidate_Flattened_Recipes;
+//
+CREATE PROCEDURE Invalidate_Flattened_Recipes(
+    IN p_ingredient_id VARCHAR(20)
+)
+BEGIN
+    DELETE FROM FlattenedRecipe
+    WHERE recipe_id IN (
+        SELECT recipe_id FROM (
+            WITH RECURSIVE affected (ingredient_id) AS (
+                SELECT CAST(p_ingredient_id AS CHAR(20))
+                UNION
+                -- every compound whose formulation contains an affected ingredient
+                SELECT f.ingredient_id
+                FROM affected a
+                JOIN FormulationMaterials fm ON fm.material_ingredient_id = a.ingredient_id
+                JOIN Formulation f ON f.formulation_id = fm.formulation_id
+            )
+            SELECT DISTINCT ri.recipe_id
+            FROM RecipeIngredient ri
+            JOIN affected a ON a.ingredient_id = ri.ingredient_id
+        ) AS affected_recipes
+    );
+END;
+//
 
-    -- =================================================================
-    -- FIX FOR ERROR 1137: Copy data from t1 into t2
-    -- =================================================================
-    INSERT INTO Temp_Flattened_Atomics_2 (ingredient_id)
-    SELECT ingredient_id FROM Temp_Flattened_Atomics;
+DROP TRIGGER IF EXISTS trg_flattened_recipe_ri_insert;
+//
+CREATE TRIGGER trg_flattened_recipe_ri_insert
+AFTER INSERT ON RecipeIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id = NEW.recipe_id;
+END;
+//
 
+DROP TRIGGER IF EXISTS trg_flattened_recipe_ri_update;
+//
+CREATE TRIGGER trg_flattened_recipe_ri_update
+AFTER UPDATE ON RecipeIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+//
 
-    -- 5. Check for conflicts
-    -- We self-join our list of atomics against the DoNotCombine table
-    SELECT COUNT(*)
-    INTO v_conflict_count
-    FROM
-        Temp_Flattened_Atomics AS t1
-    JOIN
-        DoNotCombine AS dnc ON t1.ingredient_id = dnc.ingredient_a_id
-    -- =================================================================
-    -- FIX FOR ERROR 1137: Join against the *second* temp table
-    -- =================================================================
-    JOIN
-        Temp_Flattened_Atomics_2 AS t2 ON dnc.ingredient_b_id = t2.ingredient_id;
-    
-    SET v_conflict_count = v_conflict_count + (
-        SELECT COUNT(*)
-        FROM
-            Temp_Flattened_Atomics AS t1
-        JOIN
-            DoNotCombine AS dnc ON t1.ingredient_id = dnc.ingredient_b_id
-        JOIN
-            Temp_Flattened_Atomics_2 AS t2 ON dnc.ingredient_a_id = t2.ingredient_id
-    );
+DROP TRIGGER IF EXISTS trg_flattened_recipe_ri_delete;
+//
+CREATE TRIGGER trg_flattened_recipe_ri_delete
+AFTER DELETE ON RecipeIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id = OLD.recipe_id;
+END;
+//
 
-    -- 6. Block or Allow
-    IF v_conflict_count > 0 THEN
+DROP TRIGGER IF EXISTS trg_flattened_recipe_formulation_insert;
+//
+CREATE TRIGGER trg_flattened_recipe_formulation_insert
+AFTER INSERT ON Formulation
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(NEW.ingredient_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_formulation_update;
+//
+CREATE TRIGGER trg_flattened_recipe_formulation_update
+AFTER UPDATE ON Formulation
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(OLD.ingredient_id);
+    CALL Invalidate_Flattened_Recipes(NEW.ingredient_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_formulation_delete;
+//
+CREATE TRIGGER trg_flattened_recipe_formulation_delete
+AFTER DELETE ON Formulation
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(OLD.ingredient_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_fm_insert;
+//
+CREATE TRIGGER trg_flattened_recipe_fm_insert
+AFTER INSERT ON FormulationMaterials
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = NEW.formulation_id));
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_fm_update;
+//
+CREATE TRIGGER trg_flattened_recipe_fm_update
+AFTER UPDATE ON FormulationMaterials
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = OLD.formulation_id));
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = NEW.formulation_id));
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_flattened_recipe_fm_delete;
+//
+CREATE TRIGGER trg_flattened_recipe_fm_delete
+AFTER DELETE ON FormulationMaterials
+FOR EACH ROW
+BEGIN
+    CALL Invalidate_Flattened_Recipes(
+        (SELECT ingredient_id FROM Formulation WHERE formulation_id = OLD.formulation_id));
+END;
+//
+
+-- ============================================
+-- INCOMPATIBLE PAIR SYNC (migration 003)
+-- Mirrors every DoNotCombine row into IncompatiblePair in both directions.
+-- ============================================
+
+DROP TRIGGER IF EXISTS trg_incompatible_pair_insert;
+//
+CREATE TRIGGER trg_incompatible_pair_insert
+AFTER INSERT ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+    VALUES (NEW.ingredient_a_id, NEW.ingredient_b_id),
+           (NEW.ingredient_b_id, NEW.ingredient_a_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_incompatible_pair_update;
+//
+CREATE TRIGGER trg_incompatible_pair_update
+AFTER UPDATE ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM IncompatiblePair
+    WHERE (ingredient_id = OLD.ingredient_a_id AND partner_id = OLD.ingredient_b_id)
+       OR (ingredient_id = OLD.ingredient_b_id AND partner_id = OLD.ingredient_a_id);
+
+    INSERT IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+    VALUES (NEW.ingredient_a_id, NEW.ingredient_b_id),
+           (NEW.ingredient_b_id, NEW.ingredient_a_id);
+END;
+//
+
+DROP TRIGGER IF EXISTS trg_incompatible_pair_delete;
+//
+CREATE TRIGGER trg_incompatible_pair_delete
+AFTER DELETE ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM IncompatiblePair
+    WHERE (ingredient_id = OLD.ingredient_a_id AND partner_id = OLD.ingredient_b_id)
+       OR (ingredient_id = OLD.ingredient_b_id AND partner_id = OLD.ingredient_a_id);
+END;
+//
+
+-- ============================================
+-- STAGED CONSUMPTION
+-- The consumption plan lives in ConsumptionStage, a TEMPORARY table of the
+-- session, while a batch is checked and posted. Posters never share stage
+-- rows, index ranges or locks. Open_Consumption_Stage creates the table
+-- before the posting transaction starts. CREATE TEMPORARY TABLE does not
+-- commit implicitly, and the pool's session reset drops the table again.
+-- Python stages a plan with one multi-row INSERT. The JSON procedures stage
+-- it with a single JSON_TABLE pass and then run the same staged logic.
+-- ============================================
+
+-- ---------------------------------------------------------------------
+-- Procedure: Open Consumption Stage
+-- Creates this session's stage table if it does not exist yet.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Open_Consumption_Stage;
+//
+CREATE PROCEDURE Open_Consumption_Stage()
+BEGIN
+    CREATE TEMPORARY TABLE IF NOT EXISTS ConsumptionStage (
+        lot_number VARCHAR(255) NOT NULL PRIMARY KEY,
+        qty DECIMAL(10, 2) NOT NULL
+    ) ENGINE = InnoDB;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Stage Consumption List
+-- Replaces this session's staged plan with the JSON list
+-- [{"lot": ..., "qty": ...}] (duplicate lots are summed).
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Stage_Consumption_List;
+//
+CREATE PROCEDURE Stage_Consumption_List(
+    IN p_consumption_list JSON
+)
+BEGIN
+    CALL Open_Consumption_Stage();
+    DELETE FROM ConsumptionStage;
+
+    INSERT INTO ConsumptionStage (lot_number, qty)
+    SELECT jt.lot, SUM(COALESCE(jt.qty, 0))
+    FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
+        lot VARCHAR(255) PATH '$.lot',
+        qty DECIMAL(10, 2) PATH '$.qty'
+    )) AS jt
+    GROUP BY jt.lot;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Evaluate Staged Health Risk
+-- Flattens the staged lots to their atomic ingredients and probes
+-- IncompatiblePair once per ingredient. No temporary tables, so nothing
+-- DDL-like runs inside the posting transaction.
+-- Compound lots resolve through their own supplier's formulation as of the
+-- lot's intake date; nested compounds through any formulation active then.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Evaluate_Staged_Health_Risk;
+//
+CREATE PROCEDURE Evaluate_Staged_Health_Risk()
+BEGIN
+    DECLARE v_conflict VARCHAR(64) DEFAULT NULL;
+    DECLARE v_message VARCHAR(255);
+
+    WITH RECURSIVE atoms (ingredient_id, ingredient_type, supplier_id, as_of_date, depth) AS (
+        SELECT
+            ib.ingredient_id,
+            i.ingredient_type,
+            ib.supplier_id,
+            ib.intake_date,
+            0
+        FROM ConsumptionStage cs
+        JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+
+        UNION ALL
+
+        SELECT
+            fm.material_ingredient_id,
+            mi.ingredient_type,
+            NULL,
+            a.as_of_date,
+            a.depth + 1
+        FROM atoms a
+        JOIN Formulation f
+          ON f.ingredient_id = a.ingredient_id
+         AND (a.supplier_id IS NULL OR f.supplier_id = a.supplier_id)
+         AND a.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE a.ingredient_type = 'COMPOUND'
+          AND a.depth < 10
+    ),
+    batch_atoms AS (
+        SELECT DISTINCT ingredient_id FROM atoms WHERE ingredient_type = 'ATOMIC'
+    )
+    -- One primary-key probe per atom; each pair is reported once (a < b)
+    SELECT MIN(CONCAT(ip.ingredient_id, ' + ', ip.partner_id))
+    INTO v_conflict
+    FROM batch_atoms ba
+    JOIN IncompatiblePair ip ON ip.ingredient_id = ba.ingredient_id
+    WHERE ip.ingredient_id < ip.partner_id
+      AND ip.partner_id IN (SELECT ingredient_id FROM batch_atoms);
+
+    IF v_conflict IS NOT NULL THEN
+        SET v_message = LEFT(CONCAT(
+            'ERROR: Health risk detected! Incompatible ingredients found in batch: ', v_conflict), 128);
         SIGNAL SQLSTATE '45000'
-        SET MESSAGE_TEXT = 'ERROR: Health risk detected! Incompatible ingredients found in batch.';
+        SET MESSAGE_TEXT = v_message;
     END IF;
 
 END;
 //
 
 -- ---------------------------------------------------------------------
--- Procedure: Record Production Batch
--- Main transaction for creating a product batch and consuming ingredients
+-- Procedure: Evaluate Health Risk
+-- JSON entry point (kept for compatibility): the Evaluate_Staged_Health_Risk
+-- check over the lots of the JSON list, read with JSON_TABLE. The session's
+-- ConsumptionStage is left alone, so a plan the caller has staged survives.
 -- ---------------------------------------------------------------------
-DROP PROCEDURE IF EXISTS Record_Production_Batch;
+DROP PROCEDURE IF EXISTS Evaluate_Health_Risk;
 //
-CREATE PROCEDURE Record_Production_Batch(
+CREATE PROCEDURE Evaluate_Health_Risk(
+    IN p_consumption_list JSON
+)
+BEGIN
+    DECLARE v_conflict VARCHAR(64) DEFAULT NULL;
+    DECLARE v_message VARCHAR(255);
+
+    WITH RECURSIVE atoms (ingredient_id, ingredient_type, supplier_id, as_of_date, depth) AS (
+        SELECT
+            ib.ingredient_id,
+            i.ingredient_type,
+            ib.supplier_id,
+            ib.intake_date,
+            0
+        FROM JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
+            lot VARCHAR(255) PATH '$.lot'
+        )) AS jt
+        JOIN IngredientBatch ib ON ib.lot_number = jt.lot
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+
+        UNION ALL
+
+        SELECT
+            fm.material_ingredient_id,
+            mi.ingredient_type,
+            NULL,
+            a.as_of_date,
+            a.depth + 1
+        FROM atoms a
+        JOIN Formulation f
+          ON f.ingredient_id = a.ingredient_id
+         AND (a.supplier_id IS NULL OR f.supplier_id = a.supplier_id)
+         AND a.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE a.ingredient_type = 'COMPOUND'
+          AND a.depth < 10
+    ),
+    batch_atoms AS (
+        SELECT DISTINCT ingredient_id FROM atoms WHERE ingredient_type = 'ATOMIC'
+    )
+    SELECT MIN(CONCAT(ip.ingredient_id, ' + ', ip.partner_id))
+    INTO v_conflict
+    FROM batch_atoms ba
+    JOIN IncompatiblePair ip ON ip.ingredient_id = ba.ingredient_id
+    WHERE ip.ingredient_id < ip.partner_id
+      AND ip.partner_id IN (SELECT ingredient_id FROM batch_atoms);
+
+    IF v_conflict IS NOT NULL THEN
+        SET v_message = LEFT(CONCAT(
+            'ERROR: Health risk detected! Incompatible ingredients found in batch: ', v_conflict), 128);
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = v_message;
+    END IF;
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Post Staged Production Batch
+-- Health check, cost, ProductBatch insert and consumption insert over the
+-- staged plan, WITHOUT transaction control (callers post many batches per
+-- COMMIT, one SAVEPOINT per batch). The caller opens and fills the stage.
+-- The stage is cleared when done. On error the caller's rollback removes the
+-- staged rows with everything else, because the temporary table is InnoDB.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Post_Staged_Production_Batch;
+//
+CREATE PROCEDURE Post_Staged_Production_Batch(
     IN p_product_id VARCHAR(20),
     IN p_manufacturer_id VARCHAR(20),
     IN p_manufacturer_batch_id VARCHAR(100),
     IN p_produced_quantity INT,
     IN p_expiration_date DATE,
-    IN p_recipe_id_used INT,
-    IN p_consumption_list JSON
+    IN p_recipe_id_used INT
 )
 BEGIN
     DECLARE v_total_cost DECIMAL(10, 2) DEFAULT 0.00;
     DECLARE v_new_lot_number VARCHAR(255);
-    
-    DECLARE EXIT HANDLER FOR SQLEXCEPTION
-    BEGIN
-        ROLLBACK;
-        RESIGNAL;
-    END;
 
-    START TRANSACTION;
-    
-    CALL Evaluate_Health_Risk(p_consumption_list);
-    
-    -- Calculate total cost using consumption list
-    SELECT SUM(jt.qty * ib.per_unit_cost)
+    CALL Evaluate_Staged_Health_Risk();
+
+    -- Calculate total cost of the staged plan
+    SELECT SUM(cs.qty * ib.per_unit_cost)
     INTO v_total_cost
-    FROM 
-      JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
-          lot VARCHAR(255) PATH '$.lot',
-          qty DECIMAL(10, 2) PATH '$.qty'
-      )) AS jt
-    JOIN 
-      IngredientBatch AS ib ON ib.lot_number = jt.lot;
+    FROM ConsumptionStage cs
+    JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number;
 
     -- Create product batch record
     INSERT INTO ProductBatch
-      (product_id, manufacturer_id, manufacturer_batch_id, 
-       produced_quantity, production_date, expiration_date, 
+      (product_id, manufacturer_id, manufacturer_batch_id,
+       produced_quantity, production_date, expiration_date,
        recipe_id_used, total_batch_cost)
     VALUES
       (p_product_id, p_manufacturer_id, p_manufacturer_batch_id,
        p_produced_quantity, CURDATE(), p_expiration_date,
        p_recipe_id_used, v_total_cost);
 
-    -- Record ingredient consumption
+    -- Record ingredient consumption (fires the validation / on-hand triggers).
+    -- In ingredient order, so concurrent posters take the IngredientStockSummary
+    -- row locks in the same order and wait for each other instead of deadlocking.
     SET v_new_lot_number = CONCAT(p_product_id, '-', p_manufacturer_id, '-', p_manufacturer_batch_id);
 
     INSERT INTO BatchConsumption
       (product_lot_number, ingredient_lot_number, quantity_consumed)
-    SELECT
-      v_new_lot_number,
-      jt.lot,
-      jt.qty
-    FROM 
-      JSON_TABLE(p_consumption_list, '$[*]' COLUMNS (
-          lot VARCHAR(255) PATH '$.lot',
-          qty DECIMAL(10, 2) PATH '$.qty'
-      )) AS jt;
+    SELECT v_new_lot_number, cs.lot_number, cs.qty
+    FROM ConsumptionStage cs
+    JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number
+    ORDER BY ib.ingredient_id, cs.lot_number;
+
+    DELETE FROM ConsumptionStage;
+
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Post Production Batch
+-- JSON entry point (kept for compatibility): parses the list once into
+-- ConsumptionStage and posts it with Post_Staged_Production_Batch.
+-- No transaction control; errors propagate to the caller.
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Post_Production_Batch;
+//
+CREATE PROCEDURE Post_Production_Batch(
+    IN p_product_id VARCHAR(20),
+    IN p_manufacturer_id VARCHAR(20),
+    IN p_manufacturer_batch_id VARCHAR(100),
+    IN p_produced_quantity INT,
+    IN p_expiration_date DATE,
+    IN p_recipe_id_used INT,
+    IN p_consumption_list JSON
+)
+BEGIN
+    CALL Stage_Consumption_List(p_consumption_list);
+    CALL Post_Staged_Production_Batch(
+        p_product_id, p_manufacturer_id, p_manufacturer_batch_id,
+        p_produced_quantity, p_expiration_date, p_recipe_id_used
+    );
+END;
+//
+
+-- ---------------------------------------------------------------------
+-- Procedure: Record Production Batch
+-- Main transaction for creating a product batch and consuming ingredients
+-- ---------------------------------------------------------------------
+DROP PROCEDURE IF EXISTS Record_Production_Batch;
+//
+CREATE PROCEDURE Record_Production_Batch(
+    IN p_product_id VARCHAR(20),
+    IN p_manufacturer_id VARCHAR(20),
+    IN p_manufacturer_batch_id VARCHAR(100),
+    IN p_produced_quantity INT,
+    IN p_expiration_date DATE,
+    IN p_recipe_id_used INT,
+    IN p_consumption_list JSON
+)
+BEGIN
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    CALL Open_Consumption_Stage();  -- before the transaction, not inside it
+    START TRANSACTION;
+
+    CALL Post_Production_Batch(
+        p_product_id, p_manufacturer_id, p_manufacturer_batch_id,
+        p_produced_quantity, p_expiration_date, p_recipe_id_used,
+        p_consumption_list
+    );
 
     COMMIT;
 
@@ -0,0 +1,510 @@
+-- =====================================================================
+-- SQLITE SCHEMA (embedded backend, see sqlite_backend.py)
+-- The MySQL schema, migrations 001-006 and triggers in one script.
+-- Differences from the MySQL version:
+--   * lot numbers are STORED generated columns (SQLite triggers cannot
+--     assign NEW.*), declared UNIQUE so BatchConsumption can reference them
+--   * DECIMAL/DATE/DATETIME keep their declared types so the driver returns
+--     Decimal / date / datetime values like mysql.connector does
+--   * triggers cannot call procedures or use CTEs: Apply_Stock_Delta is
+--     inlined, and formulation changes clear the whole FlattenedRecipe cache
+--   * session variables (@meal_archiving, @meal_loading) are read with the
+--     session_var() function the backend registers on every connection
+--   * DECIMAL values are stored as REAL, so the stock triggers ROUND to the
+--     column scale (2) instead of letting float error pile up
+-- Stored procedures live in sqlite_backend.py (PROCEDURES).
+-- =====================================================================
+
+-- =====================================================================
+-- 1. USER AND ROLE MANAGEMENT
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS Manufacturer (
+    manufacturer_id VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Supplier (
+    supplier_id VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS AppUser (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(100) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL CHECK (role IN ('Manufacturer', 'Supplier', 'Viewer')),
+    manufacturer_id VARCHAR(20) NULL REFERENCES Manufacturer(manufacturer_id),
+    supplier_id VARCHAR(20) NULL REFERENCES Supplier(supplier_id),
+
+    CONSTRAINT chk_user_role CHECK (
+        (role = 'Manufacturer' AND manufacturer_id IS NOT NULL AND supplier_id IS NULL) OR
+        (role = 'Supplier' AND supplier_id IS NOT NULL AND manufacturer_id IS NULL) OR
+        (role = 'Viewer' AND manufacturer_id IS NULL AND supplier_id IS NULL)
+    )
+);
+
+-- =====================================================================
+-- 2. PRODUCT & RECIPE DEFINITIONS
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS Category (
+    category_id VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS Ingredient (
+    ingredient_id VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE,
+    ingredient_type VARCHAR(10) NOT NULL CHECK (ingredient_type IN ('ATOMIC', 'COMPOUND'))
+);
+
+CREATE TABLE IF NOT EXISTS Product (
+    product_id VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    category_id VARCHAR(20) NOT NULL REFERENCES Category(category_id),
+    manufacturer_id VARCHAR(20) NOT NULL REFERENCES Manufacturer(manufacturer_id),
+    standard_batch_size INT NOT NULL CHECK (standard_batch_size > 0)
+);
+
+CREATE TABLE IF NOT EXISTS Recipe (
+    recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id VARCHAR(20) NOT NULL REFERENCES Product(product_id),
+    name VARCHAR(100) NOT NULL,
+    creation_date DATE NOT NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+
+    UNIQUE (product_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS RecipeIngredient (
+    recipe_id INT NOT NULL REFERENCES Recipe(recipe_id),
+    ingredient_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    quantity DECIMAL(10, 2) NOT NULL,
+    unit_of_measure VARCHAR(20) NOT NULL,
+
+    PRIMARY KEY (recipe_id, ingredient_id)
+);
+
+-- =====================================================================
+-- 3. SUPPLIER FORMULATIONS
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS Formulation (
+    formulation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    supplier_id VARCHAR(20) NOT NULL REFERENCES Supplier(supplier_id),
+    ingredient_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    pack_size VARCHAR(50) NOT NULL,
+    unit_price DECIMAL(10, 2) NOT NULL,
+    valid_from_date DATE NOT NULL,
+    valid_to_date DATE
+);
+
+CREATE TABLE IF NOT EXISTS FormulationMaterials (
+    formulation_id INT NOT NULL REFERENCES Formulation(formulation_id),
+    material_ingredient_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    quantity DECIMAL(10, 2) NOT NULL,
+
+    PRIMARY KEY (formulation_id, material_ingredient_id)
+);
+
+-- =====================================================================
+-- 4. INVENTORY & TRACEABILITY
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS IngredientBatch (
+    lot_number VARCHAR(255) GENERATED ALWAYS AS
+        (ingredient_id || '-' || supplier_id || '-' || supplier_batch_id) STORED NOT NULL UNIQUE,
+    ingredient_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    supplier_id VARCHAR(20) NOT NULL REFERENCES Supplier(supplier_id),
+    supplier_batch_id VARCHAR(100) NOT NULL,
+    quantity_on_hand DECIMAL(10, 2) NOT NULL,
+    per_unit_cost DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    intake_date DATE NOT NULL,
+
+    UNIQUE (ingredient_id, supplier_id, supplier_batch_id)
+);
+
+CREATE TABLE IF NOT EXISTS ProductBatch (
+    lot_number VARCHAR(255) GENERATED ALWAYS AS
+        (product_id || '-' || manufacturer_id || '-' || manufacturer_batch_id) STORED NOT NULL UNIQUE,
+    product_id VARCHAR(20) NOT NULL REFERENCES Product(product_id),
+    manufacturer_id VARCHAR(20) NOT NULL REFERENCES Manufacturer(manufacturer_id),
+    manufacturer_batch_id VARCHAR(100) NOT NULL,
+    produced_quantity INT NOT NULL,
+    expiration_date DATE NOT NULL,
+    production_date DATETIME NOT NULL,
+    total_batch_cost DECIMAL(10, 2),
+    recipe_id_used INT NOT NULL REFERENCES Recipe(recipe_id),
+
+    UNIQUE (product_id, manufacturer_id, manufacturer_batch_id)
+);
+
+CREATE TABLE IF NOT EXISTS BatchConsumption (
+    product_lot_number VARCHAR(255) NOT NULL REFERENCES ProductBatch(lot_number),
+    ingredient_lot_number VARCHAR(255) NOT NULL REFERENCES IngredientBatch(lot_number),
+    quantity_consumed DECIMAL(10, 2) NOT NULL,
+
+    PRIMARY KEY (product_lot_number, ingredient_lot_number)
+);
+
+-- =====================================================================
+-- 5. GRADUATE FEATURES
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS DoNotCombine (
+    ingredient_a_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    ingredient_b_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+
+    PRIMARY KEY (ingredient_a_id, ingredient_b_id),
+    CONSTRAINT chk_ingredient_order CHECK (ingredient_a_id < ingredient_b_id)
+);
+
+-- =====================================================================
+-- MIGRATIONS 001-006
+-- =====================================================================
+
+CREATE INDEX IF NOT EXISTS idx_ib_fefo
+    ON IngredientBatch (ingredient_id, expiration_date, lot_number, quantity_on_hand);
+CREATE INDEX IF NOT EXISTS idx_formulation_validity
+    ON Formulation (ingredient_id, supplier_id, valid_from_date, valid_to_date);
+CREATE INDEX IF NOT EXISTS idx_bc_ingredient_lot
+    ON BatchConsumption (ingredient_lot_number, product_lot_number, quantity_consumed);
+CREATE INDEX IF NOT EXISTS idx_pb_product_date
+    ON ProductBatch (product_id, manufacturer_id, production_date);
+CREATE INDEX IF NOT EXISTS idx_recipe_active
+    ON Recipe (product_id, is_active);
+
+CREATE TABLE IF NOT EXISTS FlattenedRecipe (
+    recipe_id INT NOT NULL REFERENCES Recipe(recipe_id),
+    effective_date DATE NOT NULL,
+    ingredient_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    quantity DECIMAL(20, 6) NOT NULL,
+
+    PRIMARY KEY (recipe_id, effective_date, ingredient_id)
+);
+
+CREATE TABLE IF NOT EXISTS IncompatiblePair (
+    ingredient_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+    partner_id VARCHAR(20) NOT NULL REFERENCES Ingredient(ingredient_id),
+
+    PRIMARY KEY (ingredient_id, partner_id)
+);
+
+CREATE TABLE IF NOT EXISTS IngredientStockSummary (
+    ingredient_id VARCHAR(20) PRIMARY KEY REFERENCES Ingredient(ingredient_id),
+    total_on_hand DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    earliest_expiry DATE NULL,
+    lot_count INT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_stock_summary_expiry ON IngredientStockSummary (earliest_expiry);
+
+CREATE TABLE IF NOT EXISTS IngredientBatchArchive (
+    lot_number VARCHAR(255) PRIMARY KEY,
+    ingredient_id VARCHAR(20) NOT NULL,
+    supplier_id VARCHAR(20) NOT NULL,
+    supplier_batch_id VARCHAR(100) NOT NULL,
+    quantity_on_hand DECIMAL(10, 2) NOT NULL,
+    per_unit_cost DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    intake_date DATE NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_iba_ingredient ON IngredientBatchArchive (ingredient_id, expiration_date);
+
+CREATE TABLE IF NOT EXISTS ProductBatchArchive (
+    lot_number VARCHAR(255) PRIMARY KEY,
+    product_id VARCHAR(20) NOT NULL,
+    manufacturer_id VARCHAR(20) NOT NULL,
+    manufacturer_batch_id VARCHAR(100) NOT NULL,
+    produced_quantity INT NOT NULL,
+    expiration_date DATE NOT NULL,
+    production_date DATETIME NOT NULL,
+    total_batch_cost DECIMAL(10, 2),
+    recipe_id_used INT NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_pba_product_date ON ProductBatchArchive (product_id, manufacturer_id, production_date);
+
+CREATE TABLE IF NOT EXISTS BatchConsumptionArchive (
+    product_lot_number VARCHAR(255) NOT NULL,
+    ingredient_lot_number VARCHAR(255) NOT NULL,
+    quantity_consumed DECIMAL(10, 2) NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (product_lot_number, ingredient_lot_number)
+);
+CREATE INDEX IF NOT EXISTS idx_bca_ingredient_lot
+    ON BatchConsumptionArchive (ingredient_lot_number, product_lot_number, quantity_consumed);
+
+CREATE VIEW IF NOT EXISTS AllIngredientBatch AS
+    SELECT lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand,
+           per_unit_cost, expiration_date, intake_date, 0 AS archived
+    FROM IngredientBatch
+    UNION ALL
+    SELECT lot_number, ingredient_id, supplier_id, supplier_batch_id, quantity_on_hand,
+           per_unit_cost, expiration_date, intake_date, 1 AS archived
+    FROM IngredientBatchArchive;
+
+CREATE VIEW IF NOT EXISTS AllProductBatch AS
+    SELECT lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+           expiration_date, production_date, total_batch_cost, recipe_id_used, 0 AS archived
+    FROM ProductBatch
+    UNION ALL
+    SELECT lot_number, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+           expiration_date, production_date, total_batch_cost, recipe_id_used, 1 AS archived
+    FROM ProductBatchArchive;
+
+CREATE VIEW IF NOT EXISTS AllBatchConsumption AS
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed, 0 AS archived
+    FROM BatchConsumption
+    UNION ALL
+    SELECT product_lot_number, ingredient_lot_number, quantity_consumed, 1 AS archived
+    FROM BatchConsumptionArchive;
+
+-- =====================================================================
+-- TRIGGERS
+-- =====================================================================
+
+-- Archived lot numbers stay taken (archive.py): lot_number is generated, so
+-- the number is rebuilt from NEW here.
+CREATE TRIGGER IF NOT EXISTS trg_reject_archived_ingredient_lot
+BEFORE INSERT ON IngredientBatch
+BEGIN
+    SELECT RAISE(ABORT, 'ERROR: Lot number already used by an archived lot.')
+    WHERE EXISTS (SELECT 1 FROM IngredientBatchArchive
+                  WHERE lot_number = NEW.ingredient_id || '-' || NEW.supplier_id || '-' || NEW.supplier_batch_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reject_archived_product_lot
+BEFORE INSERT ON ProductBatch
+BEGIN
+    SELECT RAISE(ABORT, 'ERROR: Lot number already used by an archived batch.')
+    WHERE EXISTS (SELECT 1 FROM ProductBatchArchive
+                  WHERE lot_number = NEW.product_id || '-' || NEW.manufacturer_id || '-' || NEW.manufacturer_batch_id);
+END;
+
+-- Consumption validation. The expiry check is skipped while sample data is
+-- loaded (@meal_loading): historic batches consumed lots that were fresh then.
+CREATE TRIGGER IF NOT EXISTS trg_validate_consumption
+BEFORE INSERT ON BatchConsumption
+BEGIN
+    SELECT RAISE(ABORT, 'ERROR: Cannot consume an expired ingredient lot! Lot has expired.')
+    FROM IngredientBatch
+    WHERE lot_number = NEW.ingredient_lot_number
+      AND date('now', 'localtime') > expiration_date
+      AND session_var('meal_loading') IS NULL;
+
+    SELECT RAISE(ABORT, 'ERROR: Not enough quantity on hand. A-vailable: v_quantity_on_hand, Tried to consume: NEW.quantity_consumed')
+    FROM IngredientBatch
+    WHERE lot_number = NEW.ingredient_lot_number
+      AND quantity_on_hand < ROUND(NEW.quantity_consumed, 2);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_maintain_on_hand_CONSUME
+AFTER INSERT ON BatchConsumption
+BEGIN
+    UPDATE IngredientBatch
+    SET quantity_on_hand = ROUND(quantity_on_hand - ROUND(NEW.quantity_consumed, 2), 2)
+    WHERE lot_number = NEW.ingredient_lot_number;
+END;
+
+-- Not while archive.py moves consumption rows out (@meal_archiving).
+CREATE TRIGGER IF NOT EXISTS trg_maintain_on_hand_ADJUST
+AFTER DELETE ON BatchConsumption
+WHEN session_var('meal_archiving') IS NULL
+BEGIN
+    UPDATE IngredientBatch
+    SET quantity_on_hand = ROUND(quantity_on_hand + ROUND(OLD.quantity_consumed, 2), 2)
+    WHERE lot_number = OLD.ingredient_lot_number;
+END;
+
+-- ---------------------------------------------------------------------
+-- Ingredient stock summary: Apply_Stock_Delta inlined per case.
+-- "Add" folds a lot into its ingredient's row; "remove" takes it out and,
+-- when it held the earliest expiry, re-reads the minimum.
+-- ---------------------------------------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_stock_summary_insert
+AFTER INSERT ON IngredientBatch
+BEGIN
+    INSERT OR IGNORE INTO IngredientStockSummary (ingredient_id) VALUES (NEW.ingredient_id);
+    UPDATE IngredientStockSummary
+    SET total_on_hand = ROUND(total_on_hand + NEW.quantity_on_hand, 2),
+        lot_count = lot_count + (NEW.quantity_on_hand > 0),
+        earliest_expiry = CASE
+            WHEN NEW.quantity_on_hand <= 0 THEN earliest_expiry
+            WHEN earliest_expiry IS NULL THEN NEW.expiration_date
+            ELSE MIN(earliest_expiry, NEW.expiration_date)
+        END
+    WHERE ingredient_id = NEW.ingredient_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_summary_update
+AFTER UPDATE OF quantity_on_hand, expiration_date ON IngredientBatch
+WHEN NEW.ingredient_id = OLD.ingredient_id
+ AND (NEW.quantity_on_hand <> OLD.quantity_on_hand OR NEW.expiration_date <> OLD.expiration_date)
+BEGIN
+    INSERT OR IGNORE INTO IngredientStockSummary (ingredient_id) VALUES (NEW.ingredient_id);
+    UPDATE IngredientStockSummary
+    SET total_on_hand = ROUND(total_on_hand + NEW.quantity_on_hand - OLD.quantity_on_hand, 2),
+        lot_count = lot_count + (NEW.quantity_on_hand > 0) - (OLD.quantity_on_hand > 0),
+        earliest_expiry = CASE
+            WHEN NEW.quantity_on_hand <= 0 THEN earliest_expiry
+            WHEN earliest_expiry IS NULL THEN NEW.expiration_date
+            ELSE MIN(earliest_expiry, NEW.expiration_date)
+        END
+    WHERE ingredient_id = NEW.ingredient_id;
+
+    UPDATE IngredientStockSummary
+    SET earliest_expiry = (
+        SELECT MIN(expiration_date)
+        FROM IngredientBatch
+        WHERE ingredient_id = NEW.ingredient_id
+          AND quantity_on_hand > 0
+    )
+    WHERE ingredient_id = NEW.ingredient_id
+      AND OLD.quantity_on_hand > 0
+      AND (NEW.quantity_on_hand <= 0 OR NEW.expiration_date <> OLD.expiration_date)
+      AND earliest_expiry >= OLD.expiration_date;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_summary_move
+AFTER UPDATE OF ingredient_id ON IngredientBatch
+WHEN NEW.ingredient_id <> OLD.ingredient_id
+BEGIN
+    UPDATE IngredientStockSummary
+    SET total_on_hand = ROUND(total_on_hand - OLD.quantity_on_hand, 2),
+        lot_count = lot_count - (OLD.quantity_on_hand > 0)
+    WHERE ingredient_id = OLD.ingredient_id;
+    UPDATE IngredientStockSummary
+    SET earliest_expiry = (
+        SELECT MIN(expiration_date)
+        FROM IngredientBatch
+        WHERE ingredient_id = OLD.ingredient_id
+          AND quantity_on_hand > 0
+    )
+    WHERE ingredient_id = OLD.ingredient_id
+      AND OLD.quantity_on_hand > 0
+      AND earliest_expiry >= OLD.expiration_date;
+
+    INSERT OR IGNORE INTO IngredientStockSummary (ingredient_id) VALUES (NEW.ingredient_id);
+    UPDATE IngredientStockSummary
+    SET total_on_hand = ROUND(total_on_hand + NEW.quantity_on_hand, 2),
+        lot_count = lot_count + (NEW.quantity_on_hand > 0),
+        earliest_expiry = CASE
+            WHEN NEW.quantity_on_hand <= 0 THEN earliest_expiry
+            WHEN earliest_expiry IS NULL THEN NEW.expiration_date
+            ELSE MIN(earliest_expiry, NEW.expiration_date)
+        END
+    WHERE ingredient_id = NEW.ingredient_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_summary_delete
+AFTER DELETE ON IngredientBatch
+BEGIN
+    UPDATE IngredientStockSummary
+    SET total_on_hand = ROUND(total_on_hand - OLD.quantity_on_hand, 2),
+        lot_count = lot_count - (OLD.quantity_on_hand > 0)
+    WHERE ingredient_id = OLD.ingredient_id;
+    UPDATE IngredientStockSummary
+    SET earliest_expiry = (
+        SELECT MIN(expiration_date)
+        FROM IngredientBatch
+        WHERE ingredient_id = OLD.ingredient_id
+          AND quantity_on_hand > 0
+    )
+    WHERE ingredient_id = OLD.ingredient_id
+      AND OLD.quantity_on_hand > 0
+      AND earliest_expiry >= OLD.expiration_date;
+END;
+
+-- ---------------------------------------------------------------------
+-- Flattened recipe cache invalidation
+-- ---------------------------------------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_ri_insert
+AFTER INSERT ON RecipeIngredient
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_ri_update
+AFTER UPDATE ON RecipeIngredient
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_ri_delete
+AFTER DELETE ON RecipeIngredient
+BEGIN
+    DELETE FROM FlattenedRecipe WHERE recipe_id = OLD.recipe_id;
+END;
+
+-- Without CTEs in triggers the affected recipes cannot be found here, so
+-- any formulation change drops the whole cache (it refills on demand).
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_formulation_insert
+AFTER INSERT ON Formulation
+BEGIN
+    DELETE FROM FlattenedRecipe;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_formulation_update
+AFTER UPDATE ON Formulation
+BEGIN
+    DELETE FROM FlattenedRecipe;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_formulation_delete
+AFTER DELETE ON Formulation
+BEGIN
+    DELETE FROM FlattenedRecipe;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_fm_insert
+AFTER INSERT ON FormulationMaterials
+BEGIN
+    DELETE FROM FlattenedRecipe;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_fm_update
+AFTER UPDATE ON FormulationMaterials
+BEGIN
+    DELETE FROM FlattenedRecipe;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_flattened_recipe_fm_delete
+AFTER DELETE ON FormulationMaterials
+BEGIN
+    DELETE FROM FlattenedRecipe;
+END;
+
+-- ---------------------------------------------------------------------
+-- Incompatible pair sync
+-- ---------------------------------------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_incompatible_pair_insert
+AFTER INSERT ON DoNotCombine
+BEGIN
+    INSERT OR IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+    VALUES (NEW.ingredient_a_id, NEW.ingredient_b_id),
+           (NEW.ingredient_b_id, NEW.ingredient_a_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_incompatible_pair_update
+AFTER UPDATE ON DoNotCombine
+BEGIN
+    DELETE FROM IncompatiblePair
+    WHERE (ingredient_id = OLD.ingredient_a_id AND partner_id = OLD.ingredient_b_id)
+       OR (ingredient_id = OLD.ingredient_b_id AND partner_id = OLD.ingredient_a_id);
+
+    INSERT OR IGNORE INTO IncompatiblePair (ingredient_id, partner_id)
+    VALUES (NEW.ingredient_a_id, NEW.ingredient_b_id),
+           (NEW.ingredient_b_id, NEW.ingredient_a_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_incompatible_pair_delete
+AFTER DELETE ON DoNotCombine
+BEGIN
+    DELETE FROM IncompatiblePair
+    WHERE (ingredient_id = OLD.ingredient_a_id AND partner_id = OLD.ingredient_b_id)
+       OR (ingredient_id = OLD.ingredient_b_id AND partner_id = OLD.ingredient_a_id);
+END;
@@ -0,0 +1,670 @@
+"""
+Embedded SQLite backend: the whole application in-process, no MySQL server.
+
+Select it with MEAL_DB_BACKEND=sqlite (db_pool.py, benchmarks/common.py);
+MEAL_SQLITE_PATH names the database file (default meal_manufacturer.sqlite3,
+':memory:' for a throw-away database). A new database gets
+sql_src/sqlite/schema.sql and the sample data automatically.
+
+SQLiteConnection / SQLiteCursor speak the subset of the mysql.connector API
+the application uses (dictionary cursors, fetchmany, executemany, callproc +
+stored_results, lastrowid, SAVEPOINTs, ping, connection_id), so operations,
+reports, production posting, tracing and the benchmarks run unchanged:
+
+    * %s placeholders become ?, FOR UPDATE [OF t] [SKIP LOCKED] is dropped
+      (SQLite serialises writers with its database lock), INSERT IGNORE
+      becomes INSERT OR IGNORE and EXPLAIN becomes EXPLAIN QUERY PLAN
+    * CURDATE(), NOW(), CONNECTION_ID(), CONCAT(), LEAST() and GREATEST() are
+      registered as SQL functions; SET @var = ... is kept per connection and
+      readable from triggers as session_var('var')
+    * the stored procedures (Record_Production_Batch, Post_Production_Batch,
+      Evaluate_Health_Risk, Flatten_Recipe, ...) are Python functions in
+      PROCEDURES, running the same SQL steps as sql_src/procedures_triggers.sql
+    * errors are raised as mysql.connector errors; a trigger or procedure
+      rejection is a DatabaseError with sqlstate '45000', as SIGNAL gives
+
+Transactions always take the write lock up front. The first write, FOR
+UPDATE read, SAVEPOINT or START TRANSACTION runs BEGIN IMMEDIATE, and the
+transaction lasts until commit / rollback. A second writer waits for the
+lock for up to BUSY_TIMEOUT. A deferred BEGIN would instead have to upgrade
+its lock at the first write, and SQLite fails that upgrade at once with
+"database is locked" without waiting. A plain read outside a transaction
+therefore runs on its own in autocommit mode, like a MySQL consistent read.
+
+    python sqlite_backend.py init [path] [--no-data]
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from itertools import count
+
+from mysql.connector import errors
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(BASE_DIR, 'sql_src', 'sqlite', 'schema.sql')
+DATA_FILE = os.path.join(BASE_DIR, 'Final_Project_Submissionfiles', 'data.sql')
+DEFAULT_PATH = 'meal_manufacturer.sqlite3'
+BUSY_TIMEOUT = 10           # seconds a writer waits for the database lock
+
+ER_SIGNAL_EXCEPTION = 1644  # errno MySQL gives a SIGNAL SQLSTATE '45000'
+INTEGRITY_ERRNO = {'UNIQUE': 1062, 'FOREIGN KEY': 1452, 'NOT NULL': 1048, 'CHECK': 3819}
+
+_connection_ids = count(1)
+
+# Python values in, MySQL-like values out (DECIMAL -> Decimal, DATE -> date).
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DECIMAL', lambda raw: Decimal(raw.decode()))
+sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()[:10]))
+sqlite3.register_converter('DATETIME', lambda raw: datetime.fromisoformat(raw.decode()))
+
+
+# --- Dialect ---
+
+_LOCKING_READ = re.compile(r'\s+FOR\s+UPDATE(\s+OF\s+\w+(\s*,\s*\w+)*)?(\s+SKIP\s+LOCKED|\s+NOWAIT)?',
+                           re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE)
+_EXPLAIN = re.compile(r'^\s*EXPLAIN\s+(?!QUERY\s+PLAN)', re.IGNORECASE)
+_WRITE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|SAVEPOINT|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+_CTE_WRITE = re.compile(r'^\s*WITH\b.*\b(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE | re.DOTALL)
+_SET_VARIABLE = re.compile(r'^\s*SET\s+@(\w+)\s*=\s*(.+?)\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+_SET_SESSION = re.compile(r'^\s*SET\s+(SESSION\s+)?(\w+)(\s*=\s*(\w+))?', re.IGNORECASE)
+_TRANSACTION = re.compile(r'^\s*(START\s+TRANSACTION|BEGIN|COMMIT|ROLLBACK)\s*;?\s*$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    """MySQL statement -> (SQLite statement, takes the write lock)."""
+    locking = bool(_LOCKING_READ.search(sql))
+    sql = _LOCKING_READ.sub('', sql)
+    sql = _INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    sql = _EXPLAIN.sub('EXPLAIN QUERY PLAN ', sql)
+    sql = sql.replace('%%', '\0').replace('%s', '?').replace('\0', '%')
+    return sql, locking or bool(_WRITE.match(sql) or _CTE_WRITE.match(sql))
+
+
+def _literal(text):
+    if text.upper() == 'NULL':
+        return None
+    try:
+        return json.loads(text.replace("'", '"'))
+    except ValueError:
+        return text
+
+
+def _least(*values):
+    return None if any(value is None for value in values) else min(values)
+
+
+def _greatest(*values):
+    return None if any(value is None for value in values) else max(values)
+
+
+def _concat(*values):
+    return None if any(value is None for value in values) else ''.join(str(value) for value in values)
+
+
+def _value(value):
+    """Computed REAL results come back as Decimal, as MySQL's DECIMAL arithmetic does."""
+    return Decimal(repr(round(value, 6))) if isinstance(value, float) else value
+
+
+def _signal(message):
+    """The error a SIGNAL SQLSTATE '45000' raises through mysql.connector."""
+    return errors.DatabaseError(msg=message, errno=ER_SIGNAL_EXCEPTION, sqlstate='45000')
+
+
+def _mysql_error(err):
+    """Map a sqlite3 error onto the mysql.connector class callers catch."""
+    message = str(err)
+    if isinstance(err, sqlite3.IntegrityError):
+        if message.startswith('ERROR:'):
+            return _signal(message)  # RAISE(ABORT, ...) from a trigger
+        errno = next((code for key, code in INTEGRITY_ERRNO.items() if key in message), None)
+        return errors.IntegrityError(msg=message, errno=errno, sqlstate='23000')
+    if isinstance(err, sqlite3.OperationalError):
+        return errors.OperationalError(msg=message, sqlstate='HY000')
+    if isinstance(err, sqlite3.ProgrammingError):
+        return errors.ProgrammingError(msg=message, sqlstate='42000')
+    return errors.DatabaseError(msg=message)
+
+
+# --- Cursor ---
+
+class _StoredResult:
+    """One result set of a procedure call (cursor.stored_results())."""
+
+    def __init__(self, column_names, rows):
+        self.column_names = column_names
+        self._rows = rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over a sqlite3 cursor."""
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._db.cursor()
+        self._dictionary = dictionary
+        self._stored = []
+        self.rowcount = -1
+        self.lastrowid = None
+        self.column_names = ()
+        self.with_rows = False
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _run(self, sql, params, many=False):
+        statement, writes = translate(sql)
+        self._connection._begin(writes)
+        try:
+            if many:
+                self._cursor.executemany(statement, params)
+            else:
+                self._cursor.execute(statement, tuple(params or ()))
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+        description = self._cursor.description
+        self.with_rows = description is not None
+        self.column_names = tuple(column[0] for column in description) if description else ()
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def execute(self, operation, params=None):
+        if self._connection._session_statement(operation):
+            self.with_rows, self.column_names, self.rowcount = False, (), 0
+            return
+        self._run(operation, params)
+
+    def executemany(self, operation, seq_params):
+        self._run(operation, [tuple(params) for params in seq_params], many=True)
+
+    def _convert(self, row):
+        values = tuple(_value(value) for value in row)
+        return dict(zip(self.column_names, values)) if self._dictionary else values
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else self._convert(row)
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def callproc(self, procname, args=()):
+        procedure = PROCEDURES.get(procname)
+        if procedure is None:
+            raise errors.ProgrammingError(msg=f"PROCEDURE {procname} does not exist", errno=1305,
+                                          sqlstate='42000')
+        self._stored = []
+        procedure(self, *args)
+        return tuple(args)
+
+    def stored_results(self):
+        stored, self._stored = self._stored, []
+        return iter(stored)
+
+    def _store_result(self):
+        """Keep the rows of the last SELECT as a procedure result set."""
+        rows = [tuple(_value(value) for value in row) for row in self._cursor.fetchall()]
+        self._stored.append(_StoredResult(self.column_names, rows))
+
+    def close(self):
+        self._cursor.close()
+
+
+# --- Connection / pool ---
+
+class SQLiteConnection:
+    """mysql.connector-style connection to a SQLite database file."""
+
+    def __init__(self, path=DEFAULT_PATH, pool=None):
+        self.path = path
+        self.connection_id = next(_connection_ids)
+        self.variables = {}
+        self._pool = pool
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        if path != ':memory:':
+            self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.create_function('CURDATE', 0, lambda: date.today().isoformat())
+        self._db.create_function('NOW', 0, lambda: datetime.now().isoformat(' ', 'seconds'))
+        self._db.create_function('CONNECTION_ID', 0, lambda: self.connection_id, deterministic=True)
+        self._db.create_function('session_var', 1, self.variables.get)
+        self._db.create_function('LEAST', -1, _least, deterministic=True)
+        self._db.create_function('GREATEST', -1, _greatest, deterministic=True)
+        self._db.create_function('CONCAT', -1, _concat, deterministic=True)
+
+    # mysql.connector surface used by db_pool / main
+    unread_result = False
+
+    def cursor(self, dictionary=False, buffered=None, prepared=None):
+        # sqlite3 already caches compiled statements per connection, so prepared is a no-op
+        return SQLiteCursor(self, dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def _begin(self, writes):
+        """Open the transaction (write lock included) before the first write; reads autocommit."""
+        if writes and not self._db.in_transaction:
+            self._db.execute("BEGIN IMMEDIATE")
+
+    def start_transaction(self):
+        self.commit()
+        self._begin(True)
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def _session_statement(self, sql):
+        """Handle SET / transaction statements here. Returns True when handled."""
+        match = _SET_VARIABLE.match(sql)
+        if match:
+            self.variables[match.group(1)] = _literal(match.group(2))
+            return True
+        match = _TRANSACTION.match(sql)
+        if match:
+            keyword = match.group(1).upper()
+            if keyword == 'COMMIT':
+                self.commit()
+            elif keyword == 'ROLLBACK':
+                self.rollback()
+            else:
+                self.start_transaction()
+            return True
+        match = _SET_SESSION.match(sql)
+        if match:
+            if match.group(2).lower() == 'foreign_key_checks' and not self._db.in_transaction:
+                self._db.execute(f"PRAGMA foreign_keys = {'OFF' if match.group(4) == '0' else 'ON'}")
+            return True  # unique_checks, isolation level, ...: nothing to do
+        return False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._db.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def consume_results(self):
+        pass
+
+    def reset_session(self):
+        self.rollback()
+        self.variables.clear()
+        self._db.execute("DROP TABLE IF EXISTS temp.ConsumptionStage")  # MySQL drops TEMPORARY tables too
+        self._db.execute("PRAGMA foreign_keys = ON")
+
+    def close(self):
+        """Hand a pooled connection back (session reset), or close it."""
+        if self._pool is not None:
+            self.reset_session()
+            self._pool._release(self)
+        else:
+            self._db.close()
+
+    def _close(self):
+        self._db.close()
+
+
+class SQLitePool:
+    """Fixed-size pool with the get_connection() / PoolError contract db_pool expects."""
+
+    def __init__(self, path=DEFAULT_PATH, pool_size=5, data_file=DATA_FILE):
+        if path == ':memory:':
+            pool_size = 1  # every :memory: connection is a separate database
+        self.path = path
+        self.pool_size = pool_size  # as MySQLConnectionPool (service.py sizes its request slots by it)
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._all = [SQLiteConnection(path, pool=self) for _ in range(pool_size)]
+        ensure_database(self._all[0], data_file)
+        for connection in self._all:
+            self._idle.put(connection)
+
+    def get_connection(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            raise errors.PoolError(msg="Failed getting connection; pool exhausted") from None
+
+    def _release(self, connection):
+        self._idle.put(connection)
+
+    def _remove_connections(self):
+        with self._lock:
+            for connection in self._all:
+                connection._close()
+            self._all = []
+
+
+def connect(path=DEFAULT_PATH, data_file=DATA_FILE):
+    """One unpooled connection (benchmarks, scripts); creates the database if new."""
+    connection = SQLiteConnection(path)
+    ensure_database(connection, data_file)
+    return connection
+
+
+# --- Schema ---
+
+def load_sql_file(connection, path):
+    """Run a SQL script (schema or INSERT data; MySQL 'USE' lines are skipped)."""
+    with open(path, encoding='utf-8') as handle:
+        script = ''.join(line for line in handle if not line.lstrip().upper().startswith('USE '))
+    connection.commit()
+    try:
+        connection._db.executescript(script)
+    except sqlite3.Error as err:
+        connection.rollback()
+        raise _mysql_error(err) from err
+
+
+def ensure_database(connection, data_file=DATA_FILE):
+    """Create the schema (and load data_file) unless the database already has it."""
+    exists = connection._db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'IngredientBatch'").fetchone()
+    if exists:
+        return False
+    load_sql_file(connection, SCHEMA_FILE)
+    if data_file:
+        connection.variables['meal_loading'] = 1
+        try:
+            load_sql_file(connection, data_file)
+        finally:
+            connection.variables.pop('meal_loading', None)
+    return True
+
+
+# --- Stored procedures (sql_src/procedures_triggers.sql) ---
+
+FLATTEN_QUERY = """
+    WITH RECURSIVE bom (ingredient_id, ingredient_type, quantity, depth) AS (
+        SELECT ri.ingredient_id, i.ingredient_type, CAST(ri.quantity AS REAL), 0
+        FROM RecipeIngredient ri
+        JOIN Ingredient i ON i.ingredient_id = ri.ingredient_id
+        WHERE ri.recipe_id = %s
+
+        UNION ALL
+
+        SELECT fm.material_ingredient_id, mi.ingredient_type, b.quantity * fm.quantity, b.depth + 1
+        FROM bom b
+        JOIN Formulation f
+          ON f.ingredient_id = b.ingredient_id
+         AND %s BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE b.ingredient_type = 'COMPOUND'
+          AND b.depth < 10
+    )
+    INSERT OR IGNORE INTO FlattenedRecipe (recipe_id, effective_date, ingredient_id, quantity)
+    SELECT %s, %s, ingredient_id, SUM(quantity)
+    FROM bom
+    WHERE ingredient_type = 'ATOMIC'
+    GROUP BY ingredient_id
+"""
+
+PURGE_FLATTENED_QUERY = """
+    DELETE FROM FlattenedRecipe
+    WHERE recipe_id = %s
+      AND effective_date < CURDATE()
+      AND effective_date <> %s
+"""
+
+FLATTENED_QUERY = """
+    SELECT fr.ingredient_id, i.name, fr.quantity
+    FROM FlattenedRecipe fr
+    JOIN Ingredient i ON i.ingredient_id = fr.ingredient_id
+    WHERE fr.recipe_id = %s
+      AND fr.effective_date = %s
+    ORDER BY fr.quantity DESC, i.name
+"""
+
+INVALIDATE_QUERY = """
+    WITH RECURSIVE affected (ingredient_id) AS (
+        SELECT %s
+        UNION
+        SELECT f.ingredient_id
+        FROM affected a
+        JOIN FormulationMaterials fm ON fm.material_ingredient_id = a.ingredient_id
+        JOIN Formulation f ON f.formulation_id = fm.formulation_id
+    )
+    DELETE FROM FlattenedRecipe
+    WHERE recipe_id IN (
+        SELECT DISTINCT ri.recipe_id
+        FROM RecipeIngredient ri
+        JOIN affected a ON a.ingredient_id = ri.ingredient_id
+    )
+"""
+
+# A TEMP table shadows any ConsumptionStage left in the main schema by older files.
+OPEN_STAGE_QUERY = """
+    CREATE TEMP TABLE IF NOT EXISTS ConsumptionStage (
+        lot_number VARCHAR(255) PRIMARY KEY,
+        qty DECIMAL(10, 2) NOT NULL
+    )
+"""
+
+# {lots}: a query returning the lot_number of every lot in the plan
+CONFLICT_TEMPLATE = """
+    WITH RECURSIVE atoms (ingredient_id, ingredient_type, supplier_id, as_of_date, depth) AS (
+        SELECT ib.ingredient_id, i.ingredient_type, ib.supplier_id, ib.intake_date, 0
+        FROM ({lots}) plan
+        JOIN IngredientBatch ib ON ib.lot_number = plan.lot_number
+        JOIN Ingredient i ON i.ingredient_id = ib.ingredient_id
+
+        UNION ALL
+
+        SELECT fm.material_ingredient_id, mi.ingredient_type, NULL, a.as_of_date, a.depth + 1
+        FROM atoms a
+        JOIN Formulation f
+          ON f.ingredient_id = a.ingredient_id
+         AND (a.supplier_id IS NULL OR f.supplier_id = a.supplier_id)
+         AND a.as_of_date BETWEEN f.valid_from_date AND COALESCE(f.valid_to_date, '9999-12-31')
+        JOIN FormulationMaterials fm ON fm.formulation_id = f.formulation_id
+        JOIN Ingredient mi ON mi.ingredient_id = fm.material_ingredient_id
+        WHERE a.ingredient_type = 'COMPOUND'
+          AND a.depth < 10
+    ),
+    batch_atoms AS (
+        SELECT DISTINCT ingredient_id FROM atoms WHERE ingredient_type = 'ATOMIC'
+    )
+    SELECT MIN(ip.ingredient_id || ' + ' || ip.partner_id) AS conflict
+    FROM batch_atoms ba
+    JOIN IncompatiblePair ip ON ip.ingredient_id = ba.ingredient_id
+    WHERE ip.ingredient_id < ip.partner_id
+      AND ip.partner_id IN (SELECT ingredient_id FROM batch_atoms)
+"""
+
+STAGED_CONFLICT_QUERY = CONFLICT_TEMPLATE.format(lots="SELECT lot_number FROM ConsumptionStage")
+JSON_CONFLICT_QUERY = CONFLICT_TEMPLATE.format(
+    lots="SELECT json_extract(value, '$.lot') AS lot_number FROM json_each(%s)")
+
+TRACE_RECALL_QUERY = """
+    SELECT
+        pb.lot_number AS affected_product_lot,
+        p.name AS product_name,
+        pb.production_date,
+        pb.expiration_date,
+        pb.produced_quantity
+    FROM BatchConsumption AS bc
+    JOIN ProductBatch AS pb ON bc.product_lot_number = pb.lot_number
+    JOIN Product AS p ON pb.product_id = p.product_id
+    WHERE bc.ingredient_lot_number = %s
+      AND DATE(pb.production_date) BETWEEN date(%s, '-20 days') AND %s
+"""
+
+
+def _scalar(cursor, sql, params):
+    """First column of the first row, whatever the caller's cursor type."""
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def _clear_stage(cursor):
+    cursor.execute("DELETE FROM ConsumptionStage")
+
+
+def open_consumption_stage(cursor):
+    """Open_Consumption_Stage: this connection's TEMP stage table (dropped by reset_session)."""
+    cursor.execute(OPEN_STAGE_QUERY)
+
+
+def stage_consumption_list(cursor, consumption_list):
+    """Stage_Consumption_List: replace this connection's plan (duplicate lots summed)."""
+    plan = json.loads(consumption_list) if isinstance(consumption_list, str) else consumption_list
+    totals = {}
+    for item in plan:
+        totals[item.get('lot')] = totals.get(item.get('lot'), 0) + (item.get('qty') or 0)
+    open_consumption_stage(cursor)
+    _clear_stage(cursor)
+    cursor.executemany("INSERT INTO ConsumptionStage (lot_number, qty) VALUES (%s, %s)", list(totals.items()))
+
+
+def evaluate_staged_health_risk(cursor):
+    """Evaluate_Staged_Health_Risk: SIGNAL when two staged atoms are an incompatible pair."""
+    _raise_conflict(_scalar(cursor, STAGED_CONFLICT_QUERY, ()))
+
+
+def _raise_conflict(conflict):
+    if conflict is not None:
+        raise _signal(f"ERROR: Health risk detected! Incompatible ingredients found in batch: {conflict}"[:128])
+
+
+def evaluate_health_risk(cursor, consumption_list):
+    """Evaluate_Health_Risk: the staged check over the JSON list's lots; the stage is left alone."""
+    if not isinstance(consumption_list, str):
+        consumption_list = json.dumps(consumption_list)
+    _raise_conflict(_scalar(cursor, JSON_CONFLICT_QUERY, (consumption_list,)))
+
+
+def post_staged_production_batch(cursor, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+                                 expiration_date, recipe_id_used):
+    """Post_Staged_Production_Batch: no transaction control; the caller commits or rolls back."""
+    evaluate_staged_health_risk(cursor)
+    total_cost = _scalar(cursor, """
+        SELECT SUM(cs.qty * ib.per_unit_cost)
+        FROM ConsumptionStage cs
+        JOIN IngredientBatch ib ON ib.lot_number = cs.lot_number
+    """, ())
+    cursor.execute("""
+        INSERT INTO ProductBatch
+          (product_id, manufacturer_id, manufacturer_batch_id, produced_quantity, production_date,
+           expiration_date, recipe_id_used, total_batch_cost)
+        VALUES (%s, %s, %s, %s, CURDATE(), %s, %s, %s)
+    """, (product_id, manufacturer_id, manufacturer_batch_id, produced_quantity, expiration_date,
+          recipe_id_used, total_cost))
+    cursor.execute("""
+        INSERT INTO BatchConsumption (product_lot_number, ingredient_lot_number, quantity_consumed)
+        SELECT %s, cs.lot_number, cs.qty
+        FROM ConsumptionStage cs
+    """, (f"{product_id}-{manufacturer_id}-{manufacturer_batch_id}",))
+    _clear_stage(cursor)
+
+
+def post_production_batch(cursor, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+                          expiration_date, recipe_id_used, consumption_list):
+    """Post_Production_Batch: JSON entry point over the staged path."""
+    stage_consumption_list(cursor, consumption_list)
+    post_staged_production_batch(cursor, product_id, manufacturer_id, manufacturer_batch_id, produced_quantity,
+                                 expiration_date, recipe_id_used)
+
+
+def record_production_batch(cursor, *args):
+    """Record_Production_Batch: Post_Production_Batch in its own transaction."""
+    connection = cursor._connection
+    open_consumption_stage(cursor)
+    connection.start_transaction()
+    try:
+        post_production_batch(cursor, *args)
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+
+
+def flatten_recipe(cursor, recipe_id, effective_date=None):
+    """
+    Flatten_Recipe: fill the FlattenedRecipe cache if needed (dropping the
+    recipe's stale past days) and return it as a result set.
+    """
+    effective_date = effective_date or date.today()
+    if _scalar(cursor, "SELECT 1 FROM FlattenedRecipe WHERE recipe_id = %s AND effective_date = %s LIMIT 1",
+               (recipe_id, effective_date)) is None:
+        cursor.execute(PURGE_FLATTENED_QUERY, (recipe_id, effective_date))
+        cursor.execute(FLATTEN_QUERY, (recipe_id, effective_date, recipe_id, effective_date))
+    cursor.execute(FLATTENED_QUERY, (recipe_id, effective_date))
+    cursor._store_result()
+
+
+def invalidate_flattened_recipes(cursor, ingredient_id):
+    """Invalidate_Flattened_Recipes: drop the cached flattening of every recipe using ingredient_id."""
+    cursor.execute(INVALIDATE_QUERY, (ingredient_id,))
+
+
+def trace_recall(cursor, ingredient_lot_number, recall_date):
+    """Trace_Recall: product batches that consumed a lot in the 20 days up to recall_date."""
+    cursor.execute(TRACE_RECALL_QUERY, (ingredient_lot_number, recall_date, recall_date))
+    cursor._store_result()
+
+
+PROCEDURES = {
+    'Open_Consumption_Stage': open_consumption_stage,
+    'Stage_Consumption_List': stage_consumption_list,
+    'Evaluate_Staged_Health_Risk': evaluate_staged_health_risk,
+    'Evaluate_Health_Risk': evaluate_health_risk,
+    'Post_Staged_Production_Batch': post_staged_production_batch,
+    'Post_Production_Batch': post_production_batch,
+    'Record_Production_Batch': record_production_batch,
+    'Flatten_Recipe': flatten_recipe,
+    'Invalidate_Flattened_Recipes': invalidate_flattened_recipes,
+    'Trace_Recall': trace_recall,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the embedded SQLite database")
+    parser.add_argument('command', choices=('init',))
+    parser.add_argument('path', nargs='?', default=os.environ.get('MEAL_SQLITE_PATH', DEFAULT_PATH))
+    parser.add_argument('--no-data', action='store_true', help="Schema only, without the sample data")
+    args = parser.parse_args(argv)
+
+    connection = SQLiteConnection(args.path)
+    try:
+        created = ensure_database(connection, None if args.no_data else DATA_FILE)
+    finally:
+        connection.close()
+    print(f"{'Created' if created else 'Already initialised:'} {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+"""
+Streaming result output.
+
+Rows are pulled from an unbuffered cursor with fetchmany() and handed to a
+sink chunk by chunk, so memory use does not grow with the result size and
+the first rows are shown as soon as they arrive:
+
+    with borrow_connection(dictionary=False) as (db, cursor):
+        cursor.execute(query)
+        stream_cursor(cursor, CsvSink('spending.csv'))
+
+Sinks: TableSink (paged terminal table), CsvSink, JsonlSink and
+ColumnarCsvSink (one single-column CSV file per column).
+"""
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+from tabulate import tabulate
+
+DEFAULT_FETCH_SIZE = 1000
+DEFAULT_PAGE_SIZE = 50
+
+
+def json_default(value):
+    """json.dumps default: Decimal -> number, dates -> ISO strings."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def as_tuples(rows, columns):
+    """Dictionary cursors return dicts; sinks always receive tuples."""
+    return [tuple(row[column] for column in columns) if isinstance(row, dict) else row for row in rows]
+
+
+class TableSink:
+    """Paged grid table on stdout; asks before each further page when interactive."""
+
+    def __init__(self, page_size=DEFAULT_PAGE_SIZE, interactive=None, out=None):
+        self.page_size = page_size
+        self.out = out or sys.stdout
+        if interactive is None:
+            interactive = sys.stdin.isatty() and self.out.isatty()
+        self.interactive = interactive
+        self.columns = None
+        self.pending = []
+        self.count = 0
+
+    def open(self, columns):
+        self.columns = columns
+
+    def _print_page(self, page):
+        print(tabulate(page, headers=self.columns, tablefmt="grid"), file=self.out)
+        self.count += len(page)
+
+    def write(self, rows):
+        """Returns False when the user stops paging."""
+        self.pending.extend(rows)
+        while len(self.pending) >= self.page_size:
+            page = self.pending[:self.page_size]
+            del self.pending[:self.page_size]
+            self._print_page(page)
+            if self.interactive and input(f"-- {self.count} rows shown; Enter for more, 'q' to stop -- ") \
+                    .strip().lower() == 'q':
+                self.pending = []
+                return False
+        return True
+
+    def close(self):
+        if self.pending:
+            self._print_page(self.pending)
+            self.pending = []
+        if self.count == 0:
+            print("No results found.", file=self.out)
+        return self.count
+
+
+class CsvSink:
+    """Comma-separated file with a header row."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.writer = None
+        self.count = 0
+
+    def open(self, columns):
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.count += len(rows)
+        return True
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        return self.count
+
+
+class JsonlSink:
+    """One JSON object per line (Decimal -> number, dates -> ISO strings)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.columns = None
+        self.count = 0
+
+    def open(self, columns):
+        self.columns = columns
+        self.file = open(self.path, 'w', encoding='utf-8')
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(dict(zip(self.columns, row)), default=json_default) + "\n"
+                             for row in rows)
+        self.count += len(rows)
+        return True
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        return self.count
+
+
+class ColumnarCsvSink:
+    """
+    Column-oriented export without a Parquet dependency: <directory>/NN_<column>.csv
+    holds the column name followed by one value per row, in row order.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = []
+        self.writers = []
+        self.count = 0
+
+    def open(self, columns):
+        os.makedirs(self.directory, exist_ok=True)
+        for index, column in enumerate(columns):
+            safe_name = "".join(ch if ch.isalnum() or ch in '-_' else '_' for ch in column) or f"column_{index}"
+            handle = open(os.path.join(self.directory, f"{index:02d}_{safe_name}.csv"), 'w',
+                          newline='', encoding='utf-8')
+            writer = csv.writer(handle)
+            writer.writerow([column])
+            self.files.append(handle)
+            self.writers.append(writer)
+
+    def write(self, rows):
+        for index, writer in enumerate(self.writers):
+            writer.writerows([row[index]] for row in rows)
+        self.count += len(rows)
+        return True
+
+    def close(self):
+        for handle in self.files:
+            handle.close()
+        return self.count
+
+
+class OutputPathError(ValueError):
+    """An output path that names neither a known file type nor a directory."""
+
+
+def sink_for_path(path):
+    """
+    Pick a sink from an output path: *.csv, *.jsonl, a directory (columnar;
+    an existing one, or any path ending in '/'), blank = screen. Raises
+    OutputPathError for anything else, e.g. out.txt.
+    """
+    path = (path or '').strip()
+    if not path:
+        return TableSink()
+    if path.endswith('.jsonl'):
+        return JsonlSink(path)
+    if path.endswith('.csv'):
+        return CsvSink(path)
+    if path.endswith(('/', os.sep)) or os.path.isdir(path):
+        return ColumnarCsvSink(path)
+    raise OutputPathError(f"Output {path!r} must end in .csv or .jsonl, or name a directory "
+                          f"(end it with '/' for a new one).")
+
+
+def stream_cursor(cursor, sink, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    Feed an executed (unbuffered) cursor's rows to a sink with fetchmany().
+    Returns the number of rows written.
+    """
+    columns = list(cursor.column_names)
+    sink.open(columns)
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            if not sink.write(as_tuples(rows, columns)):
+                # Stopped early: drain the rest chunk by chunk so the
+                # connection is clean when it goes back to the pool.
+                while cursor.fetchmany(fetch_size):
+                    pass
+                break
+    finally:
+        count = sink.close()
+    return count
+
+
+def write_rows(rows, sink, columns=None):
+    """Send an already-materialised list of row dicts through a sink."""
+    columns = columns or (list(rows[0].keys()) if rows else [])
+    sink.open(columns)
+    try:
+        if rows:
+            sink.write(as_tuples(rows, columns))
+    finally:
+        count = sink.close()
+    return count
@@ -0,0 +1,41 @@
+"""
+Shared fixtures. Most tests run on the embedded SQLite backend (a fresh
+database with the sample data per test); the MySQL-only checks use the
+server of main.DB_CONFIG (password from MEAL_DB_PASSWORD) and are skipped
+when it cannot be reached.
+"""
+import os
+import sys
+
+import mysql.connector
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_pool  # noqa: E402
+import refcache  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_pool(tmp_path, monkeypatch):
+    """A process-wide pool over a new SQLite database with the sample data."""
+    monkeypatch.setenv('MEAL_DB_BACKEND', 'sqlite')
+    monkeypatch.setenv('MEAL_SQLITE_PATH', str(tmp_path / 'meal.sqlite3'))
+    refcache.get_cache().clear()    # entries loaded from another test's database
+    pool = db_pool.init_pool({}, 4)
+    yield pool
+    db_pool.close_pool()
+
+
+@pytest.fixture
+def mysql_pool(monkeypatch):
+    """A one-connection pool on the local MySQL server, or skip."""
+    from main import DB_CONFIG
+    monkeypatch.setenv('MEAL_DB_BACKEND', 'mysql')
+    config = dict(DB_CONFIG, password=os.environ.get('MEAL_DB_PASSWORD', ''), connection_timeout=2)
+    try:
+        pool = db_pool.init_pool(config, 1)
+    except mysql.connector.Error as err:
+        pytest.skip(f"MySQL is not reachable: {err}")
+    yield pool
+    db_pool.close_pool()
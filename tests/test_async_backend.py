@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import operations
+from async_backend import AsyncBackend, BackendBusy
+
+
+@pytest.fixture
+def backend(sqlite_pool):
+    backends = []
+
+    def make(**options):
+        backends.append(AsyncBackend(**options))
+        return backends[-1]
+    yield make
+    for created in backends:
+        created.close()
+
+
+def test_operations_run_on_the_pool(backend):
+    async def run(async_backend):
+        return await asyncio.gather(async_backend.run_report('2', manufacturer_id='MFG001'),
+                                    async_backend.ingredient_list('100'),
+                                    async_backend.plan_product_batch('MFG001', '100', 100))
+    async_backend = backend()
+    assert async_backend.max_concurrency == 4       # the pool size
+    report, ingredients, plan = asyncio.run(run(async_backend))
+    assert report and ingredients
+    assert plan['recipe_id'] == 1
+    assert async_backend.in_flight == 0
+
+
+def test_concurrency_is_capped(backend, monkeypatch):
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def slow(product_id):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return product_id
+    monkeypatch.setattr(operations, 'ingredient_list', slow)
+    async_backend = backend(max_concurrency=2, max_pending=10)
+
+    async def run():
+        return await asyncio.gather(*(async_backend.ingredient_list(str(n)) for n in range(8)))
+    assert asyncio.run(run()) == [str(n) for n in range(8)]
+    assert peak[0] == 2
+
+
+def test_excess_calls_are_shed(backend, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(operations, 'ingredient_list', lambda product_id: release.wait(5) and product_id)
+    async_backend = backend(max_concurrency=1, max_pending=2)
+
+    async def run():
+        tasks = [asyncio.create_task(async_backend.ingredient_list(str(n))) for n in range(6)]
+        await asyncio.sleep(0.01)
+        assert async_backend.in_flight == 3         # one running, two waiting
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    results = asyncio.run(run())
+    assert results[:3] == ['0', '1', '2']
+    assert all(isinstance(result, BackendBusy) for result in results[3:])
+    assert async_backend.in_flight == 0
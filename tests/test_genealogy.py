@@ -0,0 +1,25 @@
+import genealogy
+from db_pool import borrow_connection
+
+
+def _lots(rows):
+    return sorted((row['ingredient_lot'], row['product_lot']) for row in rows)
+
+
+def test_graph_loads_only_the_traced_lots(sqlite_pool):
+    with borrow_connection() as (db, cursor):
+        cursor.execute("SELECT COUNT(*) AS n FROM BatchConsumption")
+        total = cursor.fetchone()['n']
+        graph = genealogy.ConsumptionGraph.load(cursor, ['106-20-B0006'])
+        assert 0 < graph.edges < total
+        assert set(graph.consumers) == {'106-20-B0006'}
+        assert _lots(genealogy.trace_forward(cursor, ['106-20-B0006'], graph)) == \
+            _lots(genealogy.trace_forward(cursor, ['106-20-B0006']))
+
+
+def test_recall_with_a_closure_graph(sqlite_pool):
+    with borrow_connection() as (db, cursor):
+        lots = genealogy.containing_lots(cursor, ['106'])
+        graph = genealogy.ConsumptionGraph.load(cursor, lots)
+        with_graph = list(genealogy.iter_recall(cursor, ['106'], graph, lots=lots))
+        assert _lots(row for rows in with_graph for row in rows) == _lots(genealogy.recall(cursor, ['106']))
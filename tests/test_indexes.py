@@ -0,0 +1,33 @@
+import os
+import re
+
+import queries
+from db_pool import borrow_connection
+from indexes import HOT_PATH_INDEXES, HOT_QUERIES, check_index_usage
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'sql_src', 'migrations', '001_hot_path_indexes.sql')
+
+
+def test_registered_hot_queries_are_checked_verbatim():
+    checked = {label: sql for label, sql, *_ in HOT_QUERIES}
+    for name in ('fefo_query', 'reservation_lock_lots', 'formulation_authorization', 'active_recipe',
+                 'product_context'):
+        assert checked[name] is queries.get(name)
+
+
+def test_every_managed_index_has_a_hot_query():
+    assert {expected for *_, expected, _ in HOT_QUERIES} == set(HOT_PATH_INDEXES)
+
+
+def test_migration_creates_the_managed_indexes():
+    with open(MIGRATION, encoding='utf-8') as handle:
+        calls = re.findall(r"CALL Create_Index_If_Missing\('(\w+)', '(\w+)',\s*'([^']+)'\)", handle.read())
+    declared = {index: (table, tuple(column.strip() for column in columns.split(',')))
+                for table, index, columns in calls}
+    assert declared == HOT_PATH_INDEXES
+
+
+def test_hot_queries_use_their_indexes(mysql_pool):
+    with borrow_connection() as (db, cursor):
+        assert check_index_usage(cursor) == []
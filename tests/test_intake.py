@@ -0,0 +1,14 @@
+import intake
+
+
+def test_chunk_size_reaches_the_lookups(sqlite_pool, monkeypatch):
+    seen = []
+    for name in ('authorized_ingredients', 'existing_lot_numbers'):
+        lookup = getattr(intake, name)
+        monkeypatch.setattr(intake, name, lambda *args, _lookup=lookup, _name=name:
+                            seen.append((_name, args[-1])) or _lookup(*args))
+    rows = [{'ingredient_id': '104', 'supplier_batch_id': f'T{n}', 'quantity': 10, 'per_unit_cost': 1,
+             'expiration_date': '2026-12-31'} for n in range(5)]
+    rejections, summary = intake.bulk_intake_lots('20', rows, intake_date=intake.date(2025, 11, 15), chunk_size=2)
+    assert seen == [('authorized_ingredients', 2), ('existing_lot_numbers', 2)]
+    assert (rejections, summary['accepted']) == ([], 5)
@@ -0,0 +1,54 @@
+from datetime import date
+
+import numpy as np
+
+import operations
+import refcache
+from benchmarks.bench_planning import day_loop
+from db_pool import borrow_connection
+from planning import plan_schedule
+
+START = date(2025, 11, 1)
+SCHEDULE = [
+    {'product_id': '100', 'quantity': 700, 'date': '2025-11-01'},   # more 106 and 201 than in stock
+    {'product_id': '100', 'quantity': 50, 'date': '2025-12-21'},
+    {'product_id': '101', 'quantity': 300, 'date': '2025-11-10'},
+    {'product_id': '101', 'quantity': 300, 'date': '2026-01-05'},   # after lots of 101/102/108 expire
+    {'product_id': '999', 'quantity': 10, 'date': '2025-11-02'},
+]
+
+
+def test_plan_matches_day_by_day_fefo(sqlite_pool):
+    with borrow_connection() as (db, cursor):
+        plan = plan_schedule(cursor, SCHEDULE, start=START)
+        shortage, waste, on_hand = day_loop(cursor, plan)
+    assert plan['shortage'].sum() > 0 and plan['waste'].sum() > 0
+    np.testing.assert_allclose(plan['shortage'], shortage, atol=1e-6)
+    np.testing.assert_allclose(plan['waste'], waste, atol=1e-6)
+    np.testing.assert_allclose(plan['on_hand'], on_hand, atol=1e-6)
+    assert [row['product_id'] for row in plan['unplanned']] == ['999']
+
+
+def test_consumption_is_capped_at_stock(sqlite_pool):
+    with borrow_connection() as (db, cursor):
+        plan = plan_schedule(cursor, SCHEDULE, start=START)
+        cursor.execute("SELECT SUM(quantity_on_hand) AS stock FROM IngredientBatch WHERE ingredient_id = '106'")
+        stock = float(cursor.fetchone()['stock'])
+    n = plan['ingredient_ids'].index('106')
+    consumed, waste = plan['consumed'][:, n], plan['waste'][:, n]
+    assert consumed.sum() == stock
+    assert (consumed <= plan['demand'][:, n]).all()
+    np.testing.assert_allclose(consumed + plan['shortage'][:, n], plan['demand'][:, n])
+    assert waste.sum() == 0 and plan['on_hand'][-1, n] == 0
+
+
+def test_newest_active_recipe_is_current(sqlite_pool):
+    recipe_id = operations.create_recipe('MFG001', '100', 'v2-Steak-Dinner',
+                                         [{'ingredient_id': '106', 'quantity': 8}])
+    with borrow_connection() as (db, cursor):
+        assert refcache.active_recipe_id(cursor, '100') == recipe_id
+        assert refcache.product_context(cursor, '100')['recipe_id'] == recipe_id
+        plan = plan_schedule(cursor, [{'product_id': '100', 'quantity': 10, 'date': START}], start=START)
+    assert plan['ingredient_ids'] == ['106']
+    assert plan['demand'].sum() == 80
+    assert operations.plan_product_batch('MFG001', '100', 100)['recipe_id'] == recipe_id
@@ -0,0 +1,66 @@
+import threading
+
+from refcache import RefCache
+
+
+def _load_across(cache, invalidate):
+    """Load 'old' while invalidate() runs mid-load, then return what a fresh lookup sees."""
+    def loader():
+        invalidate()
+        return 'old'
+    assert cache.get_or_load('product', '100', loader) == 'old'
+    return cache.get_or_load('product', '100', lambda: 'new')
+
+
+def test_hit_after_load():
+    cache = RefCache(ttl=60)
+    assert cache.get_or_load('product', '100', lambda: 'a') == 'a'
+    assert cache.get_or_load('product', '100', lambda: 'b') == 'a'
+    assert cache.stats()['hits'] == 1
+
+
+def test_none_is_not_cached():
+    cache = RefCache(ttl=60)
+    assert cache.get_or_load('product', '100', lambda: None) is None
+    assert cache.get_or_load('product', '100', lambda: 'a') == 'a'
+
+
+def test_key_invalidation_during_load_wins():
+    cache = RefCache(ttl=60)
+    assert _load_across(cache, lambda: cache.invalidate('product', '100')) == 'new'
+
+
+def test_namespace_invalidation_during_load_wins():
+    cache = RefCache(ttl=60)
+    assert _load_across(cache, lambda: cache.invalidate('product')) == 'new'
+
+
+def test_clear_during_load_wins():
+    cache = RefCache(ttl=60)
+    assert _load_across(cache, cache.clear) == 'new'
+
+
+def test_other_keys_still_cached():
+    cache = RefCache(ttl=60)
+    def loader():
+        cache.invalidate('product', '101')
+        return 'a'
+    cache.get_or_load('product', '100', loader)
+    assert cache.get_or_load('product', '100', lambda: 'b') == 'a'
+
+
+def test_concurrent_invalidation():
+    cache = RefCache(ttl=60)
+    loading, invalidated = threading.Event(), threading.Event()
+
+    def slow_loader():
+        loading.set()
+        invalidated.wait(5)
+        return 'stale'
+    reader = threading.Thread(target=cache.get_or_load, args=('product', '100', slow_loader))
+    reader.start()
+    loading.wait(5)
+    cache.invalidate('product', '100')
+    invalidated.set()
+    reader.join(5)
+    assert cache.get_or_load('product', '100', lambda: 'fresh') == 'fresh'
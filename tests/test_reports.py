@@ -0,0 +1,46 @@
+import reports
+from db_pool import borrow_connection
+
+
+def _product_lots(cursor):
+    cursor.execute("SELECT lot_number FROM ProductBatch ORDER BY lot_number")
+    return [row['lot_number'] for row in cursor.fetchall()]
+
+
+def test_report_4_is_chunked(sqlite_pool, monkeypatch):
+    monkeypatch.setattr(reports, 'LOT_CHUNK_SIZE', 1)
+    with borrow_connection() as (db, cursor):
+        lots = _product_lots(cursor)
+        assert len(lots) > 1
+        expected = reports.conflicting_ingredients(cursor, lots)
+        executed = []
+        execute = cursor.execute
+        monkeypatch.setattr(cursor, 'execute', lambda sql, params=(): executed.append(params) or execute(sql, params),
+                            raising=False)
+        result = reports.execute_report(cursor, '4', product_lots=lots)
+        assert list(result.column_names) == ['Product Lot', 'Conflicting ID', 'Conflicting Ingredient Name']
+        rows = result.fetchall()
+    assert rows and rows == expected
+    assert executed == [(lot,) for lot in lots]
+
+
+def test_chunked_fetchmany_spans_chunks(sqlite_pool, monkeypatch):
+    monkeypatch.setattr(reports, 'LOT_CHUNK_SIZE', 1)
+    with borrow_connection() as (db, cursor):
+        lots = _product_lots(cursor)
+        expected = reports.conflicting_ingredients(cursor, lots)
+        result = reports.execute_report(cursor, '4', product_lots=lots)
+        rows = []
+        while True:
+            batch = result.fetchmany(2)
+            if not batch:
+                break
+            rows.extend(batch)
+    assert rows == expected
+
+
+def test_report_7_horizon(sqlite_pool):
+    with borrow_connection() as (db, cursor):
+        short = reports.execute_report(cursor, '7', as_of='2025-11-15', horizon_days=1).fetchall()
+        long = reports.execute_report(cursor, '7', as_of='2025-11-15', horizon_days=60).fetchall()
+    assert len(short) < len(long)
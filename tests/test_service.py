@@ -0,0 +1,142 @@
+import base64
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import operations
+from service import ServiceServer
+
+MANUFACTURER = ('jsmith', 'password123')
+SUPPLIER = ('jdoe', 'password123')
+VIEWER = ('bjohnson', 'password123')
+
+
+@pytest.fixture
+def base_url(sqlite_pool):
+    server = ServiceServer(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def call(base_url, method, path, body=None, user=VIEWER):
+    """(status, headers, decoded JSON payload) of one request."""
+    request = urllib.request.Request(base_url + path, method=method,
+                                     data=None if body is None else json.dumps(body).encode('utf-8'))
+    if body is not None:
+        request.add_header('Content-Type', 'application/json')
+    if user is not None:
+        request.add_header('Authorization', 'Basic ' + base64.b64encode(':'.join(user).encode()).decode())
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return err.code, err.headers, json.loads(err.read())
+
+
+def test_browse_products(base_url):
+    status, _, payload = call(base_url, 'GET', '/products')
+    assert status == 200
+    assert {row['ID'] for row in payload['products']} == {'100', '101'}
+
+
+def test_plan_batch(base_url):
+    status, _, payload = call(base_url, 'POST', '/manufacturer/batches/plan',
+                              {'product_id': '100', 'produced_quantity': 100}, user=MANUFACTURER)
+    assert status == 200
+    assert payload['recipe_id'] == 1
+    assert payload['consumption_plan']
+
+
+def test_near_expiry_report(base_url):
+    status, _, payload = call(base_url, 'GET', '/manufacturer/reports/7?as_of=2025-11-01&days=30',
+                              user=MANUFACTURER)
+    assert status == 200
+    assert payload['report'] == '7'
+
+
+def test_missing_credentials(base_url):
+    status, headers, _ = call(base_url, 'GET', '/products', user=None)
+    assert status == 401
+    assert headers['WWW-Authenticate'].startswith('Basic')
+
+
+def test_wrong_password(base_url):
+    status, _, _ = call(base_url, 'GET', '/products', user=('jsmith', 'wrong'))
+    assert status == 401
+
+
+def test_wrong_role(base_url):
+    status, _, _ = call(base_url, 'GET', '/manufacturer/reports/1', user=SUPPLIER)
+    assert status == 403
+
+
+def test_unknown_path(base_url):
+    status, _, _ = call(base_url, 'GET', '/nowhere')
+    assert status == 404
+
+
+def test_wrong_method(base_url):
+    status, headers, _ = call(base_url, 'GET', '/manufacturer/recipes', user=MANUFACTURER)
+    assert status == 405
+    assert headers['Allow'] == 'POST'
+    status, headers, _ = call(base_url, 'POST', '/metrics', {})
+    assert status == 405
+    assert headers['Allow'] == 'GET'
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/manufacturer/batches/plan', {'product_id': '100'}),
+    ('/manufacturer/batches/plan', {'product_id': '100', 'produced_quantity': 'lots'}),
+    ('/manufacturer/recipes', {'product_id': '100', 'name': 'v2', 'ingredients': 'salt'}),
+    ('/manufacturer/recipes', {'product_id': '100', 'name': 'v2', 'ingredients': [{'quantity': 1}]}),
+])
+def test_malformed_request(base_url, path, body):
+    status, _, payload = call(base_url, 'POST', path, body, user=MANUFACTURER)
+    assert status == 400
+    assert payload['error']
+
+
+def test_malformed_query(base_url):
+    status, _, _ = call(base_url, 'GET', '/manufacturer/reports/7?as_of=soon', user=MANUFACTURER)
+    assert status == 400
+
+
+def test_rejected_operation(base_url):
+    status, _, payload = call(base_url, 'POST', '/manufacturer/batches/plan',
+                              {'product_id': '100', 'produced_quantity': 150}, user=MANUFACTURER)
+    assert status == 400
+    assert 'multiple' in payload['error']
+
+
+def test_handler_bug_is_a_server_error(base_url, monkeypatch, caplog):
+    def broken():
+        return {}['products']
+    monkeypatch.setattr(operations, 'browse_products', broken)
+    with caplog.at_level(logging.ERROR, logger='service'):
+        status, _, payload = call(base_url, 'GET', '/products')
+    assert status == 500
+    assert 'KeyError' not in payload['error']
+    assert any(record.exc_info for record in caplog.records)
+
+
+def test_metrics_count_errors(base_url):
+    call(base_url, 'GET', '/products')
+    call(base_url, 'GET', '/products', user=None)
+    # a request is recorded just after its response is sent
+    deadline = time.monotonic() + 5
+    while True:
+        status, _, payload = call(base_url, 'GET', '/metrics', user=None)
+        stats = payload['endpoints'].get('GET /products', {'requests': 0})
+        if stats['requests'] == 2 or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    assert status == 200
+    assert (stats['requests'], stats['errors']) == (2, 1)
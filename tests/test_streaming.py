@@ -0,0 +1,23 @@
+import pytest
+
+from streaming import ColumnarCsvSink, CsvSink, JsonlSink, OutputPathError, TableSink, sink_for_path, write_rows
+
+
+def test_sink_for_path(tmp_path):
+    assert isinstance(sink_for_path(''), TableSink)
+    assert isinstance(sink_for_path(str(tmp_path / 'out.csv')), CsvSink)
+    assert isinstance(sink_for_path(str(tmp_path / 'out.jsonl')), JsonlSink)
+    assert isinstance(sink_for_path(str(tmp_path)), ColumnarCsvSink)
+    assert isinstance(sink_for_path(str(tmp_path / 'new') + '/'), ColumnarCsvSink)
+
+
+def test_unknown_extension_is_rejected(tmp_path):
+    with pytest.raises(OutputPathError):
+        sink_for_path(str(tmp_path / 'out.txt'))
+    assert not (tmp_path / 'out.txt').exists()
+
+
+def test_columnar_export(tmp_path):
+    sink = sink_for_path(str(tmp_path / 'cols') + '/')
+    assert write_rows([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}], sink) == 2
+    assert sorted(path.name for path in (tmp_path / 'cols').iterdir()) == ['00_id.csv', '01_name.csv']